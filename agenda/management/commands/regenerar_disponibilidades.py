@@ -1,8 +1,7 @@
 from django.core.management.base import BaseCommand
-from django.db.models import Q
 from cuentas.models import CustomUser
-from agenda.models import HorarioFijoVeterinario, DisponibilidadBloquesDia
-from agenda.views import _generar_disponibilidades_desde_horario_semanal
+from agenda.models import block_index_to_time
+from agenda.services.disponibilidades import generar_disponibilidades
 
 
 class Command(BaseCommand):
@@ -18,38 +17,60 @@ class Command(BaseCommand):
             '--semanas',
             type=int,
             default=8,
-            help='Número de semanas a generar (por defecto 8)',
+            help='Número de semanas a generar (por defecto 8, ej. 52 para un año)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Muestra los cambios que se harían sin escribir en la base de datos',
         )
 
     def handle(self, *args, **options):
         veterinario_id = options.get('veterinario')
         semanas = options.get('semanas', 8)
-        
+        dry_run = options.get('dry_run', False)
+
         if veterinario_id:
-            # Regenerar para un veterinario específico
-            try:
-                veterinario = CustomUser.objects.get(pk=veterinario_id, rol='veterinario')
-                self.stdout.write(f'Regenerando disponibilidades para {veterinario.nombre} {veterinario.apellido}...')
-                _generar_disponibilidades_desde_horario_semanal(veterinario, semanas=semanas)
-                self.stdout.write(self.style.SUCCESS(f'✓ Disponibilidades regeneradas para {veterinario.nombre}'))
-            except CustomUser.DoesNotExist:
+            veterinarios = CustomUser.objects.filter(pk=veterinario_id, rol='veterinario')
+            if not veterinarios.exists():
                 self.stdout.write(self.style.ERROR(f'✗ Veterinario con ID {veterinario_id} no encontrado'))
+                return
         else:
-            # Regenerar para todos los veterinarios con horarios configurados
-            veterinarios_con_horarios = CustomUser.objects.filter(
+            # Todos los veterinarios con horarios configurados
+            veterinarios = CustomUser.objects.filter(
                 rol='veterinario',
                 horarios_fijos__activo=True
             ).distinct()
-            
-            total = veterinarios_con_horarios.count()
-            self.stdout.write(f'Encontrados {total} veterinarios con horarios configurados')
-            
-            for i, veterinario in enumerate(veterinarios_con_horarios, 1):
-                self.stdout.write(f'[{i}/{total}] Procesando {veterinario.nombre} {veterinario.apellido}...')
-                try:
-                    _generar_disponibilidades_desde_horario_semanal(veterinario, semanas=semanas)
-                    self.stdout.write(self.style.SUCCESS(f'  ✓ Completado'))
-                except Exception as e:
-                    self.stdout.write(self.style.ERROR(f'  ✗ Error: {str(e)}'))
-            
-            self.stdout.write(self.style.SUCCESS(f'\n✓ Proceso completado para {total} veterinarios'))
+
+        nombres = {v.id: f'{v.nombre} {v.apellido}' for v in veterinarios}
+        self.stdout.write(f'Encontrados {len(nombres)} veterinarios con horarios configurados')
+
+        resumen = generar_disponibilidades(list(nombres), semanas=semanas, dry_run=dry_run)
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING('Modo dry-run: no se escribirán cambios'))
+            for accion, cambios in (('+', resumen['crear']), ('~', resumen['actualizar'])):
+                for cambio in cambios:
+                    antes = cambio['antes']
+                    despues = cambio['despues']
+                    self.stdout.write(
+                        f"  {accion} {cambio['fecha']} {nombres.get(cambio['veterinario_id'])}: "
+                        f"{self._describir(antes)} -> {self._describir(despues)}"
+                    )
+
+        creadas, actualizadas = ('por crear', 'por actualizar') if dry_run else ('creadas', 'actualizadas')
+        self.stdout.write(self.style.SUCCESS(
+            f"\n✓ {len(resumen['crear'])} {creadas}, {len(resumen['actualizar'])} {actualizadas}, "
+            f"{resumen['sin_cambios']} sin cambios, {resumen['personalizadas']} personalizadas (no modificadas)"
+        ))
+
+    @staticmethod
+    def _describir(estado):
+        if estado is None:
+            return '(no existe)'
+        if not estado['trabaja']:
+            return 'no trabaja'
+        return ', '.join(
+            f"{block_index_to_time(r['start_block']):%H:%M}-{block_index_to_time(r['end_block']):%H:%M}"
+            for r in estado['rangos']
+        )
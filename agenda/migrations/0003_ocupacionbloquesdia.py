@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agenda', '0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OcupacionBloquesDia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('tiene_disponibilidad', models.BooleanField(default=False, help_text='Indica si existe DisponibilidadBloquesDia para el día')),
+                ('trabaja', models.BooleanField(default=False)),
+                ('disponible_hex', models.CharField(default='0', help_text='Bitmap de bloques disponibles', max_length=24)),
+                ('ocupado_hex', models.CharField(default='0', help_text='Bitmap de bloques ocupados por citas activas', max_length=24)),
+                ('intervalos', models.JSONField(default=dict, help_text='Dict {cita_id: [start_block, end_block, hora_inicio, hora_fin]} de citas activas')),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+                ('veterinario', models.ForeignKey(limit_choices_to={'rol': 'veterinario'}, on_delete=django.db.models.deletion.CASCADE, related_name='ocupaciones_bloques', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Ocupación diaria (bloques)',
+                'verbose_name_plural': 'Ocupaciones diarias (bloques)',
+                'ordering': ['fecha'],
+                'unique_together': {('veterinario', 'fecha')},
+            },
+        ),
+    ]
@@ -213,6 +213,63 @@ class DisponibilidadBloquesDia(models.Model):
         self.rangos = merged
 
 
+class OcupacionBloquesDia(models.Model):
+    """
+    Mapa de ocupación materializado por veterinario y día.
+
+    Guarda la disponibilidad y los bloques ocupados como bitmaps de 96 bits
+    (bit i = bloque i de 15 min) codificados en hexadecimal, para que sean
+    portables entre motores. Se mantiene de forma incremental desde los
+    signals de Cita y DisponibilidadBloquesDia (ver agenda/signals.py) y se
+    reconstruye bajo demanda si falta (ver agenda/services/ocupacion.py).
+    """
+
+    veterinario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='ocupaciones_bloques',
+        limit_choices_to={'rol': 'veterinario'}
+    )
+    fecha = models.DateField()
+    tiene_disponibilidad = models.BooleanField(
+        default=False,
+        help_text='Indica si existe DisponibilidadBloquesDia para el día'
+    )
+    trabaja = models.BooleanField(default=False)
+    disponible_hex = models.CharField(max_length=24, default='0', help_text='Bitmap de bloques disponibles')
+    ocupado_hex = models.CharField(max_length=24, default='0', help_text='Bitmap de bloques ocupados por citas activas')
+    intervalos = models.JSONField(
+        default=dict,
+        help_text='Dict {cita_id: [start_block, end_block, hora_inicio, hora_fin]} de citas activas'
+    )
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Ocupación diaria (bloques)'
+        verbose_name_plural = 'Ocupaciones diarias (bloques)'
+        ordering = ['fecha']
+        unique_together = ['veterinario', 'fecha']
+
+    def __str__(self):
+        return f"{self.veterinario_id} - {self.fecha} ({len(self.intervalos)} citas)"
+
+    @property
+    def mascara_disponible(self) -> int:
+        return int(self.disponible_hex or '0', 16)
+
+    @mascara_disponible.setter
+    def mascara_disponible(self, value: int):
+        self.disponible_hex = format(value, 'x')
+
+    @property
+    def mascara_ocupada(self) -> int:
+        return int(self.ocupado_hex or '0', 16)
+
+    @mascara_ocupada.setter
+    def mascara_ocupada(self, value: int):
+        self.ocupado_hex = format(value, 'x')
+
+
 class Cita(models.Model):
     ESTADO_CHOICES = [
         ('pendiente', 'Pendiente'),
@@ -307,44 +364,27 @@ class Cita(models.Model):
             if self.hora_inicio >= self.hora_fin:
                 raise ValidationError('La hora de inicio debe ser menor que la hora de fin')
 
-        # Validar disponibilidad por bloques si existe registro diario
-        if self.veterinario_id and self.fecha and self.start_block is not None and self.end_block is not None:
-            disponibilidad_dia = DisponibilidadBloquesDia.objects.filter(veterinario=self.veterinario, fecha=self.fecha).first()
-
-            if disponibilidad_dia:
-                if not disponibilidad_dia.trabaja:
-                    raise ValidationError('El veterinario no trabaja este día.')
-
-                dentro = any(
-                    rng['start_block'] <= self.start_block and self.end_block <= rng['end_block']
-                    for rng in disponibilidad_dia.rangos
-                )
-                if not dentro:
-                    raise ValidationError('El horario solicitado está fuera de la disponibilidad configurada.')
-
-        # Validar solapes con otras citas usando bloques si ambos lo tienen
+        # Validar disponibilidad y solapes (mapa de ocupación como atajo, Cita como verificación final)
         if self.veterinario_id and self.fecha:
-            citas_existentes = Cita.objects.filter(
-                veterinario=self.veterinario,
-                fecha=self.fecha,
-                estado__in=['pendiente', 'confirmada', 'en_curso']
-            )
-            if self.pk:
-                citas_existentes = citas_existentes.exclude(pk=self.pk)
-
-            for cita in citas_existentes:
-                if self.start_block is not None and self.end_block is not None and cita.start_block is not None and cita.end_block is not None:
-                    if self.start_block < cita.end_block and self.end_block > cita.start_block:
-                        raise ValidationError(
-                            f'Bloques ocupados por otra cita {cita.hora_inicio.strftime("%H:%M")} - {cita.hora_fin.strftime("%H:%M")}.'
-                        )
-                elif cita.hora_fin and self.hora_fin:
-                    if self.hora_inicio < cita.hora_fin and self.hora_fin > cita.hora_inicio:
-                        raise ValidationError(
-                            f'Ya existe una cita agendada para este veterinario que se solapa '
-                            f'con el horario {cita.hora_inicio.strftime("%H:%M")} - {cita.hora_fin.strftime("%H:%M")}'
-                        )
+            from .services.ocupacion import bloques_de_cita, validar_cita
+
+            bloques = bloques_de_cita(self)
+            if bloques:
+                validar_cita(
+                    self.veterinario_id,
+                    self.fecha,
+                    *bloques,
+                    excluir_cita_id=self.pk,
+                    validar_disponibilidad=self.start_block is not None and self.end_block is not None,
+                )
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Día con el que se cargó la cita, para retirarla de su mapa de ocupación si cambia
+        instance._ocupacion_original = (instance.__dict__.get('veterinario_id'), instance.__dict__.get('fecha'))
+        return instance
+
     def save(self, *args, **kwargs):
         self.full_clean()
         super().save(*args, **kwargs)
@@ -0,0 +1,142 @@
+"""
+Generación masiva de DisponibilidadBloquesDia desde el horario semanal.
+
+Carga de una vez los horarios fijos y las disponibilidades existentes de todo
+el rango, calcula las diferencias en memoria y las aplica con bulk_create /
+bulk_update. Solo se sobrescriben días generados automáticamente: los días
+editados a mano (notas personalizadas) se respetan.
+
+FUNCIONES:
+- generar_disponibilidades(): Calcula y (salvo dry_run) aplica los cambios
+"""
+
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from agenda.models import DisponibilidadBloquesDia, HorarioFijoVeterinario, time_to_block_index
+
+from .ocupacion import descartar_ocupaciones
+
+
+NOTA_GENERADO = 'Generado automáticamente desde horario semanal'
+NOTA_NO_TRABAJA = 'No trabaja este día'
+NOTAS_AUTOMATICAS = (NOTA_GENERADO, NOTA_NO_TRABAJA)
+
+TAMANO_LOTE = 500
+
+
+def _rangos_por_dia(veterinario_ids):
+    """{veterinario_id: {dia_semana: [rangos]}} con una sola consulta."""
+    horarios = HorarioFijoVeterinario.objects.filter(
+        veterinario_id__in=veterinario_ids,
+        activo=True
+    ).order_by('veterinario_id', 'dia_semana', 'hora_inicio').values_list(
+        'veterinario_id', 'dia_semana', 'hora_inicio', 'hora_fin'
+    )
+    resultado = {}
+    for veterinario_id, dia_semana, hora_inicio, hora_fin in horarios:
+        resultado.setdefault(veterinario_id, {}).setdefault(dia_semana, []).append({
+            'start_block': time_to_block_index(hora_inicio),
+            'end_block': time_to_block_index(hora_fin),
+        })
+    return resultado
+
+
+def generar_disponibilidades(veterinario_ids, semanas=8, desde=None, dry_run=False):
+    """
+    Genera las disponibilidades diarias de los veterinarios desde su horario semanal.
+
+    Args:
+        veterinario_ids: IDs de los veterinarios a procesar
+        semanas: Horizonte en semanas (desde `desde` hasta `desde + semanas`, inclusive)
+        desde: Fecha inicial (por defecto, hoy)
+        dry_run: Si es True solo calcula el diff, sin escribir en la base de datos
+
+    Returns:
+        dict: {
+            'crear': [cambio, ...],
+            'actualizar': [cambio, ...],
+            'sin_cambios': int,
+            'personalizadas': int,   # días con notas manuales que no se tocan
+        }
+        donde cada cambio es {'veterinario_id', 'fecha', 'antes', 'despues'}
+        y 'antes'/'despues' son {'trabaja', 'rangos'} (o None si no existía).
+    """
+    fecha_inicio = desde or date.today()
+    fecha_fin = fecha_inicio + timedelta(weeks=semanas)
+    fechas = [fecha_inicio + timedelta(days=i) for i in range((fecha_fin - fecha_inicio).days + 1)]
+
+    # Igual que antes: un veterinario sin horario semanal no se regenera
+    rangos_por_vet = _rangos_por_dia(veterinario_ids)
+
+    existentes = {
+        (disp.veterinario_id, disp.fecha): disp
+        for disp in DisponibilidadBloquesDia.objects.filter(
+            veterinario_id__in=list(rangos_por_vet),
+            fecha__range=(fecha_inicio, fecha_fin)
+        )
+    }
+
+    resumen = {'crear': [], 'actualizar': [], 'sin_cambios': 0, 'personalizadas': 0}
+    nuevas, modificadas = [], []
+    ahora = timezone.now()
+
+    for veterinario_id, rangos_semana in rangos_por_vet.items():
+        for fecha in fechas:
+            rangos = rangos_semana.get(fecha.weekday(), [])
+            deseado = {
+                'trabaja': bool(rangos),
+                'rangos': rangos,
+                'notas': NOTA_GENERADO if rangos else NOTA_NO_TRABAJA,
+            }
+            disp = existentes.get((veterinario_id, fecha))
+
+            if disp is None:
+                nuevas.append(DisponibilidadBloquesDia(veterinario_id=veterinario_id, fecha=fecha, **deseado))
+                resumen['crear'].append({
+                    'veterinario_id': veterinario_id,
+                    'fecha': fecha,
+                    'antes': None,
+                    'despues': {'trabaja': deseado['trabaja'], 'rangos': rangos},
+                })
+                continue
+
+            if disp.notas not in NOTAS_AUTOMATICAS:
+                resumen['personalizadas'] += 1
+                continue
+
+            if (disp.trabaja, disp.rangos, disp.notas) == (deseado['trabaja'], rangos, deseado['notas']):
+                resumen['sin_cambios'] += 1
+                continue
+
+            resumen['actualizar'].append({
+                'veterinario_id': veterinario_id,
+                'fecha': fecha,
+                'antes': {'trabaja': disp.trabaja, 'rangos': disp.rangos},
+                'despues': {'trabaja': deseado['trabaja'], 'rangos': rangos},
+            })
+            disp.trabaja = deseado['trabaja']
+            disp.rangos = rangos
+            disp.notas = deseado['notas']
+            # bulk_update no aplica auto_now
+            disp.fecha_modificacion = ahora
+            modificadas.append(disp)
+
+    if dry_run or not (nuevas or modificadas):
+        return resumen
+
+    with transaction.atomic():
+        DisponibilidadBloquesDia.objects.bulk_create(nuevas, batch_size=TAMANO_LOTE)
+        DisponibilidadBloquesDia.objects.bulk_update(
+            modificadas,
+            ['trabaja', 'rangos', 'notas', 'fecha_modificacion'],
+            batch_size=TAMANO_LOTE
+        )
+        # Las operaciones masivas no disparan signals: descartar los mapas afectados
+        descartar_ocupaciones(
+            [(d.veterinario_id, d.fecha) for d in nuevas] +
+            [(d.veterinario_id, d.fecha) for d in modificadas]
+        )
+    return resumen
@@ -0,0 +1,121 @@
+"""
+Búsqueda de los primeros huecos libres para un servicio.
+
+Recorre el horizonte por semanas cargando en lote los mapas de ocupación de
+todos los veterinarios (ver ocupacion.obtener_ocupaciones) y, para cada día,
+obtiene los inicios válidos con operaciones sobre bitmaps: no se construye la
+grilla de bloques ni se consulta la base de datos por día.
+"""
+
+from datetime import timedelta
+
+from django.utils import timezone
+
+from agenda.models import BLOCK_MINUTES, Cita
+from cuentas.models import CustomUser
+
+from .ocupacion import (
+    ESTADOS_ACTIVOS,
+    ETIQUETAS_BLOQUES,
+    MASCARA_DIA,
+    bloques_libres,
+    inicios_posibles,
+    iterar_bits,
+    obtener_ocupaciones,
+    rango_a_mascara,
+    rango_de_bloques,
+)
+
+
+DIAS_POR_LOTE = 7
+
+
+def _mascaras_paciente(paciente_id, fechas):
+    """Bloques ya comprometidos por el paciente en otras citas activas, por día."""
+    mascaras = {}
+    citas = Cita.objects.filter(
+        paciente_id=paciente_id,
+        fecha__in=fechas,
+        estado__in=ESTADOS_ACTIVOS
+    ).values_list('fecha', 'start_block', 'end_block', 'hora_inicio', 'hora_fin')
+    for fecha, start_block, end_block, hora_inicio, hora_fin in citas:
+        bloques = rango_de_bloques(start_block, end_block, hora_inicio, hora_fin)
+        if bloques:
+            mascaras[fecha] = mascaras.get(fecha, 0) | rango_a_mascara(*bloques)
+    return mascaras
+
+
+def buscar_primeros_huecos(servicio, cantidad=5, desde=None, dias=14, veterinario_ids=None, paciente_id=None):
+    """
+    Devuelve los primeros huecos donde cabe el servicio, en orden cronológico.
+
+    Solo considera días con disponibilidad configurada en los que el
+    veterinario trabaja, igual que agendar_cita_por_bloques.
+
+    Args:
+        servicio: Instancia de Servicio (define los bloques requeridos)
+        cantidad: Máximo de huecos a devolver
+        desde: Fecha inicial (por defecto, hoy; hoy solo considera bloques futuros)
+        dias: Largo del horizonte de búsqueda en días
+        veterinario_ids: Restringe la búsqueda a estos veterinarios (opcional)
+        paciente_id: Excluye horarios en que el paciente ya tiene otra cita (opcional)
+
+    Returns:
+        list[dict]: veterinario_id, veterinario, fecha, start_block, end_block,
+                    hora_inicio, hora_fin
+    """
+    ahora = timezone.localtime()
+    hoy = ahora.date()
+    desde = max(desde or hoy, hoy)
+    bloques_requeridos = servicio.blocks_required
+
+    veterinarios = CustomUser.objects.filter(rol='veterinario', is_active=True)
+    if veterinario_ids:
+        veterinarios = veterinarios.filter(id__in=veterinario_ids)
+    veterinarios = list(veterinarios.order_by('nombre', 'apellido').only('id', 'nombre', 'apellido'))
+    if not veterinarios or cantidad <= 0:
+        return []
+    veterinario_ids = [vet.id for vet in veterinarios]
+
+    # Bloques de hoy que ya comenzaron
+    bloque_actual = -(-(ahora.hour * 60 + ahora.minute) // BLOCK_MINUTES)
+    mascara_pasado_hoy = rango_a_mascara(0, bloque_actual)
+
+    huecos = []
+    for inicio_lote in range(0, dias, DIAS_POR_LOTE):
+        fechas = [desde + timedelta(days=i) for i in range(inicio_lote, min(inicio_lote + DIAS_POR_LOTE, dias))]
+        ocupaciones = obtener_ocupaciones(veterinario_ids, fechas)
+        mascaras_paciente = _mascaras_paciente(paciente_id, fechas) if paciente_id else {}
+
+        for fecha in fechas:
+            bloqueados = mascaras_paciente.get(fecha, 0)
+            if fecha == hoy:
+                bloqueados |= mascara_pasado_hoy
+
+            candidatos = []
+            for vet in veterinarios:
+                ocupacion = ocupaciones[(vet.id, fecha)]
+                if not ocupacion.tiene_disponibilidad or not ocupacion.trabaja:
+                    continue
+                libres = bloques_libres(ocupacion) & ~bloqueados & MASCARA_DIA
+                # Cada veterinario aporta como máximo `cantidad` inicios por día
+                for n, start_block in enumerate(iterar_bits(inicios_posibles(libres, bloques_requeridos))):
+                    if n >= cantidad:
+                        break
+                    candidatos.append((start_block, vet))
+
+            candidatos.sort(key=lambda c: c[0])
+            for start_block, vet in candidatos:
+                end_block = start_block + bloques_requeridos
+                huecos.append({
+                    'veterinario_id': vet.id,
+                    'veterinario': f"{vet.nombre} {vet.apellido}",
+                    'fecha': fecha.isoformat(),
+                    'start_block': start_block,
+                    'end_block': end_block,
+                    'hora_inicio': ETIQUETAS_BLOQUES[start_block][0],
+                    'hora_fin': ETIQUETAS_BLOQUES[end_block - 1][1],
+                })
+                if len(huecos) >= cantidad:
+                    return huecos
+    return huecos
@@ -0,0 +1,529 @@
+"""
+Motor de ocupación de la agenda por bloques de 15 minutos.
+
+Cada día de un veterinario se representa con dos bitmaps de 96 bits
+(bit i = bloque i): los bloques disponibles según DisponibilidadBloquesDia y
+los bloques ocupados por citas activas. Con ellos, validar solapes, buscar
+huecos libres y pintar la grilla se reduce a operaciones AND/OR en lugar de
+recorrer cada cita bloque a bloque.
+
+Los bitmaps viven en OcupacionBloquesDia (tabla materializada, compartida por
+todos los workers y transaccional con las citas). Se construyen bajo demanda
+con dos consultas y se mantienen de forma incremental desde agenda/signals.py.
+
+NOTA: QuerySet.update() y bulk_create() no disparan signals; tras una
+modificación masiva de citas o disponibilidades usar reconstruir_ocupacion()
+o descartar_ocupaciones().
+
+FUNCIONES:
+- obtener_ocupacion(): Devuelve (o construye) el mapa de un veterinario/día
+- obtener_ocupaciones(): Idem para varios veterinarios y días en lote
+- validar_bloques(): Verifica disponibilidad y solapes con bitmaps
+- validar_cita(): Validación de Cita.clean (mapa como atajo, Cita como verificación final)
+- citas_en_conflicto(): Citas activas que se cruzan con un rango, leídas de Cita
+- sincronizar_cita() / sincronizar_disponibilidad(): Actualización incremental
+- renderizar_bloques(): Genera los 96 bloques para la grilla de agenda
+"""
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from agenda.models import (
+    BLOCK_MINUTES,
+    Cita,
+    DisponibilidadBloquesDia,
+    OcupacionBloquesDia,
+    block_index_to_time,
+)
+
+
+BLOQUES_DIA = 96
+MASCARA_DIA = (1 << BLOQUES_DIA) - 1
+ESTADOS_ACTIVOS = ('pendiente', 'confirmada', 'en_curso')
+
+# (hora_inicio, hora_fin) formateadas de cada bloque; se calculan una sola vez
+ETIQUETAS_BLOQUES = tuple(
+    (block_index_to_time(idx).strftime('%H:%M'), block_index_to_time(idx + 1).strftime('%H:%M'))
+    for idx in range(BLOQUES_DIA)
+)
+
+
+# ============================================
+# OPERACIONES SOBRE BITMAPS
+# ============================================
+
+def rango_a_mascara(start_block, end_block):
+    """Bitmap con los bloques [start_block, end_block) encendidos."""
+    start_block = max(0, start_block)
+    end_block = min(BLOQUES_DIA, end_block)
+    if end_block <= start_block:
+        return 0
+    return ((1 << (end_block - start_block)) - 1) << start_block
+
+
+def mascara_de_rangos(rangos):
+    """Convierte una lista de {'start_block', 'end_block'} en bitmap."""
+    mascara = 0
+    for rng in rangos or []:
+        try:
+            mascara |= rango_a_mascara(int(rng['start_block']), int(rng['end_block']))
+        except (KeyError, TypeError, ValueError):
+            continue
+    return mascara
+
+
+def mascara_a_rangos(mascara):
+    """Convierte un bitmap en la lista de rangos contiguos que representa."""
+    rangos = []
+    idx = 0
+    mascara &= MASCARA_DIA
+    while mascara >> idx:
+        if not (mascara >> idx) & 1:
+            # Saltar directo al siguiente bit encendido
+            resto = mascara >> idx
+            idx += (resto & -resto).bit_length() - 1
+            continue
+        inicio = idx
+        while idx < BLOQUES_DIA and (mascara >> idx) & 1:
+            idx += 1
+        rangos.append({'start_block': inicio, 'end_block': idx})
+    return rangos
+
+
+def rango_de_bloques(start_block, end_block, hora_inicio, hora_fin):
+    """
+    Rango de bloques [inicio, fin) de una cita. Usa los bloques guardados y, si
+    faltan, redondea las horas hacia afuera (inicio hacia abajo, fin hacia arriba).
+    """
+    if start_block is None and hora_inicio is not None:
+        start_block = (hora_inicio.hour * 60 + hora_inicio.minute) // BLOCK_MINUTES
+    if end_block is None and hora_fin is not None:
+        if (hora_fin.hour, hora_fin.minute) == (23, 59):
+            end_block = BLOQUES_DIA
+        else:
+            end_block = (hora_fin.hour * 60 + hora_fin.minute + BLOCK_MINUTES - 1) // BLOCK_MINUTES
+    if start_block is None or end_block is None or end_block <= start_block:
+        return None
+    return start_block, min(end_block, BLOQUES_DIA)
+
+
+def bloques_de_cita(cita):
+    """Rango (start_block, end_block) de una instancia de Cita, o None."""
+    return rango_de_bloques(cita.start_block, cita.end_block, cita.hora_inicio, cita.hora_fin)
+
+
+def _intervalo(start_block, end_block, hora_inicio, hora_fin):
+    """Entrada de OcupacionBloquesDia.intervalos: [inicio, fin, 'HH:MM', 'HH:MM']."""
+    bloques = rango_de_bloques(start_block, end_block, hora_inicio, hora_fin)
+    if bloques is None:
+        return None
+    inicio, fin = bloques
+    return [
+        inicio,
+        fin,
+        hora_inicio.strftime('%H:%M') if hora_inicio else ETIQUETAS_BLOQUES[inicio][0],
+        hora_fin.strftime('%H:%M') if hora_fin else ETIQUETAS_BLOQUES[fin - 1][1],
+    ]
+
+
+def _mascara_intervalos(intervalos, excluir=None):
+    mascara = 0
+    for cita_id, (inicio, fin, _, _) in intervalos.items():
+        if cita_id != excluir:
+            mascara |= rango_a_mascara(inicio, fin)
+    return mascara
+
+
+# ============================================
+# CONSTRUCCIÓN Y ACCESO
+# ============================================
+
+def construir_ocupaciones(claves, citas=None):
+    """
+    Calcula (sin guardar) los mapas de varias claves (veterinario_id, fecha)
+    con una consulta de disponibilidades y otra de citas.
+
+    Args:
+        claves: Iterable de tuplas (veterinario_id, fecha)
+        citas: Citas activas ya cargadas que cubren las claves (opcional);
+               si se entregan se evita la consulta de citas
+
+    Returns:
+        dict: {(veterinario_id, fecha): OcupacionBloquesDia}
+    """
+    ocupaciones = {
+        (veterinario_id, fecha): OcupacionBloquesDia(veterinario_id=veterinario_id, fecha=fecha, intervalos={})
+        for veterinario_id, fecha in claves
+    }
+    if not ocupaciones:
+        return ocupaciones
+    veterinario_ids = {veterinario_id for veterinario_id, _ in ocupaciones}
+    fechas = {fecha for _, fecha in ocupaciones}
+
+    disponibilidades = DisponibilidadBloquesDia.objects.filter(
+        veterinario_id__in=veterinario_ids,
+        fecha__in=fechas
+    ).values_list('veterinario_id', 'fecha', 'trabaja', 'rangos')
+    for veterinario_id, fecha, trabaja, rangos in disponibilidades:
+        ocupacion = ocupaciones.get((veterinario_id, fecha))
+        if ocupacion is not None:
+            ocupacion.tiene_disponibilidad = True
+            ocupacion.trabaja = trabaja
+            ocupacion.mascara_disponible = mascara_de_rangos(rangos)
+
+    if citas is None:
+        filas = Cita.objects.filter(
+            veterinario_id__in=veterinario_ids,
+            fecha__in=fechas,
+            estado__in=ESTADOS_ACTIVOS
+        ).values_list('veterinario_id', 'fecha', 'id', 'start_block', 'end_block', 'hora_inicio', 'hora_fin')
+    else:
+        filas = (
+            (c.veterinario_id, c.fecha, c.id, c.start_block, c.end_block, c.hora_inicio, c.hora_fin)
+            for c in citas if c.estado in ESTADOS_ACTIVOS
+        )
+    for veterinario_id, fecha, cita_id, start_block, end_block, hora_inicio, hora_fin in filas:
+        ocupacion = ocupaciones.get((veterinario_id, fecha))
+        intervalo = _intervalo(start_block, end_block, hora_inicio, hora_fin)
+        if ocupacion is not None and intervalo:
+            ocupacion.intervalos[str(cita_id)] = intervalo
+
+    for ocupacion in ocupaciones.values():
+        ocupacion.mascara_ocupada = _mascara_intervalos(ocupacion.intervalos)
+    return ocupaciones
+
+
+def construir_ocupacion(veterinario_id, fecha):
+    """Calcula (sin guardar) el mapa de ocupación desde la base de datos."""
+    return construir_ocupaciones([(veterinario_id, fecha)])[(veterinario_id, fecha)]
+
+
+def obtener_ocupacion(veterinario_id, fecha):
+    """Devuelve el mapa de ocupación del día, construyéndolo si no existe."""
+    ocupacion = OcupacionBloquesDia.objects.filter(veterinario_id=veterinario_id, fecha=fecha).first()
+    if ocupacion is not None:
+        return ocupacion
+
+    ocupacion = construir_ocupacion(veterinario_id, fecha)
+    try:
+        with transaction.atomic():
+            ocupacion.save()
+    except IntegrityError:
+        # Otro proceso lo creó en paralelo
+        ocupacion = OcupacionBloquesDia.objects.get(veterinario_id=veterinario_id, fecha=fecha)
+    return ocupacion
+
+
+def obtener_ocupaciones(veterinario_ids, fechas, citas=None):
+    """
+    Devuelve los mapas de ocupación de varios veterinarios y días. Los que
+    faltan se construyen en lote y se guardan con un solo bulk_create.
+
+    Returns:
+        dict: {(veterinario_id, fecha): OcupacionBloquesDia}
+    """
+    veterinario_ids = list(veterinario_ids)
+    fechas = list(fechas)
+    ocupaciones = {
+        (ocupacion.veterinario_id, ocupacion.fecha): ocupacion
+        for ocupacion in OcupacionBloquesDia.objects.filter(veterinario_id__in=veterinario_ids, fecha__in=fechas)
+    }
+    faltantes = [
+        (veterinario_id, fecha)
+        for veterinario_id in veterinario_ids
+        for fecha in fechas
+        if (veterinario_id, fecha) not in ocupaciones
+    ]
+    if faltantes:
+        nuevas = construir_ocupaciones(faltantes, citas=citas)
+        # Si otro proceso creó alguno en paralelo se conserva el suyo (mismo contenido)
+        OcupacionBloquesDia.objects.bulk_create(nuevas.values(), ignore_conflicts=True)
+        ocupaciones.update(nuevas)
+    return ocupaciones
+
+
+def reconstruir_ocupacion(veterinario_id, fecha):
+    """Descarta el mapa guardado para que se recalcule en el próximo acceso."""
+    OcupacionBloquesDia.objects.filter(veterinario_id=veterinario_id, fecha=fecha).delete()
+
+
+def descartar_ocupaciones(claves):
+    """Igual que reconstruir_ocupacion() para muchas claves (una consulta por veterinario)."""
+    fechas_por_vet = {}
+    for veterinario_id, fecha in claves:
+        fechas_por_vet.setdefault(veterinario_id, set()).add(fecha)
+    for veterinario_id, fechas in fechas_por_vet.items():
+        OcupacionBloquesDia.objects.filter(veterinario_id=veterinario_id, fecha__in=fechas).delete()
+
+
+# ============================================
+# VALIDACIÓN
+# ============================================
+
+def validar_bloques(ocupacion, start_block, end_block, excluir_cita_id=None, validar_disponibilidad=True):
+    """
+    Valida que [start_block, end_block) quepa en la disponibilidad del día y no
+    se solape con otra cita activa.
+
+    Raises:
+        ValidationError: Con los mismos mensajes que usaba Cita.clean
+    """
+    solicitada = rango_a_mascara(start_block, end_block)
+
+    if validar_disponibilidad and ocupacion.tiene_disponibilidad:
+        if not ocupacion.trabaja:
+            raise ValidationError('El veterinario no trabaja este día.')
+        if solicitada & ~ocupacion.mascara_disponible:
+            raise ValidationError('El horario solicitado está fuera de la disponibilidad configurada.')
+
+    excluir = str(excluir_cita_id) if excluir_cita_id is not None else None
+    ocupada = ocupacion.mascara_ocupada
+    if excluir in ocupacion.intervalos:
+        ocupada = _mascara_intervalos(ocupacion.intervalos, excluir=excluir)
+
+    if solicitada & ocupada:
+        for cita_id, (inicio, fin, hora_inicio, hora_fin) in sorted(ocupacion.intervalos.items(), key=lambda i: i[1][0]):
+            if cita_id != excluir and solicitada & rango_a_mascara(inicio, fin):
+                raise ValidationError(f'Bloques ocupados por otra cita {hora_inicio} - {hora_fin}.')
+
+
+def citas_en_conflicto(veterinario_id, fecha, start_block, end_block, excluir_cita_id=None):
+    """
+    Citas activas del día cuyos bloques se cruzan con [start_block, end_block),
+    leídas de Cita y no del mapa (mismo redondeo a bloques que el mapa).
+    """
+    solapa_horas = Q(hora_fin__gt=block_index_to_time(start_block))
+    if end_block < BLOQUES_DIA:
+        solapa_horas &= Q(hora_inicio__lt=block_index_to_time(end_block))
+    candidatas = Cita.objects.filter(
+        Q(start_block__lt=end_block, end_block__gt=start_block) | solapa_horas,
+        veterinario_id=veterinario_id,
+        fecha=fecha,
+        estado__in=ESTADOS_ACTIVOS,
+    ).only('start_block', 'end_block', 'hora_inicio', 'hora_fin').order_by('hora_inicio')
+    if excluir_cita_id is not None:
+        candidatas = candidatas.exclude(pk=excluir_cita_id)
+
+    solicitada = rango_a_mascara(start_block, end_block)
+    return [
+        cita for cita in candidatas
+        if (bloques := bloques_de_cita(cita)) and solicitada & rango_a_mascara(*bloques)
+    ]
+
+
+def validar_cita(veterinario_id, fecha, start_block, end_block, excluir_cita_id=None, validar_disponibilidad=True):
+    """
+    Validación de disponibilidad y solapes de Cita.clean.
+
+    El mapa guardado (si existe) rechaza sin más consultas, pero puede no
+    incluir una cita confirmada mientras se construía; por eso, si el mapa
+    deja pasar la cita, la verificación final es citas_en_conflicto(). Si el
+    mapa no existe se calcula desde la BD sin guardarlo (clean no escribe).
+
+    Raises:
+        ValidationError: Con los mismos mensajes que validar_bloques()
+    """
+    ocupacion = OcupacionBloquesDia.objects.filter(veterinario_id=veterinario_id, fecha=fecha).first()
+    guardada = ocupacion is not None
+    if not guardada:
+        ocupacion = construir_ocupacion(veterinario_id, fecha)
+    validar_bloques(ocupacion, start_block, end_block, excluir_cita_id, validar_disponibilidad)
+
+    if guardada:
+        for cita in citas_en_conflicto(veterinario_id, fecha, start_block, end_block, excluir_cita_id):
+            _, _, hora_inicio, hora_fin = _intervalo(cita.start_block, cita.end_block, cita.hora_inicio, cita.hora_fin)
+            raise ValidationError(f'Bloques ocupados por otra cita {hora_inicio} - {hora_fin}.')
+
+
+def bloques_libres(ocupacion):
+    """Bitmap de bloques disponibles y sin citas (sin disponibilidad = todo el día)."""
+    if ocupacion.tiene_disponibilidad:
+        base = ocupacion.mascara_disponible if ocupacion.trabaja else 0
+    else:
+        base = MASCARA_DIA
+    return base & ~ocupacion.mascara_ocupada & MASCARA_DIA
+
+
+def inicios_posibles(libres, bloques_requeridos):
+    """
+    Bitmap de los bloques donde puede comenzar una cita de bloques_requeridos
+    bloques consecutivos libres (bit i encendido si [i, i+n) está libre).
+    """
+    if bloques_requeridos <= 0:
+        return 0
+    inicios = libres
+    for desplazamiento in range(1, bloques_requeridos):
+        inicios &= libres >> desplazamiento
+        if not inicios:
+            break
+    return inicios
+
+
+def iterar_bits(mascara):
+    """Índices de los bits encendidos, de menor a mayor."""
+    while mascara:
+        bit = mascara & -mascara
+        yield bit.bit_length() - 1
+        mascara ^= bit
+
+
+# ============================================
+# ACTUALIZACIÓN INCREMENTAL
+# ============================================
+
+def _ocupacion_bloqueada(veterinario_id, fecha):
+    """Mapa existente bloqueado para escritura, o None si aún no se ha construido."""
+    return OcupacionBloquesDia.objects.select_for_update().filter(
+        veterinario_id=veterinario_id,
+        fecha=fecha
+    ).first()
+
+
+def _aplicar_intervalo(ocupacion, cita_id, intervalo):
+    clave = str(cita_id)
+    if intervalo is None:
+        if clave not in ocupacion.intervalos:
+            return
+        ocupacion.intervalos.pop(clave)
+    else:
+        if ocupacion.intervalos.get(clave) == intervalo:
+            return
+        ocupacion.intervalos[clave] = intervalo
+    ocupacion.mascara_ocupada = _mascara_intervalos(ocupacion.intervalos)
+    ocupacion.save(update_fields=['intervalos', 'ocupado_hex', 'fecha_actualizacion'])
+
+
+def sincronizar_cita(cita, eliminada=False, creada=False):
+    """
+    Refleja el estado actual de una cita en los mapas de ocupación existentes.
+
+    Si la cita cambió de veterinario o de fecha, se retira del día anterior
+    (conocido por Cita.from_db). Una cita recién creada (`creada`, el
+    `created` de post_save) no puede estar en ningún mapa y no se busca en
+    ellos. Los días aún no construidos no se tocan: se calcularán completos
+    en su primer acceso.
+    """
+    clave_nueva = (cita.veterinario_id, cita.fecha) if cita.veterinario_id and cita.fecha else None
+    clave_original = getattr(cita, '_ocupacion_original', None)
+    activa = not eliminada and cita.estado in ESTADOS_ACTIVOS
+    intervalo = _intervalo(cita.start_block, cita.end_block, cita.hora_inicio, cita.hora_fin) if activa else None
+
+    with transaction.atomic():
+        if creada:
+            anteriores = []
+        elif clave_original and all(clave_original):
+            anteriores = [clave_original] if clave_original != clave_nueva else []
+        else:
+            # Instancia no cargada desde BD: buscar cualquier día que la contenga
+            anteriores = [
+                clave for clave in OcupacionBloquesDia.objects.filter(
+                    intervalos__has_key=str(cita.pk)
+                ).values_list('veterinario_id', 'fecha')
+                if clave != clave_nueva
+            ]
+
+        for veterinario_id, fecha in anteriores:
+            ocupacion = _ocupacion_bloqueada(veterinario_id, fecha)
+            if ocupacion is not None:
+                _aplicar_intervalo(ocupacion, cita.pk, None)
+
+        if clave_nueva:
+            ocupacion = _ocupacion_bloqueada(*clave_nueva)
+            if ocupacion is not None:
+                _aplicar_intervalo(ocupacion, cita.pk, intervalo)
+
+    cita._ocupacion_original = None if eliminada else clave_nueva
+
+
+def sincronizar_disponibilidad(disponibilidad, eliminada=False):
+    """Refleja una DisponibilidadBloquesDia en el mapa de su día, si existe."""
+    with transaction.atomic():
+        ocupacion = _ocupacion_bloqueada(disponibilidad.veterinario_id, disponibilidad.fecha)
+        if ocupacion is None:
+            return
+        if eliminada:
+            ocupacion.tiene_disponibilidad = False
+            ocupacion.trabaja = False
+            ocupacion.mascara_disponible = 0
+        else:
+            ocupacion.tiene_disponibilidad = True
+            ocupacion.trabaja = disponibilidad.trabaja
+            ocupacion.mascara_disponible = mascara_de_rangos(disponibilidad.rangos)
+        ocupacion.save(update_fields=['tiene_disponibilidad', 'trabaja', 'disponible_hex', 'fecha_actualizacion'])
+
+
+# ============================================
+# RENDERIZADO
+# ============================================
+
+def _detalle_cita(cita, fecha):
+    paciente = cita.paciente if cita.paciente_id else None
+    propietario = paciente.propietario if paciente else None
+    return {
+        'status': 'occupied',
+        'label': paciente.nombre if paciente else 'Ocupado',
+        'cita_id': cita.id,
+        'paciente_id': cita.paciente_id,
+        'paciente_nombre': paciente.nombre if paciente else 'Sin paciente',
+        'propietario_nombre': propietario.nombre_completo if propietario else 'Sin propietario',
+        'propietario_telefono': propietario.telefono if propietario else '',
+        'propietario_email': propietario.email if propietario else '',
+        'propietario_id': paciente.propietario_id if paciente else None,
+        'servicio_nombre': cita.servicio.nombre if cita.servicio_id else 'Sin servicio',
+        'hora_inicio': cita.hora_inicio.strftime('%H:%M') if cita.hora_inicio else '',
+        'hora_fin': cita.hora_fin.strftime('%H:%M') if cita.hora_fin else '',
+        'fecha': cita.fecha.isoformat() if cita.fecha else (fecha.isoformat() if fecha else None),
+    }
+
+
+def citas_de_ocupacion(ocupacion):
+    """QuerySet de las citas activas del mapa, con lo necesario para renderizar."""
+    return Cita.objects.filter(
+        pk__in=[int(cita_id) for cita_id in ocupacion.intervalos]
+    ).select_related('paciente__propietario', 'servicio')
+
+
+def renderizar_bloques(ocupacion, citas, fecha=None):
+    """
+    Construye la lista de 96 bloques con estado available/occupied/unavailable.
+
+    Args:
+        ocupacion: OcupacionBloquesDia del día
+        citas: Iterable de citas activas (ver citas_de_ocupacion())
+        fecha: Fecha del día (para el campo 'fecha' de cada bloque)
+    """
+    fecha_iso = fecha.isoformat() if fecha else None
+    disponible = ocupacion.mascara_disponible if ocupacion.trabaja else 0
+    ocupada = ocupacion.mascara_ocupada
+
+    # Dueño de cada bloque ocupado; si hay solapes heredados gana la última cita
+    duenos = [None] * BLOQUES_DIA
+    detalles = {}
+    for cita in citas:
+        intervalo = ocupacion.intervalos.get(str(cita.id))
+        if not intervalo:
+            continue
+        detalles[cita.id] = _detalle_cita(cita, fecha)
+        for idx in range(intervalo[0], intervalo[1]):
+            duenos[idx] = cita.id
+
+    blocks = []
+    for idx, (inicio, fin) in enumerate(ETIQUETAS_BLOQUES):
+        bit = 1 << idx
+        block = {
+            'block_index': idx,
+            'start_time': inicio,
+            'end_time': fin,
+            'status': 'available' if disponible & bit else 'unavailable',
+            'label': '',
+            'fecha': fecha_iso,
+        }
+        if ocupada & bit:
+            if duenos[idx] is not None:
+                block.update(detalles[duenos[idx]])
+            else:
+                block['status'] = 'occupied'
+                block['label'] = 'Ocupado'
+        blocks.append(block)
+    return blocks
@@ -0,0 +1,68 @@
+"""
+Signals para mantener los mapas de ocupación (OcupacionBloquesDia).
+
+Cada alta, cambio o baja de Cita / DisponibilidadBloquesDia se aplica de forma
+incremental sobre el bitmap del día afectado. Si la actualización falla, el
+mapa se descarta para que se reconstruya completo en el próximo acceso.
+"""
+import logging
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Cita, DisponibilidadBloquesDia
+from .services.ocupacion import (
+    reconstruir_ocupacion,
+    sincronizar_cita,
+    sincronizar_disponibilidad,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+def _descartar_ocupaciones(*claves):
+    for veterinario_id, fecha in claves:
+        if veterinario_id and fecha:
+            reconstruir_ocupacion(veterinario_id, fecha)
+
+
+@receiver(post_save, sender=Cita)
+def cita_post_save(sender, instance, created, **kwargs):
+    """Actualiza el bitmap de ocupación del día de la cita."""
+    original = getattr(instance, '_ocupacion_original', None) or (None, None)
+    try:
+        sincronizar_cita(instance, creada=created)
+    except Exception:
+        logger.error("Error actualizando ocupación de cita %s", instance.pk, exc_info=True)
+        _descartar_ocupaciones(original, (instance.veterinario_id, instance.fecha))
+
+
+@receiver(post_delete, sender=Cita)
+def cita_post_delete(sender, instance, **kwargs):
+    """Libera los bloques de una cita eliminada."""
+    try:
+        sincronizar_cita(instance, eliminada=True)
+    except Exception:
+        logger.error("Error liberando ocupación de cita %s", instance.pk, exc_info=True)
+        _descartar_ocupaciones((instance.veterinario_id, instance.fecha))
+
+
+@receiver(post_save, sender=DisponibilidadBloquesDia)
+def disponibilidad_bloques_post_save(sender, instance, **kwargs):
+    """Actualiza el bitmap de disponibilidad del día."""
+    try:
+        sincronizar_disponibilidad(instance)
+    except Exception:
+        logger.error("Error actualizando disponibilidad de ocupación %s", instance.pk, exc_info=True)
+        _descartar_ocupaciones((instance.veterinario_id, instance.fecha))
+
+
+@receiver(post_delete, sender=DisponibilidadBloquesDia)
+def disponibilidad_bloques_post_delete(sender, instance, **kwargs):
+    """Quita la disponibilidad del bitmap del día."""
+    try:
+        sincronizar_disponibilidad(instance, eliminada=True)
+    except Exception:
+        logger.error("Error quitando disponibilidad de ocupación %s", instance.pk, exc_info=True)
+        _descartar_ocupaciones((instance.veterinario_id, instance.fecha))
@@ -1,3 +1,259 @@
+from datetime import date, time
+
+from django.core.exceptions import ValidationError
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from agenda.models import Cita, DisponibilidadBloquesDia, HorarioFijoVeterinario, OcupacionBloquesDia
+from agenda.services.disponibilidades import generar_disponibilidades
+from agenda.services.huecos import buscar_primeros_huecos
+from agenda.services.ocupacion import (
+    mascara_a_rangos,
+    mascara_de_rangos,
+    obtener_ocupacion,
+    rango_a_mascara,
+    renderizar_bloques,
+)
+from cuentas.models import CustomUser
+from pacientes.models import Paciente, Propietario
+from servicios.models import Servicio
+
+
+class AgendaTestMixin:
+    fecha = date(2030, 1, 7)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vet = CustomUser.objects.create_user(
+            rut='11111111-1',
+            password='clave-segura-123',
+            nombre='Ana',
+            apellido='Pérez',
+            correo='ana@example.com',
+            rol='veterinario',
+        )
+        cls.otro_vet = CustomUser.objects.create_user(
+            rut='33333333-3',
+            password='clave-segura-123',
+            nombre='Luis',
+            apellido='Soto',
+            correo='luis@example.com',
+            rol='veterinario',
+        )
+        propietario = Propietario.objects.create(nombre='Juan', apellido='Rojas', telefono='+56911111111')
+        cls.paciente = Paciente.objects.create(nombre='Firulais', especie='canino', sexo='M', propietario=propietario)
+        cls.servicio = Servicio.objects.create(nombre='Consulta', categoria='consulta', precio=10000, duracion=30)
+
+    def crear_disponibilidad(self, veterinario=None, rangos=None, trabaja=True):
+        return DisponibilidadBloquesDia.objects.create(
+            veterinario=veterinario or self.vet,
+            fecha=self.fecha,
+            trabaja=trabaja,
+            rangos=rangos if rangos is not None else [{'start_block': 36, 'end_block': 72}],
+        )
+
+    def crear_cita(self, hora, veterinario=None, **kwargs):
+        return Cita.objects.create(
+            paciente=self.paciente,
+            veterinario=veterinario or self.vet,
+            servicio=self.servicio,
+            fecha=kwargs.pop('fecha', self.fecha),
+            hora_inicio=hora,
+            motivo='Control',
+            **kwargs,
+        )
+
+
+class MascaraBloquesTests(TestCase):
+    def test_rangos_ida_y_vuelta(self):
+        rangos = [{'start_block': 0, 'end_block': 4}, {'start_block': 36, 'end_block': 48}, {'start_block': 90, 'end_block': 96}]
+        mascara = mascara_de_rangos(rangos)
+        self.assertEqual(mascara_a_rangos(mascara), rangos)
+        self.assertEqual(rango_a_mascara(36, 38), 0b11 << 36)
+        self.assertEqual(rango_a_mascara(5, 5), 0)
+
+
+class OcupacionBloquesTests(AgendaTestMixin, TestCase):
+    def setUp(self):
+        self.crear_disponibilidad()
+        # Materializar el mapa para ejercitar la actualización incremental
+        obtener_ocupacion(self.vet.id, self.fecha)
+
+    def ocupacion(self, veterinario=None):
+        return OcupacionBloquesDia.objects.get(veterinario=veterinario or self.vet, fecha=self.fecha)
+
+    def test_cita_marca_y_libera_bloques(self):
+        with CaptureQueriesContext(connection) as consultas:
+            cita = self.crear_cita(time(10, 0))
+        self.assertEqual(self.ocupacion().mascara_ocupada, rango_a_mascara(40, 42))
+        # Una cita nueva no puede estar en ningún mapa: no se buscan sus intervalos
+        self.assertFalse([
+            q['sql'] for q in consultas.captured_queries if '"intervalos"' in q['sql'].partition(' WHERE ')[2]
+        ])
+
+        cita.estado = 'cancelada'
+        cita.save()
+        self.assertEqual(self.ocupacion().mascara_ocupada, 0)
+
+        cita.estado = 'confirmada'
+        cita.save()
+        cita.delete()
+        self.assertEqual(self.ocupacion().intervalos, {})
+
+    def test_mover_cita_de_veterinario_libera_dia_anterior(self):
+        obtener_ocupacion(self.otro_vet.id, self.fecha)
+        cita = self.crear_cita(time(10, 0))
+
+        cita = Cita.objects.get(pk=cita.pk)
+        cita.veterinario = self.otro_vet
+        cita.save()
+
+        self.assertEqual(self.ocupacion().mascara_ocupada, 0)
+        self.assertEqual(self.ocupacion(self.otro_vet).mascara_ocupada, rango_a_mascara(40, 42))
+
+    def test_solape_y_disponibilidad(self):
+        self.crear_cita(time(10, 0))
+        with self.assertRaisesMessage(ValidationError, 'Bloques ocupados por otra cita 10:00 - 10:30.'):
+            self.crear_cita(time(10, 15))
+        with self.assertRaisesMessage(ValidationError, 'fuera de la disponibilidad'):
+            self.crear_cita(time(17, 45))
+        self.crear_cita(time(10, 30))
+
+    def test_solape_con_cita_ausente_del_mapa(self):
+        # Cita confirmada mientras otro proceso construía el mapa: el mapa no la tiene
+        existente = self.crear_cita(time(10, 0))
+        OcupacionBloquesDia.objects.all().delete()
+        Cita.objects.filter(pk=existente.pk).update(estado='cancelada')
+        obtener_ocupacion(self.vet.id, self.fecha)
+        Cita.objects.filter(pk=existente.pk).update(estado='confirmada')
+
+        with self.assertRaisesMessage(ValidationError, 'Bloques ocupados por otra cita 10:00 - 10:30.'):
+            self.crear_cita(time(10, 15))
+
+        # Sin mapa, clean valida contra la BD sin construirlo
+        OcupacionBloquesDia.objects.all().delete()
+        with self.assertRaises(ValidationError):
+            self.crear_cita(time(10, 15))
+        self.crear_cita(time(11, 0))
+        self.assertFalse(OcupacionBloquesDia.objects.exists())
+
+    def test_mapa_incremental_igual_a_reconstruido(self):
+        self.crear_cita(time(9, 0))
+        self.crear_cita(time(11, 0))
+        DisponibilidadBloquesDia.objects.filter(veterinario=self.vet).first().delete()
+        incremental = self.ocupacion()
+
+        OcupacionBloquesDia.objects.all().delete()
+        reconstruido = obtener_ocupacion(self.vet.id, self.fecha)
+        self.assertEqual(
+            (incremental.ocupado_hex, incremental.disponible_hex, incremental.tiene_disponibilidad, incremental.intervalos),
+            (reconstruido.ocupado_hex, reconstruido.disponible_hex, reconstruido.tiene_disponibilidad, reconstruido.intervalos),
+        )
+
+    def test_renderizar_bloques(self):
+        cita = self.crear_cita(time(10, 0))
+        ocupacion = self.ocupacion()
+        blocks = renderizar_bloques(ocupacion, [cita], self.fecha)
+
+        self.assertEqual(len(blocks), 96)
+        self.assertEqual(blocks[35]['status'], 'unavailable')
+        self.assertEqual(blocks[36]['status'], 'available')
+        self.assertEqual(blocks[40]['status'], 'occupied')
+        self.assertEqual(blocks[41]['cita_id'], cita.id)
+        self.assertEqual(blocks[41]['propietario_nombre'], 'Juan Rojas')
+        self.assertEqual((blocks[40]['start_time'], blocks[95]['end_time']), ('10:00', '23:59'))
+
+
+class AgendaBloquesRangoTests(AgendaTestMixin, TestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_user(
+            rut='44444444-4',
+            password='clave-segura-123',
+            nombre='Admin',
+            apellido='Clinica',
+            correo='admin@example.com',
+            rol='administracion',
+        )
+        self.client.force_login(self.admin)
+        self.crear_disponibilidad()
+        self.crear_disponibilidad(veterinario=self.otro_vet)
+        self.cita = self.crear_cita(time(10, 0))
+        self.crear_cita(time(11, 0), veterinario=self.otro_vet, fecha=date(2030, 1, 9))
+
+    def consultar(self, dias):
+        with CaptureQueriesContext(connection) as contexto:
+            response = self.client.get(reverse('agenda:agenda_bloques_rango'), {
+                'veterinarios': f'{self.vet.id},{self.otro_vet.id}',
+                'desde': self.fecha.isoformat(),
+                'dias': dias,
+            })
+        self.assertEqual(response.status_code, 200)
+        return response.json(), len(contexto.captured_queries)
+
+    def test_grilla_varios_veterinarios_y_dias(self):
+        data, _ = self.consultar(7)
+        self.assertEqual(len(data['agendas']), 14)
+        agenda = next(a for a in data['agendas'] if a['veterinario_id'] == self.vet.id and a['fecha'] == '2030-01-07')
+        self.assertTrue(agenda['trabaja'])
+        self.assertEqual(agenda['blocks'][40]['cita_id'], self.cita.id)
+        self.assertEqual(agenda['blocks'][40]['propietario_nombre'], 'Juan Rojas')
+
+    def test_consultas_no_crecen_con_el_rango(self):
+        _, consultas_un_dia = self.consultar(1)
+        OcupacionBloquesDia.objects.all().delete()
+        _, consultas_semana = self.consultar(7)
+        self.assertEqual(consultas_un_dia, consultas_semana)
+
+
+class BuscarHuecosTests(AgendaTestMixin, TestCase):
+    def setUp(self):
+        self.crear_disponibilidad(rangos=[{'start_block': 40, 'end_block': 48}])
+        self.crear_disponibilidad(veterinario=self.otro_vet, rangos=[{'start_block': 41, 'end_block': 44}])
+        self.crear_cita(time(10, 30))
+
+    def test_primeros_huecos_en_orden(self):
+        huecos = buscar_primeros_huecos(self.servicio, cantidad=4, desde=self.fecha, dias=3)
+        self.assertEqual(
+            [(h['veterinario_id'], h['hora_inicio'], h['hora_fin']) for h in huecos],
+            [
+                (self.vet.id, '10:00', '10:30'),
+                (self.otro_vet.id, '10:15', '10:45'),
+                (self.otro_vet.id, '10:30', '11:00'),
+                (self.vet.id, '11:00', '11:30'),
+            ],
+        )
+
+    def test_restricciones_de_veterinario_y_paciente(self):
+        huecos = buscar_primeros_huecos(
+            self.servicio, cantidad=5, desde=self.fecha, dias=1,
+            veterinario_ids=[self.otro_vet.id], paciente_id=self.paciente.id,
+        )
+        # El paciente ya está ocupado de 10:30 a 11:00: en otro_vet solo cabe hasta las 10:30
+        self.assertEqual(huecos, [])
+        self.assertEqual(len(buscar_primeros_huecos(self.servicio, desde=self.fecha, dias=1, veterinario_ids=[self.otro_vet.id])), 2)
+
+
+class GenerarDisponibilidadesTests(AgendaTestMixin, TestCase):
+    def setUp(self):
+        # Lunes 9:00-13:00; el resto de la semana no trabaja
+        HorarioFijoVeterinario.objects.create(veterinario=self.vet, dia_semana=0, hora_inicio=time(9, 0), hora_fin=time(13, 0))
+
+    def test_crea_actualiza_y_respeta_personalizadas(self):
+        resumen = generar_disponibilidades([self.vet.id], semanas=1, desde=self.fecha)
+        self.assertEqual(len(resumen['crear']), 8)
+        lunes = DisponibilidadBloquesDia.objects.get(veterinario=self.vet, fecha=self.fecha)
+        self.assertEqual((lunes.trabaja, lunes.rangos), (True, [{'start_block': 36, 'end_block': 52}]))
+
+        DisponibilidadBloquesDia.objects.filter(fecha=date(2030, 1, 8)).update(notas='Feriado ajustado a mano')
+        HorarioFijoVeterinario.objects.create(veterinario=self.vet, dia_semana=1, hora_inicio=time(15, 0), hora_fin=time(16, 0))
+
+        with self.assertNumQueries(2):
+            diff = generar_disponibilidades([self.vet.id], semanas=1, desde=self.fecha, dry_run=True)
+        self.assertEqual((len(diff['actualizar']), diff['personalizadas'], diff['sin_cambios']), (0, 1, 7))
 
-# Create your tests here.
+    def test_descarta_mapas_de_ocupacion_afectados(self):
+        obtener_ocupacion(self.vet.id, self.fecha)
+        generar_disponibilidades([self.vet.id], semanas=1, desde=self.fecha)
+        self.assertTrue(obtener_ocupacion(self.vet.id, self.fecha).trabaja)
@@ -29,6 +29,8 @@ urlpatterns = [
 
     # Agenda por bloques y agendamiento rápido por bloque
     path('bloques/<int:veterinario_id>/<int:year>/<int:month>/<int:day>/', views.agenda_bloques_dia, name='agenda_bloques_dia'),
+    path('bloques/rango/', views.agenda_bloques_rango, name='agenda_bloques_rango'),
+    path('huecos/', views.buscar_huecos_disponibles, name='buscar_huecos_disponibles'),
     path('citas/agendar-por-bloques/', views.agendar_cita_por_bloques, name='agendar_cita_por_bloques'),
     
     # Horario semanal del veterinario
@@ -21,54 +21,18 @@ from .models import (
     block_index_to_time,
     BLOCK_MINUTES,
 )
+from .services.disponibilidades import generar_disponibilidades
+from .services.huecos import buscar_primeros_huecos
+from .services.ocupacion import (
+    citas_de_ocupacion,
+    mascara_a_rangos,
+    obtener_ocupacion,
+    obtener_ocupaciones,
+    renderizar_bloques,
+    validar_bloques,
+)
 
 
-def _build_day_blocks(availability: DisponibilidadBloquesDia, citas_qs, fecha=None):
-    """Construye la lista de 96 bloques con estado available/occupied/unavailable."""
-    blocks = []
-    for idx in range(96):
-        start_t = block_index_to_time(idx)
-        end_t = block_index_to_time(idx + 1)
-        blocks.append({
-            'block_index': idx,
-            'start_time': start_t.strftime('%H:%M'),
-            'end_time': end_t.strftime('%H:%M'),
-            'status': 'unavailable',
-            'label': '',
-            'fecha': fecha.isoformat() if fecha else None,
-        })
-
-    if availability and availability.trabaja:
-        for rng in availability.rangos:
-            for idx in range(rng['start_block'], rng['end_block']):
-                blocks[idx]['status'] = 'available'
-
-    # Marcar ocupados por citas
-    for cita in citas_qs:
-        try:
-            start_block = cita.start_block if cita.start_block is not None else time_to_block_index(cita.hora_inicio)
-            end_block = cita.end_block if cita.end_block is not None else time_to_block_index(cita.hora_fin)
-        except ValidationError:
-            continue
-
-        for idx in range(start_block, end_block):
-            if 0 <= idx < 96:
-                blocks[idx]['status'] = 'occupied'
-                blocks[idx]['label'] = cita.paciente.nombre if cita.paciente_id else 'Ocupado'
-                blocks[idx]['cita_id'] = cita.id
-                blocks[idx]['paciente_id'] = cita.paciente_id
-                blocks[idx]['paciente_nombre'] = cita.paciente.nombre if cita.paciente_id else 'Sin paciente'
-                blocks[idx]['propietario_nombre'] = cita.paciente.propietario.nombre_completo if cita.paciente_id else 'Sin propietario'
-                blocks[idx]['propietario_telefono'] = cita.paciente.propietario.telefono if cita.paciente_id else ''
-                blocks[idx]['propietario_email'] = cita.paciente.propietario.email if cita.paciente_id else ''
-                blocks[idx]['propietario_id'] = cita.paciente.propietario_id if cita.paciente_id else None
-                blocks[idx]['servicio_nombre'] = cita.servicio.nombre if cita.servicio_id else 'Sin servicio'
-                blocks[idx]['hora_inicio'] = cita.hora_inicio.strftime('%H:%M') if cita.hora_inicio else ''
-                blocks[idx]['hora_fin'] = cita.hora_fin.strftime('%H:%M') if cita.hora_fin else ''
-                blocks[idx]['fecha'] = cita.fecha.isoformat() if hasattr(cita, 'fecha') and cita.fecha else (fecha.isoformat() if fecha else None)
-
-    return blocks
-
 @login_required
 def agenda(request):
     """Vista principal de la agenda"""
@@ -582,31 +546,141 @@ def agenda_bloques_dia(request, veterinario_id, year, month, day):
         fecha = date(year, month, day)
         veterinario = get_object_or_404(CustomUser, id=veterinario_id, rol='veterinario')
 
-        disponibilidad = DisponibilidadBloquesDia.objects.filter(
-            veterinario=veterinario,
-            fecha=fecha
-        ).first()
-
-        citas = Cita.objects.filter(
-            veterinario=veterinario,
-            fecha=fecha,
-            estado__in=['pendiente', 'confirmada', 'en_curso']
-        ).select_related('paciente')
-
-        blocks = _build_day_blocks(disponibilidad, citas, fecha)
+        ocupacion = obtener_ocupacion(veterinario.id, fecha)
+        blocks = renderizar_bloques(ocupacion, citas_de_ocupacion(ocupacion), fecha)
 
         return JsonResponse({
             'success': True,
             'fecha': fecha.isoformat(),
             'veterinario': f"{veterinario.nombre} {veterinario.apellido}",
-            'trabaja': bool(disponibilidad.trabaja) if disponibilidad else False,
-            'rangos': disponibilidad.rangos if disponibilidad else [],
+            'trabaja': ocupacion.trabaja,
+            'rangos': mascara_a_rangos(ocupacion.mascara_disponible),
             'blocks': blocks,
         })
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=400)
 
 
+MAX_DIAS_RANGO_BLOQUES = 31
+
+
+@login_required
+@require_http_methods(["GET"])
+def agenda_bloques_rango(request):
+    """
+    Devuelve la grilla de 96 bloques para N veterinarios x M días en una sola respuesta.
+
+    Parámetros GET:
+        veterinarios: IDs separados por coma (por defecto, todos los activos)
+        desde: Fecha inicial YYYY-MM-DD (por defecto, hoy)
+        dias: Cantidad de días (1-31, por defecto 1)
+    """
+    try:
+        desde_str = request.GET.get('desde')
+        desde = datetime.strptime(desde_str, '%Y-%m-%d').date() if desde_str else date.today()
+        dias = int(request.GET.get('dias', 1))
+        if dias < 1 or dias > MAX_DIAS_RANGO_BLOQUES:
+            return JsonResponse({'success': False, 'error': f'El rango debe ser de 1 a {MAX_DIAS_RANGO_BLOQUES} días.'}, status=400)
+        fechas = [desde + timedelta(days=i) for i in range(dias)]
+
+        veterinarios = CustomUser.objects.filter(rol='veterinario', is_active=True).order_by('nombre', 'apellido')
+        ids_str = request.GET.get('veterinarios')
+        if ids_str:
+            veterinarios = veterinarios.filter(id__in=[int(v) for v in ids_str.split(',') if v.strip()])
+        # Un veterinario solo ve su propia agenda
+        if request.user.rol == 'veterinario' and not request.user.is_superuser and not request.user.is_staff:
+            veterinarios = veterinarios.filter(id=request.user.id)
+        veterinarios = list(veterinarios.only('id', 'nombre', 'apellido'))
+        veterinario_ids = [vet.id for vet in veterinarios]
+
+        # Una consulta de citas para todo el rango; se reutiliza para construir y renderizar
+        citas = list(Cita.objects.filter(
+            veterinario_id__in=veterinario_ids,
+            fecha__range=(fechas[0], fechas[-1]),
+            estado__in=['pendiente', 'confirmada', 'en_curso']
+        ).select_related('paciente__propietario', 'servicio'))
+        citas_por_dia = {}
+        for cita in citas:
+            citas_por_dia.setdefault((cita.veterinario_id, cita.fecha), []).append(cita)
+
+        ocupaciones = obtener_ocupaciones(veterinario_ids, fechas, citas=citas)
+
+        agendas = []
+        for vet in veterinarios:
+            nombre = f"{vet.nombre} {vet.apellido}"
+            for fecha in fechas:
+                ocupacion = ocupaciones[(vet.id, fecha)]
+                agendas.append({
+                    'veterinario_id': vet.id,
+                    'veterinario': nombre,
+                    'fecha': fecha.isoformat(),
+                    'trabaja': ocupacion.trabaja,
+                    'rangos': mascara_a_rangos(ocupacion.mascara_disponible),
+                    'blocks': renderizar_bloques(ocupacion, citas_por_dia.get((vet.id, fecha), []), fecha),
+                })
+
+        return JsonResponse({
+            'success': True,
+            'desde': fechas[0].isoformat(),
+            'hasta': fechas[-1].isoformat(),
+            'agendas': agendas,
+        })
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Parámetros inválidos.'}, status=400)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+
+MAX_DIAS_BUSQUEDA_HUECOS = 90
+
+
+@login_required
+@require_http_methods(["GET"])
+def buscar_huecos_disponibles(request):
+    """
+    Busca los primeros horarios libres donde cabe un servicio.
+
+    Parámetros GET:
+        servicio_id: Servicio a agendar (requerido)
+        cantidad: Huecos a devolver (por defecto 5, máximo 50)
+        veterinario_id: Restringe a un veterinario (opcional)
+        paciente_id: Evita horarios en que el paciente ya tiene cita (opcional)
+        desde: Fecha inicial YYYY-MM-DD (por defecto, hoy)
+        dias: Horizonte de búsqueda en días (por defecto 14, máximo 90)
+    """
+    try:
+        servicio_id = request.GET.get('servicio_id')
+        if not servicio_id:
+            return JsonResponse({'success': False, 'error': 'Debe indicar el servicio.'}, status=400)
+        servicio = get_object_or_404(Servicio, pk=servicio_id)
+
+        cantidad = min(int(request.GET.get('cantidad', 5)), 50)
+        dias = min(int(request.GET.get('dias', 14)), MAX_DIAS_BUSQUEDA_HUECOS)
+        desde_str = request.GET.get('desde')
+        desde = datetime.strptime(desde_str, '%Y-%m-%d').date() if desde_str else None
+        veterinario_id = request.GET.get('veterinario_id')
+        paciente_id = request.GET.get('paciente_id')
+
+        huecos = buscar_primeros_huecos(
+            servicio,
+            cantidad=cantidad,
+            desde=desde,
+            dias=dias,
+            veterinario_ids=[int(veterinario_id)] if veterinario_id else None,
+            paciente_id=int(paciente_id) if paciente_id else None,
+        )
+        return JsonResponse({
+            'success': True,
+            'servicio': servicio.nombre,
+            'bloques_requeridos': servicio.blocks_required,
+            'huecos': huecos,
+        })
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Parámetros inválidos.'}, status=400)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+
 @csrf_exempt
 @login_required
 @require_http_methods(["POST"])
@@ -633,35 +707,14 @@ def agendar_cita_por_bloques(request):
         if end_block > 96:
             return JsonResponse({'success': False, 'error': 'El servicio no cabe al final del día.'}, status=400)
 
-        disponibilidad = DisponibilidadBloquesDia.objects.filter(
-            veterinario_id=veterinario_id,
-            fecha=fecha_cita
-        ).first()
-
-        if not disponibilidad or not disponibilidad.trabaja:
+        ocupacion = obtener_ocupacion(veterinario_id, fecha_cita)
+        if not ocupacion.tiene_disponibilidad or not ocupacion.trabaja:
             return JsonResponse({'success': False, 'error': 'El veterinario no trabaja este día.'}, status=400)
 
-        dentro = any(
-            rng['start_block'] <= start_block and end_block <= rng['end_block']
-            for rng in disponibilidad.rangos
-        )
-        if not dentro:
-            return JsonResponse({'success': False, 'error': 'Fuera de la disponibilidad configurada.'}, status=400)
-
-        citas = Cita.objects.filter(
-            veterinario_id=veterinario_id,
-            fecha=fecha_cita,
-            estado__in=['pendiente', 'confirmada', 'en_curso']
-        )
-
-        for cita in citas:
-            c_start = cita.start_block if cita.start_block is not None else time_to_block_index(cita.hora_inicio)
-            c_end = cita.end_block if cita.end_block is not None else time_to_block_index(cita.hora_fin)
-            if start_block < c_end and end_block > c_start:
-                return JsonResponse({
-                    'success': False,
-                    'error': f'Bloques ocupados por otra cita {cita.hora_inicio.strftime("%H:%M")} - {cita.hora_fin.strftime("%H:%M")}.',
-                }, status=400)
+        try:
+            validar_bloques(ocupacion, start_block, end_block)
+        except ValidationError as e:
+            return JsonResponse({'success': False, 'error': e.messages[0]}, status=400)
 
         cita = Cita(
             paciente_id=paciente_id,
@@ -802,88 +855,8 @@ def eliminar_horario_fijo(request, horario_id):
         return JsonResponse({'success': False, 'error': str(e)}, status=400)
 
 
-def _generar_disponibilidades_desde_horario_semanal(veterinario, semanas=8):
-    """
-    Genera DisponibilidadBloquesDia para un veterinario basándose en su HorarioFijoVeterinario.
-    Genera disponibilidades para las próximas 'semanas' semanas desde hoy.
-    """
-    from datetime import date, timedelta
-    
-    # Obtener todos los horarios fijos activos del veterinario
-    horarios_fijos = HorarioFijoVeterinario.objects.filter(
-        veterinario=veterinario,
-        activo=True
-    ).order_by('dia_semana', 'hora_inicio')
-    
-    if not horarios_fijos.exists():
-        return
-    
-    # Agrupar horarios por día de la semana
-    horarios_por_dia = {}
-    for h in horarios_fijos:
-        if h.dia_semana not in horarios_por_dia:
-            horarios_por_dia[h.dia_semana] = []
-        horarios_por_dia[h.dia_semana].append(h)
-    
-    # Generar disponibilidades para las próximas semanas
-    fecha_inicio = date.today()
-    fecha_fin = fecha_inicio + timedelta(weeks=semanas)
-    
-    fecha_actual = fecha_inicio
-    while fecha_actual <= fecha_fin:
-        # Obtener el día de la semana (0=lunes, 6=domingo)
-        dia_semana = fecha_actual.weekday()
-        
-        # Si hay horarios para este día, crear/actualizar disponibilidad
-        if dia_semana in horarios_por_dia:
-            horarios = horarios_por_dia[dia_semana]
-            
-            # Convertir horarios a bloques
-            rangos_bloques = []
-            for h in horarios:
-                start_block = time_to_block_index(h.hora_inicio)
-                end_block = time_to_block_index(h.hora_fin)
-                rangos_bloques.append({
-                    'start_block': start_block,
-                    'end_block': end_block
-                })
-            
-            # Crear o actualizar disponibilidad
-            disp, created = DisponibilidadBloquesDia.objects.get_or_create(
-                veterinario=veterinario,
-                fecha=fecha_actual,
-                defaults={
-                    'trabaja': True,
-                    'rangos': rangos_bloques,
-                    'notas': 'Generado automáticamente desde horario semanal'
-                }
-            )
-            
-            # Si ya existía, actualizar solo si fue generado automáticamente
-            if not created and (disp.notas == 'Generado automáticamente desde horario semanal' or disp.notas == 'No trabaja este día'):
-                disp.trabaja = True
-                disp.rangos = rangos_bloques
-                disp.notas = 'Generado automáticamente desde horario semanal'
-                disp.save()
-        else:
-            # Si no hay horarios para este día, marcar como no trabaja
-            disp, created = DisponibilidadBloquesDia.objects.get_or_create(
-                veterinario=veterinario,
-                fecha=fecha_actual,
-                defaults={
-                    'trabaja': False,
-                    'rangos': [],
-                    'notas': 'No trabaja este día'
-                }
-            )
-            
-            # Si ya existía, actualizar solo si no tiene notas personalizadas
-            if not created and (disp.notas == 'No trabaja este día' or disp.notas == 'Generado automáticamente desde horario semanal'):
-                disp.trabaja = False
-                disp.rangos = []
-                disp.save()
-        
-        fecha_actual += timedelta(days=1)
+# Horizonte de disponibilidades generadas al guardar/regenerar un horario semanal
+SEMANAS_DISPONIBILIDAD = 8
 
 
 @login_required
@@ -892,11 +865,13 @@ def regenerar_disponibilidades_veterinario(request, veterinario_id):
     """Regenera las disponibilidades diarias para un veterinario desde su horario semanal"""
     try:
         veterinario = get_object_or_404(CustomUser, pk=veterinario_id, rol='veterinario')
-        _generar_disponibilidades_desde_horario_semanal(veterinario, semanas=8)
+        resumen = generar_disponibilidades([veterinario.id], semanas=SEMANAS_DISPONIBILIDAD)
         
         return JsonResponse({
             'success': True,
-            'message': 'Disponibilidades regeneradas correctamente'
+            'message': 'Disponibilidades regeneradas correctamente',
+            'creadas': len(resumen['crear']),
+            'actualizadas': len(resumen['actualizar']),
         })
     
     except Exception as e:
@@ -973,7 +948,7 @@ def guardar_horario_semanal(request):
                 h.save()
         
         # Generar disponibilidades diarias para las próximas 8 semanas
-        _generar_disponibilidades_desde_horario_semanal(veterinario, semanas=8)
+        generar_disponibilidades([veterinario.id], semanas=SEMANAS_DISPONIBILIDAD)
         
         return JsonResponse({
             'success': True,
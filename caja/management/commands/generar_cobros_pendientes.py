@@ -0,0 +1,57 @@
+from datetime import date, datetime, time, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from caja.services import crear_cobros_pendientes_lote
+from clinica.models import Consulta, Hospitalizacion
+
+
+class Command(BaseCommand):
+    help = ('Genera en lote los cobros pendientes que faltan: consultas con servicios o insumos y '
+            'hospitalizaciones dadas de alta sin venta asociada (p. ej. tras una caída o una jornada de vacunación)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', type=date.fromisoformat,
+                            help='Fecha inicial YYYY-MM-DD (consulta / alta); por defecto, hoy')
+        parser.add_argument('--hasta', type=date.fromisoformat,
+                            help='Fecha final YYYY-MM-DD, inclusive; por defecto, --desde')
+        parser.add_argument('--usuario', help='RUT del usuario de creación (por defecto, el veterinario de cada origen)')
+        parser.add_argument('--simular', action='store_true', help='Mostrar lo que se crearía sin guardar nada')
+
+    def handle(self, *args, **options):
+        desde = options['desde'] or timezone.localdate()
+        hasta = options['hasta'] or desde
+        if hasta < desde:
+            raise CommandError('--hasta no puede ser anterior a --desde')
+
+        usuario = None
+        if options['usuario']:
+            try:
+                usuario = get_user_model().objects.get(rut=options['usuario'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"No existe un usuario con RUT {options['usuario']}")
+
+        inicio = timezone.make_aware(datetime.combine(desde, time.min))
+        fin = timezone.make_aware(datetime.combine(hasta + timedelta(days=1), time.min))
+        consultas = Consulta.objects.filter(
+            fecha__gte=inicio, fecha__lt=fin, venta__isnull=True
+        ).filter(Q(servicios__isnull=False) | Q(insumos_detalle__isnull=False)).distinct()
+        hospitalizaciones = Hospitalizacion.objects.filter(
+            estado='alta', fecha_alta__gte=inicio, fecha_alta__lt=fin, venta__isnull=True
+        ).filter(Q(insumos_detalle__isnull=False) | Q(cirugias__isnull=False)).distinct()
+
+        with transaction.atomic():
+            resultado = crear_cobros_pendientes_lote(consultas, hospitalizaciones, usuario=usuario)
+            for tipo_origen, origen_id, motivo in resultado['omitidos']:
+                self.stdout.write(self.style.WARNING(f'  Omitido {tipo_origen} #{origen_id}: {motivo}'))
+            total = sum(venta.total for venta in resultado['ventas'])
+            if options['simular']:
+                transaction.set_rollback(True)
+                self.stdout.write(f"Simulación: se crearían {len(resultado['ventas'])} cobros por ${total:,.0f}")
+                return
+
+        self.stdout.write(self.style.SUCCESS(f"✓ {len(resultado['ventas'])} cobros pendientes creados por ${total:,.0f}"))
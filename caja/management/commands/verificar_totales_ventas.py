@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from caja.models import Venta
+from caja.services import verificar_totales_ventas
+
+
+class Command(BaseCommand):
+    help = 'Compara los totales guardados de las ventas con los recalculados desde sus detalles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--estado', choices=[estado for estado, _ in Venta.ESTADO_CHOICES],
+                            help='Revisar solo ventas en este estado')
+        parser.add_argument('--corregir', action='store_true',
+                            help='Guardar los totales recalculados en las ventas descuadradas')
+
+    def handle(self, *args, **options):
+        ventas = Venta.objects.all()
+        if options['estado']:
+            ventas = ventas.filter(estado=options['estado'])
+
+        descuadradas = verificar_totales_ventas(ventas, corregir=options['corregir'])
+        for fila in descuadradas:
+            guardado, calculado = fila['guardado'], fila['calculado']
+            self.stdout.write(
+                f"  {fila['numero_venta']}: total guardado {guardado['total']} / calculado {calculado['total']} "
+                f"(servicios {guardado['subtotal_servicios']}/{calculado['subtotal_servicios']}, "
+                f"insumos {guardado['subtotal_insumos']}/{calculado['subtotal_insumos']})"
+            )
+
+        if not descuadradas:
+            self.stdout.write(self.style.SUCCESS('✓ Todos los totales cuadran'))
+        elif options['corregir']:
+            self.stdout.write(self.style.SUCCESS(f'✓ {len(descuadradas)} ventas corregidas'))
+        else:
+            self.stdout.write(self.style.WARNING(f'{len(descuadradas)} ventas descuadradas (use --corregir)'))
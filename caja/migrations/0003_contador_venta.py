@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:41
+
+import re
+from datetime import datetime
+
+from django.db import migrations, models
+
+
+def sembrar_contadores(apps, schema_editor):
+    """Cada día con ventas parte del mayor correlativo ya usado (numeración anterior: Max(id) + 1)"""
+    Venta = apps.get_model('caja', 'Venta')
+    ContadorVenta = apps.get_model('caja', 'ContadorVenta')
+    ultimos = {}
+    for numero in Venta.objects.values_list('numero_venta', flat=True).iterator():
+        coincidencia = re.fullmatch(r'V(\d{8})-(\d+)', numero or '')
+        if coincidencia:
+            fecha = datetime.strptime(coincidencia.group(1), '%Y%m%d').date()
+            ultimos[fecha] = max(ultimos.get(fecha, 0), int(coincidencia.group(2)))
+    ContadorVenta.objects.bulk_create(
+        [ContadorVenta(fecha=fecha, ultimo=ultimo) for fecha, ultimo in ultimos.items()], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caja', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorVenta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(unique=True)),
+                ('ultimo', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Contador de Ventas',
+                'verbose_name_plural': 'Contadores de Ventas',
+                'db_table': 'contador_venta',
+            },
+        ),
+        migrations.RunPython(sembrar_contadores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:45
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caja', '0003_contador_venta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sesioncaja',
+            name='reporte',
+            field=models.JSONField(blank=True, editable=False, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True),
+        ),
+    ]
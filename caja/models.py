@@ -2,8 +2,13 @@ from django.db import models
 from django.conf import settings
 from django.utils import timezone
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from decimal import Decimal
 
+from .signals import totales_venta_actualizados
+
+CENTAVOS = Decimal('0.01')
+
 
 class Caja(models.Model):
     """MODELO EXISTENTE - Mantener sin cambios"""
@@ -86,6 +91,8 @@ class SesionCaja(models.Model):
     observaciones_apertura = models.TextField(blank=True, null=True)
     observaciones_cierre = models.TextField(blank=True, null=True)
     esta_cerrada = models.BooleanField(default=False)
+    # Reporte de cierre congelado (caja.services.generar_reporte_sesion): una sesión cerrada no se recalcula
+    reporte = models.JSONField(null=True, blank=True, editable=False, encoder=DjangoJSONEncoder)
     
     class Meta:
         verbose_name = 'Sesión de Caja'
@@ -214,29 +221,61 @@ class Venta(models.Model):
         return f"{self.numero_venta}{paciente_str} - {self.get_estado_display()}"
     
     def save(self, *args, **kwargs):
-        """Genera número de venta automático"""
+        """Genera número de venta automático (correlativo diario, ver caja.numeracion)"""
         if not self.numero_venta:
-            from django.db.models import Max
-            ultimo = Venta.objects.aggregate(Max('id'))['id__max'] or 0
-            self.numero_venta = f"V{timezone.now().strftime('%Y%m%d')}-{ultimo + 1:04d}"
+            from .numeracion import siguiente_numero_venta
+            self.numero_venta = siguiente_numero_venta()
         super().save(*args, **kwargs)
     
+    def totales_desde_detalles(self):
+        """
+        Subtotales y total recalculados desde los detalles, en una sola consulta
+        (agregación condicional por tipo).
+        """
+        cero = Decimal('0.00')
+        subtotales = self.detalles.aggregate(
+            servicios=models.Sum('subtotal', filter=models.Q(tipo='servicio')),
+            insumos=models.Sum('subtotal', filter=models.Q(tipo='insumo')),
+        )
+        servicios = Decimal(subtotales['servicios'] or cero).quantize(CENTAVOS)
+        insumos = Decimal(subtotales['insumos'] or cero).quantize(CENTAVOS)
+        return {
+            'subtotal_servicios': servicios,
+            'subtotal_insumos': insumos,
+            'total': servicios + insumos - self.descuento,
+        }
+
     def calcular_totales(self):
-        """Recalcula los totales basándose en los detalles"""
-        self.subtotal_servicios = self.detalles.filter(
-            tipo='servicio'
-        ).aggregate(
-            total=models.Sum(models.F('cantidad') * models.F('precio_unitario'))
-        )['total'] or Decimal('0.00')
-        
-        self.subtotal_insumos = self.detalles.filter(
-            tipo='insumo'
-        ).aggregate(
-            total=models.Sum(models.F('cantidad') * models.F('precio_unitario'))
-        )['total'] or Decimal('0.00')
-        
-        self.total = self.subtotal_servicios + self.subtotal_insumos - self.descuento
-        self.save()
+        """Recalcula los totales desde cero (creación de cobros, verificación)"""
+        for campo, valor in self.totales_desde_detalles().items():
+            setattr(self, campo, valor)
+        self.save(update_fields=['subtotal_servicios', 'subtotal_insumos', 'total'])
+
+    def _actualizar_totales(self, **cambios):
+        Venta.objects.filter(pk=self.pk).update(**cambios)
+        totales_venta_actualizados.send(sender=Venta, instance=self)
+
+    def ajustar_totales(self, tipo, delta):
+        """
+        Suma `delta` (cambio del subtotal de una línea de `tipo`) al subtotal y al
+        total con un UPDATE con F(), sin releer los detalles. Llamar en la misma
+        transacción que el cambio de la línea.
+        """
+        if not delta:
+            return
+        campo = 'subtotal_servicios' if tipo == 'servicio' else 'subtotal_insumos'
+        self._actualizar_totales(**{campo: models.F(campo) + delta, 'total': models.F('total') + delta})
+        setattr(self, campo, getattr(self, campo) + delta)
+        self.total += delta
+
+    def aplicar_descuento(self, descuento):
+        """Cambia el descuento y recalcula el total desde los subtotales guardados, en un UPDATE"""
+        self._actualizar_totales(
+            descuento=descuento,
+            total=models.F('subtotal_servicios') + models.F('subtotal_insumos') - descuento,
+        )
+        self.descuento = descuento
+        self.total = self.subtotal_servicios + self.subtotal_insumos - descuento
 
 
 class DetalleVenta(models.Model):
@@ -287,9 +326,13 @@ class DetalleVenta(models.Model):
     def __str__(self):
         return f"{self.descripcion} x{self.cantidad} = ${self.subtotal}"
     
+    def calcular_subtotal(self):
+        """cantidad x precio_unitario, redondeado como se guarda (también para bulk_create)"""
+        self.subtotal = (Decimal(self.cantidad) * Decimal(self.precio_unitario)).quantize(CENTAVOS)
+
     def save(self, *args, **kwargs):
         """Calcula subtotal automáticamente"""
-        self.subtotal = self.cantidad * self.precio_unitario
+        self.calcular_subtotal()
         super().save(*args, **kwargs)
 
 
@@ -337,3 +380,17 @@ class AuditoriaCaja(models.Model):
     
     def __str__(self):
         return f"{self.get_accion_display()} - {self.usuario.nombre} - {self.fecha.strftime('%d/%m/%Y %H:%M')}"
+
+
+class ContadorVenta(models.Model):
+    """Último correlativo de numero_venta entregado por día (caja.numeracion)"""
+    fecha = models.DateField(unique=True)
+    ultimo = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'contador_venta'
+        verbose_name = 'Contador de Ventas'
+        verbose_name_plural = 'Contadores de Ventas'
+
+    def __str__(self):
+        return f"{self.fecha:%d/%m/%Y}: {self.ultimo}"
@@ -0,0 +1,59 @@
+"""
+Numeración de ventas: V<AAAAMMDD>-<correlativo del día>.
+
+El correlativo sale de una fila ContadorVenta por día que se incrementa con
+un UPDATE ... SET ultimo = ultimo + n. El UPDATE bloquea la fila hasta el
+fin de la transacción, así que dos cajas que cobran a la vez reciben números
+distintos (la segunda espera a la primera) y, como el incremento se revierte
+con la transacción, no quedan huecos por cobros que fallan. El correlativo
+vuelve a 1 cada día (fecha local).
+
+FUNCIONES:
+- reservar_numeros_venta(): Bloque de n números consecutivos (creación masiva)
+- siguiente_numero_venta(): Un número (Venta.save)
+"""
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ContadorVenta
+
+
+def formatear_numero_venta(fecha, correlativo):
+    return f"V{fecha:%Y%m%d}-{correlativo:04d}"
+
+
+def _incrementar(fecha, cantidad):
+    """Suma `cantidad` al contador del día y devuelve el nuevo último (dentro de un atomic)."""
+    if not ContadorVenta.objects.filter(fecha=fecha).update(ultimo=F('ultimo') + cantidad):
+        try:
+            # Primer número del día; si otra caja crea la fila a la vez, se incrementa la suya
+            with transaction.atomic():
+                ContadorVenta.objects.create(fecha=fecha, ultimo=cantidad)
+            return cantidad
+        except IntegrityError:
+            ContadorVenta.objects.filter(fecha=fecha).update(ultimo=F('ultimo') + cantidad)
+    return ContadorVenta.objects.filter(fecha=fecha).values_list('ultimo', flat=True).get()
+
+
+def reservar_numeros_venta(cantidad, fecha=None):
+    """
+    Reserva `cantidad` números consecutivos del día.
+
+    Llamar dentro de la transacción que crea las ventas: si se revierte, los
+    números vuelven a estar disponibles.
+
+    Returns:
+        list[str]: Números en orden
+    """
+    if cantidad < 1:
+        return []
+    fecha = fecha or timezone.localdate()
+    with transaction.atomic():
+        ultimo = _incrementar(fecha, cantidad)
+    return [formatear_numero_venta(fecha, correlativo) for correlativo in range(ultimo - cantidad + 1, ultimo + 1)]
+
+
+def siguiente_numero_venta(fecha=None):
+    return reservar_numeros_venta(1, fecha)[0]
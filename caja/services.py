@@ -5,10 +5,15 @@ Maneja: cálculo de insumos, cobros pendientes, pagos, descuento de stock, repor
 
 from decimal import Decimal, ROUND_UP
 from django.db import transaction
+from django.db.models import Count, F, Prefetch, Q, Sum
+from django.utils.dateparse import parse_datetime
 from django.utils import timezone
 from django.core.exceptions import ValidationError
-from .models import SesionCaja, Venta, DetalleVenta, AuditoriaCaja
+from .models import CENTAVOS, SesionCaja, Venta, DetalleVenta, AuditoriaCaja
+from .numeracion import reservar_numeros_venta
+from .signals import totales_venta_actualizados, ventas_creadas
 from inventario.models import Insumo
+from inventario.services import descontar_stock, reintegrar_stock
 from servicios.models import Servicio
 
 
@@ -100,61 +105,103 @@ def obtener_datos_faltantes_insumo(insumo):
 # CREACIÓN DE COBROS PENDIENTES
 # =============================================================================
 
+def _detalle_insumo(detalle_clinico, descripcion):
+    """DetalleVenta (sin guardar) desde un ConsultaInsumo / HospitalizacionInsumo / CirugiaInsumo"""
+    insumo = detalle_clinico.insumo
+    return DetalleVenta(
+        tipo='insumo',
+        insumo=insumo,
+        descripcion=descripcion,
+        cantidad=detalle_clinico.cantidad_final,
+        precio_unitario=insumo.precio_venta or Decimal('0'),
+        peso_paciente=detalle_clinico.peso_paciente,
+        dosis_calculada_ml=detalle_clinico.dosis_total_ml,
+        ml_contenedor=detalle_clinico.ml_por_contenedor,
+        calculo_automatico=detalle_clinico.calculo_automatico
+    )
+
+
+def _detalles_consulta(consulta):
+    """Servicios e insumos de la consulta como DetalleVenta sin guardar"""
+    detalles = [
+        DetalleVenta(
+            tipo='servicio',
+            servicio=servicio,
+            descripcion=servicio.nombre,
+            cantidad=1,
+            precio_unitario=servicio.precio
+        )
+        for servicio in consulta.servicios.all()
+    ]
+    detalles += [
+        _detalle_insumo(consulta_insumo, consulta_insumo.insumo.medicamento)
+        for consulta_insumo in consulta.insumos_detalle.all()
+    ]
+    return detalles
+
+
+def _detalles_hospitalizacion(hospitalizacion):
+    """Insumos de la hospitalización y cirugías (servicio + insumos) como DetalleVenta sin guardar"""
+    detalles = [
+        _detalle_insumo(hosp_insumo, f"{hosp_insumo.insumo.medicamento} (Hospitalización)")
+        for hosp_insumo in hospitalizacion.insumos_detalle.all()
+    ]
+    for cirugia in hospitalizacion.cirugias.all():
+        if cirugia.servicio:
+            detalles.append(DetalleVenta(
+                tipo='servicio',
+                servicio=cirugia.servicio,
+                descripcion=f"Cirugía: {cirugia.tipo_cirugia}",
+                cantidad=1,
+                precio_unitario=cirugia.servicio.precio
+            ))
+        detalles += [
+            _detalle_insumo(cirugia_insumo, f"{cirugia_insumo.insumo.medicamento} (Cirugía: {cirugia.tipo_cirugia})")
+            for cirugia_insumo in cirugia.insumos_detalle.all()
+        ]
+    return detalles
+
+
+def _asignar_detalles(venta, detalles):
+    """Enlaza los detalles a la venta y calcula subtotales y total en memoria"""
+    venta.subtotal_servicios = Decimal('0.00')
+    venta.subtotal_insumos = Decimal('0.00')
+    for detalle in detalles:
+        detalle.venta = venta
+        detalle.calcular_subtotal()
+        if detalle.tipo == 'servicio':
+            venta.subtotal_servicios += detalle.subtotal
+        else:
+            venta.subtotal_insumos += detalle.subtotal
+    venta.total = venta.subtotal_servicios + venta.subtotal_insumos - venta.descuento
+
+
 @transaction.atomic
 def crear_cobro_pendiente_desde_consulta(consulta, usuario):
     """
     Crea un cobro pendiente automáticamente desde una consulta
     
     Pasos:
-    1. Crea la venta en estado pendiente
-    2. Agrega servicios
-    3. Agrega insumos calculados
-    4. Calcula totales
-    5. Registra auditoría
+    1. Arma los detalles (servicios e insumos calculados) y los totales en memoria
+    2. Crea la venta en estado pendiente
+    3. Crea los detalles con un bulk_create
+    4. Registra auditoría
     """
-    from clinica.models import ConsultaInsumo
-    
     # Verificar que no exista ya un cobro para esta consulta
     if hasattr(consulta, 'venta') and consulta.venta:
         raise ValidationError("Esta consulta ya tiene un cobro asociado")
     
-    # Crear la venta
-    venta = Venta.objects.create(
+    venta = Venta(
         tipo_origen='consulta',
         consulta=consulta,
         paciente=consulta.paciente,
         estado='pendiente',
         usuario_creacion=usuario
     )
-    
-    # Agregar servicios
-    for servicio in consulta.servicios.all():
-        DetalleVenta.objects.create(
-            venta=venta,
-            tipo='servicio',
-            servicio=servicio,
-            descripcion=servicio.nombre,
-            cantidad=1,
-            precio_unitario=servicio.precio
-        )
-    
-    # Agregar insumos con cálculo automático
-    for consulta_insumo in consulta.insumos_detalle.all():
-        DetalleVenta.objects.create(
-            venta=venta,
-            tipo='insumo',
-            insumo=consulta_insumo.insumo,
-            descripcion=consulta_insumo.insumo.medicamento,
-            cantidad=consulta_insumo.cantidad_final,
-            precio_unitario=consulta_insumo.insumo.precio_venta or Decimal('0'),
-            peso_paciente=consulta_insumo.peso_paciente,
-            dosis_calculada_ml=consulta_insumo.dosis_total_ml,
-            ml_contenedor=consulta_insumo.ml_por_contenedor,
-            calculo_automatico=consulta_insumo.calculo_automatico
-        )
-    
-    # Recalcular totales
-    venta.calcular_totales()
+    detalles = _detalles_consulta(consulta)
+    _asignar_detalles(venta, detalles)
+    venta.save()
+    DetalleVenta.objects.bulk_create(detalles)
     
     # Registrar auditoría
     AuditoriaCaja.objects.create(
@@ -173,66 +220,21 @@ def crear_cobro_pendiente_desde_hospitalizacion(hospitalizacion, usuario):
     Crea un cobro pendiente desde una hospitalización
     Incluye: servicios, insumos de hospitalización, cirugías, etc.
     """
-    from clinica.models import HospitalizacionInsumo, CirugiaInsumo
-    
     # Verificar que no exista ya un cobro
     if hasattr(hospitalizacion, 'venta') and hospitalizacion.venta:
         raise ValidationError("Esta hospitalización ya tiene un cobro asociado")
     
-    # Crear la venta
-    venta = Venta.objects.create(
+    venta = Venta(
         tipo_origen='hospitalizacion',
         hospitalizacion=hospitalizacion,
         paciente=hospitalizacion.paciente,
         estado='pendiente',
         usuario_creacion=usuario
     )
-    
-    # Agregar insumos de hospitalización
-    for hosp_insumo in hospitalizacion.insumos_detalle.all():
-        DetalleVenta.objects.create(
-            venta=venta,
-            tipo='insumo',
-            insumo=hosp_insumo.insumo,
-            descripcion=f"{hosp_insumo.insumo.medicamento} (Hospitalización)",
-            cantidad=hosp_insumo.cantidad_final,
-            precio_unitario=hosp_insumo.insumo.precio_venta or Decimal('0'),
-            peso_paciente=hosp_insumo.peso_paciente,
-            dosis_calculada_ml=hosp_insumo.dosis_total_ml,
-            ml_contenedor=hosp_insumo.ml_por_contenedor,
-            calculo_automatico=hosp_insumo.calculo_automatico
-        )
-    
-    # Agregar cirugías y sus insumos
-    for cirugia in hospitalizacion.cirugias.all():
-        # Agregar servicio de cirugía si existe
-        if cirugia.servicio:
-            DetalleVenta.objects.create(
-                venta=venta,
-                tipo='servicio',
-                servicio=cirugia.servicio,
-                descripcion=f"Cirugía: {cirugia.tipo_cirugia}",
-                cantidad=1,
-                precio_unitario=cirugia.servicio.precio
-            )
-        
-        # Agregar insumos de cirugía
-        for cirugia_insumo in cirugia.insumos_detalle.all():
-            DetalleVenta.objects.create(
-                venta=venta,
-                tipo='insumo',
-                insumo=cirugia_insumo.insumo,
-                descripcion=f"{cirugia_insumo.insumo.medicamento} (Cirugía: {cirugia.tipo_cirugia})",
-                cantidad=cirugia_insumo.cantidad_final,
-                precio_unitario=cirugia_insumo.insumo.precio_venta or Decimal('0'),
-                peso_paciente=cirugia_insumo.peso_paciente,
-                dosis_calculada_ml=cirugia_insumo.dosis_total_ml,
-                ml_contenedor=cirugia_insumo.ml_por_contenedor,
-                calculo_automatico=cirugia_insumo.calculo_automatico
-            )
-    
-    # Recalcular totales
-    venta.calcular_totales()
+    detalles = _detalles_hospitalizacion(hospitalizacion)
+    _asignar_detalles(venta, detalles)
+    venta.save()
+    DetalleVenta.objects.bulk_create(detalles)
     
     # Registrar auditoría
     AuditoriaCaja.objects.create(
@@ -245,6 +247,92 @@ def crear_cobro_pendiente_desde_hospitalizacion(hospitalizacion, usuario):
     return venta
 
 
+def crear_cobros_pendientes_lote(consultas=None, hospitalizaciones=None, usuario=None):
+    """
+    Crea los cobros pendientes de muchas consultas y hospitalizaciones a la vez
+    (jornadas de vacunación, cobros no generados durante una caída).
+
+    Carga servicios, insumos, cirugías y precios con prefetch (unas pocas
+    consultas en total), arma ventas, detalles y totales en memoria y los
+    inserta con bulk_create. Omite los orígenes que ya tienen cobro o no
+    tienen nada que cobrar.
+
+    Args:
+        consultas: QuerySet o ids de Consulta
+        hospitalizaciones: QuerySet o ids de Hospitalizacion
+        usuario: Usuario de creación (default: el veterinario del origen)
+
+    Returns:
+        dict: {'ventas': [Venta, ...], 'omitidos': [(origen, id, motivo), ...]}
+    """
+    from clinica.models import Cirugia, CirugiaInsumo, Consulta, ConsultaInsumo, Hospitalizacion, HospitalizacionInsumo
+
+    def _ids(origenes):
+        if origenes is None:
+            return []
+        if hasattr(origenes, 'values_list'):
+            return origenes.values_list('pk', flat=True)
+        return [getattr(origen, 'pk', origen) for origen in origenes]
+
+    def insumos(modelo):
+        return Prefetch('insumos_detalle', queryset=modelo.objects.select_related('insumo'))
+
+    consultas = Consulta.objects.filter(pk__in=_ids(consultas), venta__isnull=True).select_related(
+        'paciente', 'veterinario'
+    ).prefetch_related('servicios', insumos(ConsultaInsumo))
+    hospitalizaciones = Hospitalizacion.objects.filter(
+        pk__in=_ids(hospitalizaciones), venta__isnull=True
+    ).select_related('paciente', 'veterinario').prefetch_related(
+        insumos(HospitalizacionInsumo),
+        Prefetch('cirugias', queryset=Cirugia.objects.select_related('servicio').prefetch_related(insumos(CirugiaInsumo))),
+    )
+
+    pendientes = []
+    omitidos = []
+    origenes = [('consulta', consulta, _detalles_consulta) for consulta in consultas]
+    origenes += [('hospitalizacion', hospitalizacion, _detalles_hospitalizacion) for hospitalizacion in hospitalizaciones]
+    for tipo_origen, origen, detalles_de in origenes:
+        detalles = detalles_de(origen)
+        creador = usuario or origen.veterinario
+        if not detalles:
+            omitidos.append((tipo_origen, origen.pk, 'sin servicios ni insumos'))
+            continue
+        if creador is None:
+            omitidos.append((tipo_origen, origen.pk, 'sin usuario de creación (indique uno)'))
+            continue
+        venta = Venta(
+            tipo_origen=tipo_origen,
+            paciente=origen.paciente,
+            estado='pendiente',
+            usuario_creacion=creador,
+            **{tipo_origen: origen}
+        )
+        _asignar_detalles(venta, detalles)
+        pendientes.append((venta, detalles))
+
+    if not pendientes:
+        return {'ventas': [], 'omitidos': omitidos}
+
+    ventas = [venta for venta, _ in pendientes]
+    with transaction.atomic():
+        for venta, numero in zip(ventas, reservar_numeros_venta(len(ventas))):
+            venta.numero_venta = numero
+        Venta.objects.bulk_create(ventas, batch_size=500)
+        DetalleVenta.objects.bulk_create([detalle for _, detalles in pendientes for detalle in detalles], batch_size=500)
+        AuditoriaCaja.objects.bulk_create([
+            AuditoriaCaja(
+                venta=venta,
+                accion='crear_venta',
+                usuario=venta.usuario_creacion,
+                descripcion=f"Cobro pendiente creado en lote desde {venta.get_tipo_origen_display().lower()} "
+                            f"#{venta.consulta_id or venta.hospitalizacion_id}"
+            )
+            for venta in ventas
+        ], batch_size=500)
+        ventas_creadas.send(sender=Venta, ventas=ventas)
+    return {'ventas': ventas, 'omitidos': omitidos}
+
+
 @transaction.atomic
 def crear_venta_libre(usuario, items_servicios=None, items_insumos=None, paciente=None, observaciones=''):
     """
@@ -340,8 +428,8 @@ def agregar_detalle_venta(venta, tipo, item_id, cantidad, usuario, precio_manual
             precio_unitario=precio_manual or (insumo.precio_venta or Decimal('0'))
         )
     
-    # Recalcular totales
-    venta.calcular_totales()
+    # Actualizar totales con el subtotal de la nueva línea
+    venta.ajustar_totales(detalle.tipo, detalle.subtotal)
     
     # Registrar auditoría
     AuditoriaCaja.objects.create(
@@ -360,7 +448,8 @@ def eliminar_detalle_venta(detalle_id, usuario):
     """
     Elimina un detalle de una venta pendiente
     """
-    detalle = DetalleVenta.objects.get(pk=detalle_id)
+    # Fila bloqueada: dos bajas concurrentes no descuentan dos veces el subtotal
+    detalle = DetalleVenta.objects.select_for_update().get(pk=detalle_id)
     venta = detalle.venta
     
     if venta.estado != 'pendiente':
@@ -376,8 +465,8 @@ def eliminar_detalle_venta(detalle_id, usuario):
     # Eliminar
     detalle.delete()
     
-    # Recalcular totales
-    venta.calcular_totales()
+    # Descontar la línea de los totales
+    venta.ajustar_totales(detalle.tipo, -detalle.subtotal)
     
     # Registrar auditoría
     AuditoriaCaja.objects.create(
@@ -394,18 +483,21 @@ def modificar_cantidad_detalle(detalle_id, nueva_cantidad, usuario):
     """
     Modifica la cantidad de un detalle en una venta pendiente
     """
-    detalle = DetalleVenta.objects.get(pk=detalle_id)
+    # Fila bloqueada antes de leer el subtotal: la diferencia aplicada a los
+    # totales es siempre contra el valor vigente, aunque dos cajas editen a la vez
+    detalle = DetalleVenta.objects.select_for_update().get(pk=detalle_id)
     venta = detalle.venta
     
     if venta.estado != 'pendiente':
         raise ValidationError("Solo se pueden editar ventas pendientes")
     
     cantidad_anterior = detalle.cantidad
+    subtotal_anterior = detalle.subtotal
     detalle.cantidad = nueva_cantidad
-    detalle.save()
+    detalle.save(update_fields=['cantidad', 'subtotal'])
     
-    # Recalcular totales
-    venta.calcular_totales()
+    # Aplicar la diferencia de la línea a los totales
+    venta.ajustar_totales(detalle.tipo, detalle.subtotal - subtotal_anterior)
     
     # Registrar auditoría
     AuditoriaCaja.objects.create(
@@ -427,8 +519,7 @@ def aplicar_descuento_venta(venta, descuento, usuario, motivo=''):
         raise ValidationError("No se puede aplicar descuento a esta venta")
     
     descuento_anterior = venta.descuento
-    venta.descuento = descuento
-    venta.calcular_totales()
+    venta.aplicar_descuento(descuento)
     
     # Registrar auditoría
     AuditoriaCaja.objects.create(
@@ -467,10 +558,8 @@ def procesar_pago(venta, usuario, metodo_pago, sesion_caja=None):
     venta.sesion = sesion_caja
     venta.save()
     
-    # DESCONTAR STOCK de insumos
-    for detalle in venta.detalles.filter(tipo='insumo'):
-        if detalle.insumo and not detalle.stock_descontado:
-            descontar_stock_insumo(detalle)
+    # DESCONTAR STOCK de insumos (todas las líneas juntas)
+    descontar_stock_venta(venta, usuario)
     
     # Registrar auditoría
     AuditoriaCaja.objects.create(
@@ -488,7 +577,39 @@ def procesar_pago(venta, usuario, metodo_pago, sesion_caja=None):
     return venta
 
 
-def descontar_stock_insumo(detalle_venta):
+def descontar_stock_venta(venta, usuario=None):
+    """
+    Descuenta el stock de todas las líneas de insumo pendientes de la venta.
+
+    Las cantidades se suman por insumo y se descuentan con un solo UPDATE
+    condicional (inventario.services.descontar_stock): si un insumo no alcanza
+    no se descuenta ninguno. Las líneas se marcan con un solo UPDATE, solo
+    si siguen pendientes: un pago concurrente de la misma venta falla.
+
+    Returns:
+        int: Líneas marcadas como descontadas
+    """
+    pendientes = venta.detalles.filter(tipo='insumo', insumo__isnull=False, stock_descontado=False)
+    cantidades = {}
+    ids = []
+    for detalle_id, insumo_id, cantidad in pendientes.values_list('id', 'insumo_id', 'cantidad'):
+        cantidades[insumo_id] = cantidades.get(insumo_id, 0) + int(cantidad)
+        ids.append(detalle_id)
+    if not ids:
+        return 0
+
+    descontar_stock(cantidades, usuario=usuario, origen=('venta', venta.pk))
+    # Condicional: si otro pago marcó las líneas primero, este se revierte completo
+    marcadas = DetalleVenta.objects.filter(id__in=ids, stock_descontado=False).update(
+        stock_descontado=True,
+        fecha_descuento_stock=timezone.now(),
+    )
+    if marcadas != len(ids):
+        raise ValidationError("El stock de esta venta ya fue descontado por otro pago")
+    return marcadas
+
+
+def descontar_stock_insumo(detalle_venta, usuario=None):
     """
     Descuenta el stock de un insumo
     Se ejecuta solo cuando el pago es confirmado
@@ -496,21 +617,12 @@ def descontar_stock_insumo(detalle_venta):
     if detalle_venta.stock_descontado:
         raise ValidationError("El stock ya fue descontado para este detalle")
     
-    insumo = detalle_venta.insumo
-    cantidad = int(detalle_venta.cantidad)
-    
-    # Verificar stock disponible
-    if insumo.stock_actual < cantidad:
-        raise ValidationError(
-            f"Stock insuficiente para {insumo.medicamento}. "
-            f"Disponible: {insumo.stock_actual}, Requerido: {cantidad}"
-        )
-    
-    # Descontar
-    insumo.stock_actual -= cantidad
-    insumo.ultimo_movimiento = timezone.now()
-    insumo.tipo_ultimo_movimiento = 'salida'
-    insumo.save()
+    # UPDATE condicional: falla si otra venta dejó el stock por debajo de lo requerido
+    descontar_stock(
+        {detalle_venta.insumo_id: int(detalle_venta.cantidad)},
+        usuario=usuario,
+        origen=('venta', detalle_venta.venta_id),
+    )
     
     # Marcar como descontado
     detalle_venta.stock_descontado = True
@@ -529,14 +641,15 @@ def cancelar_venta(venta, usuario, motivo=''):
     
     estado_anterior = venta.estado
     
-    # Si estaba pagada, reintegrar stock
+    # Si estaba pagada, reintegrar stock (un solo UPDATE para todos los insumos)
     if estado_anterior == 'pagado':
-        for detalle in venta.detalles.filter(tipo='insumo', stock_descontado=True):
-            if detalle.insumo:
-                detalle.insumo.stock_actual += int(detalle.cantidad)
-                detalle.insumo.save()
-                detalle.stock_descontado = False
-                detalle.save()
+        descontados = venta.detalles.filter(tipo='insumo', stock_descontado=True, insumo__isnull=False)
+        reintegrar_stock(
+            [(insumo_id, int(cantidad)) for insumo_id, cantidad in descontados.values_list('insumo_id', 'cantidad')],
+            usuario=usuario,
+            origen=venta,
+        )
+        descontados.update(stock_descontado=False)
     
     # Cancelar
     venta.estado = 'cancelado'
@@ -619,6 +732,10 @@ def cerrar_sesion_caja(sesion, usuario, monto_contado, observaciones=''):
         }
     )
     
+    # Congelar el reporte: la sesión cerrada ya no cambia
+    sesion.reporte = construir_reporte_sesion(sesion)
+    sesion.save(update_fields=['reporte'])
+    
     return sesion
 
 
@@ -626,12 +743,47 @@ def cerrar_sesion_caja(sesion, usuario, monto_contado, observaciones=''):
 # REPORTES
 # =============================================================================
 
+# Claves del reporte que el JSON guarda como texto y se restauran al leer la copia congelada
+CLAVES_FECHA = {'fecha_apertura', 'fecha_cierre', 'fecha_pago', 'fecha'}
+CLAVES_DECIMAL = {
+    'monto_inicial', 'monto_final_calculado', 'monto_final_contado', 'diferencia',
+    'total_vendido', 'total', 'cantidad', 'valor_total',
+}
+
+
+def _restaurar_tipos(valor, clave=None):
+    if isinstance(valor, dict):
+        return {k: _restaurar_tipos(v, k) for k, v in valor.items()}
+    if isinstance(valor, list):
+        return [_restaurar_tipos(v) for v in valor]
+    if isinstance(valor, str):
+        if clave in CLAVES_FECHA:
+            return parse_datetime(valor)
+        if clave in CLAVES_DECIMAL:
+            return Decimal(valor)
+    return valor
+
+
 def generar_reporte_sesion(sesion):
     """
     Genera un reporte completo de una sesión de caja
+
+    Una sesión cerrada devuelve el reporte congelado en cerrar_sesion_caja()
+    (las cerradas antes de existir la copia la guardan la primera vez).
+    """
+    if sesion.esta_cerrada:
+        if sesion.reporte is None:
+            sesion.reporte = construir_reporte_sesion(sesion)
+            SesionCaja.objects.filter(pk=sesion.pk).update(reporte=sesion.reporte)
+        return _restaurar_tipos(sesion.reporte)
+    return construir_reporte_sesion(sesion)
+
+
+def construir_reporte_sesion(sesion):
+    """
+    Calcula el reporte de la sesión: un agregado agrupado por medio de pago, la
+    lista de ventas con su paciente, los insumos consumidos y la auditoría.
     """
-    from django.db.models import Sum, Count, Q
-    
     ventas_pagadas = sesion.ventas.filter(estado='pagado')
     
     reporte = {
@@ -647,10 +799,10 @@ def generar_reporte_sesion(sesion):
             'diferencia': sesion.diferencia,
         },
         'resumen': {
-            'total_vendido': ventas_pagadas.aggregate(Sum('total'))['total__sum'] or Decimal('0'),
-            'cantidad_ventas': ventas_pagadas.count(),
-            'ventas_con_paciente': ventas_pagadas.exclude(paciente__isnull=True).count(),
-            'ventas_sin_paciente': ventas_pagadas.filter(paciente__isnull=True).count(),
+            'total_vendido': Decimal('0'),
+            'cantidad_ventas': 0,
+            'ventas_con_paciente': 0,
+            'ventas_sin_paciente': 0,
         },
         'medios_pago': {},
         'ventas': [],
@@ -658,18 +810,32 @@ def generar_reporte_sesion(sesion):
         'auditoria': []
     }
     
-    # Resumen por medio de pago
-    for metodo, _ in Venta.METODO_PAGO_CHOICES:
-        total = ventas_pagadas.filter(metodo_pago=metodo).aggregate(Sum('total'))['total__sum'] or Decimal('0')
-        cantidad = ventas_pagadas.filter(metodo_pago=metodo).count()
-        if cantidad > 0:
-            reporte['medios_pago'][metodo] = {
-                'total': total,
-                'cantidad': cantidad
-            }
+    # Resumen y medios de pago: una consulta agrupada
+    por_metodo = ventas_pagadas.order_by().values('metodo_pago').annotate(
+        total=Sum('total'),
+        cantidad=Count('id'),
+        con_paciente=Count('id', filter=Q(paciente__isnull=False)),
+    )
+    resumen = reporte['resumen']
+    for fila in por_metodo:
+        total = fila['total'] or Decimal('0')
+        resumen['total_vendido'] += total
+        resumen['cantidad_ventas'] += fila['cantidad']
+        resumen['ventas_con_paciente'] += fila['con_paciente']
+        if fila['metodo_pago']:
+            reporte['medios_pago'][fila['metodo_pago']] = {'total': total, 'cantidad': fila['cantidad']}
+    resumen['ventas_sin_paciente'] = resumen['cantidad_ventas'] - resumen['ventas_con_paciente']
+    # Mismo orden que METODO_PAGO_CHOICES
+    orden = [metodo for metodo, _ in Venta.METODO_PAGO_CHOICES]
+    reporte['medios_pago'] = dict(sorted(
+        reporte['medios_pago'].items(), key=lambda item: orden.index(item[0]) if item[0] in orden else len(orden)
+    ))
     
     # Detalle de ventas
-    for venta in ventas_pagadas:
+    ventas = ventas_pagadas.select_related('paciente').only(
+        'sesion', 'numero_venta', 'tipo_origen', 'total', 'metodo_pago', 'fecha_pago', 'paciente__nombre'
+    )
+    for venta in ventas:
         reporte['ventas'].append({
             'numero': venta.numero_venta,
             'paciente': venta.paciente.nombre if venta.paciente else 'Venta Libre',
@@ -680,9 +846,9 @@ def generar_reporte_sesion(sesion):
         })
     
     # Insumos consumidos
-    from django.db.models import F
     insumos_consumidos = DetalleVenta.objects.filter(
-        venta__in=ventas_pagadas,
+        venta__sesion=sesion,
+        venta__estado='pagado',
         tipo='insumo',
         stock_descontado=True
     ).values(
@@ -736,3 +902,48 @@ def obtener_cobros_pendientes(sesion=None, paciente=None):
         queryset = queryset.filter(paciente=paciente)
     
     return queryset.select_related('paciente', 'usuario_creacion').prefetch_related('detalles')
+
+
+# =============================================================================
+# VERIFICACIÓN DE TOTALES
+# =============================================================================
+
+CAMPOS_TOTALES = ('subtotal_servicios', 'subtotal_insumos', 'total')
+
+
+def verificar_totales_ventas(ventas=None, corregir=False):
+    """
+    Recalcula subtotales y total desde los detalles, para todas las ventas de
+    `ventas` (default: todas) en una sola consulta con agregación condicional,
+    y devuelve las que no cuadran con los totales guardados (que se mantienen
+    de forma incremental, ver Venta.ajustar_totales).
+
+    Args:
+        ventas: QuerySet de Venta a revisar
+        corregir: Si es True, guarda los totales recalculados
+
+    Returns:
+        list[dict]: {'venta_id', 'numero_venta', 'guardado': {...}, 'calculado': {...}}
+    """
+    ventas = Venta.objects.all() if ventas is None else ventas
+    filas = ventas.order_by('pk').annotate(
+        calculado_servicios=Sum('detalles__subtotal', filter=Q(detalles__tipo='servicio')),
+        calculado_insumos=Sum('detalles__subtotal', filter=Q(detalles__tipo='insumo')),
+    ).values_list('pk', 'numero_venta', *CAMPOS_TOTALES, 'descuento', 'calculado_servicios', 'calculado_insumos')
+
+    descuadradas = []
+    for pk, numero, *guardado, descuento, servicios, insumos in filas.iterator():
+        servicios = Decimal(servicios or 0).quantize(CENTAVOS)
+        insumos = Decimal(insumos or 0).quantize(CENTAVOS)
+        calculado = dict(zip(CAMPOS_TOTALES, (servicios, insumos, servicios + insumos - descuento)))
+        guardado = dict(zip(CAMPOS_TOTALES, guardado))
+        if guardado != calculado:
+            descuadradas.append({'venta_id': pk, 'numero_venta': numero, 'guardado': guardado, 'calculado': calculado})
+
+    if corregir and descuadradas:
+        with transaction.atomic():
+            corregidas = [Venta(pk=fila['venta_id'], **fila['calculado']) for fila in descuadradas]
+            Venta.objects.bulk_update(corregidas, CAMPOS_TOTALES, batch_size=500)
+        for venta in Venta.objects.filter(pk__in=[fila['venta_id'] for fila in descuadradas]):
+            totales_venta_actualizados.send(sender=Venta, instance=venta)
+    return descuadradas
@@ -0,0 +1,13 @@
+"""
+Signals de caja.
+"""
+from django.dispatch import Signal
+
+
+# Totales de una venta cambiados con un UPDATE directo (Venta.ajustar_totales /
+# Venta.aplicar_descuento), sin post_save. Argumentos: instance (la venta).
+totales_venta_actualizados = Signal()
+
+# Ventas insertadas con bulk_create (caja.services.crear_cobros_pendientes_lote),
+# sin post_save. Argumentos: ventas.
+ventas_creadas = Signal()
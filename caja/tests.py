@@ -1,3 +1,263 @@
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from cuentas.models import CustomUser
+from inventario.models import Insumo
+from inventario.signals import stock_actualizado
+from servicios.models import Servicio
+
+from historial.models import RegistroHistorico
+
+from .models import ContadorVenta, DetalleVenta, SesionCaja, Venta
+from .numeracion import reservar_numeros_venta, siguiente_numero_venta
+from .services import (
+    agregar_detalle_venta,
+    abrir_sesion_caja,
+    aplicar_descuento_venta,
+    cerrar_sesion_caja,
+    construir_reporte_sesion,
+    crear_cobros_pendientes_lote,
+    eliminar_detalle_venta,
+    generar_reporte_sesion,
+    modificar_cantidad_detalle,
+    procesar_pago,
+    verificar_totales_ventas,
+)
+
+
+class NumeracionVentaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = CustomUser.objects.create_user(
+            rut='11111111-1',
+            password='clave-segura-123',
+            nombre='Caja',
+            apellido='Demo',
+            correo='caja@example.com',
+            rol='recepcion',
+        )
+
+    def test_correlativo_diario_y_bloques(self):
+        dia = date(2026, 3, 1)
+
+        self.assertEqual(siguiente_numero_venta(dia), 'V20260301-0001')
+        self.assertEqual(reservar_numeros_venta(3, dia), ['V20260301-0002', 'V20260301-0003', 'V20260301-0004'])
+        self.assertEqual(siguiente_numero_venta(date(2026, 3, 2)), 'V20260302-0001')
+        self.assertEqual(ContadorVenta.objects.get(fecha=dia).ultimo, 4)
+
+    def test_venta_nueva_no_agrega_sobre_la_tabla(self):
+        Venta.objects.create(usuario_creacion=self.usuario)
+
+        with CaptureQueriesContext(connection) as consultas:
+            segunda = Venta.objects.create(usuario_creacion=self.usuario)
+
+        self.assertTrue(segunda.numero_venta.endswith('-0002'))
+        self.assertFalse([q['sql'] for q in consultas.captured_queries if 'MAX(' in q['sql'].upper()])
+
+
+class TotalesVentaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = CustomUser.objects.create_user(
+            rut='11111111-1',
+            password='clave-segura-123',
+            nombre='Caja',
+            apellido='Demo',
+            correo='caja@example.com',
+            rol='recepcion',
+        )
+        cls.servicio = Servicio.objects.create(nombre='Consulta general', precio=15000)
+        cls.insumo = Insumo.objects.create(medicamento='Meloxicam', precio_venta=Decimal('1250.50'))
+
+    def test_totales_incrementales_cuadran_con_el_recalculo(self):
+        venta = Venta.objects.create(usuario_creacion=self.usuario)
+        agregar_detalle_venta(venta, 'servicio', self.servicio.pk, Decimal('1'), self.usuario)
+        detalle = agregar_detalle_venta(venta, 'insumo', self.insumo.pk, Decimal('2'), self.usuario)
+        self.assertEqual(venta.total, Decimal('17501.00'))
+
+        with CaptureQueriesContext(connection) as consultas:
+            modificar_cantidad_detalle(detalle.pk, Decimal('3'), self.usuario)
+        self.assertFalse([q['sql'] for q in consultas.captured_queries if 'SUM(' in q['sql'].upper()])
+
+        aplicar_descuento_venta(venta, Decimal('500'), self.usuario)
+        venta.refresh_from_db()
+        self.assertEqual(
+            (venta.subtotal_servicios, venta.subtotal_insumos, venta.total),
+            (Decimal('15000'), Decimal('3751.50'), Decimal('18251.50')),
+        )
+        self.assertEqual(verificar_totales_ventas(), [])
+
+        eliminar_detalle_venta(detalle.pk, self.usuario)
+        venta.refresh_from_db()
+        self.assertEqual((venta.subtotal_insumos, venta.total), (Decimal('0'), Decimal('14500')))
+
+    def test_verificacion_detecta_y_corrige(self):
+        venta = Venta.objects.create(usuario_creacion=self.usuario)
+        agregar_detalle_venta(venta, 'servicio', self.servicio.pk, Decimal('2'), self.usuario)
+        Venta.objects.filter(pk=venta.pk).update(total=1)
+
+        descuadradas = verificar_totales_ventas(corregir=True)
+
+        self.assertEqual([fila['venta_id'] for fila in descuadradas], [venta.pk])
+        self.assertEqual(descuadradas[0]['calculado']['total'], Decimal('30000.00'))
+        venta.refresh_from_db()
+        self.assertEqual(venta.total, Decimal('30000'))
+        self.assertEqual(verificar_totales_ventas(), [])
+
+
+class ReporteSesionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = CustomUser.objects.create_user(
+            rut='11111111-1',
+            password='clave-segura-123',
+            nombre='Caja',
+            apellido='Demo',
+            correo='caja@example.com',
+            rol='recepcion',
+        )
+        cls.sesion = abrir_sesion_caja(cls.usuario, monto_inicial=Decimal('10000'))
+        for total, metodo in ((Decimal('5000'), 'efectivo'), (Decimal('2500'), 'efectivo'), (Decimal('8000'), 'tarjeta')):
+            Venta.objects.create(
+                usuario_creacion=cls.usuario, sesion=cls.sesion, estado='pagado',
+                total=total, metodo_pago=metodo, fecha_pago=timezone.now(),
+            )
+
+    def test_reporte_agrupado_y_congelado_al_cierre(self):
+        with self.assertNumQueries(6):  # sesión, usuario, agregado por medio, ventas, insumos, auditoría
+            reporte = construir_reporte_sesion(SesionCaja.objects.get(pk=self.sesion.pk))
+
+        self.assertEqual(reporte['resumen']['total_vendido'], Decimal('15500'))
+        self.assertEqual(reporte['resumen']['ventas_sin_paciente'], 3)
+        self.assertEqual(reporte['medios_pago']['efectivo'], {'total': Decimal('7500'), 'cantidad': 2})
+        self.assertEqual(len(reporte['ventas']), 3)
+
+        cerrar_sesion_caja(self.sesion, self.usuario, Decimal('25500'))
+        sesion = SesionCaja.objects.get(pk=self.sesion.pk)
+        with self.assertNumQueries(0):
+            congelado = generar_reporte_sesion(sesion)
+        self.assertEqual(congelado['resumen']['total_vendido'], Decimal('15500'))
+        self.assertEqual(congelado['sesion']['diferencia'], Decimal('0'))
+        self.assertIsNotNone(congelado['ventas'][0]['fecha_pago'].tzinfo)
+
+
+class PagoVentaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = CustomUser.objects.create_user(
+            rut='11111111-1',
+            password='clave-segura-123',
+            nombre='Caja',
+            apellido='Demo',
+            correo='caja@example.com',
+            rol='recepcion',
+        )
+        cls.meloxicam = Insumo.objects.create(medicamento='Meloxicam', precio_venta=Decimal('1000'), stock_actual=10)
+        cls.jeringa = Insumo.objects.create(medicamento='Jeringa', precio_venta=Decimal('300'), stock_actual=5)
+
+    def _venta(self, cantidad_jeringas=2):
+        venta = Venta.objects.create(usuario_creacion=self.usuario)
+        for insumo, cantidad in ((self.meloxicam, 2), (self.meloxicam, 3), (self.jeringa, cantidad_jeringas)):
+            DetalleVenta.objects.create(
+                venta=venta, tipo='insumo', insumo=insumo, descripcion=insumo.medicamento,
+                cantidad=Decimal(cantidad), precio_unitario=insumo.precio_venta,
+            )
+        return venta
+
+    def test_descuenta_todas_las_lineas_en_un_update(self):
+        venta = self._venta()
+
+        with CaptureQueriesContext(connection) as consultas, self.captureOnCommitCallbacks(execute=True):
+            procesar_pago(venta, self.usuario, 'efectivo')
+
+        sql = [q['sql'] for q in consultas.captured_queries]
+        self.assertEqual(len([q for q in sql if q.startswith('UPDATE "inventario"')]), 1)
+        self.assertEqual(len([q for q in sql if q.startswith('UPDATE "caja_detalleventa"')]), 1)
+        self.assertEqual(len([q for q in sql if q.startswith('INSERT INTO "registro_historico"')]), 1)
+        self.meloxicam.refresh_from_db()
+        self.jeringa.refresh_from_db()
+        self.assertEqual((self.meloxicam.stock_actual, self.jeringa.stock_actual), (5, 3))
+        self.assertFalse(venta.detalles.filter(stock_descontado=False).exists())
+        self.assertEqual(RegistroHistorico.objects.filter(tipo_evento='salida_stock').count(), 2)
+
+    def test_pago_concurrente_no_descuenta_dos_veces(self):
+        venta = self._venta()
+
+        def otro_pago(sender, **kwargs):
+            # Otro pago de la misma venta marca las líneas entre la lectura y el UPDATE de este
+            DetalleVenta.objects.filter(venta=venta).update(stock_descontado=True)
+
+        stock_actualizado.connect(otro_pago)
+        self.addCleanup(stock_actualizado.disconnect, otro_pago)
+        with self.assertRaisesMessage(ValidationError, 'ya fue descontado por otro pago'):
+            procesar_pago(venta, self.usuario, 'efectivo')
+
+        self.meloxicam.refresh_from_db()
+        self.assertEqual(self.meloxicam.stock_actual, 10)
+
+    def test_stock_insuficiente_no_descuenta_ninguna_linea(self):
+        venta = self._venta(cantidad_jeringas=6)
+
+        with self.assertRaisesMessage(ValidationError, "Stock insuficiente para 'Jeringa'"):
+            procesar_pago(venta, self.usuario, 'efectivo')
+
+        self.meloxicam.refresh_from_db()
+        venta.refresh_from_db()
+        self.assertEqual((self.meloxicam.stock_actual, venta.estado), (10, 'pendiente'))
+        self.assertFalse(venta.detalles.filter(stock_descontado=True).exists())
+
+
+class CobrosLoteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from clinica.models import Consulta, ConsultaInsumo
+        from pacientes.models import Paciente, Propietario
+
+        cls.veterinario = CustomUser.objects.create_user(
+            rut='22222222-2',
+            password='clave-segura-123',
+            nombre='Vet',
+            apellido='Demo',
+            correo='vet@example.com',
+            rol='veterinario',
+        )
+        propietario = Propietario.objects.create(nombre='Ana', apellido='Pérez', telefono='+56911111111')
+        paciente = Paciente.objects.create(nombre='Toby', especie='perro', propietario=propietario)
+        vacuna = Servicio.objects.create(nombre='Vacuna óctuple', precio=12000)
+        insumo = Insumo.objects.create(medicamento='Jeringa', precio_venta=Decimal('300'))
+        cls.consultas = []
+        for _ in range(3):
+            consulta = Consulta.objects.create(paciente=paciente, veterinario=cls.veterinario, diagnostico='Vacunación')
+            consulta.servicios.add(vacuna)
+            cls.cantidad = ConsultaInsumo.objects.create(consulta=consulta, insumo=insumo, peso_paciente=10).cantidad_final
+            cls.consultas.append(consulta)
+
+    def test_lote_crea_ventas_detalles_y_totales(self):
+        salida = StringIO()
+        call_command('generar_cobros_pendientes', '--simular', stdout=salida)
+        self.assertIn('se crearían 3 cobros', salida.getvalue())
+        self.assertFalse(Venta.objects.exists())
+
+        # Consulta, servicios, insumos; contador (con savepoints) y un INSERT por tabla: no crece con el lote
+        with self.assertNumQueries(14):
+            resultado = crear_cobros_pendientes_lote(consultas=[c.pk for c in self.consultas])
+
+        self.assertEqual(len(resultado['ventas']), 3)
+        venta = Venta.objects.get(consulta=self.consultas[0])
+        insumos = self.cantidad * 300
+        self.assertEqual((venta.subtotal_servicios, venta.subtotal_insumos, venta.total),
+                         (Decimal('12000'), insumos, 12000 + insumos))
+        self.assertEqual(venta.detalles.count(), 2)
+        self.assertEqual(len({v.numero_venta for v in Venta.objects.all()}), 3)
+        self.assertEqual(verificar_totales_ventas(), [])
 
-# Create your tests here.
+        # Los que ya tienen cobro se omiten
+        self.assertEqual(crear_cobros_pendientes_lote(consultas=self.consultas)['ventas'], [])
@@ -1,6 +1,7 @@
 # caja/views.py
 from django.views.decorators.csrf import csrf_exempt
 from django.http import JsonResponse
+from django.core.exceptions import ValidationError
 import json
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
@@ -10,6 +11,7 @@ from decimal import Decimal
 
 # Importar desde las apps correctas
 from inventario.models import Insumo
+from inventario.services import descontar_stock
 from servicios.models import Servicio
 from .models import Caja, MovimientoCaja
 from .forms import AperturaCajaForm, CierreCajaForm
@@ -36,17 +38,21 @@ def procesar_venta(request):
         data = json.loads(request.body)
         items = data.get('items', [])
         try:
+            cantidades = []
             for item in items:
                 nombre = item['name']
-                cantidad = int(item['quantity'])
                 # Busca el producto por nombre
                 producto = Insumo.objects.get(medicamento=nombre)
-                if producto.stock_actual >= cantidad:
-                    producto.stock_actual -= cantidad
-                    producto.save()
-                else:
-                    return JsonResponse({'success': False, 'error': f'Stock insuficiente para {nombre}'})
+                cantidades.append((producto.pk, int(item['quantity'])))
+            # Todo o nada: si un producto no alcanza, no se descuenta ninguno
+            descontar_stock(
+                cantidades,
+                usuario=request.user if request.user.is_authenticated else None,
+                origen=('venta', None),
+            )
             return JsonResponse({'success': True})
+        except ValidationError as e:
+            return JsonResponse({'success': False, 'error': e.messages[0]})
         except Exception as e:
             return JsonResponse({'success': False, 'error': str(e)})
     return JsonResponse({'success': False, 'error': 'Método no permitido'})
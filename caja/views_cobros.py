@@ -447,7 +447,9 @@ def cancelar_venta_view(request, venta_id):
 @user_passes_test(es_admin_o_recepcion)
 def ver_reporte_sesion(request, sesion_id):
     """Muestra el reporte completo de una sesión de caja"""
-    sesion = get_object_or_404(SesionCaja, pk=sesion_id)
+    sesion = get_object_or_404(
+        SesionCaja.objects.select_related('usuario_apertura', 'usuario_cierre'), pk=sesion_id
+    )
     reporte = generar_reporte_sesion(sesion)
     
     context = {
@@ -462,7 +464,13 @@ def ver_reporte_sesion(request, sesion_id):
 @user_passes_test(es_admin_o_recepcion)
 def historial_sesiones(request):
     """Muestra el historial de todas las sesiones de caja"""
-    sesiones = SesionCaja.objects.all().order_by('-fecha_apertura')[:50]
+    sesiones = SesionCaja.objects.select_related(
+        'usuario_apertura', 'usuario_cierre'
+    ).order_by('-fecha_apertura')[:50]
+    
+    # Las cerradas traen su resumen del reporte congelado al cierre
+    for sesion in sesiones:
+        sesion.resumen = generar_reporte_sesion(sesion)['resumen'] if sesion.esta_cerrada else None
     
     context = {
         'sesiones': sesiones,
@@ -1,4 +1,7 @@
+from datetime import timedelta
+
 from django.db import models
+from django.db.models import Case, ExpressionWrapper, F, OuterRef, Subquery, Value, When
 from django.conf import settings
 from django.utils import timezone
 from django.core.exceptions import ValidationError
@@ -105,19 +108,11 @@ class Consulta(models.Model):
                 'message': 'Consulta confirmada sin insumos asociados'
             }
         
-        resultados = []
-        
-        # Descontar dentro de transacción atómica
+        # Descontar todos los insumos con un solo UPDATE dentro de transacción atómica
         with transaction.atomic():
-            for detalle in insumos_detalle:
-                try:
-                    resultado = detalle.descontar_stock(usuario, dias_tratamiento)
-                    resultados.append(resultado)
-                except ValidationError as e:
-                    # Re-lanzar para rollback de toda la transacción
-                    raise ValidationError(
-                        f"Error al descontar {detalle.insumo.medicamento}: {str(e)}"
-                    )
+            resultados = descontar_detalles_insumo(
+                insumos_detalle.select_related('insumo'), usuario, dias_tratamiento, origen=self
+            )
             
             # Marcar consulta como procesada
             self.insumos_descontados = True
@@ -148,6 +143,41 @@ class MedicamentoUtilizado(models.Model):
         return f"{self.nombre} - {self.dosis or 'Sin dosis'}"
 
 
+class HospitalizacionQuerySet(models.QuerySet):
+    """QuerySet de hospitalizaciones con anotaciones de seguimiento clínico."""
+
+    def with_ultimo_registro(self, horas_actualizacion=12, ahora=None):
+        """
+        Anota el estado del último RegistroDiario en la misma consulta
+        (subconsulta correlacionada con OuterRef), evitando una consulta por
+        hospitalización:
+
+        - ultimo_registro_fecha: fecha_registro más reciente (None si no hay)
+        - tiempo_sin_registro: ahora - ultimo_registro_fecha (timedelta o None)
+        - necesita_actualizacion: True si no hay registros o el último tiene
+          `horas_actualizacion` horas o más
+        """
+        ahora = ahora or timezone.now()
+        ultimo_registro = RegistroDiario.objects.filter(
+            hospitalizacion=OuterRef('pk')
+        ).order_by('-fecha_registro').values('fecha_registro')[:1]
+
+        return self.annotate(
+            ultimo_registro_fecha=Subquery(ultimo_registro, output_field=models.DateTimeField()),
+        ).annotate(
+            tiempo_sin_registro=ExpressionWrapper(
+                Value(ahora, output_field=models.DateTimeField()) - F('ultimo_registro_fecha'),
+                output_field=models.DurationField()
+            ),
+            necesita_actualizacion=Case(
+                When(ultimo_registro_fecha__isnull=True, then=Value(True)),
+                When(ultimo_registro_fecha__lte=ahora - timedelta(hours=horas_actualizacion), then=Value(True)),
+                default=Value(False),
+                output_field=models.BooleanField(),
+            ),
+        )
+
+
 class Hospitalizacion(models.Model):
     """Modelo para hospitalizaciones"""
     ESTADO_CHOICES = [
@@ -173,6 +203,8 @@ class Hospitalizacion(models.Model):
         help_text="Indica si los insumos de esta hospitalización ya fueron descontados del inventario. "
                   "Previene descuentos duplicados."
     )
+
+    objects = HospitalizacionQuerySet.as_manager()
     
     class Meta:
         ordering = ['-fecha_ingreso']
@@ -243,17 +275,10 @@ class Hospitalizacion(models.Model):
                 'message': 'Hospitalización finalizada sin insumos asociados'
             }
         
-        resultados = []
-        
         with transaction.atomic():
-            for detalle in insumos_detalle:
-                try:
-                    resultado = detalle.descontar_stock(usuario, dias_tratamiento)
-                    resultados.append(resultado)
-                except ValidationError as e:
-                    raise ValidationError(
-                        f"Error al descontar {detalle.insumo.medicamento}: {str(e)}"
-                    )
+            resultados = descontar_detalles_insumo(
+                insumos_detalle.select_related('insumo'), usuario, dias_tratamiento, origen=self
+            )
             
             self.insumos_descontados = True
             self.save(update_fields=['insumos_descontados'])
@@ -470,7 +495,7 @@ class ConsultaInsumo(models.Model):
         
         REGLAS:
         - Usa calcular_envases_requeridos() del modelo Insumo
-        - Valida stock suficiente ANTES de descontar
+        - Descuenta con un UPDATE condicional (stock_actual >= envases)
         - Marca stock_descontado=True para evitar duplicados
         - Registra metadata del movimiento
         - NUNCA permite stock negativo
@@ -485,61 +510,7 @@ class ConsultaInsumo(models.Model):
         Raises:
             ValidationError: Si stock insuficiente o ya descontado
         """
-        from django.db import transaction
-        
-        # Validar que no se haya descontado previamente
-        if self.stock_descontado:
-            raise ValidationError(
-                f"El stock del insumo '{self.insumo.medicamento}' "
-                f"ya fue descontado para esta consulta."
-            )
-        
-        # Calcular envases requeridos
-        resultado = self.insumo.calcular_envases_requeridos(
-            peso_paciente_kg=float(self.peso_paciente),
-            dias_tratamiento=dias_tratamiento
-        )
-        
-        envases_requeridos = resultado['envases_requeridos']
-        
-        # Validar stock suficiente
-        if self.insumo.stock_actual < envases_requeridos:
-            raise ValidationError(
-                f"Stock insuficiente para '{self.insumo.medicamento}'. "
-                f"Requerido: {envases_requeridos} envases, "
-                f"Disponible: {self.insumo.stock_actual} envases"
-            )
-        
-        # Descontar stock dentro de transacción
-        with transaction.atomic():
-            # Actualizar stock del insumo
-            stock_anterior = self.insumo.stock_actual
-            self.insumo.stock_actual -= envases_requeridos
-            self.insumo.ultimo_movimiento = timezone.now()
-            self.insumo.tipo_ultimo_movimiento = 'salida'
-            self.insumo.usuario_ultimo_movimiento = usuario
-            self.insumo.save(update_fields=[
-                'stock_actual',
-                'ultimo_movimiento',
-                'tipo_ultimo_movimiento',
-                'usuario_ultimo_movimiento'
-            ])
-            
-            # Marcar como descontado
-            self.stock_descontado = True
-            self.fecha_descuento = timezone.now()
-            self.save(update_fields=['stock_descontado', 'fecha_descuento'])
-        
-        return {
-            'success': True,
-            'insumo': self.insumo.medicamento,
-            'envases_descontados': envases_requeridos,
-            'stock_anterior': stock_anterior,
-            'stock_actual': self.insumo.stock_actual,
-            'calculo_automatico': resultado['calculo_automatico'],
-            'detalle': resultado['detalle']
-        }
-
+        return descontar_detalles_insumo([self], usuario, dias_tratamiento, origen=('consulta', self.consulta_id))[0]
 
 class HospitalizacionInsumo(models.Model):
     """
@@ -625,55 +596,9 @@ class HospitalizacionInsumo(models.Model):
         Descuenta stock del insumo usando calcular_envases_requeridos().
         Misma lógica que ConsultaInsumo.descontar_stock()
         """
-        from django.db import transaction
-        
-        if self.stock_descontado:
-            raise ValidationError(
-                f"El stock del insumo '{self.insumo.medicamento}' "
-                f"ya fue descontado para esta hospitalización."
-            )
-        
-        resultado = self.insumo.calcular_envases_requeridos(
-            peso_paciente_kg=float(self.peso_paciente),
-            dias_tratamiento=dias_tratamiento
-        )
-        
-        envases_requeridos = resultado['envases_requeridos']
-        
-        if self.insumo.stock_actual < envases_requeridos:
-            raise ValidationError(
-                f"Stock insuficiente para '{self.insumo.medicamento}'. "
-                f"Requerido: {envases_requeridos} envases, "
-                f"Disponible: {self.insumo.stock_actual} envases"
-            )
-        
-        with transaction.atomic():
-            stock_anterior = self.insumo.stock_actual
-            self.insumo.stock_actual -= envases_requeridos
-            self.insumo.ultimo_movimiento = timezone.now()
-            self.insumo.tipo_ultimo_movimiento = 'salida'
-            self.insumo.usuario_ultimo_movimiento = usuario
-            self.insumo.save(update_fields=[
-                'stock_actual',
-                'ultimo_movimiento',
-                'tipo_ultimo_movimiento',
-                'usuario_ultimo_movimiento'
-            ])
-            
-            self.stock_descontado = True
-            self.fecha_descuento = timezone.now()
-            self.save(update_fields=['stock_descontado', 'fecha_descuento'])
-        
-        return {
-            'success': True,
-            'insumo': self.insumo.medicamento,
-            'envases_descontados': envases_requeridos,
-            'stock_anterior': stock_anterior,
-            'stock_actual': self.insumo.stock_actual,
-            'calculo_automatico': resultado['calculo_automatico'],
-            'detalle': resultado['detalle']
-        }
-
+        return descontar_detalles_insumo(
+            [self], usuario, dias_tratamiento, origen=('hospitalizacion', self.hospitalizacion_id)
+        )[0]
 
 class CirugiaInsumo(models.Model):
     """
@@ -744,4 +669,64 @@ class CirugiaInsumo(models.Model):
     def save(self, *args, **kwargs):
         """Calcula cantidad antes de guardar"""
         self.calcular_cantidad()
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+
+
+def descontar_detalles_insumo(detalles, usuario, dias_tratamiento=1, origen=None):
+    """
+    Descuenta el stock de varios ConsultaInsumo / HospitalizacionInsumo del
+    mismo tipo con un solo UPDATE condicional y los marca como descontados.
+
+    Si algún insumo no tiene stock suficiente no se descuenta ninguno.
+    `origen` (Consulta, Hospitalizacion o par ('consulta', id)) queda en el
+    libro MovimientoInventario.
+
+    Returns:
+        list: Un dict de resultado por detalle (mismo orden que `detalles`)
+
+    Raises:
+        ValidationError: Si algún detalle ya fue descontado o falta stock
+    """
+    from inventario.services import descontar_stock
+
+    detalles = list(detalles)
+    calculos = []
+    for detalle in detalles:
+        if detalle.stock_descontado:
+            raise ValidationError(
+                f"El stock del insumo '{detalle.insumo.medicamento}' ya fue descontado."
+            )
+        calculos.append(detalle.insumo.calcular_envases_requeridos(
+            peso_paciente_kg=float(detalle.peso_paciente),
+            dias_tratamiento=dias_tratamiento
+        ))
+    if not detalles:
+        return []
+
+    movimientos = descontar_stock(
+        [(detalle.insumo_id, calculo['envases_requeridos']) for detalle, calculo in zip(detalles, calculos)],
+        usuario=usuario,
+        origen=origen
+    )
+
+    ahora = timezone.now()
+    for detalle in detalles:
+        detalle.stock_descontado = True
+        detalle.fecha_descuento = ahora
+    type(detalles[0]).objects.bulk_update(detalles, ['stock_descontado', 'fecha_descuento'])
+
+    resultados = []
+    for detalle, calculo in zip(detalles, calculos):
+        # Sin movimiento si el cálculo dio 0 envases
+        sin_cambio = {'stock_anterior': detalle.insumo.stock_actual, 'stock_actual': detalle.insumo.stock_actual}
+        movimiento = movimientos.get(detalle.insumo_id, sin_cambio)
+        resultados.append({
+            'success': True,
+            'insumo': detalle.insumo.medicamento,
+            'envases_descontados': calculo['envases_requeridos'],
+            'stock_anterior': movimiento['stock_anterior'],
+            'stock_actual': movimiento['stock_actual'],
+            'calculo_automatico': calculo['calculo_automatico'],
+            'detalle': calculo['detalle']
+        })
+    return resultados
@@ -6,14 +6,50 @@ y descontar inventario al ejecutar servicios veterinarios.
 
 FUNCIONES:
 - validate_stock_for_services(): Valida stock sin modificar inventario
-- discount_stock_for_services(): Descuenta stock y registra movimientos
+- discount_stock_for_services(): Descuenta stock y registra movimientos (MovimientoInventario)
 """
 
+from collections import Counter
+
 from django.core.exceptions import ValidationError
 from django.db import transaction
+from django.db.models import QuerySet
+from inventario.services import descontar_stock
 from servicios.models import Servicio, ServicioInsumo
 
 
+MENSAJE_STOCK_INSUFICIENTE = "No hay stock suficiente para ejecutar los servicios:\n"
+
+
+def _insumos_requeridos(services):
+    """
+    Cantidad requerida y stock de cada insumo para un conjunto de servicios,
+    en una sola consulta a ServicioInsumo (con el insumo en el JOIN).
+    
+    Con un QuerySet de servicios se filtra por subconsulta; con una lista, un
+    servicio repetido suma sus insumos una vez por aparición.
+    
+    Returns:
+        dict: {insumo_id: {'medicamento': str, 'stock_actual': int, 'cantidad': int}}
+    """
+    if isinstance(services, QuerySet):
+        veces = None
+        filas = ServicioInsumo.objects.filter(servicio__in=services.values('pk'))
+    else:
+        veces = Counter(servicio.pk for servicio in services)
+        filas = ServicioInsumo.objects.filter(servicio_id__in=veces)
+    
+    requeridos = {}
+    for servicio_id, insumo_id, medicamento, stock, cantidad in filas.values_list(
+        'servicio_id', 'insumo_id', 'insumo__medicamento', 'insumo__stock_actual', 'cantidad'
+    ):
+        requerido = requeridos.setdefault(
+            insumo_id, {'medicamento': medicamento, 'stock_actual': stock, 'cantidad': 0}
+        )
+        requerido['cantidad'] += cantidad * (veces[servicio_id] if veces else 1)
+    return requeridos
+
+
 def validate_stock_for_services(services):
     """
     Valida que existe stock suficiente para ejecutar los servicios solicitados.
@@ -57,50 +93,25 @@ def validate_stock_for_services(services):
         # Si no hay error, proceder con la operación
     """
     
-    # Diccionario para acumular cantidades requeridas por insumo
-    # {insumo_id: cantidad_total_requerida}
-    insumos_requeridos = {}
-    
-    # Referenciar objetos insumo para no hacer múltiples queries
-    # {insumo_id: objeto_insumo}
-    insumos_cache = {}
-    
-    # Iterar sobre cada servicio
-    for servicio in services:
-        # Obtener todos los insumos asociados a este servicio
-        servicios_insumos = ServicioInsumo.objects.filter(servicio=servicio).select_related('insumo')
-        
-        for servicio_insumo in servicios_insumos:
-            insumo = servicio_insumo.insumo
-            cantidad_requerida = servicio_insumo.cantidad
-            
-            # Acumular cantidades si el mismo insumo se usa en múltiples servicios
-            if insumo.idInventario in insumos_requeridos:
-                insumos_requeridos[insumo.idInventario] += cantidad_requerida
-            else:
-                insumos_requeridos[insumo.idInventario] = cantidad_requerida
-                insumos_cache[insumo.idInventario] = insumo
+    # Insumos requeridos por todos los servicios, con su stock (una consulta)
+    insumos_requeridos = _insumos_requeridos(services)
     
     # Validar stock disponible para cada insumo
     errores = []
     
-    for insumo_id, cantidad_requerida in insumos_requeridos.items():
-        insumo = insumos_cache[insumo_id]
-        stock_disponible = insumo.stock_actual
-        
+    for insumo_id, requerido in insumos_requeridos.items():
         # Si el stock es insuficiente, agregar al listado de errores
-        if stock_disponible < cantidad_requerida:
+        if requerido['stock_actual'] < requerido['cantidad']:
             error_msg = (
-                f"Stock insuficiente para '{insumo.medicamento}': "
-                f"Se requieren {cantidad_requerida} unidades, "
-                f"pero solo hay {stock_disponible} disponibles."
+                f"Stock insuficiente para '{requerido['medicamento']}': "
+                f"Se requieren {requerido['cantidad']} unidades, "
+                f"pero solo hay {requerido['stock_actual']} disponibles."
             )
             errores.append(error_msg)
     
     # Si hay errores, lanzar ValidationError con todos los mensajes
     if errores:
-        mensaje_completo = "No hay stock suficiente para ejecutar los servicios:\n" + "\n".join(errores)
-        raise ValidationError(mensaje_completo)
+        raise ValidationError(MENSAJE_STOCK_INSUFICIENTE + "\n".join(errores))
     
     # Si no hay errores, simplemente retornar (validación exitosa)
     return None
@@ -139,16 +150,17 @@ def discount_stock_for_services(services, user, origen_obj):
     se apliquen correctamente o NINGUNO se aplique (no descuentos parciales).
     
     COMPORTAMIENTO CRÍTICO:
-    - Valida stock ANTES de descontar (falla rápido si hay insuficiencia)
+    - Carga los ServicioInsumo de todos los servicios en una consulta y
+      acumula la cantidad por insumo
+    - Valida y descuenta a la vez con un único UPDATE condicional
+      (inventario.services.descontar_stock); no hay validación previa aparte
     - Usa transaction.atomic() para garantizar atomicidad
-    - Descuenta Insumo.stock_actual basado en ServicioInsumo.cantidad
     - Si cualquier operación falla, hace ROLLBACK completo
     - NO permite descuentos parciales
     
     AUDITORÍA:
-    - Prepara datos para auditoría de movimientos de inventario
-    - TODO: Implementar modelo de auditoría (MovimientoInventario o similar)
-    - Registrar: usuario, fecha/hora, origen, insumos afectados, cantidades
+    - Cada insumo descontado queda en inventario.MovimientoInventario con
+      usuario, fecha/hora, origen (origen_obj), cantidad y saldo resultante
     
     Args:
         services: Iterable de instancias de Servicio
@@ -157,7 +169,7 @@ def discount_stock_for_services(services, user, origen_obj):
                    Se almacenará la referencia para trazabilidad
     
     Raises:
-        ValidationError: Si hay stock insuficiente (antes de descontar)
+        ValidationError: Si hay stock insuficiente (no se descuenta nada)
         Exception: Cualquier error durante el descuento causa rollback completo
     
     Returns:
@@ -165,7 +177,8 @@ def discount_stock_for_services(services, user, origen_obj):
               {
                   'success': True,
                   'insumos_descontados': [
-                      {'insumo_id': 1, 'medicamento': 'X', 'cantidad': 2},
+                      {'insumo_id': 1, 'medicamento': 'X', 'cantidad_descontada': 2,
+                       'stock_anterior': 10, 'stock_restante': 8},
                       ...
                   ],
                   'mensaje': 'Descuento realizado exitosamente'
@@ -208,92 +221,38 @@ def discount_stock_for_services(services, user, origen_obj):
                 f"No es posible realizar descuentos duplicados."
             )
     
-    # PASO 1: Validar stock ANTES de hacer cualquier modificación
-    # Si falla, se lanza ValidationError y no se ejecuta nada más
-    validate_stock_for_services(services)
-    
-    # PASO 2: Preparar estructura para acumular descuentos
-    # {insumo_id: {'insumo': objeto, 'cantidad': total}}
-    descuentos_a_realizar = {}
-    
-    # Iterar servicios para acumular descuentos necesarios
-    for servicio in services:
-        servicios_insumos = ServicioInsumo.objects.filter(servicio=servicio).select_related('insumo')
-        
-        for servicio_insumo in servicios_insumos:
-            insumo = servicio_insumo.insumo
-            cantidad = servicio_insumo.cantidad
-            
-            if insumo.idInventario in descuentos_a_realizar:
-                descuentos_a_realizar[insumo.idInventario]['cantidad'] += cantidad
-            else:
-                descuentos_a_realizar[insumo.idInventario] = {
-                    'insumo': insumo,
-                    'cantidad': cantidad
-                }
+    # PASO 1: Acumular cantidades por insumo para todos los servicios (una consulta)
+    insumos_requeridos = _insumos_requeridos(services)
     
-    # PASO 3: Ejecutar descuentos dentro de transacción atómica
+    # PASO 2: Ejecutar descuentos dentro de transacción atómica
     # Si cualquier operación falla, TODO se revierte automáticamente
     try:
         with transaction.atomic():
-            insumos_descontados = []
-            
-            # Realizar descuentos
-            for insumo_id, datos in descuentos_a_realizar.items():
-                insumo = datos['insumo']
-                cantidad_a_descontar = datos['cantidad']
-                
-                # Descontar del stock actual
-                insumo.stock_actual -= cantidad_a_descontar
-                
-                # Validación adicional de seguridad (no debería fallar si validate_stock funcionó)
-                if insumo.stock_actual < 0:
-                    raise ValidationError(
-                        f"Error crítico: Stock negativo para '{insumo.medicamento}'. "
-                        f"Esto no debería ocurrir. Contacte al administrador."
-                    )
-                
-                # Guardar cambios
-                insumo.save()
-                
-                # Registrar para respuesta
-                insumos_descontados.append({
-                    'insumo_id': insumo.idInventario,
-                    'medicamento': insumo.medicamento,
-                    'cantidad_descontada': cantidad_a_descontar,
-                    'stock_restante': insumo.stock_actual
-                })
+            # Un solo UPDATE condicional para todos los insumos: valida y descuenta a
+            # la vez; si alguno no alcanza (incluso por un descuento concurrente),
+            # no se descuenta ninguno
+            try:
+                movimientos = descontar_stock(
+                    {insumo_id: requerido['cantidad'] for insumo_id, requerido in insumos_requeridos.items()},
+                    usuario=user,
+                    origen=origen_obj,
+                )
+            except ValidationError as e:
+                raise ValidationError(MENSAJE_STOCK_INSUFICIENTE + "\n".join(e.messages))
             
-            # TODO: IMPLEMENTAR AUDITORÍA DE MOVIMIENTOS DE INVENTARIO
-            # Cuando se implemente el modelo de auditoría, agregar aquí:
-            #
-            # from inventario.models import MovimientoInventario
-            # 
-            # for item in insumos_descontados:
-            #     MovimientoInventario.objects.create(
-            #         insumo_id=item['insumo_id'],
-            #         tipo_movimiento='DESCUENTO_SERVICIO',
-            #         cantidad=item['cantidad_descontada'],
-            #         usuario=user,
-            #         origen_tipo=origen_obj.__class__.__name__,
-            #         origen_id=origen_obj.id,
-            #         observaciones=f"Descuento por servicios ejecutados",
-            #         fecha=timezone.now()
-            #     )
-            #
-            # Estructura recomendada para modelo MovimientoInventario:
-            # - insumo: ForeignKey(Insumo)
-            # - tipo_movimiento: CharField (ENTRADA, SALIDA, DESCUENTO_SERVICIO, AJUSTE, etc.)
-            # - cantidad: IntegerField (positivo o negativo según tipo)
-            # - stock_anterior: IntegerField
-            # - stock_posterior: IntegerField
-            # - usuario: ForeignKey(User)
-            # - origen_tipo: CharField (ContentType o nombre de modelo)
-            # - origen_id: IntegerField (ID del objeto origen)
-            # - fecha: DateTimeField(auto_now_add=True)
-            # - observaciones: TextField
+            # Reporte por insumo armado con el resultado del UPDATE (sin consultas extra)
+            insumos_descontados = [
+                {
+                    'insumo_id': insumo_id,
+                    'medicamento': movimiento['medicamento'],
+                    'cantidad_descontada': movimiento['cantidad'],
+                    'stock_anterior': movimiento['stock_anterior'],
+                    'stock_restante': movimiento['stock_actual']
+                }
+                for insumo_id, movimiento in movimientos.items()
+            ]
             
-            # PASO 4: Marcar el objeto origen como "insumos descontados"
+            # PASO 3: Marcar el objeto origen como "insumos descontados"
             # Esto previene descuentos duplicados en futuras operaciones
             if hasattr(origen_obj, 'insumos_descontados'):
                 origen_obj.insumos_descontados = True
@@ -1,3 +1,39 @@
+from django.core.exceptions import ValidationError
 from django.test import TestCase
 
-# Create your tests here.
+from inventario.models import Insumo
+from servicios.models import Servicio, ServicioInsumo
+
+from .services.inventario_service import discount_stock_for_services, validate_stock_for_services
+
+
+class DescuentoServiciosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.jeringa = Insumo.objects.create(medicamento='Jeringa', stock_actual=10)
+        cls.vacuna = Insumo.objects.create(medicamento='Vacuna', stock_actual=1)
+        cls.consulta = Servicio.objects.create(nombre='Consulta', categoria='consulta')
+        cls.vacunacion = Servicio.objects.create(nombre='Vacunación', categoria='vacuna')
+        ServicioInsumo.objects.create(servicio=cls.consulta, insumo=cls.jeringa, cantidad=1)
+        ServicioInsumo.objects.create(servicio=cls.vacunacion, insumo=cls.jeringa, cantidad=2)
+        ServicioInsumo.objects.create(servicio=cls.vacunacion, insumo=cls.vacuna, cantidad=1)
+
+    def test_valida_todos_los_servicios_en_una_consulta(self):
+        with self.assertNumQueries(1):
+            validate_stock_for_services([self.consulta, self.vacunacion])
+
+        with self.assertRaisesMessage(ValidationError, "Stock insuficiente para 'Vacuna'"):
+            validate_stock_for_services([self.vacunacion, self.vacunacion])
+
+    def test_descuento_agrupa_por_insumo_y_reporta_sin_releer(self):
+        resultado = discount_stock_for_services([self.consulta, self.vacunacion], user=None, origen_obj=None)
+
+        reporte = {item['medicamento']: item for item in resultado['insumos_descontados']}
+        self.assertEqual(reporte['Jeringa']['cantidad_descontada'], 3)
+        self.assertEqual(reporte['Jeringa']['stock_restante'], 7)
+        self.assertEqual(reporte['Vacuna']['stock_restante'], 0)
+
+        with self.assertRaisesMessage(ValidationError, 'No hay stock suficiente'):
+            discount_stock_for_services([self.vacunacion], user=None, origen_obj=None)
+        self.jeringa.refresh_from_db()
+        self.assertEqual(self.jeringa.stock_actual, 7)
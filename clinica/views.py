@@ -3,6 +3,8 @@ from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse, FileResponse, Http404
 from django.views.decorators.http import require_http_methods
 from django.utils import timezone
+from django.db.models import Count
+from collections import Counter
 from datetime import datetime, time
 from django.core.exceptions import ValidationError
 from .models import Consulta, Hospitalizacion, Cirugia, RegistroDiario, Alta, Documento
@@ -11,9 +13,12 @@ from cuentas.models import CustomUser
 from servicios.models import Servicio
 from agenda.models import Cita
 import json
-import sys
+import logging
 import os
 
+
+logger = logging.getLogger(__name__)
+
 # ============================================================
 # FUNCIÓN CENTRALIZADA: DESCUENTO DE INSUMOS
 # ============================================================
@@ -39,19 +44,18 @@ def descontar_insumos_consulta(consulta, user):
         ValidationError: Si el stock es insuficiente
         Exception: Otros errores
     """
-    from .services.inventario_service import validate_stock_for_services, discount_stock_for_services
+    from .services.inventario_service import discount_stock_for_services
     from inventario.models import Insumo
+    from inventario.services import descontar_stock
     
-    print('=' * 60)
-    print('🔵 DESCUENTO DE INSUMOS - INICIO')
-    print('=' * 60)
-    print(f'📋 Consulta ID: {consulta.id}')
-    print(f'🐾 Paciente: {consulta.paciente.nombre}')
-    print(f'📍 Estado actual insumos_descontados: {consulta.insumos_descontados}')
+    logger.debug(
+        'Descuento de insumos: inicio consulta=%s insumos_descontados=%s',
+        consulta.id, consulta.insumos_descontados
+    )
     
     # ⭐ VALIDACIÓN: Evitar doble descuento
     if consulta.insumos_descontados:
-        print('⚠️ Los insumos ya fueron descontados previamente')
+        logger.info('Descuento de insumos omitido: consulta=%s ya descontada', consulta.id)
         return {
             'success': False,
             'error': 'ya_descontado',
@@ -65,86 +69,62 @@ def descontar_insumos_consulta(consulta, user):
     # ============================================================
     servicios = consulta.servicios.all()
     if servicios.exists():
-        print(f'\n📦 PROCESANDO SERVICIOS ({servicios.count()})')
-        print('-' * 60)
-        
         try:
-            # Validar stock disponible
-            print('🔍 Validando disponibilidad de stock...')
-            validate_stock_for_services(servicios)
-            print('✅ Stock suficiente para todos los servicios')
-            
-            # Descontar inventario
-            print('📉 Descontando insumos de servicios...')
+            # Valida y descuenta en un solo UPDATE (falla sin descontar si no alcanza)
             resultado = discount_stock_for_services(
                 services=servicios,
                 user=user,
                 origen_obj=consulta
             )
             
-            print(f'✅ {resultado["total_items"]} insumos descontados desde servicios')
-            for item in resultado['insumos_descontados']:
-                print(f'  - {item["medicamento"]}: {item["cantidad_descontada"]} unidades')
-                insumos_procesados.append(item)
+            logger.debug(
+                'Descuento de insumos: consulta=%s servicios total_items=%s',
+                consulta.id, resultado['total_items']
+            )
+            insumos_procesados.extend(resultado['insumos_descontados'])
                 
         except ValidationError as ve:
-            print(f'❌ ERROR: Stock insuficiente')
-            print(f'   Detalle: {str(ve)}')
+            logger.warning('Stock insuficiente al descontar consulta=%s: %s', consulta.id, ve)
             raise ve  # Re-lanzar para manejo en vista
-    else:
-        print('\nℹ️ No hay servicios asociados a esta consulta')
     
     # ============================================================
     # PASO 2: DESCONTAR INSUMOS MANUALES (MedicamentoUtilizado)
     # ============================================================
-    medicamentos = consulta.medicamentos_detalle.filter(inventario_id__isnull=False)
-    if medicamentos.exists():
-        print(f'\n💊 PROCESANDO MEDICAMENTOS MANUALES ({medicamentos.count()})')
-        print('-' * 60)
-        
-        for med in medicamentos:
-            try:
-                insumo = Insumo.objects.get(idInventario=med.inventario_id)
-                
-                # Validar stock
-                if insumo.stock_actual <= 0:
-                    raise ValidationError(
-                        f"Stock insuficiente para {insumo.medicamento}. "
-                        f"Stock actual: {insumo.stock_actual}"
-                    )
-                
-                # Descontar 1 unidad
-                insumo.stock_actual -= 1
-                insumo.save(update_fields=['stock_actual'])
-                
-                print(f'✅ {insumo.medicamento}: descontada 1 unidad (stock: {insumo.stock_actual + 1} → {insumo.stock_actual})')
-                
-                insumos_procesados.append({
-                    'medicamento': insumo.medicamento,
-                    'cantidad_descontada': 1,
-                    'stock_anterior': insumo.stock_actual + 1,
-                    'stock_actual': insumo.stock_actual
-                })
-                
-            except Insumo.DoesNotExist:
-                print(f'⚠️ Insumo con ID {med.inventario_id} no encontrado en inventario')
-            except Exception as e:
-                print(f'❌ Error al descontar {med.nombre}: {str(e)}')
-                raise e
-    else:
-        print('\nℹ️ No hay medicamentos manuales con inventario_id')
+    # Una unidad por medicamento, descontadas juntas con un solo UPDATE condicional
+    unidades = Counter(
+        consulta.medicamentos_detalle.filter(inventario_id__isnull=False).values_list('inventario_id', flat=True)
+    )
+    if unidades:
+        existentes = set(Insumo.objects.filter(idInventario__in=unidades).values_list('idInventario', flat=True))
+        for inventario_id in unidades.keys() - existentes:
+            logger.warning('Insumo %s no encontrado en inventario (consulta=%s)', inventario_id, consulta.id)
+        try:
+            movimientos = descontar_stock(
+                {inventario_id: unidades[inventario_id] for inventario_id in existentes},
+                usuario=user,
+                origen=consulta,
+            )
+        except ValidationError as ve:
+            logger.warning('Stock insuficiente al descontar medicamentos consulta=%s: %s', consulta.id, ve)
+            raise
+        for insumo_id, movimiento in movimientos.items():
+            logger.debug(
+                'Descuento manual: insumo=%s stock %s -> %s',
+                insumo_id, movimiento['stock_anterior'], movimiento['stock_actual']
+            )
+            insumos_procesados.append({
+                'medicamento': movimiento['medicamento'],
+                'cantidad_descontada': movimiento['cantidad'],
+                'stock_anterior': movimiento['stock_anterior'],
+                'stock_actual': movimiento['stock_actual']
+            })
     
     # ============================================================
     # PASO 3: MARCAR CONSULTA COMO PROCESADA
     # ============================================================
     consulta.insumos_descontados = True
     consulta.save(update_fields=['insumos_descontados'])
-    print(f'\n✅ Flag insumos_descontados actualizado a True')
-    
-    print('=' * 60)
-    print('✅ DESCUENTO DE INSUMOS - COMPLETADO')
-    print(f'📊 Total de insumos procesados: {len(insumos_procesados)}')
-    print('=' * 60)
+    logger.info('Descuento de insumos completado: consulta=%s insumos=%s', consulta.id, len(insumos_procesados))
     
     return {
         'success': True,
@@ -209,9 +189,6 @@ def vet_disponibilidad_view(request):
 @login_required
 def ficha_paciente(request, paciente_id):
     """Vista de la ficha del paciente"""
-    import sys
-    print(f"\n{'#'*80}\n>>> INICIO FICHA_PACIENTE - ID: {paciente_id}\n{'#'*80}", file=sys.stderr)
-    
     paciente = get_object_or_404(Paciente, id=paciente_id)
     
     # Obtener consultas del paciente ordenadas por fecha
@@ -229,44 +206,15 @@ def ficha_paciente(request, paciente_id):
     # Citas agendadas próximas y del día
     hoy = timezone.localdate()
     
-    # DEBUG: Probar sin filtro primero
-    todas_citas = Cita.objects.filter(paciente=paciente).select_related('veterinario', 'servicio')
-    print(f"\n{'='*80}", file=sys.stderr)
-    print(f"🔍 DEBUG QUERY", file=sys.stderr)
-    print(f"📅 timezone.localdate(): {hoy} (tipo: {type(hoy)})", file=sys.stderr)
-    print(f"👤 Paciente: {paciente.nombre} (ID: {paciente.id})", file=sys.stderr)
-    print(f"📊 TODAS las citas del paciente: {todas_citas.count()}", file=sys.stderr)
-    for c in todas_citas:
-        print(f"   - Cita {c.id}: fecha={c.fecha} (tipo:{type(c.fecha)}) >= {hoy}? {c.fecha >= hoy}", file=sys.stderr)
-    
     citas_agendadas = (
         Cita.objects.filter(paciente=paciente, fecha__gte=hoy)
         .exclude(estado__in=['completada', 'realizada'])
         .select_related('veterinario', 'servicio')
         .order_by('-fecha', '-hora_inicio')  # Orden descendente para mostrar más recientes primero
     )
-    print(f"\n📊 Citas filtradas (fecha__gte={hoy}): {citas_agendadas.count()}", file=sys.stderr)
-    
-    if citas_agendadas.exists():
-        print(f"\n🔍 CITAS ENCONTRADAS:", file=sys.stderr)
-        for idx, cita in enumerate(citas_agendadas, 1):
-            print(f"\n  📌 CITA #{idx}:", file=sys.stderr)
-            print(f"     ID: {cita.id}", file=sys.stderr)
-            print(f"     Fecha: {cita.fecha}", file=sys.stderr)
-            print(f"     Hora: {cita.hora_inicio} - {cita.hora_fin}", file=sys.stderr)
-            print(f"     Veterinario: {cita.veterinario.nombre} {cita.veterinario.apellido}", file=sys.stderr)
-            print(f"     Servicio: {cita.servicio.nombre if cita.servicio else 'Sin servicio'}", file=sys.stderr)
-            print(f"     Estado: {cita.estado}", file=sys.stderr)
-    else:
-        print(f"\n⚠️  NO HAY CITAS para este paciente desde hoy", file=sys.stderr)
-    
-    print(f"{'='*80}\n", file=sys.stderr)
 
     # FORZAR ORDEN DESCENDENTE SIEMPRE (más recientes primero)
     orden_timeline = 'desc'
-    
-    print(f"\n🔍 DEBUG ORDEN: FORZADO A DESC - orden_timeline = '{orden_timeline}'", file=sys.stderr)
-    print(f"🔍 DEBUG ORDEN: reverse={orden_timeline == 'desc'}\n", file=sys.stderr)
 
     timeline_items = []
     for cita in citas_agendadas:
@@ -289,14 +237,10 @@ def ficha_paciente(request, paciente_id):
 
     # ORDENAR DESCENDENTE (más recientes primero) con reverse=True  
     timeline_items = sorted(timeline_items, key=lambda x: x['sort_key'], reverse=True)
-    
-    print(f"\n✅ ORDEN FINAL ficha_paciente (después de sorted reverse=True):", file=sys.stderr)
-    for i, it in enumerate(timeline_items):
-        obj = it['obj']
-        if it['tipo'] == 'cita':
-            print(f"   [{i+1}] CITA: {obj.fecha} {obj.hora_inicio}", file=sys.stderr)
-        else:
-            print(f"   [{i+1}] CONSULTA: {obj.fecha}", file=sys.stderr)
+    logger.debug(
+        'ficha_paciente paciente=%s citas_agendadas=%s timeline=%s',
+        paciente.id, len(citas_agendadas), len(timeline_items)
+    )
 
     context = {
         'paciente': paciente,
@@ -364,20 +308,13 @@ def actualizar_antecedentes(request, paciente_id):
 @require_http_methods(["POST"])
 def crear_consulta(request, paciente_id):
     try:
-        print('=' * 50)
-        print('🔵 INICIANDO CREACIÓN DE CONSULTA')
-        print('=' * 50)
-        
         paciente = get_object_or_404(Paciente, id=paciente_id)
-        print(f'✅ Paciente encontrado: {paciente.nombre} (ID: {paciente.id})')
         
         # Parsear el body
         try:
             data = json.loads(request.body)
-            print(f'✅ JSON parseado correctamente')
-            print(f'📥 Datos recibidos: {json.dumps(data, indent=2, ensure_ascii=False)}')
         except json.JSONDecodeError as e:
-            print(f'❌ Error al parsear JSON: {str(e)}')
+            logger.warning('crear_consulta paciente=%s: JSON inválido: %s', paciente_id, e)
             return JsonResponse({
                 'success': False,
                 'error': f'JSON inválido: {str(e)}'
@@ -391,8 +328,6 @@ def crear_consulta(request, paciente_id):
         fr = data.get('frecuencia_respiratoria')
         finalizar = data.get('finalizar', False)  # ⭐ Nuevo parámetro
         
-        print(f'🔄 Modo: {"FINALIZACIÓN (descontar insumos)" if finalizar else "BORRADOR (sin descuento)"}')
-        
         # Determinar tipo de consulta basado en servicios seleccionados
         tipo_consulta = 'otros'  # Por defecto para múltiples servicios
         if servicios_ids:
@@ -418,15 +353,12 @@ def crear_consulta(request, paciente_id):
                 # Múltiples servicios = otros
                 tipo_consulta = 'otros'
         
-        print(f'📋 Servicios IDs: {servicios_ids}')
-        print(f'📋 Tipo de consulta derivado: {tipo_consulta}')
-        print(f'🌡️  Temperatura: {temperatura}')
-        print(f'⚖️  Peso: {peso}')
-        print(f'❤️  FC: {fc}')
-        print(f'🫁 FR: {fr}')
+        logger.debug(
+            'crear_consulta paciente=%s finalizar=%s tipo=%s servicios=%r',
+            paciente.id, finalizar, tipo_consulta, servicios_ids
+        )
         
         # Crear la consulta
-        print('📝 Creando consulta...')
         consulta = Consulta.objects.create(
             paciente=paciente,
             veterinario=request.user,
@@ -440,8 +372,6 @@ def crear_consulta(request, paciente_id):
             tratamiento=data.get('tratamiento', ''),
             notas=data.get('notas', '')
         )
-        print(f'✅ Consulta creada con ID: {consulta.id}')
-        print(f'✅ Tipo guardado: {consulta.tipo_consulta}')
         
         # ⭐ AGREGAR SERVICIOS A LA CONSULTA
         if servicios_ids:
@@ -450,9 +380,8 @@ def crear_consulta(request, paciente_id):
                 try:
                     servicio = Servicio.objects.get(idServicio=servicio_id.strip())
                     consulta.servicios.add(servicio)
-                    print(f'✅ Servicio agregado: {servicio.nombre}')
                 except Servicio.DoesNotExist:
-                    print(f'⚠️  Servicio no encontrado: {servicio_id}')
+                    logger.warning('Servicio %s no encontrado (consulta=%s)', servicio_id, consulta.id)
         
         # ⭐ ACTUALIZAR EL PESO DEL PACIENTE SI SE PROPORCIONÓ
         if peso:
@@ -460,14 +389,12 @@ def crear_consulta(request, paciente_id):
                 peso_float = float(peso)
                 paciente.ultimo_peso = peso_float
                 paciente.save()
-                print(f'✅ Peso del paciente actualizado: {peso_float} kg')
             except (ValueError, TypeError) as e:
-                print(f'⚠️  Error al actualizar peso: {str(e)}')
+                logger.warning('Peso inválido %r para paciente=%s: %s', peso, paciente.id, e)
         
         # Procesar medicamentos - CREAR MedicamentoUtilizado
         from .models import MedicamentoUtilizado
         medicamentos = data.get('medicamentos', [])
-        print(f'💊 Medicamentos recibidos: {len(medicamentos)}')
         
         for med in medicamentos:
             try:
@@ -478,9 +405,8 @@ def crear_consulta(request, paciente_id):
                     dosis=med.get('dosis', ''),
                     peso_paciente=peso if peso else None
                 )
-                print(f'  ✅ Medicamento guardado: {med["nombre"]} - Dosis: {med.get("dosis", "Sin dosis")}')
             except Exception as e:
-                print(f'  ❌ Error al guardar medicamento {med.get("nombre")}: {str(e)}')
+                logger.error('Error al guardar medicamento %s (consulta=%s): %s', med.get('nombre'), consulta.id, e)
 
         # ⭐ DESCUENTO DE INVENTARIO POR SERVICIOS (solo si finalizar=True)
         # Descontar insumos del inventario según los servicios ejecutados
@@ -489,16 +415,13 @@ def crear_consulta(request, paciente_id):
                 from .services.inventario_service import validate_stock_for_services, discount_stock_for_services
                 
                 # ⭐ PASO 1: VALIDAR STOCK ANTES DE DESCONTAR
-                print(f'🔍 Validando disponibilidad de stock...')
                 servicios = consulta.servicios.all()
                 
                 try:
                     validate_stock_for_services(servicios)
-                    print(f'  ✅ Stock suficiente para todos los insumos')
                 except ValidationError as stock_error:
                     # Stock insuficiente detectado ANTES de descontar
-                    print(f'  ⚠️ Stock insuficiente detectado:')
-                    print(f'     {str(stock_error)}')
+                    logger.warning('Stock insuficiente al finalizar consulta=%s: %s', consulta.id, stock_error)
                     
                     consulta.delete()  # Revertir creación de consulta
                     
@@ -521,22 +444,19 @@ def crear_consulta(request, paciente_id):
                     }, status=400)
                 
                 # ⭐ PASO 2: DESCONTAR INVENTARIO (solo si validación pasó)
-                print(f'📦 Iniciando descuento de inventario para servicios...')
-                
                 resultado = discount_stock_for_services(
                     services=servicios,
                     user=request.user,
                     origen_obj=consulta
                 )
-                
-                print(f'  ✅ Inventario descontado exitosamente')
-                print(f'  📊 Items descontados: {resultado["total_items"]}')
-                for item in resultado['insumos_descontados']:
-                    print(f'    - {item["medicamento"]}: {item["cantidad_descontada"]} unidades (quedan {item["stock_restante"]})')
+                logger.info(
+                    'Inventario descontado: consulta=%s total_items=%s',
+                    consulta.id, resultado['total_items']
+                )
                 
             except ValidationError as ve:
                 # Si hay error de validación (backup por si acaso)
-                print(f'  ⚠️ Error de validación en inventario: {str(ve)}')
+                logger.warning('Error de validación en inventario (consulta=%s): %s', consulta.id, ve)
                 consulta.delete()  # Revertir creación de consulta
                 return JsonResponse({
                     'success': False,
@@ -546,16 +466,12 @@ def crear_consulta(request, paciente_id):
                 }, status=400)
             except Exception as e:
                 # Cualquier otro error en el descuento
-                print(f'  ❌ Error inesperado al descontar inventario: {str(e)}')
+                logger.exception('Error inesperado al descontar inventario (consulta=%s)', consulta.id)
                 consulta.delete()  # Revertir creación de consulta
                 return JsonResponse({
                     'success': False,
                     'error': f'Error al procesar inventario: {str(e)}'
                 }, status=500)
-        elif not finalizar and consulta.servicios.exists():
-            print(f'  ℹ️ MODO BORRADOR: Servicios asociados pero NO se descuenta inventario')
-        else:
-            print(f'  ℹ️ No hay servicios asociados')
         
         # Si la consulta proviene de una cita, marcarla como completada (solo si finalizar=True)
         cita_id = data.get('cita_id')
@@ -564,22 +480,13 @@ def crear_consulta(request, paciente_id):
                 cita_relacionada = Cita.objects.get(id=cita_id, paciente=paciente)
                 cita_relacionada.estado = 'completada'
                 cita_relacionada.save(update_fields=['estado', 'fecha_modificacion'])
-                print(f'  ✅ Cita {cita_id} marcada como completada')
             except Cita.DoesNotExist:
-                print(f'  ⚠️ Cita {cita_id} no encontrada para este paciente; no se actualiza estado')
-        elif cita_id and not finalizar:
-            print(f'  ℹ️ MODO BORRADOR: Cita {cita_id} NO se marca como completada')
-        
-        print('=' * 50)
-        print(f'✅ CONSULTA CREADA EXITOSAMENTE')
-        print(f'   ID: {consulta.id}')
-        print(f'   Modo: {"FINALIZADA" if finalizar else "BORRADOR"}')
-        print(f'   Tipo: {consulta.tipo_consulta}')
-        print(f'   Paciente: {paciente.nombre}')
-        print(f'   Veterinario: {request.user.nombre} {request.user.apellido}')
-        print(f'   Medicamentos guardados: {consulta.medicamentos_detalle.count()}')
-        print(f'   Insumos descontados: {consulta.insumos_descontados}')
-        print('=' * 50)
+                logger.warning('Cita %s no encontrada para paciente=%s; no se actualiza estado', cita_id, paciente.id)
+        
+        logger.info(
+            'Consulta creada: consulta=%s paciente=%s finalizada=%s insumos_descontados=%s',
+            consulta.id, paciente.id, finalizar, consulta.insumos_descontados
+        )
         
         mensaje = 'Consulta finalizada exitosamente' if finalizar else 'Borrador de consulta guardado'
         
@@ -592,15 +499,7 @@ def crear_consulta(request, paciente_id):
         })
         
     except Exception as e:
-        print('=' * 50)
-        print('❌ ERROR AL CREAR CONSULTA')
-        print('=' * 50)
-        print(f'Tipo de error: {type(e).__name__}')
-        print(f'Mensaje: {str(e)}')
-        import traceback
-        print('Traceback completo:')
-        traceback.print_exc()
-        print('=' * 50)
+        logger.exception('Error al crear consulta (paciente=%s)', paciente_id)
         
         return JsonResponse({
             'success': False,
@@ -614,19 +513,12 @@ def actualizar_consulta(request, consulta_id):
     Actualiza una consulta existente (solo si es un borrador sin finalizar).
     """
     try:
-        print('=' * 50)
-        print('🔄 ACTUALIZANDO CONSULTA')
-        print('=' * 50)
-        
         # Obtener la consulta
         consulta = get_object_or_404(Consulta, id=consulta_id)
-        print(f'✅ Consulta encontrada: ID {consulta.id}')
-        print(f'   Paciente: {consulta.paciente.nombre}')
-        print(f'   Estado actual insumos_descontados: {consulta.insumos_descontados}')
         
         # ⭐ VALIDACIÓN CRÍTICA: No permitir edición de consultas finalizadas
         if consulta.insumos_descontados:
-            print('🔒 Consulta ya finalizada - No se puede editar')
+            logger.info('actualizar_consulta rechazada: consulta=%s ya finalizada', consulta.id)
             return JsonResponse({
                 'success': False,
                 'error': 'consulta_finalizada',
@@ -636,10 +528,8 @@ def actualizar_consulta(request, consulta_id):
         # Parsear el body
         try:
             data = json.loads(request.body)
-            print(f'✅ JSON parseado correctamente')
-            print(f'📥 Datos recibidos: {json.dumps(data, indent=2, ensure_ascii=False)}')
         except json.JSONDecodeError as e:
-            print(f'❌ Error al parsear JSON: {str(e)}')
+            logger.warning('actualizar_consulta consulta=%s: JSON inválido: %s', consulta.id, e)
             return JsonResponse({
                 'success': False,
                 'error': f'JSON inválido: {str(e)}'
@@ -647,7 +537,7 @@ def actualizar_consulta(request, consulta_id):
         
         # Extraer parámetros
         finalizar = data.get('finalizar', False)
-        print(f'🔄 Modo actualización: {"FINALIZACIÓN (descontar insumos)" if finalizar else "BORRADOR (sin descuento)"}')
+        logger.debug('actualizar_consulta consulta=%s finalizar=%s', consulta.id, finalizar)
         
         # Actualizar campos básicos
         consulta.temperatura = data.get('temperatura') if data.get('temperatura') else None
@@ -659,8 +549,6 @@ def actualizar_consulta(request, consulta_id):
         consulta.tratamiento = data.get('tratamiento', '')
         consulta.notas = data.get('notas', '')
         
-        print('✅ Campos básicos actualizados')
-        
         # Actualizar peso del paciente si se proporcionó
         peso = data.get('peso')
         if peso:
@@ -668,16 +556,14 @@ def actualizar_consulta(request, consulta_id):
                 peso_float = float(peso)
                 consulta.paciente.ultimo_peso = peso_float
                 consulta.paciente.save()
-                print(f'✅ Peso del paciente actualizado: {peso_float} kg')
             except (ValueError, TypeError) as e:
-                print(f'⚠️  Error al actualizar peso: {str(e)}')
+                logger.warning('Peso inválido %r para paciente=%s: %s', peso, consulta.paciente_id, e)
         
         # Actualizar servicios
         servicios_ids = data.get('servicios_ids', '')
         if servicios_ids:
             # Limpiar servicios existentes
             consulta.servicios.clear()
-            print('🗑️ Servicios anteriores eliminados')
             
             # Agregar nuevos servicios
             ids_list = servicios_ids.split(',')
@@ -685,17 +571,14 @@ def actualizar_consulta(request, consulta_id):
                 try:
                     servicio = Servicio.objects.get(idServicio=servicio_id.strip())
                     consulta.servicios.add(servicio)
-                    print(f'✅ Servicio agregado: {servicio.nombre}')
                 except Servicio.DoesNotExist:
-                    print(f'⚠️  Servicio no encontrado: {servicio_id}')
+                    logger.warning('Servicio %s no encontrado (consulta=%s)', servicio_id, consulta.id)
         
         # Actualizar medicamentos - Eliminar anteriores y crear nuevos
         from .models import MedicamentoUtilizado
         consulta.medicamentos_detalle.all().delete()
-        print('🗑️ Medicamentos anteriores eliminados')
         
         medicamentos = data.get('medicamentos', [])
-        print(f'💊 Medicamentos a guardar: {len(medicamentos)}')
         
         for med in medicamentos:
             try:
@@ -706,17 +589,14 @@ def actualizar_consulta(request, consulta_id):
                     dosis=med.get('dosis', ''),
                     peso_paciente=peso if peso else None
                 )
-                print(f'  ✅ Medicamento guardado: {med["nombre"]} - Dosis: {med.get("dosis", "Sin dosis")}')
             except Exception as e:
-                print(f'  ❌ Error al guardar medicamento {med.get("nombre")}: {str(e)}')
+                logger.error('Error al guardar medicamento %s (consulta=%s): %s', med.get('nombre'), consulta.id, e)
         
         # ⭐ GUARDAR CAMBIOS BÁSICOS ANTES DEL DESCUENTO
         consulta.save()
-        print('✅ Campos básicos guardados en BD')
         
         # ⭐ SI SE FINALIZA, DESCONTAR INSUMOS usando función centralizada
         if finalizar:
-            print('🔄 Finalizando consulta - Llamando a descontar_insumos_consulta()')
             resultado = descontar_insumos_consulta(consulta, request.user)
             
             if not resultado['success']:
@@ -742,18 +622,11 @@ def actualizar_consulta(request, consulta_id):
                     'error': error_code,
                     'message': mensaje
                 }, status=400)
-            
-            print('✅ Insumos descontados correctamente')
-        
-        # Verificar estado final
-        print(f'📊 Estado final - insumos_descontados: {consulta.insumos_descontados}')
         
-        print('=' * 50)
-        print(f'✅ CONSULTA ACTUALIZADA EXITOSAMENTE')
-        print(f'   ID: {consulta.id}')
-        print(f'   Modo: {"FINALIZADA" if finalizar else "BORRADOR"}')
-        print(f'   Insumos descontados: {consulta.insumos_descontados}')
-        print('=' * 50)
+        logger.info(
+            'Consulta actualizada: consulta=%s finalizada=%s insumos_descontados=%s',
+            consulta.id, finalizar, consulta.insumos_descontados
+        )
         
         mensaje = 'Consulta actualizada y finalizada exitosamente' if finalizar else 'Borrador de consulta actualizado'
         
@@ -766,15 +639,7 @@ def actualizar_consulta(request, consulta_id):
         })
         
     except Exception as e:
-        print('=' * 50)
-        print('❌ ERROR AL ACTUALIZAR CONSULTA')
-        print('=' * 50)
-        print(f'Tipo de error: {type(e).__name__}')
-        print(f'Mensaje: {str(e)}')
-        import traceback
-        print('Traceback completo:')
-        traceback.print_exc()
-        print('=' * 50)
+        logger.exception('Error al actualizar consulta %s', consulta_id)
         
         return JsonResponse({
             'success': False,
@@ -837,7 +702,7 @@ def detalle_consulta(request, paciente_id, consulta_id):
     except Consulta.DoesNotExist:
         return JsonResponse({'success': False, 'message': 'Consulta no encontrada'}, status=404)
     except Exception as e:
-        print(f"Error en detalle_consulta: {str(e)}")
+        logger.exception('Error en detalle_consulta %s', consulta_id)
         return JsonResponse({'success': False, 'message': str(e)}, status=500)
 
 @login_required
@@ -880,14 +745,7 @@ def confirmar_consulta(request, consulta_id):
             'message': 'Consulta no encontrada'
         }, status=404)
     except Exception as e:
-        print('=' * 50)
-        print('❌ ERROR AL CONFIRMAR CONSULTA')
-        print('=' * 50)
-        print(f'Tipo: {type(e).__name__}')
-        print(f'Mensaje: {str(e)}')
-        import traceback
-        traceback.print_exc()
-        print('=' * 50)
+        logger.exception('Error al confirmar consulta %s', consulta_id)
         
         return JsonResponse({
             'success': False,
@@ -963,54 +821,28 @@ def guardar_consulta(request, paciente_id):
             }, status=400)
     
     return JsonResponse({'success': False, 'message': 'Método no permitido'}, status=405)
-import sys
 
 @login_required
 def ficha_mascota(request, pk):
-    FORCE_RELOAD_12345 = True  # Force Python bytecode reload
-    print("\n" + "#"*80)
-    print(f"### FICHA_MASCOTA VIEW EJECUTANDOSE - PK: {pk}")
-    print("#"*80 + "\n", flush=True)
-    
     paciente = get_object_or_404(Paciente, pk=pk)
     consultas = Consulta.objects.filter(paciente=paciente).select_related('veterinario').order_by('-fecha')
     
-    sys.stderr.write(f"📦 Paciente: {paciente.nombre}\n")
-    sys.stderr.write(f"📋 Consultas encontradas: {consultas.count()}\n")
-    
-    # ⭐ DEBUG COMPLETO DE VETERINARIOS
-    todos_usuarios = CustomUser.objects.all()
-    sys.stderr.write(f"\n👥 TOTAL DE USUARIOS EN LA BD: {todos_usuarios.count()}\n")
-    for user in todos_usuarios:
-        sys.stderr.write(f"  - {user.nombre} {user.apellido} | rol='{user.rol}' | is_staff={user.is_staff}\n")
-    
     # ⭐ BUSCAR VETERINARIOS (ESTRATEGIA DE FALLBACK ROBUSTA)
-    sys.stderr.write(f"\n🔍 BUSCANDO veterinarios...\n")
-    
     # Opción 1: Usuarios con rol='veterinario'
     veterinarios = CustomUser.objects.filter(rol='veterinario').order_by('nombre', 'apellido')
-    sys.stderr.write(f"  Opción 1 (rol='veterinario'): {veterinarios.count()}\n")
     
     # Opción 2: Si no hay con ese rol, excluir administración y recepción
-    if veterinarios.count() == 0:
+    if not veterinarios.exists():
         veterinarios = CustomUser.objects.exclude(
             rol__in=['administracion', 'recepcion']
         ).order_by('nombre', 'apellido')
-        sys.stderr.write(f"  Opción 2 (exclusión admin/recepción): {veterinarios.count()}\n")
     
     # Opción 3: Si aún no hay, usar todos los usuarios
-    if veterinarios.count() == 0:
+    if not veterinarios.exists():
         veterinarios = CustomUser.objects.all().order_by('nombre', 'apellido')
-        sys.stderr.write(f"  Opción 3 (todos los usuarios): {veterinarios.count()}\n")
-    
-    sys.stderr.write(f"👨‍⚕️ Veterinarios totales a mostrar: {veterinarios.count()}\n")
-    for vet in veterinarios:
-        sys.stderr.write(f"  ✅ {vet.id} - {vet.nombre} {vet.apellido} (rol='{vet.rol}')\n")
     
     # ⭐ GENERAR NOMBRE COMPLETO DEL VETERINARIO LOGUEADO
     nombre_veterinario = f"{request.user.nombre} {request.user.apellido}".strip()
-    sys.stderr.write(f"\n👤 Veterinario logueado: {nombre_veterinario} (rol='{request.user.rol}')\n")
-    sys.stderr.write(f"📝 Total de veterinarios a mostrar: {veterinarios.count()}\n")
     
     # ⭐ AGREGAR CITAS AGENDADAS
     hoy = timezone.localdate()
@@ -1025,17 +857,8 @@ def ficha_mascota(request, pk):
     if request.user.rol == 'veterinario' and not request.user.is_superuser and not request.user.is_staff:
         citas_agendadas = citas_agendadas.filter(veterinario=request.user)
     
-    print(f"\n### CITAS AGENDADAS - Fecha hoy: {hoy}")
-    print(f"### Total citas encontradas: {citas_agendadas.count()}")
-    for cita in citas_agendadas:
-        print(f"###   Cita ID {cita.id}: {cita.fecha} {cita.hora_inicio} - Vet: {cita.veterinario.nombre}")
-    print("###" + "="*77 + "\n", flush=True)
-    
     # FORZAR ORDEN DESCENDENTE SIEMPRE (más recientes primero)
     orden_timeline = 'desc'
-    
-    print(f"\n🔍 DEBUG ORDEN: FORZADO A DESC - orden_timeline = '{orden_timeline}'", file=sys.stderr)
-    print(f"🔍 DEBUG ORDEN: reverse={orden_timeline == 'desc'}\n", file=sys.stderr)
 
     timeline_items = []
     for cita in citas_agendadas:
@@ -1058,14 +881,10 @@ def ficha_mascota(request, pk):
 
     # ORDENAR DESCENDENTE (más recientes primero) con reverse=True
     timeline_items = sorted(timeline_items, key=lambda x: x['sort_key'], reverse=True)
-    
-    print(f"\n✅ ORDEN FINAL ficha_mascota (después de sorted reverse=True):", file=sys.stderr)
-    for i, it in enumerate(timeline_items):
-        obj = it['obj']
-        if it['tipo'] == 'cita':
-            print(f"   [{i+1}] CITA: {obj.fecha} {obj.hora_inicio}", file=sys.stderr)
-        else:
-            print(f"   [{i+1}] CONSULTA: {obj.fecha}", file=sys.stderr)
+    logger.debug(
+        'ficha_mascota paciente=%s citas_agendadas=%s timeline=%s',
+        paciente.id, len(citas_agendadas), len(timeline_items)
+    )
 
     context = {
         'paciente': paciente,
@@ -1124,11 +943,7 @@ def obtener_servicios(request):
             'servicios': servicios
         })
     except Exception as e:
-        print('❌ Error en obtener_servicios:')
-        print(f'   Tipo: {type(e).__name__}')
-        print(f'   Mensaje: {str(e)}')
-        import traceback
-        traceback.print_exc()
+        logger.exception('Error en obtener_servicios')
         return JsonResponse({
             'success': False,
             'error': str(e)
@@ -1368,68 +1183,46 @@ def crear_alta_medica(request, hospitalizacion_id):
         hospitalizacion = get_object_or_404(Hospitalizacion, id=hospitalizacion_id)
         data = json.loads(request.body)
         
-        print('=' * 80)
-        print(f'🏥 INICIANDO PROCESO DE ALTA MÉDICA')
-        print(f'   Hospitalización ID: {hospitalizacion_id}')
-        print(f'   Paciente: {hospitalizacion.paciente.nombre}')
-        print(f'   Estado actual: {hospitalizacion.estado}')
-        print('=' * 80)
-        
         # ⭐ PASO 1: RECOPILAR SERVICIOS DE CIRUGÍAS
         # Obtener todos los servicios asociados a las cirugías de esta hospitalización
-        servicios_cirugias = []
-        cirugias = hospitalizacion.cirugias.all()
-        
-        print(f'\n📋 Cirugías registradas: {cirugias.count()}')
-        for cirugia in cirugias:
-            if cirugia.servicio:
-                servicios_cirugias.append(cirugia.servicio)
-                print(f'  ✅ Cirugía: {cirugia.tipo_cirugia} - Servicio: {cirugia.servicio.nombre}')
-            else:
-                print(f'  ⚠️  Cirugía: {cirugia.tipo_cirugia} - Sin servicio asociado')
-        
-        print(f'\n📦 Total de servicios a descontar: {len(servicios_cirugias)}')
+        servicios_cirugias = [
+            cirugia.servicio
+            for cirugia in hospitalizacion.cirugias.select_related('servicio')
+            if cirugia.servicio
+        ]
         
         # ⭐ PASO 2: DESCONTAR INVENTARIO POR SERVICIOS (si hay servicios)
         if servicios_cirugias:
             try:
                 from .services.inventario_service import discount_stock_for_services
                 
-                print(f'\n💰 Iniciando descuento de inventario...')
-                
                 # Llamar al servicio de descuento
                 resultado = discount_stock_for_services(
                     services=servicios_cirugias,
                     user=request.user,
                     origen_obj=hospitalizacion
                 )
-                
-                print(f'  ✅ Inventario descontado exitosamente')
-                print(f'  📊 Items descontados: {resultado["total_items"]}')
-                for item in resultado['insumos_descontados']:
-                    print(f'    - {item["medicamento"]}: {item["cantidad_descontada"]} unidades (quedan {item["stock_restante"]})')
+                logger.info(
+                    'Inventario descontado: hospitalizacion=%s total_items=%s',
+                    hospitalizacion.id, resultado['total_items']
+                )
                 
             except ValidationError as ve:
                 # Error de validación (stock insuficiente o ya descontado)
-                print(f'\n❌ Error de validación en inventario: {str(ve)}')
+                logger.warning('Error de inventario en alta de hospitalizacion=%s: %s', hospitalizacion.id, ve)
                 return JsonResponse({
                     'success': False,
                     'error': f'Error de inventario: {str(ve)}'
                 }, status=400)
             except Exception as e:
                 # Cualquier otro error en el descuento
-                print(f'\n❌ Error inesperado al descontar inventario: {str(e)}')
-                import traceback
-                traceback.print_exc()
+                logger.exception('Error inesperado al descontar inventario (hospitalizacion=%s)', hospitalizacion.id)
                 return JsonResponse({
                     'success': False,
                     'error': f'Error al procesar inventario: {str(e)}'
                 }, status=500)
-        else:
-            print(f'\n  ℹ️  No hay servicios de cirugías para descontar inventario')
         
         # ⭐ PASO 3: CREAR ALTA MÉDICA (solo si inventario fue exitoso o no aplica)
-        print(f'\n📄 Creando registro de alta médica...')
         alta = Alta.objects.create(
             hospitalizacion=hospitalizacion,
             fecha_alta=timezone.now(),
@@ -1438,21 +1231,16 @@ def crear_alta_medica(request, hospitalizacion_id):
             recomendaciones=data.get('recomendaciones', ''),
             proxima_revision=data.get('proxima_revision') or None
         )
-        print(f'  ✅ Alta médica creada con ID: {alta.id}')
         
         # ⭐ PASO 4: ACTUALIZAR ESTADO DE HOSPITALIZACIÓN
-        print(f'\n🏥 Actualizando estado de hospitalización...')
         hospitalizacion.estado = 'alta'
         hospitalizacion.fecha_alta = timezone.now()
         hospitalizacion.save()
-        print(f'  ✅ Estado actualizado a "alta"')
         
-        print('=' * 80)
-        print(f'✅ ALTA MÉDICA COMPLETADA EXITOSAMENTE')
-        print(f'   Alta ID: {alta.id}')
-        print(f'   Servicios procesados: {len(servicios_cirugias)}')
-        print(f'   Inventario descontado: {"Sí" if servicios_cirugias else "No aplica"}')
-        print('=' * 80)
+        logger.info(
+            'Alta médica creada: alta=%s hospitalizacion=%s servicios=%s',
+            alta.id, hospitalizacion.id, len(servicios_cirugias)
+        )
         
         return JsonResponse({
             'success': True,
@@ -1461,15 +1249,7 @@ def crear_alta_medica(request, hospitalizacion_id):
             'servicios_procesados': len(servicios_cirugias)
         })
     except Exception as e:
-        print('=' * 80)
-        print('❌ ERROR AL CREAR ALTA MÉDICA')
-        print('=' * 80)
-        print(f'Tipo de error: {type(e).__name__}')
-        print(f'Mensaje: {str(e)}')
-        import traceback
-        print('Traceback completo:')
-        traceback.print_exc()
-        print('=' * 80)
+        logger.exception('Error al crear alta médica (hospitalizacion=%s)', hospitalizacion_id)
         
         return JsonResponse({
             'success': False,
@@ -1483,7 +1263,13 @@ def obtener_hospitalizaciones(request, paciente_id):
     """Retorna lista de hospitalizaciones del paciente"""
     try:
         paciente = get_object_or_404(Paciente, id=paciente_id)
-        hospitalizaciones = paciente.hospitalizaciones.all().order_by('-fecha_ingreso')
+        # Conteos, último registro y alta en una sola consulta
+        hospitalizaciones = Hospitalizacion.objects.filter(
+            paciente=paciente
+        ).with_ultimo_registro().annotate(
+            cirugias_count=Count('cirugias', distinct=True),
+            registros_count=Count('registros_diarios', distinct=True),
+        ).select_related('alta_medica').order_by('-fecha_ingreso')
         
         data = []
         for hosp in hospitalizaciones:
@@ -1492,11 +1278,15 @@ def obtener_hospitalizaciones(request, paciente_id):
                 'fecha_ingreso': timezone.localtime(hosp.fecha_ingreso).strftime('%d/%m/%Y %H:%M'),
                 'motivo': hosp.motivo,
                 'estado': hosp.get_estado_display(),
-                'tiene_cirugia': hosp.cirugias.exists(),
-                'cirugias_count': hosp.cirugias.count(),
-                'registros_diarios': hosp.registros_diarios.count(),
+                'tiene_cirugia': hosp.cirugias_count > 0,
+                'cirugias_count': hosp.cirugias_count,
+                'registros_diarios': hosp.registros_count,
+                'necesita_actualizacion': hosp.estado == 'activa' and hosp.necesita_actualizacion,
             }
             
+            if hosp.ultimo_registro_fecha:
+                hosp_data['ultimo_registro'] = timezone.localtime(hosp.ultimo_registro_fecha).strftime('%d/%m/%Y %H:%M')
+            
             if hosp.fecha_alta:
                 hosp_data['fecha_alta'] = hosp.fecha_alta.strftime('%d/%m/%Y %H:%M')
             
@@ -1521,12 +1311,10 @@ def obtener_hospitalizaciones(request, paciente_id):
 def detalle_hospitalizacion(request, paciente_id, hospitalizacion_id):
     """Retorna detalles completos de una hospitalización"""
     try:
-        print(f"🔍 Buscando hospitalización: paciente_id={paciente_id}, hospitalizacion_id={hospitalizacion_id}")
         hospitalizacion = Hospitalizacion.objects.get(
             id=hospitalizacion_id,
             paciente_id=paciente_id
         )
-        print(f"✅ Hospitalización encontrada: {hospitalizacion.id}")
         
         # Datos básicos
         data = {
@@ -1639,15 +1427,16 @@ def detalle_hospitalizacion(request, paciente_id, hospitalizacion_id):
             'hospitalizacion': data
         })
     except Hospitalizacion.DoesNotExist:
-        print(f"❌ Hospitalización no encontrada: paciente_id={paciente_id}, hospitalizacion_id={hospitalizacion_id}")
+        logger.warning(
+            'Hospitalización no encontrada: paciente_id=%s, hospitalizacion_id=%s',
+            paciente_id, hospitalizacion_id
+        )
         return JsonResponse({
             'success': False,
             'message': 'Hospitalización no encontrada'
         }, status=404)
     except Exception as e:
-        import traceback
-        print(f"❌ Error en detalle_hospitalizacion: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception('Error en detalle_hospitalizacion %s', hospitalizacion_id)
         return JsonResponse({
             'success': False,
             'error': str(e)
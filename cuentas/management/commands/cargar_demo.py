@@ -5,6 +5,7 @@ from django.db import transaction
 
 from agenda.models import Cita
 from cuentas.models import CustomUser
+from dashboard.services import metricas_en_lote
 from inventario.models import Insumo
 from pacientes.models import Paciente, Propietario
 from servicios.models import Servicio
@@ -16,6 +17,7 @@ DEMO_PASSWORD = 'DemoVet2026!'
 class Command(BaseCommand):
     help = 'Carga datos ficticios e idempotentes para la demo pública.'
 
+    @metricas_en_lote()
     @transaction.atomic
     def handle(self, *args, **options):
         usuarios = [
@@ -0,0 +1,11 @@
+from django.contrib import admin
+from .models import MetricaDiaria
+
+
+@admin.register(MetricaDiaria)
+class MetricaDiariaAdmin(admin.ModelAdmin):
+    list_display = ['fecha', 'veterinario', 'citas_total', 'citas_completadas', 'ingresos_total', 'cobros_pendientes_count']
+    list_filter = ['fecha', 'veterinario']
+    date_hierarchy = 'fecha'
+    ordering = ['-fecha']
+    readonly_fields = ['fecha_actualizacion']
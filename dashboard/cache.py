@@ -0,0 +1,73 @@
+"""
+Caché de fragmentos del dashboard.
+
+Cada fragmento (agenda, hospitalizaciones, caja, stock) se guarda por rol,
+veterinario y fecha con un TTL corto. Los signals de dashboard/signals.py
+borran exactamente las claves afectadas, así que el TTL solo acota la deriva
+de valores relativos a la hora actual (p. ej. horas sin registro).
+
+Usa el backend `default` de CACHES: locmem en desarrollo, y un backend
+compartido (Redis, Memcached, o FileBasedCache / DatabaseCache como
+alternativa local) cuando hay varios procesos.
+
+FUNCIONES:
+- obtener_fragmento(): Lee un fragmento o lo calcula y guarda
+- invalidar_fragmentos(): Borra los fragmentos afectados por un cambio
+"""
+
+from datetime import date
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+TTL_FRAGMENTOS = 60
+
+PREFIJO = 'dashboard:fragmento'
+
+# Roles que ven cada fragmento a nivel de clínica (sin filtrar por veterinario)
+ROLES_CLINICA = ('administracion', 'recepcion')
+
+
+def clave_fragmento(nombre, rol, fecha, veterinario_id=None):
+    return f'{PREFIJO}:{nombre}:{rol}:{veterinario_id or 0}:{fecha.isoformat()}'
+
+
+def obtener_fragmento(nombre, rol, fecha, calcular, veterinario_id=None):
+    """
+    Devuelve el fragmento cacheado o lo calcula con `calcular()` y lo guarda.
+    El resultado debe ser serializable (listas e instancias, no querysets perezosos).
+    """
+    clave = clave_fragmento(nombre, rol, fecha, veterinario_id)
+    valor = cache.get(clave)
+    if valor is None:
+        valor = calcular()
+        cache.set(clave, valor, TTL_FRAGMENTOS)
+    return valor
+
+
+def _claves(nombre, fechas, veterinario_ids):
+    claves = []
+    for fecha in fechas:
+        claves.extend(clave_fragmento(nombre, rol, fecha) for rol in ROLES_CLINICA)
+        claves.extend(
+            clave_fragmento(nombre, 'veterinario', fecha, veterinario_id)
+            for veterinario_id in veterinario_ids if veterinario_id
+        )
+    return claves
+
+
+def invalidar_fragmentos(nombre, fechas=None, veterinario_ids=()):
+    """
+    Borra el fragmento `nombre` de los roles de clínica y de los veterinarios
+    indicados para las fechas dadas (por defecto, hoy).
+
+    Se borra en el momento y otra vez al confirmar la transacción, para que una
+    lectura concurrente no vuelva a guardar datos anteriores al commit.
+    """
+    fechas = {f for f in (fechas or [date.today()]) if f is not None}
+    claves = _claves(nombre, fechas, set(veterinario_ids))
+    if not claves:
+        return
+    cache.delete_many(claves)
+    transaction.on_commit(lambda: cache.delete_many(claves))
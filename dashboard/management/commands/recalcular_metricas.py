@@ -0,0 +1,45 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from dashboard.services import recalcular_rango
+
+
+class Command(BaseCommand):
+    help = 'Recalcula la tabla MetricaDiaria (backfill) desde citas y ventas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--desde',
+            type=date.fromisoformat,
+            help='Fecha inicial YYYY-MM-DD (por defecto, la primera cita o venta registrada)',
+        )
+        parser.add_argument(
+            '--hasta',
+            type=date.fromisoformat,
+            help='Fecha final YYYY-MM-DD (por defecto, hoy)',
+        )
+
+    def handle(self, *args, **options):
+        hasta = options.get('hasta') or date.today()
+        desde = options.get('desde') or self._primera_fecha() or hasta
+
+        if desde > hasta:
+            raise CommandError('--desde debe ser anterior o igual a --hasta')
+
+        self.stdout.write(f'Recalculando métricas del {desde} al {hasta} ({(hasta - desde).days + 1} días)...')
+        filas = recalcular_rango(desde, hasta)
+        self.stdout.write(self.style.SUCCESS(f'✓ {filas} filas de métricas escritas'))
+
+    @staticmethod
+    def _primera_fecha():
+        from agenda.models import Cita
+        from caja.models import Venta
+
+        primera_cita = Cita.objects.aggregate(primera=Min('fecha'))['primera']
+        primera_venta = Venta.objects.aggregate(primera=Min('fecha_creacion'))['primera']
+        candidatas = [primera_cita, timezone.localdate(primera_venta) if primera_venta else None]
+        candidatas = [c for c in candidatas if c]
+        return min(candidatas) if candidatas else None
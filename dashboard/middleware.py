@@ -0,0 +1,19 @@
+"""
+Middleware del dashboard.
+
+MetricasLoteMiddleware ejecuta cada request dentro de metricas_en_lote(): los
+guardados de la vista (con o sin transacción) recalculan MetricaDiaria una
+sola vez, al terminar.
+"""
+from .services import metricas_en_lote
+
+
+class MetricasLoteMiddleware:
+    """Un solo recálculo de MetricaDiaria por request, al terminar la vista."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with metricas_en_lote():
+            return self.get_response(request)
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:04
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(db_index=True)),
+                ('citas_total', models.PositiveIntegerField(default=0)),
+                ('citas_pendientes', models.PositiveIntegerField(default=0)),
+                ('citas_confirmadas', models.PositiveIntegerField(default=0)),
+                ('citas_en_curso', models.PositiveIntegerField(default=0)),
+                ('citas_completadas', models.PositiveIntegerField(default=0)),
+                ('citas_canceladas', models.PositiveIntegerField(default=0)),
+                ('citas_no_asistio', models.PositiveIntegerField(default=0)),
+                ('pacientes_atendidos', models.PositiveIntegerField(default=0)),
+                ('ingresos_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('ingresos_efectivo', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('ingresos_tarjeta', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('ingresos_transferencia', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('ingresos_cheque', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('ingresos_mixto', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('ventas_pagadas', models.PositiveIntegerField(default=0)),
+                ('cobros_pendientes_count', models.PositiveIntegerField(default=0)),
+                ('cobros_pendientes_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('insumos_unidades', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('insumos_detalle', models.JSONField(default=dict, help_text='Dict {descripcion: cantidad}')),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+                ('veterinario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='metricas_diarias', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Métrica diaria',
+                'verbose_name_plural': 'Métricas diarias',
+                'ordering': ['-fecha'],
+                'indexes': [models.Index(fields=['fecha', 'veterinario'], name='dashboard_m_fecha_801d14_idx')],
+            },
+        ),
+    ]
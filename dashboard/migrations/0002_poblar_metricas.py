@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def poblar(apps, schema_editor):
+    """Sin esto la tabla nace vacía y el dashboard de administración muestra 0 cobros pendientes"""
+    from dashboard.services import poblar_metricas
+
+    poblar_metricas(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0001_initial'),
+        ('agenda', '0003_ocupacionbloquesdia'),
+        ('caja', '0004_reporte_sesion'),
+        ('clinica', '0004_consultainsumo_fecha_descuento_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(poblar, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations
+from django.db.models import Count
+
+
+def deduplicar(apps, schema_editor):
+    """Recálculos concurrentes pudieron dejar filas repetidas; se recalculan esos días antes de exigir unicidad"""
+    from dashboard.services import recalcular_metricas
+
+    MetricaDiaria = apps.get_model('dashboard', 'MetricaDiaria')
+    fechas = set(
+        MetricaDiaria.objects.order_by().values('fecha', 'veterinario').annotate(
+            n=Count('id')
+        ).filter(n__gt=1).values_list('fecha', flat=True)
+    )
+    if fechas:
+        recalcular_metricas(fechas, apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0002_poblar_metricas'),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicar, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0003_deduplicar_metricas'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='metricadiaria',
+            constraint=models.UniqueConstraint(fields=('fecha', 'veterinario'), name='metrica_dia_veterinario_unica'),
+        ),
+        migrations.AddConstraint(
+            model_name='metricadiaria',
+            constraint=models.UniqueConstraint(condition=models.Q(('veterinario__isnull', True)), fields=('fecha',), name='metrica_dia_clinica_unica'),
+        ),
+    ]
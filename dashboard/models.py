@@ -1,3 +1,71 @@
+from decimal import Decimal
+
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+
+class MetricaDiaria(models.Model):
+    """
+    Resumen materializado de la actividad de un día por veterinario.
+
+    veterinario=None agrupa lo que no tiene veterinario asociado (ventas
+    libres, citas sin asignar). Las filas de un día se recalculan completas
+    desde los datos de origen (ver dashboard/services.py), por lo que la tabla
+    puede reconstruirse en cualquier momento con `recalcular_metricas`.
+    """
+
+    fecha = models.DateField(db_index=True)
+    veterinario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='metricas_diarias'
+    )
+
+    # Agenda
+    citas_total = models.PositiveIntegerField(default=0)
+    citas_pendientes = models.PositiveIntegerField(default=0)
+    citas_confirmadas = models.PositiveIntegerField(default=0)
+    citas_en_curso = models.PositiveIntegerField(default=0)
+    citas_completadas = models.PositiveIntegerField(default=0)
+    citas_canceladas = models.PositiveIntegerField(default=0)
+    citas_no_asistio = models.PositiveIntegerField(default=0)
+    pacientes_atendidos = models.PositiveIntegerField(default=0)
+
+    # Caja: ingresos pagados en el día, por método de pago
+    ingresos_total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    ingresos_efectivo = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    ingresos_tarjeta = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    ingresos_transferencia = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    ingresos_cheque = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    ingresos_mixto = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    ventas_pagadas = models.PositiveIntegerField(default=0)
+
+    # Cobros creados en el día que siguen pendientes
+    cobros_pendientes_count = models.PositiveIntegerField(default=0)
+    cobros_pendientes_total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+
+    # Insumos vendidos en ventas pagadas del día
+    insumos_unidades = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    insumos_detalle = models.JSONField(default=dict, help_text='Dict {descripcion: cantidad}')
+
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Métrica diaria'
+        verbose_name_plural = 'Métricas diarias'
+        ordering = ['-fecha']
+        indexes = [
+            models.Index(fields=['fecha', 'veterinario']),
+        ]
+        constraints = [
+            # Una fila por día y veterinario; NULL no choca en UNIQUE, de ahí la segunda
+            models.UniqueConstraint(fields=['fecha', 'veterinario'], name='metrica_dia_veterinario_unica'),
+            models.UniqueConstraint(
+                fields=['fecha'], condition=models.Q(veterinario__isnull=True), name='metrica_dia_clinica_unica',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} - {self.veterinario or 'Sin veterinario'}"
@@ -0,0 +1,308 @@
+"""
+Servicios del dashboard: tabla materializada MetricaDiaria.
+
+Las métricas de un día se recalculan completas desde Cita / Venta / DetalleVenta
+con consultas agregadas (GROUP BY día y veterinario) y se reemplazan en bloque.
+Los signals solo marcan los días afectados; el recálculo se ejecuta al hacer
+commit, una vez por request (dashboard.middleware.MetricasLoteMiddleware) o por bloque
+metricas_en_lote().
+
+FUNCIONES:
+- recalcular_metricas(): Recalcula las filas de un conjunto de días
+- poblar_metricas(): Días con cobros pendientes y los últimos días (migración inicial)
+- programar_recalculo(): Marca días para recalcular al confirmar la transacción
+- metricas_en_lote(): Junta los recálculos de un bloque en uno solo al salir
+- metricas_del_dia(): Totales de la clínica para un día y cobros pendientes
+- tendencia_metricas(): Serie mensual o anual para los gráficos de administración
+"""
+
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from functools import partial
+
+from django.apps import apps as apps_globales
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate, TruncMonth, TruncYear
+from django.utils import timezone
+
+from .models import MetricaDiaria
+
+
+# Días por consulta: mantiene acotado el IN (...) de fechas en backfills largos
+DIAS_POR_LOTE = 90
+
+# Reintentos cuando otro recálculo del mismo día confirma primero (unicidad fecha/veterinario)
+INTENTOS_RECALCULO = 3
+
+# Días recientes que poblar_metricas() recalcula además de los con cobros pendientes
+DIAS_POBLADO_INICIAL = 90
+
+CAMPOS_CITAS = {
+    'citas_pendientes': 'pendiente',
+    'citas_confirmadas': 'confirmada',
+    'citas_en_curso': 'en_curso',
+    'citas_completadas': 'completada',
+    'citas_canceladas': 'cancelada',
+    'citas_no_asistio': 'no_asistio',
+}
+
+CAMPOS_INGRESOS = {
+    'ingresos_efectivo': 'efectivo',
+    'ingresos_tarjeta': 'tarjeta',
+    'ingresos_transferencia': 'transferencia',
+    'ingresos_cheque': 'cheque',
+    'ingresos_mixto': 'mixto',
+}
+
+CAMPOS_SUMABLES = (
+    ['citas_total', *CAMPOS_CITAS, 'pacientes_atendidos']
+    + ['ingresos_total', *CAMPOS_INGRESOS, 'ventas_pagadas']
+    + ['cobros_pendientes_count', 'cobros_pendientes_total', 'insumos_unidades']
+)
+
+# Veterinario al que se atribuye una venta: el de la consulta o el de la hospitalización
+VETERINARIO_VENTA = Coalesce('consulta__veterinario_id', 'hospitalizacion__veterinario_id')
+
+
+def _lotes(fechas):
+    fechas = sorted(set(fechas))
+    for i in range(0, len(fechas), DIAS_POR_LOTE):
+        yield fechas[i:i + DIAS_POR_LOTE]
+
+
+def _modelos(apps):
+    """Cita, Venta, DetalleVenta y MetricaDiaria del registro `apps` (el global o el de una migración)."""
+    apps = apps or apps_globales
+    return (
+        apps.get_model('agenda', 'Cita'),
+        apps.get_model('caja', 'Venta'),
+        apps.get_model('caja', 'DetalleVenta'),
+        apps.get_model('dashboard', 'MetricaDiaria'),
+    )
+
+
+def _calcular_filas(fechas, apps=None):
+    """{(fecha, veterinario_id): MetricaDiaria} para los días indicados (4 consultas)."""
+    Cita, Venta, DetalleVenta, MetricaDiaria = _modelos(apps)
+
+    filas = {}
+
+    def fila(fecha, veterinario_id):
+        clave = (fecha, veterinario_id)
+        if clave not in filas:
+            filas[clave] = MetricaDiaria(fecha=fecha, veterinario_id=veterinario_id)
+        return filas[clave]
+
+    citas = Cita.objects.filter(fecha__in=fechas).order_by().values('fecha', 'veterinario_id').annotate(
+        citas_total=Count('id'),
+        pacientes_atendidos=Count('paciente', filter=Q(estado='completada'), distinct=True),
+        **{campo: Count('id', filter=Q(estado=estado)) for campo, estado in CAMPOS_CITAS.items()},
+    )
+    for row in citas:
+        metrica = fila(row.pop('fecha'), row.pop('veterinario_id'))
+        for campo, valor in row.items():
+            setattr(metrica, campo, valor)
+
+    pagadas = Venta.objects.filter(
+        estado='pagado', fecha_pago__date__in=fechas
+    ).order_by().annotate(
+        dia=TruncDate('fecha_pago'), vet=VETERINARIO_VENTA
+    ).values('dia', 'vet').annotate(
+        ingresos_total=Sum('total'),
+        ventas_pagadas=Count('id'),
+        **{campo: Sum('total', filter=Q(metodo_pago=metodo)) for campo, metodo in CAMPOS_INGRESOS.items()},
+    )
+    for row in pagadas:
+        metrica = fila(row.pop('dia'), row.pop('vet'))
+        for campo, valor in row.items():
+            setattr(metrica, campo, valor if valor is not None else Decimal('0.00'))
+
+    pendientes = Venta.objects.filter(
+        estado='pendiente', fecha_creacion__date__in=fechas
+    ).order_by().annotate(
+        dia=TruncDate('fecha_creacion'), vet=VETERINARIO_VENTA
+    ).values('dia', 'vet').annotate(
+        cantidad=Count('id'), monto=Sum('total'),
+    )
+    for row in pendientes:
+        metrica = fila(row['dia'], row['vet'])
+        metrica.cobros_pendientes_count = row['cantidad']
+        metrica.cobros_pendientes_total = row['monto'] or Decimal('0.00')
+
+    insumos = DetalleVenta.objects.filter(
+        tipo='insumo', venta__estado='pagado', venta__fecha_pago__date__in=fechas
+    ).order_by().annotate(
+        dia=TruncDate('venta__fecha_pago'),
+        vet=Coalesce('venta__consulta__veterinario_id', 'venta__hospitalizacion__veterinario_id'),
+    ).values('dia', 'vet', 'descripcion').annotate(cantidad_total=Sum('cantidad'))
+    for row in insumos:
+        metrica = fila(row['dia'], row['vet'])
+        metrica.insumos_detalle[row['descripcion']] = str(row['cantidad_total'])
+        metrica.insumos_unidades += row['cantidad_total']
+
+    return filas
+
+
+def recalcular_metricas(fechas, apps=None):
+    """
+    Recalcula y reemplaza las filas de MetricaDiaria de los días indicados.
+
+    Args:
+        fechas: Iterable de date
+        apps: Registro de modelos (el de la migración al poblar la tabla)
+
+    Returns:
+        int: Filas escritas
+    """
+    MetricaDiaria = _modelos(apps)[3]
+    escritas = 0
+    for lote in _lotes(fechas):
+        for intento in range(INTENTOS_RECALCULO):
+            filas = _calcular_filas(lote, apps)
+            try:
+                with transaction.atomic():
+                    # Reemplazo completo del día: también borra filas de veterinarios sin actividad
+                    MetricaDiaria.objects.filter(fecha__in=lote).delete()
+                    MetricaDiaria.objects.bulk_create(filas.values())
+                break
+            except IntegrityError:
+                # Otro recálculo insertó las mismas filas (fecha, veterinario) y
+                # confirmó primero: se recalcula y reemplaza sobre las suyas
+                if intento == INTENTOS_RECALCULO - 1:
+                    raise
+        escritas += len(filas)
+    return escritas
+
+
+def recalcular_rango(desde, hasta):
+    """Recalcula todos los días entre `desde` y `hasta` (inclusive)."""
+    return recalcular_metricas(desde + timedelta(days=i) for i in range((hasta - desde).days + 1))
+
+
+def poblar_metricas(apps=None, dias=DIAS_POBLADO_INICIAL, hoy=None):
+    """
+    Recalcula los días que el dashboard lee apenas se crea la tabla: los que
+    tienen cobros pendientes (metricas_del_dia los suma todos, de cualquier
+    día) y los últimos `dias`. El resto del historial, con `recalcular_metricas`.
+    """
+    Venta = _modelos(apps)[1]
+    hoy = hoy or timezone.localdate()
+    fechas = {hoy - timedelta(days=i) for i in range(dias)}
+    fechas.update(
+        Venta.objects.filter(estado='pendiente').order_by().annotate(
+            dia=TruncDate('fecha_creacion')
+        ).values_list('dia', flat=True).distinct()
+    )
+    return recalcular_metricas(fechas, apps)
+
+
+# =============================================================================
+# RECÁLCULO INCREMENTAL (signals)
+# =============================================================================
+
+_pendientes = threading.local()
+
+
+def _recalcular_confirmadas(fechas):
+    """on_commit de programar_recalculo: si la transacción se revierte, Django descarta la llamada."""
+    lote = getattr(_pendientes, 'lote', None)
+    if lote is not None:
+        lote.update(fechas)
+    else:
+        recalcular_metricas(fechas)
+
+
+def programar_recalculo(*fechas):
+    """
+    Marca días para recalcular cuando se confirme la transacción actual (de
+    inmediato fuera de transacción).
+
+    Dentro de metricas_en_lote() (cada request, vía MetricasLoteMiddleware) los
+    días confirmados se juntan y se recalculan una sola vez al salir del bloque.
+    """
+    fechas = frozenset(f for f in fechas if f is not None)
+    if fechas:
+        transaction.on_commit(partial(_recalcular_confirmadas, fechas))
+
+
+@contextmanager
+def metricas_en_lote():
+    """
+    Junta los recálculos del bloque (p. ej. Venta + detalles guardados fuera de
+    una transacción) y recalcula cada día una vez al salir. Los bloques
+    anidados se suman al exterior.
+
+    Uso:
+        with metricas_en_lote():
+            ...
+
+    También sirve como decorador: @metricas_en_lote()
+    """
+    if getattr(_pendientes, 'lote', None) is not None:
+        yield
+        return
+    _pendientes.lote = set()
+    try:
+        yield
+    finally:
+        fechas, _pendientes.lote = _pendientes.lote, None
+        if fechas:
+            recalcular_metricas(fechas)
+
+
+# =============================================================================
+# LECTURA
+# =============================================================================
+
+def metricas_del_dia(fecha):
+    """
+    Totales de la clínica para un día, los 5 insumos más utilizados y los
+    cobros pendientes de todos los días, en una sola consulta.
+    """
+    totales = {campo: MetricaDiaria._meta.get_field(campo).get_default() for campo in CAMPOS_SUMABLES}
+    totales['pendientes_count'] = 0
+    totales['pendientes_total'] = Decimal('0.00')
+    detalle = defaultdict(Decimal)
+
+    for metrica in MetricaDiaria.objects.filter(Q(fecha=fecha) | Q(cobros_pendientes_count__gt=0)):
+        totales['pendientes_count'] += metrica.cobros_pendientes_count
+        totales['pendientes_total'] += metrica.cobros_pendientes_total
+        if metrica.fecha != fecha:
+            continue
+        for campo in CAMPOS_SUMABLES:
+            totales[campo] += getattr(metrica, campo)
+        for descripcion, cantidad in metrica.insumos_detalle.items():
+            detalle[descripcion] += Decimal(cantidad)
+
+    totales['insumos_utilizados'] = [
+        {'descripcion': descripcion, 'cantidad_total': cantidad}
+        for descripcion, cantidad in sorted(detalle.items(), key=lambda item: -item[1])[:5]
+    ]
+    return totales
+
+
+def tendencia_metricas(periodo='mes', desde=None, hasta=None, veterinario_id=None):
+    """
+    Serie agregada por mes o año desde MetricaDiaria.
+
+    Returns:
+        list: [{'periodo': date, 'citas_total': ..., 'ingresos_total': ..., ...}, ...]
+    """
+    truncar = TruncYear if periodo == 'anio' else TruncMonth
+    metricas = MetricaDiaria.objects.all()
+    if desde:
+        metricas = metricas.filter(fecha__gte=desde)
+    if hasta:
+        metricas = metricas.filter(fecha__lte=hasta)
+    if veterinario_id:
+        metricas = metricas.filter(veterinario_id=veterinario_id)
+
+    return list(
+        metricas.order_by().annotate(periodo=truncar('fecha')).values('periodo').annotate(
+            **{campo: Sum(campo) for campo in CAMPOS_SUMABLES}
+        ).order_by('periodo')
+    )
@@ -0,0 +1,108 @@
+"""
+Signals del dashboard.
+
+- MetricaDiaria: solo marcan los días afectados; el recálculo se hace al
+  confirmar la transacción, una vez por request (ver
+  dashboard.services.programar_recalculo).
+- Caché de fragmentos: borran los fragmentos de los roles, veterinarios y
+  fechas afectados (ver dashboard.cache.invalidar_fragmentos).
+"""
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from agenda.models import Cita
+from caja.models import DetalleVenta, SesionCaja, Venta
+from caja.signals import totales_venta_actualizados, ventas_creadas
+from clinica.models import Consulta, Hospitalizacion, RegistroDiario
+from inventario.models import Insumo
+from inventario.signals import stock_actualizado
+
+from .cache import invalidar_fragmentos
+from .services import programar_recalculo
+
+
+def _dia(valor):
+    """Fecha local de un DateTimeField (o None)."""
+    return timezone.localdate(valor) if valor else None
+
+
+def _veterinario_de_venta(venta):
+    if not venta.consulta_id:
+        return None
+    return Consulta.objects.filter(pk=venta.consulta_id).values_list('veterinario_id', flat=True).first()
+
+
+@receiver(pre_save, sender=Cita)
+def cita_pre_save(sender, instance, **kwargs):
+    """Recuerda veterinario y fecha cargados desde la BD para actualizar también el día anterior al reagendar."""
+    instance._dashboard_original = getattr(instance, '_ocupacion_original', None) or (None, None)
+
+
+@receiver(post_save, sender=Cita)
+@receiver(post_delete, sender=Cita)
+def cita_actualizar_dashboard(sender, instance, **kwargs):
+    veterinario_original, fecha_original = getattr(instance, '_dashboard_original', (None, None))
+    programar_recalculo(instance.fecha, fecha_original)
+    invalidar_fragmentos(
+        'agenda',
+        fechas=[instance.fecha, fecha_original],
+        veterinario_ids=[instance.veterinario_id, veterinario_original],
+    )
+
+
+@receiver(post_save, sender=Venta)
+@receiver(post_delete, sender=Venta)
+@receiver(totales_venta_actualizados)
+def venta_actualizar_dashboard(sender, instance, **kwargs):
+    programar_recalculo(_dia(instance.fecha_creacion), _dia(instance.fecha_pago))
+    invalidar_fragmentos('caja', veterinario_ids=[_veterinario_de_venta(instance)])
+
+
+@receiver(ventas_creadas)
+def ventas_creadas_actualizar_dashboard(sender, ventas, **kwargs):
+    programar_recalculo(*{_dia(venta.fecha_creacion) for venta in ventas})
+    invalidar_fragmentos('caja', veterinario_ids={venta.consulta.veterinario_id for venta in ventas if venta.consulta_id})
+
+
+@receiver(post_save, sender=DetalleVenta)
+@receiver(post_delete, sender=DetalleVenta)
+def detalle_venta_actualizar_dashboard(sender, instance, **kwargs):
+    """Los insumos solo cuentan en ventas pagadas."""
+    if instance.tipo != 'insumo':
+        return
+    try:
+        venta = instance.venta
+    except Venta.DoesNotExist:
+        return
+    if venta.estado == 'pagado':
+        programar_recalculo(_dia(venta.fecha_pago))
+        invalidar_fragmentos('caja')
+
+
+@receiver(post_save, sender=SesionCaja)
+@receiver(post_delete, sender=SesionCaja)
+def sesion_caja_actualizar_dashboard(sender, instance, **kwargs):
+    invalidar_fragmentos('caja')
+
+
+@receiver(post_save, sender=Hospitalizacion)
+@receiver(post_delete, sender=Hospitalizacion)
+def hospitalizacion_actualizar_dashboard(sender, instance, **kwargs):
+    invalidar_fragmentos('hospitalizaciones', veterinario_ids=[instance.veterinario_id])
+
+
+@receiver(post_save, sender=RegistroDiario)
+@receiver(post_delete, sender=RegistroDiario)
+def registro_diario_actualizar_dashboard(sender, instance, **kwargs):
+    veterinario_id = Hospitalizacion.objects.filter(
+        pk=instance.hospitalizacion_id
+    ).values_list('veterinario_id', flat=True).first()
+    invalidar_fragmentos('hospitalizaciones', veterinario_ids=[veterinario_id])
+
+
+@receiver(post_save, sender=Insumo)
+@receiver(post_delete, sender=Insumo)
+@receiver(stock_actualizado)
+def insumo_actualizar_dashboard(sender, **kwargs):
+    invalidar_fragmentos('stock')
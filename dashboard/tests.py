@@ -1,3 +1,257 @@
+from datetime import date, time, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from agenda.models import Cita
+from caja.models import Venta
+from clinica.models import Hospitalizacion, RegistroDiario
+from cuentas.models import CustomUser
+from pacientes.models import Paciente, Propietario
+
+from .models import MetricaDiaria
+from .services import metricas_del_dia, metricas_en_lote, poblar_metricas, recalcular_metricas
+
+
+# Máximo de consultas por render del dashboard (incluye sesión, usuario y
+# context processors). Si una vista nueva lo supera, agregar en SQL, no en Python.
+PRESUPUESTO_CONSULTAS = {
+    'administracion': 10,
+    'recepcion': 8,
+    'veterinario': 6,
+}
+
+
+class DashboardPresupuestoConsultasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuarios = {
+            rol: CustomUser.objects.create_user(
+                rut=rut,
+                password='clave-segura-123',
+                nombre=rol.capitalize(),
+                apellido='Demo',
+                correo=f'{rol}@example.com',
+                rol=rol,
+            )
+            for rol, rut in (
+                ('administracion', '11111111-1'),
+                ('recepcion', '22222222-2'),
+                ('veterinario', '33333333-3'),
+            )
+        }
+        veterinario = cls.usuarios['veterinario']
+        hoy = timezone.localdate()
+        # Ejecutar los on_commit para que MetricaDiaria refleje el fixture
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.crear_fixture(veterinario, hoy)
+
+    @classmethod
+    def crear_fixture(cls, veterinario, hoy):
+        for i in range(6):
+            propietario = Propietario.objects.create(nombre=f'Dueño{i}', apellido='Test', telefono=f'+5690000000{i}')
+            paciente = Paciente.objects.create(nombre=f'Mascota{i}', especie='canino', sexo='M', propietario=propietario)
+            Cita.objects.create(
+                paciente=paciente,
+                veterinario=veterinario,
+                fecha=hoy,
+                hora_inicio=time(9 + i, 0),
+                hora_fin=time(9 + i, 30),
+                estado=['pendiente', 'confirmada', 'completada'][i % 3],
+                motivo='Control',
+            )
+            Venta.objects.create(
+                paciente=paciente,
+                usuario_creacion=cls.usuarios['recepcion'],
+                estado='pendiente',
+                total=Decimal('1000.00') * (i + 1),
+            )
+
+            # Hospitalizaciones activas: sin registro, con registro reciente y con registro antiguo
+            if i < 3:
+                hosp = Hospitalizacion.objects.create(
+                    paciente=paciente,
+                    veterinario=veterinario,
+                    fecha_ingreso=timezone.now() - timedelta(days=2),
+                    motivo='Observación',
+                )
+                for horas in [(), (2, 30), (20, 40)][i]:
+                    RegistroDiario.objects.create(
+                        hospitalizacion=hosp,
+                        fecha_registro=timezone.now() - timedelta(hours=horas),
+                        temperatura=Decimal('38.5'),
+                    )
+
+    def setUp(self):
+        cache.clear()
+
+    def consultas_dashboard(self, rol):
+        self.client.force_login(self.usuarios[rol])
+        with CaptureQueriesContext(connection) as contexto:
+            response = self.client.get(reverse('dashboard:dashboard'))
+        self.assertEqual(response.status_code, 200)
+        return response, len(contexto.captured_queries)
+
+    def test_presupuesto_de_consultas_por_rol(self):
+        for rol, presupuesto in PRESUPUESTO_CONSULTAS.items():
+            with self.subTest(rol=rol):
+                _, consultas = self.consultas_dashboard(rol)
+                self.assertLessEqual(consultas, presupuesto)
+
+    def test_totales_de_cobros_en_sql(self):
+        response, _ = self.consultas_dashboard('administracion')
+        indicadores = response.context['indicadores']
+        self.assertEqual(indicadores['cobros_pendientes_count'], 6)
+        self.assertEqual(indicadores['cobros_pendientes_total'], Decimal('21000.00'))
+        self.assertEqual((indicadores['citas_hoy'], indicadores['citas_pendientes'], indicadores['citas_completadas']), (6, 4, 2))
+
+    def test_fragmentos_cacheados_e_invalidados_por_signals(self):
+        for rol in PRESUPUESTO_CONSULTAS:
+            with self.subTest(rol=rol):
+                _, primera = self.consultas_dashboard(rol)
+                _, segunda = self.consultas_dashboard(rol)
+                self.assertLess(segunda, primera)
+
+        # Una cita nueva invalida solo la agenda: el resto sigue en caché
+        cita = Cita.objects.filter(veterinario=self.usuarios['veterinario']).first()
+        Cita.objects.create(
+            paciente=cita.paciente, veterinario=cita.veterinario, fecha=cita.fecha,
+            hora_inicio=time(18, 0), hora_fin=time(18, 30), estado='pendiente', motivo='Control',
+        )
+        for rol in PRESUPUESTO_CONSULTAS:
+            with self.subTest(rol=rol):
+                response, _ = self.consultas_dashboard(rol)
+                self.assertEqual(response.context['indicadores']['citas_hoy'], 7)
+
+    def test_respuesta_incluye_id_de_correlacion(self):
+        self.client.force_login(self.usuarios['recepcion'])
+        response = self.client.get(reverse('dashboard:dashboard'), HTTP_X_REQUEST_ID='abc-123')
+        self.assertEqual(response['X-Request-ID'], 'abc-123')
+        response = self.client.get(reverse('dashboard:dashboard'), HTTP_X_REQUEST_ID='inválido con espacios')
+        self.assertRegex(response['X-Request-ID'], r'^[0-9a-f]{32}$')
+
+    def test_ultimo_registro_anotado_sin_n_mas_1(self):
+        response, _ = self.consultas_dashboard('veterinario')
+        hospitalizaciones = {h.paciente.nombre: h for h in response.context['mis_hospitalizaciones']}
+        self.assertEqual(
+            {nombre: (h.necesita_actualizacion, h.horas_sin_registro) for nombre, h in hospitalizaciones.items()},
+            {'Mascota0': (True, 24), 'Mascota1': (False, 2), 'Mascota2': (True, 20)},
+        )
+
+
+class MetricaDiariaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user(
+            rut='44444444-4', password='clave-segura-123', nombre='Admin', apellido='Demo',
+            correo='admin@example.com', rol='administracion',
+        )
+        cls.veterinario = CustomUser.objects.create_user(
+            rut='55555555-5', password='clave-segura-123', nombre='Vet', apellido='Demo',
+            correo='vet@example.com', rol='veterinario',
+        )
+        propietario = Propietario.objects.create(nombre='Dueño', apellido='Test', telefono='+56911111111')
+        cls.paciente = Paciente.objects.create(nombre='Mascota', especie='canino', sexo='M', propietario=propietario)
+        cls.hoy = timezone.localdate()
+
+    def test_signals_recalculan_dia_actual_y_anterior(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            cita = Cita.objects.create(
+                paciente=self.paciente, veterinario=self.veterinario, fecha=self.hoy,
+                hora_inicio=time(9, 0), hora_fin=time(9, 30), estado='completada', motivo='Control',
+            )
+            venta = Venta.objects.create(paciente=self.paciente, usuario_creacion=self.admin, total=Decimal('5000.00'))
+            venta.detalles.create(tipo='insumo', descripcion='Jeringa', cantidad=Decimal('3'), precio_unitario=Decimal('100'))
+        self.assertEqual(MetricaDiaria.objects.get(fecha=self.hoy, veterinario=self.veterinario).citas_completadas, 1)
+        self.assertEqual(MetricaDiaria.objects.get(fecha=self.hoy, veterinario=None).cobros_pendientes_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            venta.estado = 'pagado'
+            venta.metodo_pago = 'tarjeta'
+            venta.fecha_pago = timezone.now()
+            venta.save()
+        metricas = metricas_del_dia(self.hoy)
+        self.assertEqual((metricas['ingresos_total'], metricas['ingresos_tarjeta']), (Decimal('5000.00'), Decimal('5000.00')))
+        self.assertEqual(metricas['cobros_pendientes_count'], 0)
+        self.assertEqual(metricas['insumos_utilizados'], [{'descripcion': 'Jeringa', 'cantidad_total': Decimal('3')}])
+
+        # Reagendar: el día original queda sin la cita
+        cita = Cita.objects.get(pk=cita.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            cita.fecha = self.hoy + timedelta(days=1)
+            cita.save()
+        self.assertEqual(metricas_del_dia(self.hoy)['citas_total'], 0)
+        self.assertEqual(metricas_del_dia(self.hoy + timedelta(days=1))['citas_total'], 1)
+
+        # El backfill completo produce los mismos valores
+        antes = list(MetricaDiaria.objects.order_by('fecha', 'veterinario').values_list('fecha', 'veterinario', 'citas_total', 'ingresos_total'))
+        call_command('recalcular_metricas', desde=self.hoy - timedelta(days=1), hasta=self.hoy + timedelta(days=1), stdout=StringIO())
+        despues = list(MetricaDiaria.objects.order_by('fecha', 'veterinario').values_list('fecha', 'veterinario', 'citas_total', 'ingresos_total'))
+        self.assertEqual(antes, despues)
+
+    def crear_cita(self, **extra):
+        return Cita.objects.create(
+            paciente=self.paciente, veterinario=self.veterinario, fecha=self.hoy,
+            hora_inicio=time(9, 0), hora_fin=time(9, 30), estado='pendiente', motivo='Control', **extra,
+        )
+
+    def test_rollback_descarta_dias_y_lote_recalcula_una_vez(self):
+        with mock.patch('dashboard.services.recalcular_metricas', wraps=recalcular_metricas) as recalculo:
+            with self.captureOnCommitCallbacks(execute=True):
+                try:
+                    with transaction.atomic():
+                        self.crear_cita()
+                        raise RuntimeError
+                except RuntimeError:
+                    pass
+            recalculo.assert_not_called()
+
+            # Fuera de transacción (como una vista sin atomic): un solo recálculo al salir del lote
+            with metricas_en_lote(), self.captureOnCommitCallbacks(execute=True):
+                self.crear_cita()
+                venta = Venta.objects.create(paciente=self.paciente, usuario_creacion=self.admin, total=Decimal('5000.00'))
+                venta.detalles.create(tipo='insumo', descripcion='Jeringa', cantidad=Decimal('1'), precio_unitario=Decimal('100'))
+                recalculo.assert_not_called()
+            recalculo.assert_called_once()
+        self.assertEqual(metricas_del_dia(self.hoy)['citas_total'], 1)
+
+    def test_una_fila_por_dia_y_veterinario(self):
+        MetricaDiaria.objects.create(fecha=self.hoy)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            MetricaDiaria.objects.create(fecha=self.hoy)
+        MetricaDiaria.objects.create(fecha=self.hoy, veterinario=self.veterinario)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            MetricaDiaria.objects.create(fecha=self.hoy, veterinario=self.veterinario)
+
+    def test_poblado_inicial_incluye_cobros_pendientes_antiguos(self):
+        venta = Venta.objects.create(paciente=self.paciente, usuario_creacion=self.admin, total=Decimal('8000.00'))
+        Venta.objects.filter(pk=venta.pk).update(fecha_creacion=timezone.now() - timedelta(days=200))
+        MetricaDiaria.objects.all().delete()
+
+        poblar_metricas()
+
+        metricas = metricas_del_dia(self.hoy)
+        self.assertEqual((metricas['pendientes_count'], metricas['pendientes_total']), (1, Decimal('8000.00')))
+
+    def test_tendencia_solo_administracion(self):
+        MetricaDiaria.objects.create(fecha=date(2030, 1, 5), citas_total=2, ingresos_total=Decimal('100'))
+        MetricaDiaria.objects.create(fecha=date(2030, 1, 20), citas_total=3, ingresos_total=Decimal('50'))
+        MetricaDiaria.objects.create(fecha=date(2030, 2, 1), citas_total=1)
+
+        self.client.force_login(self.veterinario)
+        self.assertEqual(self.client.get(reverse('dashboard:metricas_tendencia')).status_code, 403)
 
-# Create your tests here.
+        self.client.force_login(self.admin)
+        serie = self.client.get(reverse('dashboard:metricas_tendencia'), {'periodo': 'mes'}).json()['serie']
+        self.assertEqual(
+            [(p['periodo'], p['citas_total'], p['ingresos_total']) for p in serie],
+            [('2030-01-01', 5, 150.0), ('2030-02-01', 1, 0.0)],
+        )
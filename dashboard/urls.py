@@ -5,4 +5,5 @@ app_name = 'dashboard'
 
 urlpatterns = [
     path('', views.dashboard, name='dashboard'),
+    path('metricas/tendencia/', views.metricas_tendencia, name='metricas_tendencia'),
 ]
\ No newline at end of file
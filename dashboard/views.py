@@ -1,10 +1,14 @@
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
 from django.utils import timezone
 from django.db.models import Q, Count, Sum
 from datetime import date, timedelta
 from decimal import Decimal
 
+from .cache import obtener_fragmento
+from .services import metricas_del_dia, tendencia_metricas
+
 
 @login_required(login_url='login')
 def dashboard(request):
@@ -70,6 +74,35 @@ def dashboard(request):
     
     return render(request, template, context)
 
+@login_required(login_url='login')
+def metricas_tendencia(request):
+    """
+    Tendencia mensual (?periodo=mes) o anual (?periodo=anio) desde MetricaDiaria.
+    Parámetros opcionales: desde, hasta (YYYY-MM-DD) y veterinario.
+    """
+    if not (request.user.rol == 'administracion' or request.user.is_superuser):
+        return JsonResponse({'success': False, 'error': 'No autorizado'}, status=403)
+
+    periodo = request.GET.get('periodo', 'mes')
+    if periodo not in ('mes', 'anio'):
+        return JsonResponse({'success': False, 'error': 'Periodo inválido (mes o anio)'}, status=400)
+
+    try:
+        desde = date.fromisoformat(request.GET['desde']) if request.GET.get('desde') else None
+        hasta = date.fromisoformat(request.GET['hasta']) if request.GET.get('hasta') else None
+        veterinario_id = int(request.GET['veterinario']) if request.GET.get('veterinario') else None
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Parámetros inválidos'}, status=400)
+
+    serie = tendencia_metricas(periodo, desde=desde, hasta=hasta, veterinario_id=veterinario_id)
+    for punto in serie:
+        punto['periodo'] = punto['periodo'].isoformat()
+        for campo, valor in punto.items():
+            if isinstance(valor, Decimal):
+                punto[campo] = float(valor)
+
+    return JsonResponse({'success': True, 'periodo': periodo, 'serie': serie})
+
 # Components views
 def avatars(request):
     return render(request, 'kaiadmin/components/avatars.html')
@@ -118,125 +151,169 @@ def charts(request):
 # FUNCIONES AUXILIARES PARA DASHBOARD
 # =============================================================================
 
-def _datos_administrador(hoy):
-    """Carga datos para el dashboard de administrador"""
+def _estadisticas_citas(citas):
+    """
+    Conteos por estado de un conjunto de citas en una sola consulta
+    (agregación condicional con Count(filter=Q(...))).
+    """
+    return citas.order_by().aggregate(
+        total=Count('id'),
+        pendientes=Count('id', filter=Q(estado='pendiente')),
+        confirmadas=Count('id', filter=Q(estado='confirmada')),
+        por_atender=Count('id', filter=Q(estado__in=['pendiente', 'confirmada'])),
+        completadas=Count('id', filter=Q(estado='completada')),
+        canceladas=Count('id', filter=Q(estado='cancelada')),
+        pacientes_atendidos=Count('paciente', filter=Q(estado='completada'), distinct=True),
+    )
+
+
+def _estadisticas_cobros(hoy):
+    """Cobros pendientes (cantidad y monto) e ingresos pagados del día en una sola consulta."""
+    from caja.models import Venta
+
+    pendiente = Q(estado='pendiente')
+    pagado_hoy = Q(estado='pagado', fecha_pago__date=hoy)
+    stats = Venta.objects.filter(pendiente | pagado_hoy).aggregate(
+        pendientes_count=Count('id', filter=pendiente),
+        pendientes_total=Sum('total', filter=pendiente),
+        ingresos_del_dia=Sum('total', filter=pagado_hoy),
+    )
+    stats['pendientes_total'] = stats['pendientes_total'] or Decimal('0.00')
+    stats['ingresos_del_dia'] = stats['ingresos_del_dia'] or Decimal('0.00')
+    return stats
+
+
+def _anotar_hospitalizaciones(hospitalizaciones, hoy):
+    """
+    Calcula días de hospitalización y estado del último registro diario.
+    El último registro y `necesita_actualizacion` (12 horas o más sin
+    registro) vienen anotados en SQL por Hospitalizacion.with_ultimo_registro().
+    """
+    hospitalizaciones = list(hospitalizaciones.with_ultimo_registro())
+    for hosp in hospitalizaciones:
+        fecha_ingreso = hosp.fecha_ingreso.date() if hasattr(hosp.fecha_ingreso, 'date') else hosp.fecha_ingreso
+        hosp.dias_hospitalizacion = (hoy - fecha_ingreso).days
+        hosp.horas_sin_registro = (
+            int(hosp.tiempo_sin_registro.total_seconds() // 3600)
+            if hosp.tiempo_sin_registro is not None else None
+        )
+    return hospitalizaciones
+
+
+def _agenda_clinica(hoy):
+    """Fragmento 'agenda' de administración y recepción."""
     from agenda.models import Cita
-    from pacientes.models import Paciente
-    from clinica.models import Hospitalizacion
-    from inventario.models import Insumo
-    from caja.models import SesionCaja, Venta
-    
-    # 1. AGENDA - Resumen del día
+
     citas_hoy = Cita.objects.filter(fecha=hoy).select_related(
         'paciente__propietario', 'veterinario', 'servicio'
     ).order_by('hora_inicio')
+    return {
+        'stats': _estadisticas_citas(citas_hoy),
+        # Mostrar solo citas pendientes y confirmadas
+        'mis_citas': list(citas_hoy.filter(estado__in=['pendiente', 'confirmada'])),
+    }
+
+
+def _hospitalizaciones_activas(hoy, veterinario=None):
+    """Fragmento 'hospitalizaciones': activas de la clínica o del veterinario."""
+    from clinica.models import Hospitalizacion
+
+    hospitalizaciones = Hospitalizacion.objects.filter(estado='activa')
+    if veterinario is not None:
+        hospitalizaciones = hospitalizaciones.filter(veterinario=veterinario).select_related(
+            'paciente__propietario'
+        ).order_by('fecha_ingreso')
+    else:
+        hospitalizaciones = hospitalizaciones.select_related('paciente__propietario', 'veterinario')
+    return _anotar_hospitalizaciones(hospitalizaciones, hoy)
+
+
+def _stock_bajo():
+    """
+    Fragmento 'stock': insumos a reponer según el pronóstico precalculado
+    (comando pronosticar_stock), primero los que se agotan antes.
+    """
+    from inventario.pronostico import insumos_a_reponer
+
+    return insumos_a_reponer(limite=10)
+
+
+def _caja_clinica(hoy, rol):
+    """Fragmento 'caja' de administración y recepción."""
+    from caja.models import SesionCaja, Venta
+
+    sesion_activa = SesionCaja.objects.filter(esta_cerrada=False).first()
+    caja = {
+        'sesion': sesion_activa,
+        'total_vendido': sesion_activa.calcular_total_vendido() if sesion_activa else Decimal('0.00'),
+        'cobros_pendientes': list(Venta.objects.filter(estado='pendiente').select_related('paciente')[:10]),
+    }
+    if rol == 'administracion':
+        # Ingresos, insumos utilizados y cobros pendientes desde la tabla materializada
+        caja['metricas_hoy'] = metricas_del_dia(hoy)
+        caja['cobros'] = caja['metricas_hoy']
+    else:
+        caja['cobros'] = _estadisticas_cobros(hoy)
+    return caja
+
+
+def _datos_administrador(hoy):
+    """Carga datos para el dashboard de administrador"""
+    from pacientes.models import Paciente
     
+    rol = 'administracion'
+    
+    # 1. AGENDA - Resumen del día
+    agenda = obtener_fragmento('agenda', rol, hoy, lambda: _agenda_clinica(hoy))
+    stats = agenda['stats']
     citas_stats = {
-        'total': citas_hoy.count(),
-        'pendientes': citas_hoy.filter(estado='pendiente').count(),
-        'confirmadas': citas_hoy.filter(estado='confirmada').count(),
-        'completadas': citas_hoy.filter(estado='completada').count(),
-        'canceladas': citas_hoy.filter(estado='cancelada').count(),
+        'total': stats['total'],
+        'pendientes': stats['pendientes'],
+        'confirmadas': stats['confirmadas'],
+        'completadas': stats['completadas'],
+        'canceladas': stats['canceladas'],
     }
     
-    # Mostrar solo citas pendientes y confirmadas
-    mis_citas = citas_hoy.filter(estado__in=['pendiente', 'confirmada'])
-    
     # 2. HOSPITALIZACIONES
-    hospitalizaciones_activas = Hospitalizacion.objects.filter(
-        estado='activa'
-    ).select_related('paciente__propietario', 'veterinario')
-    
-    # Agregar cálculo de días de hospitalización
-    from clinica.models import RegistroDiario
-    for hosp in hospitalizaciones_activas:
-        fecha_ingreso = hosp.fecha_ingreso.date() if hasattr(hosp.fecha_ingreso, 'date') else hosp.fecha_ingreso
-        hosp.dias_hospitalizacion = (hoy - fecha_ingreso).days
-        
-        # Calcular si necesita actualización (más de 12 horas sin registro)
-        hosp.ultimo_registro = RegistroDiario.objects.filter(
-            hospitalizacion=hosp
-        ).order_by('-fecha_registro').first()
-        
-        if hosp.ultimo_registro:
-            horas_desde_registro = (timezone.now() - hosp.ultimo_registro.fecha_registro).total_seconds() / 3600
-            hosp.necesita_actualizacion = horas_desde_registro >= 12
-        else:
-            hosp.necesita_actualizacion = True
-    
-    mis_hospitalizaciones = list(hospitalizaciones_activas)
+    mis_hospitalizaciones = obtener_fragmento('hospitalizaciones', rol, hoy, lambda: _hospitalizaciones_activas(hoy))
     
     # 3. INVENTARIO / STOCK
-    stock_bajo = Insumo.objects.filter(
-        stock_actual__lte=10
-    ).order_by('stock_actual')[:10]
-    
-    # Insumos más utilizados hoy
-    insumos_utilizados_hoy = []
-    try:
-        from caja.models import DetalleVenta
-        insumos_hoy = DetalleVenta.objects.filter(
-            venta__fecha_pago__date=hoy,
-            venta__estado='pagado',
-            tipo='insumo'
-        ).values('descripcion').annotate(
-            cantidad_total=Sum('cantidad')
-        ).order_by('-cantidad_total')[:5]
-        insumos_utilizados_hoy = list(insumos_hoy)
-    except:
-        pass
+    stock_bajo = obtener_fragmento('stock', rol, hoy, _stock_bajo)
     
     # 4. CAJA
-    sesion_activa = SesionCaja.objects.filter(esta_cerrada=False).first()
+    caja = obtener_fragmento('caja', rol, hoy, lambda: _caja_clinica(hoy, rol))
+    cobros = caja['cobros']
+    metricas_hoy = caja['metricas_hoy']
     
     caja_stats = {
-        'estado': 'abierta' if sesion_activa else 'cerrada',
-        'sesion': sesion_activa,
-        'total_vendido_hoy': Decimal('0.00'),
-        'cobros_pendientes_count': 0,
-        'cobros_pendientes_total': Decimal('0.00'),
+        'estado': 'abierta' if caja['sesion'] else 'cerrada',
+        'sesion': caja['sesion'],
+        'total_vendido_hoy': caja['total_vendido'],
+        'cobros_pendientes_count': cobros['pendientes_count'],
+        'cobros_pendientes_total': cobros['pendientes_total'],
+        'cobros_pendientes': caja['cobros_pendientes'],
     }
     
-    if sesion_activa:
-        caja_stats['total_vendido_hoy'] = sesion_activa.calcular_total_vendido()
-    
-    cobros_pendientes = Venta.objects.filter(estado='pendiente').select_related('paciente')[:10]
-    caja_stats['cobros_pendientes_count'] = cobros_pendientes.count()
-    caja_stats['cobros_pendientes_total'] = sum(v.total for v in cobros_pendientes)
-    caja_stats['cobros_pendientes'] = cobros_pendientes
-    
     # 5. INDICADORES GENERALES
-    cobros_pendientes_all = Venta.objects.filter(estado='pendiente')
-    cobros_pendientes_total = sum(v.total for v in cobros_pendientes_all) if cobros_pendientes_all else Decimal('0.00')
-    
     indicadores = {
-        'citas_hoy': citas_hoy.count(),
-        'citas_pendientes': citas_hoy.filter(estado__in=['pendiente', 'confirmada']).count(),
-        'citas_completadas': citas_hoy.filter(estado='completada').count(),
-        'hospitalizados': hospitalizaciones_activas.count(),
-        'cobros_pendientes_count': cobros_pendientes_all.count(),
-        'cobros_pendientes_total': cobros_pendientes_total,
-        'pacientes_atendidos_hoy': Cita.objects.filter(
-            fecha=hoy,
-            estado='completada'
-        ).values('paciente').distinct().count(),
-        
-        'ingresos_del_dia': Venta.objects.filter(
-            fecha_pago__date=hoy,
-            estado='pagado'
-        ).aggregate(total=Sum('total'))['total'] or Decimal('0.00'),
-        
+        'citas_hoy': stats['total'],
+        'citas_pendientes': stats['por_atender'],
+        'citas_completadas': stats['completadas'],
+        'hospitalizados': len(mis_hospitalizaciones),
+        'cobros_pendientes_count': cobros['pendientes_count'],
+        'cobros_pendientes_total': cobros['pendientes_total'],
+        'pacientes_atendidos_hoy': stats['pacientes_atendidos'],
+        'ingresos_del_dia': metricas_hoy['ingresos_total'],
         'total_pacientes': Paciente.objects.filter(activo=True).count(),
-        
-        'hospitalizaciones_activas_count': hospitalizaciones_activas.count(),
+        'hospitalizaciones_activas_count': len(mis_hospitalizaciones),
     }
     
     return {
         'citas_stats': citas_stats,
-        'mis_citas': mis_citas,
+        'mis_citas': agenda['mis_citas'],
         'mis_hospitalizaciones': mis_hospitalizaciones,
         'stock_bajo': stock_bajo,
-        'insumos_utilizados_hoy': insumos_utilizados_hoy,
+        'insumos_utilizados_hoy': metricas_hoy['insumos_utilizados'],
         'caja_stats': caja_stats,
         'indicadores': indicadores,
     }
@@ -244,84 +321,46 @@ def _datos_administrador(hoy):
 
 def _datos_recepcion(hoy, usuario):
     """Carga datos para el dashboard de recepción"""
-    from agenda.models import Cita
-    from clinica.models import Hospitalizacion
-    from caja.models import SesionCaja, Venta
+    rol = 'recepcion'
     
     # 1. AGENDA - Citas del día (mis_citas para compatible con partials)
-    citas_hoy = Cita.objects.filter(fecha=hoy).select_related(
-        'paciente__propietario', 'veterinario', 'servicio'
-    ).order_by('hora_inicio').distinct()
-    
-    # Mostrar solo citas pendientes y confirmadas
-    mis_citas = citas_hoy.filter(estado__in=['pendiente', 'confirmada'])
-    
+    agenda = obtener_fragmento('agenda', rol, hoy, lambda: _agenda_clinica(hoy))
+    stats = agenda['stats']
     agenda_stats = {
-        'total_citas': citas_hoy.count(),
-        'pendientes': citas_hoy.filter(estado='pendiente').count(),
-        'confirmadas': citas_hoy.filter(estado='confirmada').count(),
-        'completadas': citas_hoy.filter(estado='completada').count(),
+        'total_citas': stats['total'],
+        'pendientes': stats['pendientes'],
+        'confirmadas': stats['confirmadas'],
+        'completadas': stats['completadas'],
     }
     
     # 2. HOSPITALIZACIONES (mis_hospitalizaciones para compatible con partials)
-    hospitalizaciones_activas = Hospitalizacion.objects.filter(
-        estado='activa'
-    ).select_related('paciente__propietario', 'veterinario')
-    
-    # Agregar cálculo de días de hospitalización
-    from clinica.models import RegistroDiario
-    for hosp in hospitalizaciones_activas:
-        fecha_ingreso = hosp.fecha_ingreso.date() if hasattr(hosp.fecha_ingreso, 'date') else hosp.fecha_ingreso
-        hosp.dias_hospitalizacion = (hoy - fecha_ingreso).days
-        
-        # Calcular si necesita actualización (más de 12 horas sin registro)
-        hosp.ultimo_registro = RegistroDiario.objects.filter(
-            hospitalizacion=hosp
-        ).order_by('-fecha_registro').first()
-        
-        if hosp.ultimo_registro:
-            horas_desde_registro = (timezone.now() - hosp.ultimo_registro.fecha_registro).total_seconds() / 3600
-            hosp.necesita_actualizacion = horas_desde_registro >= 12
-        else:
-            hosp.necesita_actualizacion = True
-    
-    mis_hospitalizaciones = list(hospitalizaciones_activas)
+    mis_hospitalizaciones = obtener_fragmento('hospitalizaciones', rol, hoy, lambda: _hospitalizaciones_activas(hoy))
     
     # 3. CAJA
-    sesion_activa = SesionCaja.objects.filter(esta_cerrada=False).first()
+    caja = obtener_fragmento('caja', rol, hoy, lambda: _caja_clinica(hoy, rol))
+    cobros = caja['cobros']
     
     caja_stats = {
-        'estado': 'abierta' if sesion_activa else 'cerrada',
-        'sesion': sesion_activa,
-        'puede_abrir': not sesion_activa,
-        'total_acumulado': Decimal('0.00'),
+        'estado': 'abierta' if caja['sesion'] else 'cerrada',
+        'sesion': caja['sesion'],
+        'puede_abrir': not caja['sesion'],
+        'total_acumulado': caja['total_vendido'],
+        'cobros_pendientes': caja['cobros_pendientes'],
+        'cobros_pendientes_count': cobros['pendientes_count'],
     }
     
-    if sesion_activa:
-        caja_stats['total_acumulado'] = sesion_activa.calcular_total_vendido()
-    
-    cobros_pendientes = Venta.objects.filter(
-        estado='pendiente'
-    ).select_related('paciente')[:10]
-    
-    caja_stats['cobros_pendientes'] = cobros_pendientes
-    caja_stats['cobros_pendientes_count'] = cobros_pendientes.count()
-    
     # 4. INDICADORES
-    cobros_pendientes_all = Venta.objects.filter(estado='pendiente')
-    cobros_pendientes_total = sum(v.total for v in cobros_pendientes_all) if cobros_pendientes_all else Decimal('0.00')
-    
     indicadores = {
-        'citas_hoy': citas_hoy.count(),
-        'citas_pendientes': citas_hoy.filter(estado='pendiente').count(),
-        'citas_completadas': citas_hoy.filter(estado='completada').count(),
-        'hospitalizados': hospitalizaciones_activas.count(),
-        'cobros_pendientes_count': cobros_pendientes_all.count(),
-        'cobros_pendientes_total': cobros_pendientes_total,
+        'citas_hoy': stats['total'],
+        'citas_pendientes': stats['pendientes'],
+        'citas_completadas': stats['completadas'],
+        'hospitalizados': len(mis_hospitalizaciones),
+        'cobros_pendientes_count': cobros['pendientes_count'],
+        'cobros_pendientes_total': cobros['pendientes_total'],
     }
     
     return {
-        'mis_citas': mis_citas,
+        'mis_citas': agenda['mis_citas'],
         'mis_hospitalizaciones': mis_hospitalizaciones,
         'agenda_stats': agenda_stats,
         'caja_stats': caja_stats,
@@ -332,139 +371,63 @@ def _datos_recepcion(hoy, usuario):
 def _datos_veterinario(hoy, usuario):
     """Carga datos para el dashboard de veterinario"""
     from agenda.models import Cita
-    from clinica.models import Hospitalizacion, RegistroDiario
     from caja.models import Venta
     
-    # 1. AGENDA PERSONAL
-    citas_del_dia = Cita.objects.filter(
+    rol = 'veterinario'
+    
+    # 1. AGENDA PERSONAL (una consulta; el resto se deriva en memoria)
+    citas_del_dia = obtener_fragmento('agenda', rol, hoy, lambda: list(Cita.objects.filter(
         veterinario=usuario,
         fecha=hoy
-    ).select_related('paciente__propietario', 'servicio').order_by('hora_inicio')
+    ).select_related('paciente__propietario', 'servicio').order_by('hora_inicio')), veterinario_id=usuario.id)
     
     # Mostrar solo citas pendientes y confirmadas en la agenda
-    mis_citas = citas_del_dia.filter(
-        estado__in=['pendiente', 'confirmada']
-    )
-    
-    proximas_citas = citas_del_dia.filter(
-        estado__in=['pendiente', 'confirmada']
-    )[:5]
-    
-    cita_actual = citas_del_dia.filter(estado='en_curso').first()
-    
-    agenda_stats = {
-        'total_del_dia': citas_del_dia.count(),
-        'completadas': citas_del_dia.filter(estado='completada').count(),
-        'pendientes': citas_del_dia.filter(estado__in=['pendiente', 'confirmada']).count(),
-    }
-    
-    # 2. PACIENTES DEL DÍA
-    pacientes_del_dia = []
-    for cita in citas_del_dia:
-        pacientes_del_dia.append({
-            'paciente': cita.paciente,
-            'cita': cita,
-            'atendido': cita.estado == 'completada',
-        })
-    
-    # 3. HOSPITALIZACIONES A CARGO
-    hospitalizaciones_asignadas = Hospitalizacion.objects.filter(
-        veterinario=usuario,
-        estado='activa'
-    ).select_related('paciente__propietario').order_by('fecha_ingreso')
-    
-    # Agregar cálculo de días de hospitalización y último registro
-    for hosp in hospitalizaciones_asignadas:
-        hosp.dias_hospitalizacion = (hoy - hosp.fecha_ingreso.date()).days
-        hosp.ultimo_registro = RegistroDiario.objects.filter(
-            hospitalizacion=hosp
-        ).order_by('-fecha_registro').first()
-        
-        # Determinar si necesita actualización (más de 12 horas sin registro)
-        if hosp.ultimo_registro:
-            horas_desde_registro = (timezone.now() - hosp.ultimo_registro.fecha_registro).total_seconds() / 3600
-            hosp.necesita_actualizacion = horas_desde_registro >= 12
-        else:
-            hosp.necesita_actualizacion = True
+    mis_citas = [c for c in citas_del_dia if c.estado in ('pendiente', 'confirmada')]
+    cita_actual = next((c for c in citas_del_dia if c.estado == 'en_curso'), None)
+    completadas = sum(1 for c in citas_del_dia if c.estado == 'completada')
     
-    # 4. ALERTAS CLÍNICAS
-    alertas = []
+    # 2. HOSPITALIZACIONES A CARGO
+    hospitalizaciones_asignadas = obtener_fragmento(
+        'hospitalizaciones', rol, hoy, lambda: _hospitalizaciones_activas(hoy, usuario), veterinario_id=usuario.id
+    )
     
-    # Consultas con cobro pendiente
+    # 3. ALERTAS CLÍNICAS
+    cobros_pendientes = []
     try:
-        consultas_sin_cobrar = Venta.objects.filter(
+        cobros_pendientes = obtener_fragmento('caja', rol, hoy, lambda: list(Venta.objects.filter(
             tipo_origen='consulta',
             consulta__veterinario=usuario,
-            estado='pendiente',
-            fecha_creacion__date__lte=hoy - timedelta(days=1)
-        ).count()
-        
-        if consultas_sin_cobrar > 0:
-            alertas.append({
-                'tipo': 'warning',
-                'icono': 'fa-exclamation-triangle',
-                'mensaje': f'{consultas_sin_cobrar} consulta(s) con cobro pendiente de días anteriores',
-            })
+            estado='pendiente'
+        ).select_related('paciente')[:10]), veterinario_id=usuario.id)
     except:
         pass
     
-    # Hospitalizaciones sin actualización reciente
-    for hosp in hospitalizaciones_asignadas:
-        if not hosp.ultimo_registro or (timezone.now() - hosp.ultimo_registro.fecha_registro).days >= 1:
-            alertas.append({
-                'tipo': 'info',
-                'icono': 'fa-clipboard-check',
-                'mensaje': f'Hospitalización de {hosp.paciente.nombre} sin registro reciente',
-            })
-    
     # Insumos sin confirmar - obtener lista completa
     insumos_sin_confirmar = []
     try:
         from clinica.models import ConsultaInsumo
-        insumos_sin_confirmar = ConsultaInsumo.objects.filter(
+        insumos_sin_confirmar = list(ConsultaInsumo.objects.filter(
             consulta__veterinario=usuario,
             requiere_confirmacion=True,
             confirmado_por__isnull=True
-        ).select_related('consulta')[:10]
-        
-        if insumos_sin_confirmar:
-            alertas.append({
-                'tipo': 'warning',
-                'icono': 'fa-pills',
-                'mensaje': f'{len(insumos_sin_confirmar)} insumo(s) sin confirmar cantidad',
-            })
+        ).select_related('consulta')[:10])
     except:
         pass
     
-    # Cobros pendientes del veterinario
-    cobros_pendientes = []
-    try:
-        cobros_pendientes = Venta.objects.filter(
-            tipo_origen='consulta',
-            consulta__veterinario=usuario,
-            estado='pendiente'
-        ).select_related('paciente')[:10]
-    except:
-        pass
-    
-    # Hospitalizaciones sin actualizar
+    # Hospitalizaciones sin actualizar (24 horas o más sin registro)
     hospitalizaciones_sin_actualizar = []
     for hosp in hospitalizaciones_asignadas:
-        if hosp.ultimo_registro:
-            horas_sin_registro = int((timezone.now() - hosp.ultimo_registro.fecha_registro).total_seconds() / 3600)
-        else:
-            horas_sin_registro = 24
-        
-        if horas_sin_registro >= 24:
-            hosp.horas_sin_registro = horas_sin_registro
+        if hosp.horas_sin_registro is None:
+            hosp.horas_sin_registro = 24
+        if hosp.horas_sin_registro >= 24:
             hospitalizaciones_sin_actualizar.append(hosp)
     
     # Indicadores
     indicadores = {
-        'citas_hoy': citas_del_dia.count(),
-        'citas_pendientes': citas_del_dia.filter(estado__in=['pendiente', 'confirmada']).count(),
-        'citas_completadas': citas_del_dia.filter(estado='completada').count(),
-        'hospitalizados': hospitalizaciones_asignadas.count(),
+        'citas_hoy': len(citas_del_dia),
+        'citas_pendientes': len(mis_citas),
+        'citas_completadas': completadas,
+        'hospitalizados': len(hospitalizaciones_asignadas),
     }
     
     # Alertas detalladas
@@ -477,7 +440,7 @@ def _datos_veterinario(hoy, usuario):
     
     return {
         'mis_citas': mis_citas,
-        'proxima_cita': proximas_citas.first() if proximas_citas.exists() else None,
+        'proxima_cita': mis_citas[0] if mis_citas else None,
         'cita_actual': cita_actual,
         'indicadores': indicadores,
         'mis_hospitalizaciones': hospitalizaciones_asignadas,
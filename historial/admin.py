@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import RegistroHistorico
+from .models import MuestraRendimiento, RegistroHistorico
 
 
 @admin.register(RegistroHistorico)
@@ -54,3 +54,18 @@ class RegistroHistoricoAdmin(admin.ModelAdmin):
     
     date_hierarchy = 'fecha_evento'
     ordering = ['-fecha_evento']
+
+
+@admin.register(MuestraRendimiento)
+class MuestraRendimientoAdmin(admin.ModelAdmin):
+    """Muestras del perfil SQL por request (solo lectura)."""
+    list_display = ['fecha', 'metodo', 'endpoint', 'status', 'consultas', 'consultas_duplicadas', 'tiempo_total_ms']
+    list_filter = ['metodo', 'status', 'fecha']
+    search_fields = ['endpoint']
+    date_hierarchy = 'fecha'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
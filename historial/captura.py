@@ -0,0 +1,235 @@
+"""
+Captura de cambios para el historial sin consultas extra.
+
+- SnapshotCargaMixin: guarda en la instancia los valores con que se cargó
+  desde la BD (from_db) y los actualiza al guardar o refrescar. Los signals
+  comparan contra ese estado en vez de volver a leer la fila en pre_save.
+- estado_anterior(): valores "antes" de un save, respetando update_fields.
+- guardar_estado_anterior() / tomar_estado_anterior(): el "antes" viaja en la
+  propia instancia de pre_save a post_save (atributo _estado_anterior) y
+  SnapshotCargaMixin.save() lo descarta al terminar, aunque el save falle.
+  Nada queda en variables de módulo: no crece con el proceso ni se mezcla
+  entre hilos que guardan el mismo pk.
+- encolar_evento() / historial_en_lote(): los eventos de un bloque (p. ej.
+  los de un post_save que detecta varios cambios) se escriben con un solo
+  bulk_create al salir del bloque, dentro de la transacción del cambio: se
+  confirman o se revierten con ella y una caída después del COMMIT no los
+  pierde. Con HISTORIAL_COLA_ARCHIVO se escriben en la cola local
+  (historial.cola) al confirmarse la transacción y los drena
+  `procesar_cola_historial`; como la cola no participa de la transacción,
+  una caída entre el COMMIT y esa escritura pierde los eventos del bloque.
+
+El "antes" es el estado con que se cargó la instancia: una instancia debe
+guardarse poco después de leerse (como hacen las vistas), igual que antes lo
+era la fila leída en pre_save.
+"""
+
+import logging
+from contextlib import contextmanager
+from functools import partial
+from threading import local
+
+from django.conf import settings
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+_lote = local()
+
+# Atributo de instancia con el "antes" entre pre_save y post_save
+ATRIBUTO_ESTADO = '_estado_anterior'
+
+
+class SnapshotCargaMixin:
+    """Mixin de modelo: `_valores_cargados` = {attname: valor} de los campos leídos de la BD."""
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # field_names son attnames en el mismo orden que values (solo los no diferidos)
+        instance._valores_cargados = dict(zip(field_names, values))
+        return instance
+
+    def _actualizar_snapshot(self, attnames):
+        valores = getattr(self, '_valores_cargados', None)
+        if valores is None:
+            valores = self._valores_cargados = {}
+        for attname in attnames:
+            valores[attname] = getattr(self, attname)
+
+    def save(self, *args, **kwargs):
+        try:
+            super().save(*args, **kwargs)
+        finally:
+            self.__dict__.pop(ATRIBUTO_ESTADO, None)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            attnames = [f.attname for f in self._meta.concrete_fields if f.attname in self.__dict__]
+        else:
+            attnames = [self._meta.get_field(nombre).attname for nombre in update_fields]
+        self._actualizar_snapshot(attnames)
+
+    save.alters_data = True
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        if fields is None:
+            attnames = [f.attname for f in self._meta.concrete_fields if f.attname in self.__dict__]
+        else:
+            attnames = [self._meta.get_field(nombre).attname for nombre in fields]
+        self._actualizar_snapshot(attnames)
+
+
+def estado_anterior(instance, campos, update_fields=None):
+    """
+    {campo: valor antes del save} para `campos` (attnames).
+
+    Los campos fuera de update_fields no se escriben, así que su "antes" es el
+    valor actual. Los que no estén en el snapshot (instancia creada a mano con
+    pk, campos diferidos) se leen con un solo SELECT de esas columnas.
+
+    Returns:
+        dict, o None si la fila no existe en la BD
+    """
+    cargados = getattr(instance, '_valores_cargados', {})
+    escritos = None
+    if update_fields is not None:
+        escritos = {instance._meta.get_field(nombre).attname for nombre in update_fields}
+
+    anteriores = {}
+    faltantes = []
+    for campo in campos:
+        if escritos is not None and campo not in escritos:
+            anteriores[campo] = getattr(instance, campo)
+        elif campo in cargados:
+            anteriores[campo] = cargados[campo]
+        else:
+            faltantes.append(campo)
+
+    if faltantes:
+        fila = type(instance)._base_manager.filter(pk=instance.pk).values(*faltantes).first()
+        if fila is None:
+            return None
+        anteriores.update(fila)
+    return anteriores
+
+
+def guardar_estado_anterior(instance, campos, update_fields=None):
+    """Para pre_save: deja estado_anterior() en la instancia (nada si la fila no existe)."""
+    instance.__dict__.pop(ATRIBUTO_ESTADO, None)
+    if instance.pk:
+        anterior = estado_anterior(instance, campos, update_fields)
+        if anterior is not None:
+            instance.__dict__[ATRIBUTO_ESTADO] = anterior
+
+
+def tomar_estado_anterior(instance):
+    """Para post_save: el dict guardado en pre_save, o None (alta o fila inexistente)."""
+    return instance.__dict__.get(ATRIBUTO_ESTADO)
+
+
+# =============================================================================
+# ESCRITURA EN LOTE
+# =============================================================================
+
+def _profundidad():
+    """Nivel de atomic() actual en la conexión (0 = autocommit)."""
+    if not connection.in_atomic_block:
+        return 0
+    return len(connection.savepoint_ids) + 1
+
+
+def _lote_activo():
+    pila = getattr(_lote, 'pila', None)
+    return pila[-1] if pila else None
+
+
+def _usa_cola():
+    return bool(getattr(settings, 'HISTORIAL_COLA_ARCHIVO', ''))
+
+
+def _escribir(eventos):
+    """
+    Sin cola local: bulk_create ahora, dentro de la transacción en curso (se
+    confirma o se revierte junto con el cambio que registra). Con cola local:
+    al confirmarse la transacción, porque la cola no participa de ella.
+    """
+    if not eventos:
+        return
+    if _usa_cola() and connection.in_atomic_block:
+        transaction.on_commit(partial(escribir_eventos, eventos))
+    else:
+        escribir_eventos(eventos)
+
+
+def encolar_evento(registro):
+    """
+    Deja `registro` en camino a la BD: se acumula en el lote abierto en el
+    mismo nivel de transacción (historial_en_lote) o, si no lo hay, se escribe
+    en el momento.
+    """
+    lote = _lote_activo()
+    if lote is not None and lote[0] == _profundidad():
+        lote[1].append(registro)
+    else:
+        _escribir([registro])
+
+
+def escribir_eventos(eventos):
+    """
+    Escribe eventos: a la cola local si HISTORIAL_COLA_ARCHIVO está configurado
+    (los drena `procesar_cola_historial`), si no con un bulk_create.
+    Nunca lanza: un error del historial no debe afectar la operación principal.
+    """
+    if not eventos:
+        return
+    if _usa_cola():
+        from .cola import encolar_eventos
+
+        try:
+            encolar_eventos(eventos)
+            return
+        except Exception:
+            logger.exception("No se pudo escribir en la cola del historial; se insertan directo")
+    insertar_eventos(eventos)
+
+
+def insertar_eventos(eventos):
+    """bulk_create en un savepoint; devuelve False (y lo registra en el log) si falla."""
+    from .models import RegistroHistorico
+
+    try:
+        # Savepoint: un error del historial no debe invalidar una transacción en curso
+        with transaction.atomic():
+            RegistroHistorico.objects.bulk_create(eventos, batch_size=500)
+        return True
+    except Exception:
+        logger.exception("No se pudieron registrar %d eventos de historial", len(eventos))
+        return False
+
+
+@contextmanager
+def historial_en_lote():
+    """
+    Acumula los eventos de RegistroHistorico.registrar_evento() del bloque y
+    los escribe juntos con un bulk_create al salir, en la misma transacción
+    (si se revierte, se revierten con ella). Los eventos de un atomic() más
+    interno se escriben aparte, con su savepoint. Anidado en el mismo nivel de
+    transacción se usa el lote exterior. También sirve como decorador.
+    """
+    profundidad = _profundidad()
+    lote = _lote_activo()
+    if lote is not None and lote[0] == profundidad:
+        yield
+        return
+
+    pila = getattr(_lote, 'pila', None)
+    if pila is None:
+        pila = _lote.pila = []
+    eventos = []
+    pila.append((profundidad, eventos))
+    try:
+        yield
+    finally:
+        pila.pop()
+        _escribir(eventos)
@@ -0,0 +1,95 @@
+"""
+Cola local de eventos del historial (modo fuera de proceso).
+
+Con HISTORIAL_COLA_ARCHIVO configurado, captura.escribir_eventos() no inserta
+los eventos confirmados en la BD principal: los agrega a una base SQLite local
+(una fila JSON por evento, journal WAL y synchronous=FULL: una vez encolados
+sobreviven a una caída del proceso). `procesar_cola_historial` los drena por
+lotes con bulk_create y solo borra de la cola lo que quedó insertado. Si el
+drenado se corta entre el INSERT y el borrado, ese lote se vuelve a insertar
+(entrega al menos una vez).
+
+El archivo es local a la máquina: todos los procesos web que lo comparten y el
+comando que lo drena deben correr en el mismo servidor.
+
+FUNCIONES:
+- encolar_eventos(): Agrega RegistroHistorico sin guardar a la cola
+- drenar_cola(): Inserta lo pendiente en RegistroHistorico, por lotes
+- eventos_pendientes(): Cantidad de eventos en la cola
+"""
+
+import json
+import sqlite3
+from contextlib import closing
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+TAMANO_LOTE = 500
+
+
+def _conectar():
+    conexion = sqlite3.connect(settings.HISTORIAL_COLA_ARCHIVO, timeout=30)
+    conexion.execute('PRAGMA journal_mode=WAL')
+    conexion.execute('PRAGMA synchronous=FULL')
+    conexion.execute(
+        'CREATE TABLE IF NOT EXISTS eventos (id INTEGER PRIMARY KEY AUTOINCREMENT, datos TEXT NOT NULL)'
+    )
+    return conexion
+
+
+def _campos():
+    from .models import RegistroHistorico
+
+    return [campo.attname for campo in RegistroHistorico._meta.concrete_fields if not campo.primary_key]
+
+
+def encolar_eventos(eventos):
+    """Serializa y agrega a la cola; lanza si no se pudo escribir (nada queda a medias)."""
+    campos = _campos()
+    filas = [
+        (json.dumps({campo: getattr(registro, campo) for campo in campos}, cls=DjangoJSONEncoder),)
+        for registro in eventos
+    ]
+    with closing(_conectar()) as conexion, conexion:
+        conexion.executemany('INSERT INTO eventos (datos) VALUES (?)', filas)
+
+
+def _registro(datos):
+    from .models import RegistroHistorico
+
+    datos['fecha_evento'] = parse_datetime(datos['fecha_evento'])
+    return RegistroHistorico(**datos)
+
+
+def drenar_cola(tamano_lote=TAMANO_LOTE):
+    """
+    Inserta los eventos pendientes en RegistroHistorico, un bulk_create por lote,
+    en orden de llegada. Un error de la BD se propaga y deja el lote en la cola
+    para el próximo intento.
+
+    Returns:
+        int: Eventos insertados
+    """
+    from .models import RegistroHistorico
+
+    total = 0
+    with closing(_conectar()) as conexion:
+        while True:
+            filas = conexion.execute(
+                'SELECT id, datos FROM eventos ORDER BY id LIMIT ?', (tamano_lote,)
+            ).fetchall()
+            if not filas:
+                return total
+            with transaction.atomic():
+                RegistroHistorico.objects.bulk_create([_registro(json.loads(datos)) for _, datos in filas])
+            with conexion:
+                conexion.executemany('DELETE FROM eventos WHERE id = ?', [(id_,) for id_, _ in filas])
+            total += len(filas)
+
+
+def eventos_pendientes():
+    with closing(_conectar()) as conexion:
+        return conexion.execute('SELECT COUNT(*) FROM eventos').fetchone()[0]
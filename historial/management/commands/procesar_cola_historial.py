@@ -0,0 +1,40 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from historial.cola import TAMANO_LOTE, drenar_cola, eventos_pendientes
+
+
+class Command(BaseCommand):
+    help = 'Drena la cola local del historial (HISTORIAL_COLA_ARCHIVO) hacia RegistroHistorico'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE,
+                            help=f'Eventos por bulk_create (default: {TAMANO_LOTE})')
+        parser.add_argument('--continuo', action='store_true',
+                            help='No terminar: volver a drenar cada --intervalo segundos (worker)')
+        parser.add_argument('--intervalo', type=float, default=2.0,
+                            help='Segundos entre pasadas con --continuo (default: 2)')
+
+    def handle(self, *args, **options):
+        if not getattr(settings, 'HISTORIAL_COLA_ARCHIVO', ''):
+            raise CommandError('HISTORIAL_COLA_ARCHIVO no está configurado: los eventos se insertan directo')
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser al menos 1')
+
+        while True:
+            try:
+                insertados = drenar_cola(tamano_lote=options['lote'])
+            except Exception as e:
+                if not options['continuo']:
+                    raise CommandError(f'Error al drenar la cola (los eventos siguen en ella): {e}')
+                self.stderr.write(f'Error al drenar la cola, se reintenta: {e}')
+                insertados = 0
+            if insertados or not options['continuo']:
+                self.stdout.write(self.style.SUCCESS(
+                    f'✓ {insertados} eventos insertados, {eventos_pendientes()} pendientes'
+                ))
+            if not options['continuo']:
+                return
+            time.sleep(options['intervalo'])
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from historial.rendimiento import purgar_muestras
+
+
+class Command(BaseCommand):
+    help = 'Borra las muestras de rendimiento (PerfilSQLMiddleware) más antiguas que la retención'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int,
+                            help='Días a conservar (default: PERFIL_SQL_RETENCION_DIAS, 30)')
+
+    def handle(self, *args, **options):
+        if options['dias'] is not None and options['dias'] < 1:
+            raise CommandError('--dias debe ser al menos 1')
+
+        borradas = purgar_muestras(options['dias'])
+        self.stdout.write(self.style.SUCCESS(f'✓ {borradas} muestras borradas'))
@@ -1,9 +1,19 @@
 """
 Middleware para capturar el usuario actual en threadlocals.
 Permite que los signals accedan al usuario que realiza la acción.
+
+También incluye PerfilSQLMiddleware, que perfila una muestra de los requests
+(consultas, tiempo en BD, consultas repetidas) según PERFIL_SQL_MUESTREO.
 """
+import random
+import time
 from threading import local
 
+from django.conf import settings
+from django.db import connection
+
+from .rendimiento import PerfilSQL, guardar_muestra
+
 _thread_locals = local()
 
 
@@ -49,3 +59,35 @@ class CurrentUserMiddleware:
         set_current_user(None)
         
         return response
+
+
+class PerfilSQLMiddleware:
+    """
+    Middleware que perfila una fracción de los requests (PERFIL_SQL_MUESTREO,
+    entre 0 y 1; 0 lo desactiva).
+
+    En los requests muestreados agrega la cabecera Server-Timing (tiempo en BD
+    y total, visible en las DevTools del navegador) y guarda una
+    MuestraRendimiento para el reporte de endpoints más lentos.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        muestreo = getattr(settings, 'PERFIL_SQL_MUESTREO', 0)
+        if muestreo <= 0 or random.random() >= muestreo:
+            return self.get_response(request)
+
+        perfil = PerfilSQL()
+        inicio = time.perf_counter()
+        with connection.execute_wrapper(perfil):
+            response = self.get_response(request)
+        tiempo_total = time.perf_counter() - inicio
+
+        response['Server-Timing'] = (
+            f'db;dur={perfil.tiempo_sql * 1000:.1f};desc="{perfil.consultas} consultas", '
+            f'app;dur={tiempo_total * 1000:.1f}'
+        )
+        guardar_muestra(request, response, perfil, tiempo_total)
+        return response
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('historial', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MuestraRendimiento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('endpoint', models.CharField(help_text='Nombre de la vista (namespace:nombre)', max_length=200)),
+                ('metodo', models.CharField(max_length=10)),
+                ('status', models.PositiveSmallIntegerField()),
+                ('consultas', models.PositiveIntegerField(default=0)),
+                ('consultas_duplicadas', models.PositiveIntegerField(default=0, help_text='Consultas que repiten una huella ya ejecutada en el request')),
+                ('tiempo_sql_ms', models.FloatField(default=0)),
+                ('tiempo_total_ms', models.FloatField(default=0)),
+                ('huella_repetida', models.TextField(blank=True, help_text='Huella SQL más repetida')),
+                ('repeticiones', models.PositiveIntegerField(default=0)),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Muestra de rendimiento',
+                'verbose_name_plural': 'Muestras de rendimiento',
+                'db_table': 'muestra_rendimiento',
+                'ordering': ['-fecha'],
+                'indexes': [models.Index(fields=['endpoint', '-fecha'], name='muestra_ren_endpoin_5605d5_idx'), models.Index(fields=['-fecha'], name='muestra_ren_fecha_f360e0_idx')],
+            },
+        ),
+    ]
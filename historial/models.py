@@ -175,6 +175,10 @@ class RegistroHistorico(models.Model):
         Si el registro falla, captura la excepción y loggea el error
         sin interrumpir la operación principal.
         
+        El registro se escribe con historial.captura.encolar_evento(): dentro
+        de historial_en_lote() se inserta junto con los demás del bloque al
+        salir de él, así que el registro devuelto puede no tener pk aún.
+        
         Args:
             entidad (str): Tipo de entidad ('inventario', 'servicio', 'paciente')
             objeto_id (int): ID del objeto afectado
@@ -187,8 +191,10 @@ class RegistroHistorico(models.Model):
         Returns:
             RegistroHistorico or None: El registro creado o None si falló
         """
+        from .captura import encolar_evento
+        
         try:
-            return cls.objects.create(
+            registro = cls(
                 entidad=entidad,
                 objeto_id=objeto_id,
                 tipo_evento=tipo_evento,
@@ -197,6 +203,8 @@ class RegistroHistorico(models.Model):
                 datos_cambio=datos_cambio,
                 criticidad=criticidad
             )
+            encolar_evento(registro)
+            return registro
         except Exception as e:
             # Loggear el error pero no fallar la operación principal
             import logging
@@ -259,3 +267,39 @@ class RegistroHistorico(models.Model):
             'critica': 'text-danger',
         }
         return colores.get(self.criticidad, 'text-secondary')
+
+
+class MuestraRendimiento(models.Model):
+    """
+    Perfil SQL de un request muestreado por historial.middleware.PerfilSQLMiddleware.
+
+    Guarda totales por request (consultas, tiempo en BD y tiempo total) y la
+    consulta más repetida, para detectar patrones N+1 por endpoint.
+    """
+
+    endpoint = models.CharField(max_length=200, help_text='Nombre de la vista (namespace:nombre)')
+    metodo = models.CharField(max_length=10)
+    status = models.PositiveSmallIntegerField()
+    consultas = models.PositiveIntegerField(default=0)
+    consultas_duplicadas = models.PositiveIntegerField(
+        default=0,
+        help_text='Consultas que repiten una huella ya ejecutada en el request'
+    )
+    tiempo_sql_ms = models.FloatField(default=0)
+    tiempo_total_ms = models.FloatField(default=0)
+    huella_repetida = models.TextField(blank=True, help_text='Huella SQL más repetida')
+    repeticiones = models.PositiveIntegerField(default=0)
+    fecha = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'muestra_rendimiento'
+        verbose_name = 'Muestra de rendimiento'
+        verbose_name_plural = 'Muestras de rendimiento'
+        ordering = ['-fecha']
+        indexes = [
+            models.Index(fields=['endpoint', '-fecha']),
+            models.Index(fields=['-fecha']),
+        ]
+
+    def __str__(self):
+        return f"{self.metodo} {self.endpoint} - {self.consultas} consultas ({self.tiempo_total_ms:.0f} ms)"
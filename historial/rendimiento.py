@@ -0,0 +1,175 @@
+"""
+Perfil SQL por request.
+
+PerfilSQL se instala con connection.execute_wrapper() y acumula, para cada
+consulta, su tiempo y su huella (el SQL con los literales normalizados). Una
+huella ejecutada varias veces en el mismo request suele ser un patrón N+1.
+
+FUNCIONES:
+- huella_sql(): Normaliza un SQL para agrupar consultas equivalentes
+- guardar_muestra(): Persiste el perfil de un request muestreado
+- purgar_muestras(): Borra las muestras más antiguas que la retención
+- reporte_endpoints(): Endpoints ordenados por p95 de tiempo total
+"""
+
+import logging
+import math
+import random
+import re
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Largo máximo de huella guardada (el SQL completo de un listado puede ser enorme)
+LARGO_HUELLA = 2000
+
+# Días que se conservan las muestras (PERFIL_SQL_RETENCION_DIAS) y fracción de
+# guardados que además purgan las vencidas, para que la tabla no crezca sin límite
+RETENCION_DIAS = 30
+PROBABILIDAD_PURGA = 0.01
+
+_LISTA_PARAMETROS = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+_NUMEROS = re.compile(r'\b\d+\b')
+_CADENAS = re.compile(r"'(?:[^']|'')*'")
+
+
+def huella_sql(sql):
+    """
+    Huella de una consulta: literales y listas IN de largo variable se reemplazan,
+    así `WHERE id IN (%s, %s)` y `WHERE id IN (%s)` cuentan como la misma consulta.
+    """
+    sql = _CADENAS.sub('?', sql)
+    sql = _NUMEROS.sub('?', sql)
+    sql = _LISTA_PARAMETROS.sub('(...)', sql)
+    return sql.replace('%s', '?')
+
+
+class PerfilSQL:
+    """Wrapper de ejecución que cuenta consultas, tiempo en BD y huellas repetidas."""
+
+    def __init__(self):
+        self.consultas = 0
+        self.tiempo_sql = 0.0
+        self.huellas = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tiempo_sql += time.perf_counter() - inicio
+            self.consultas += 1
+            self.huellas[huella_sql(sql)] += 1
+
+    @property
+    def duplicadas(self):
+        return sum(veces - 1 for veces in self.huellas.values() if veces > 1)
+
+    def mas_repetida(self):
+        """(huella, veces) de la consulta más repetida, o ('', 0) si ninguna se repite."""
+        if not self.huellas:
+            return '', 0
+        huella, veces = self.huellas.most_common(1)[0]
+        return (huella, veces) if veces > 1 else ('', 0)
+
+
+def guardar_muestra(request, response, perfil, tiempo_total):
+    """
+    Persiste el perfil de un request. Un error al guardar solo se registra:
+    el perfilado nunca debe romper la respuesta.
+    """
+    from .models import MuestraRendimiento
+
+    match = getattr(request, 'resolver_match', None)
+    huella, veces = perfil.mas_repetida()
+    try:
+        MuestraRendimiento.objects.create(
+            endpoint=(match.view_name if match else 'sin_ruta')[:200],
+            metodo=request.method[:10],
+            status=response.status_code,
+            consultas=perfil.consultas,
+            consultas_duplicadas=perfil.duplicadas,
+            tiempo_sql_ms=round(perfil.tiempo_sql * 1000, 2),
+            tiempo_total_ms=round(tiempo_total * 1000, 2),
+            huella_repetida=huella[:LARGO_HUELLA],
+            repeticiones=veces,
+        )
+    except Exception:
+        logger.exception("No se pudo guardar la muestra de rendimiento de %s", request.path)
+        return
+    if random.random() < PROBABILIDAD_PURGA:
+        try:
+            purgar_muestras()
+        except Exception:
+            logger.exception("No se pudieron purgar las muestras de rendimiento")
+
+
+def purgar_muestras(dias=None):
+    """
+    Borra las muestras de más de `dias` (default: PERFIL_SQL_RETENCION_DIAS).
+    Sin relaciones ni signals, Django lo resuelve con un solo DELETE sobre el
+    índice de fecha.
+
+    Returns:
+        int: Muestras borradas
+    """
+    from .models import MuestraRendimiento
+
+    if dias is None:
+        dias = getattr(settings, 'PERFIL_SQL_RETENCION_DIAS', RETENCION_DIAS)
+    limite = timezone.now() - timedelta(days=dias)
+    return MuestraRendimiento.objects.filter(fecha__lt=limite).delete()[0]
+
+
+def _percentil(valores_ordenados, p):
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    if not valores_ordenados:
+        return 0
+    rango = max(1, math.ceil(p / 100 * len(valores_ordenados)))
+    return valores_ordenados[rango - 1]
+
+
+def reporte_endpoints(dias=7, limite=20):
+    """
+    Endpoints de los últimos `dias` ordenados por p95 de tiempo total.
+
+    Returns:
+        list: [{'endpoint', 'muestras', 'p50_ms', 'p95_ms', 'sql_p95_ms',
+                'consultas_p95', 'duplicadas_max', 'huella_repetida', 'repeticiones'}, ...]
+    """
+    from .models import MuestraRendimiento
+
+    muestras = MuestraRendimiento.objects.filter(
+        fecha__gte=timezone.now() - timedelta(days=dias)
+    ).values_list(
+        'endpoint', 'tiempo_total_ms', 'tiempo_sql_ms', 'consultas',
+        'consultas_duplicadas', 'huella_repetida', 'repeticiones',
+    )
+
+    por_endpoint = defaultdict(list)
+    for fila in muestras.iterator():
+        por_endpoint[fila[0]].append(fila)
+
+    reporte = []
+    for endpoint, filas in por_endpoint.items():
+        totales = sorted(f[1] for f in filas)
+        peor = max(filas, key=lambda f: f[6])
+        reporte.append({
+            'endpoint': endpoint,
+            'muestras': len(filas),
+            'p50_ms': _percentil(totales, 50),
+            'p95_ms': _percentil(totales, 95),
+            'sql_p95_ms': _percentil(sorted(f[2] for f in filas), 95),
+            'consultas_p95': _percentil(sorted(f[3] for f in filas), 95),
+            'duplicadas_max': max(f[4] for f in filas),
+            'huella_repetida': peor[5],
+            'repeticiones': peor[6],
+        })
+
+    reporte.sort(key=lambda fila: fila['p95_ms'], reverse=True)
+    return reporte[:limite]
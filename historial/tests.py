@@ -1,3 +1,184 @@
-from django.test import TestCase
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from cuentas.models import CustomUser
+from inventario.models import Insumo
+from inventario.services import descontar_stock
+
+from .captura import ATRIBUTO_ESTADO, historial_en_lote
+from .cola import eventos_pendientes
+from .models import MuestraRendimiento, RegistroHistorico
+from .rendimiento import huella_sql, reporte_endpoints
+
+
+class PerfilSQLTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user(
+            rut='11111111-1',
+            password='clave-segura-123',
+            nombre='Admin',
+            apellido='Demo',
+            correo='admin@example.com',
+            rol='administracion',
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_huella_agrupa_literales_y_listas_in(self):
+        self.assertEqual(
+            huella_sql('SELECT * FROM t WHERE id IN (%s, %s, %s) LIMIT 21'),
+            huella_sql("SELECT * FROM t WHERE id IN (%s) LIMIT 5"),
+        )
+
+    @override_settings(PERFIL_SQL_MUESTREO=1)
+    def test_request_muestreado_agrega_server_timing_y_guarda_muestra(self):
+        response = self.client.get(reverse('historial:rendimiento'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('app;dur=', response['Server-Timing'])
+        muestra = MuestraRendimiento.objects.get()
+        self.assertEqual(muestra.endpoint, 'historial:rendimiento')
+        self.assertGreater(muestra.consultas, 0)
+
+    def test_sin_muestreo_no_perfila(self):
+        response = self.client.get(reverse('historial:rendimiento'))
+
+        self.assertNotIn('Server-Timing', response)
+        self.assertFalse(MuestraRendimiento.objects.exists())
+
+    def test_reporte_ordena_por_p95(self):
+        for ms in (10, 12, 400):
+            MuestraRendimiento.objects.create(endpoint='lento', metodo='GET', status=200, tiempo_total_ms=ms)
+        MuestraRendimiento.objects.create(
+            endpoint='rapido', metodo='GET', status=200, tiempo_total_ms=50,
+            huella_repetida='SELECT ? FROM t WHERE id = ?', repeticiones=8,
+        )
+
+        reporte = reporte_endpoints()
+
+        self.assertEqual([fila['endpoint'] for fila in reporte], ['lento', 'rapido'])
+        self.assertEqual(reporte[0]['p95_ms'], 400)
+        self.assertEqual(reporte[1]['repeticiones'], 8)
+
+    def test_purga_muestras_vencidas(self):
+        vieja = MuestraRendimiento.objects.create(endpoint='vieja', metodo='GET', status=200)
+        MuestraRendimiento.objects.filter(pk=vieja.pk).update(fecha=timezone.now() - timedelta(days=31))
+        MuestraRendimiento.objects.create(endpoint='reciente', metodo='GET', status=200)
+
+        salida = StringIO()
+        call_command('purgar_muestras_rendimiento', stdout=salida)
+
+        self.assertIn('1 muestras borradas', salida.getvalue())
+        self.assertEqual(list(MuestraRendimiento.objects.values_list('endpoint', flat=True)), ['reciente'])
+
+
+class CapturaHistorialTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.a = Insumo.objects.create(medicamento='Amoxicilina', precio_venta=1000, stock_actual=5)
+        cls.b = Insumo.objects.create(medicamento='Meloxicam', stock_actual=2)
+
+    def test_editar_instancia_cargada_no_relee_la_fila(self):
+        insumo = Insumo.objects.get(pk=self.a.pk)
+        insumo.precio_venta = Decimal('1500')
+
+        with CaptureQueriesContext(connection) as consultas, self.captureOnCommitCallbacks(execute=True):
+            insumo.save()
+
+        selects = [q['sql'] for q in consultas.captured_queries if q['sql'].startswith('SELECT') and '"inventario"' in q['sql']]
+        self.assertEqual(selects, [])
+        registro = RegistroHistorico.objects.get(entidad='inventario', tipo_evento='actualizacion_precio')
+        self.assertEqual(registro.datos_cambio['antes'], 1000.0)
+
+    def test_update_fields_solo_compara_los_campos_escritos(self):
+        insumo = Insumo.objects.get(pk=self.a.pk)
+        insumo.precio_venta = Decimal('1500')
+        insumo.save(update_fields=['descripcion'])
+
+        self.assertFalse(RegistroHistorico.objects.filter(tipo_evento='actualizacion_precio').exists())
+
+    def test_estado_anterior_vive_en_la_instancia_y_se_descarta(self):
+        primera = Insumo.objects.get(pk=self.a.pk)
+        segunda = Insumo.objects.get(pk=self.a.pk)
+        primera.medicamento = None
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            primera.save()
+        self.assertNotIn(ATRIBUTO_ESTADO, primera.__dict__)
+
+        # Otra instancia del mismo pk compara contra su propia carga
+        segunda.precio_venta = Decimal('1200')
+        with self.captureOnCommitCallbacks(execute=True):
+            segunda.save()
+        self.assertNotIn(ATRIBUTO_ESTADO, segunda.__dict__)
+        registro = RegistroHistorico.objects.get(entidad='inventario', tipo_evento='actualizacion_precio')
+        self.assertEqual(registro.datos_cambio['antes'], 1000.0)
+
+    def test_movimiento_de_varios_insumos_es_un_insert(self):
+        with CaptureQueriesContext(connection) as consultas, self.captureOnCommitCallbacks(execute=True):
+            descontar_stock({self.a.pk: 1, self.b.pk: 1})
+
+        inserts = [q['sql'] for q in consultas.captured_queries if q['sql'].startswith('INSERT INTO "registro_historico"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(RegistroHistorico.objects.filter(tipo_evento='salida_stock').count(), 2)
+
+    def test_eventos_se_escriben_dentro_de_la_transaccion(self):
+        with CaptureQueriesContext(connection) as consultas, self.captureOnCommitCallbacks() as callbacks:
+            with transaction.atomic():
+                with historial_en_lote():
+                    for insumo in (self.a, self.b):
+                        RegistroHistorico.registrar_evento(
+                            entidad='inventario',
+                            objeto_id=insumo.pk,
+                            tipo_evento='modificacion_informacion',
+                            descripcion=f'Insumo "{insumo.medicamento}" revisado',
+                        )
+                # Antes del COMMIT ya están escritos: una caída después de él no los pierde
+                self.assertEqual(RegistroHistorico.objects.filter(tipo_evento='modificacion_informacion').count(), 2)
+
+        self.assertEqual(callbacks, [])
+        inserts = [q['sql'] for q in consultas.captured_queries if q['sql'].startswith('INSERT INTO "registro_historico"')]
+        self.assertEqual(len(inserts), 1)
+
+    def test_rollback_descarta_los_eventos(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    descontar_stock({self.a.pk: 1})
+                    raise IntegrityError('forzado')
+            except IntegrityError:
+                pass
+            descontar_stock({self.b.pk: 1})
+
+        self.assertEqual(
+            list(RegistroHistorico.objects.filter(tipo_evento='salida_stock').values_list('objeto_id', flat=True)),
+            [self.b.pk],
+        )
+
+    def test_cola_local_y_drenado(self):
+        with tempfile.TemporaryDirectory() as directorio:
+            with override_settings(HISTORIAL_COLA_ARCHIVO=str(Path(directorio) / 'cola.sqlite3')):
+                with self.captureOnCommitCallbacks(execute=True):
+                    descontar_stock({self.a.pk: 1, self.b.pk: 1})
+                self.assertFalse(RegistroHistorico.objects.filter(tipo_evento='salida_stock').exists())
+                self.assertEqual(eventos_pendientes(), 2)
+
+                call_command('procesar_cola_historial', stdout=StringIO())
+
+                self.assertEqual(eventos_pendientes(), 0)
+        self.assertEqual(
+            sorted(RegistroHistorico.objects.filter(tipo_evento='salida_stock').values_list('objeto_id', flat=True)),
+            sorted([self.a.pk, self.b.pk]),
+        )
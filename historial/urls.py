@@ -7,6 +7,9 @@ from . import views
 app_name = 'historial'
 
 urlpatterns = [
+    # Reporte de endpoints más lentos (solo administración)
+    path('rendimiento/', views.rendimiento_endpoints, name='rendimiento'),
+
     # Página completa de historial (detecta AJAX automáticamente)
     path('<str:entidad>/<int:objeto_id>/', 
          views.historial_detalle, 
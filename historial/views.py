@@ -1,7 +1,8 @@
 """
 Vistas para el sistema de historial genérico.
 """
-from django.shortcuts import render
+from django.conf import settings
+from django.shortcuts import redirect, render
 from django.core.paginator import Paginator
 from django.http import Http404
 from django.contrib.auth.decorators import login_required
@@ -9,6 +10,7 @@ from django.db.models import Count
 from collections import defaultdict
 
 from .models import RegistroHistorico
+from .rendimiento import reporte_endpoints
 
 
 @login_required
@@ -122,6 +124,28 @@ def historial_resumen(request, entidad, objeto_id):
     return render(request, 'historial/partials/historial_resumen.html', context)
 
 
+@login_required
+def rendimiento_endpoints(request):
+    """
+    Reporte de los endpoints más lentos por p95, con sus consultas repetidas
+    (posibles N+1). Parámetro opcional: dias (por defecto 7).
+    """
+    if not (request.user.is_superuser or request.user.rol == 'administracion'):
+        return redirect('dashboard:dashboard')
+
+    try:
+        dias = max(1, int(request.GET.get('dias', 7)))
+    except ValueError:
+        dias = 7
+
+    context = {
+        'endpoints': reporte_endpoints(dias=dias),
+        'dias': dias,
+        'muestreo': settings.PERFIL_SQL_MUESTREO,
+    }
+    return render(request, 'historial/rendimiento.html', context)
+
+
 # ===========================
 # FUNCIONES AUXILIARES
 # ===========================
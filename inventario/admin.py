@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django import forms
-from .models import Insumo
+from .models import Insumo, MovimientoInventario, PronosticoStock
 
 class InsumoAdminForm(forms.ModelForm):
     class Meta:
@@ -51,3 +51,35 @@ class InsumoAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+
+
+@admin.register(MovimientoInventario)
+class MovimientoInventarioAdmin(admin.ModelAdmin):
+    """Libro de movimientos de stock (solo lectura)."""
+    list_display = ['fecha', 'insumo', 'tipo', 'cantidad', 'saldo', 'origen', 'origen_id', 'usuario']
+    list_filter = ['tipo', 'origen', 'fecha']
+    search_fields = ['insumo__medicamento']
+    list_select_related = ['insumo', 'usuario']
+    date_hierarchy = 'fecha'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(PronosticoStock)
+class PronosticoStockAdmin(admin.ModelAdmin):
+    """Pronósticos de reposición (los escribe el comando pronosticar_stock)."""
+    list_display = ['insumo', 'stock_actual', 'consumo_diario', 'dias_cobertura', 'fecha_quiebre',
+                    'punto_reorden', 'cantidad_sugerida', 'requiere_reposicion', 'fecha_calculo']
+    list_filter = ['requiere_reposicion']
+    search_fields = ['insumo__medicamento']
+    list_select_related = ['insumo']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
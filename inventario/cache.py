@@ -0,0 +1,69 @@
+"""
+Versión del catálogo de productos.
+
+api_productos responde con ETag y Last-Modified derivados de la fila
+VersionCatalogo. Los signals de inventario/signals.py la incrementan con cada
+alta, edición, baja o movimiento de stock, al confirmarse el cambio, así que
+una llamada repetida sin cambios responde 304 con una sola consulta por clave
+primaria, sin leer el catálogo. Entre el COMMIT y el incremento una respuesta
+puede llevar datos nuevos con la versión anterior; el cliente vuelve a pedir
+el catálogo en cuanto la versión cambia.
+
+La versión vive en la base de datos y no en CACHES: con LocMemCache cada
+worker tendría la suya y los que no atendieron el cambio seguirían
+respondiendo 304 con stock y precios viejos.
+
+FUNCIONES:
+- version_catalogo(): (versión, fecha del último cambio)
+- invalidar_catalogo(): Incrementa la versión tras un cambio
+- etag_catalogo() / ultima_modificacion_catalogo(): Para @condition
+"""
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import VersionCatalogo
+
+ATRIBUTO_REQUEST = '_version_catalogo'
+
+
+def version_catalogo():
+    """(versión, fecha del último cambio) vigentes; (0, None) si aún no hay fila."""
+    fila = VersionCatalogo.objects.filter(pk=1).values_list('version', 'modificado').first()
+    return fila or (0, None)
+
+
+def _incrementar_version():
+    ahora = timezone.now()
+    if not VersionCatalogo.objects.filter(pk=1).update(version=F('version') + 1, modificado=ahora):
+        try:
+            # La migración crea la fila; si falta, se crea (otro proceso puede ganarle)
+            with transaction.atomic():
+                VersionCatalogo.objects.create(pk=1, version=1, modificado=ahora)
+        except IntegrityError:
+            VersionCatalogo.objects.filter(pk=1).update(version=F('version') + 1, modificado=ahora)
+
+
+def invalidar_catalogo():
+    """
+    Incrementa la versión al confirmarse la transacción, con su propio UPDATE
+    en autocommit: la fila única no queda bloqueada durante la transacción del
+    cambio, que así no se serializa con los demás movimientos de stock.
+    """
+    transaction.on_commit(_incrementar_version)
+
+
+def _version_request(request):
+    # ETag y Last-Modified de un mismo request comparten la consulta
+    if not hasattr(request, ATRIBUTO_REQUEST):
+        setattr(request, ATRIBUTO_REQUEST, version_catalogo())
+    return getattr(request, ATRIBUTO_REQUEST)
+
+
+def etag_catalogo(request, *args, **kwargs):
+    return f'catalogo-{_version_request(request)[0]}'
+
+
+def ultima_modificacion_catalogo(request, *args, **kwargs):
+    return _version_request(request)[1]
@@ -0,0 +1,160 @@
+"""
+Cálculo de envases por lote.
+
+calcular_envases_lote() aplica las reglas de Insumo.calcular_envases_requeridos()
+a un catálogo completo con un solo SELECT de las columnas necesarias, en vez
+de instanciar cada Insumo y calcular uno por uno. Con NumPy instalado el
+cálculo es vectorizado; sin NumPy se usa un recorrido en Python puro. Ambos
+caminos hacen las mismas operaciones en float y en el mismo orden que el
+método del modelo, así que el resultado es idéntico (incluidos los rechazos
+por rango de peso).
+
+FUNCIONES:
+- calcular_envases_lote(): {insumo_id: {'envases_requeridos', 'calculo_automatico'}}
+"""
+
+import math
+
+from django.db.models import QuerySet
+
+try:
+    import numpy as np
+except ImportError:  # NumPy es opcional: se usa el cálculo en Python puro
+    np = None
+
+CAMPOS = (
+    'pk', 'formato', 'ml_contenedor', 'cantidad_pastillas', 'unidades_pipeta',
+    'dosis_ml', 'peso_kg', 'tiene_rango_peso', 'peso_min_kg', 'peso_max_kg',
+)
+
+FORMATOS_ML = ('liquido', 'inyectable')
+FORMATOS_GENERICOS = ('polvo', 'crema', 'otro')
+
+SIN_CALCULO = {'envases_requeridos': 1, 'calculo_automatico': False}
+
+
+def _filas(insumos):
+    """Queryset -> values_list de CAMPOS; lista de Insumo -> tuplas equivalentes."""
+    if isinstance(insumos, QuerySet):
+        return list(insumos.values_list(*CAMPOS))
+    return [tuple(getattr(insumo, campo) for campo in CAMPOS) for insumo in insumos]
+
+
+def _fuera_de_rango(peso, minimo, maximo):
+    return bool((minimo and peso < float(minimo)) or (maximo and peso > float(maximo)))
+
+
+def _envases_python(filas, peso, dias):
+    resultado = {}
+    for pk, formato, ml, pastillas, pipeta, dosis, peso_ref, rango, minimo, maximo in filas:
+        if formato in FORMATOS_ML or formato in FORMATOS_GENERICOS:
+            contenido = float(ml) if ml else None
+        elif formato == 'pastilla':
+            contenido = float(pastillas) if pastillas else None
+        elif formato == 'pipeta':
+            contenido = float(pipeta) if pipeta else None
+        else:
+            contenido = None
+        if not contenido or contenido <= 0:
+            resultado[pk] = dict(SIN_CALCULO)
+            continue
+
+        if formato in FORMATOS_ML:
+            if not dosis:
+                resultado[pk] = dict(SIN_CALCULO)
+                continue
+            if peso_ref and peso_ref > 0:
+                diaria = float(dosis) * (peso / float(peso_ref))
+            else:
+                diaria = float(dosis)
+            total = diaria * dias
+        elif formato == 'pastilla':
+            if peso_ref and peso_ref > 0 and rango and _fuera_de_rango(peso, minimo, maximo):
+                resultado[pk] = dict(SIN_CALCULO)
+                continue
+            total = (float(pastillas) if pastillas else 1) * dias
+        elif formato == 'pipeta':
+            if rango and _fuera_de_rango(peso, minimo, maximo):
+                resultado[pk] = dict(SIN_CALCULO)
+                continue
+            total = 1 * dias
+        else:
+            if not dosis:
+                resultado[pk] = dict(SIN_CALCULO)
+                continue
+            total = float(dosis) * dias
+
+        if total > 0:
+            resultado[pk] = {'envases_requeridos': math.ceil(total / contenido), 'calculo_automatico': True}
+        else:
+            resultado[pk] = dict(SIN_CALCULO)
+    return resultado
+
+
+def _envases_numpy(filas, peso, dias):
+    pks, formato, ml, pastillas, pipeta, dosis, peso_ref, rango, minimo, maximo = zip(*filas)
+
+    def numeros(valores):
+        # None y 0 son "no definido" en el modelo; ambos quedan en 0.0
+        return np.array([float(v) if v else 0.0 for v in valores], dtype=np.float64)
+
+    formato = np.array([f or '' for f in formato])
+    ml, pastillas, pipeta, dosis, peso_ref, minimo, maximo = map(
+        numeros, (ml, pastillas, pipeta, dosis, peso_ref, minimo, maximo)
+    )
+    rango = np.array([bool(r) for r in rango])
+
+    es_ml = np.isin(formato, FORMATOS_ML)
+    es_generico = np.isin(formato, FORMATOS_GENERICOS)
+    es_pastilla = formato == 'pastilla'
+    es_pipeta = formato == 'pipeta'
+
+    contenido = np.select([es_ml | es_generico, es_pastilla, es_pipeta], [ml, pastillas, pipeta], 0.0)
+
+    factor = np.divide(peso, peso_ref, out=np.ones_like(peso_ref), where=peso_ref > 0)
+    diaria_ml = np.where(peso_ref > 0, dosis * factor, dosis)
+    total = np.select(
+        [es_ml, es_pastilla, es_pipeta, es_generico],
+        [diaria_ml * dias, np.where(pastillas != 0, pastillas, 1.0) * dias, np.full_like(dosis, 1 * dias), dosis * dias],
+        0.0,
+    )
+
+    fuera_de_rango = rango & (((minimo != 0) & (peso < minimo)) | ((maximo != 0) & (peso > maximo)))
+    rechazado = (
+        ((es_ml | es_generico) & (dosis == 0))
+        | (es_pastilla & (peso_ref > 0) & fuera_de_rango)
+        | (es_pipeta & fuera_de_rango)
+    )
+    automatico = (contenido > 0) & ~rechazado & (total > 0)
+    envases = np.ones(len(pks), dtype=np.int64)
+    envases[automatico] = np.ceil(total[automatico] / contenido[automatico])
+
+    return {
+        pk: {'envases_requeridos': int(n), 'calculo_automatico': bool(auto)}
+        for pk, n, auto in zip(pks, envases.tolist(), automatico.tolist())
+    }
+
+
+def calcular_envases_lote(insumos, peso_paciente_kg, dias_tratamiento=1):
+    """
+    Envases requeridos de cada insumo para un paciente y un tratamiento.
+
+    Args:
+        insumos: QuerySet o lista de Insumo
+        peso_paciente_kg (float): Peso del paciente en kg
+        dias_tratamiento (int): Días de duración del tratamiento (default: 1)
+
+    Returns:
+        dict: {insumo_id: {'envases_requeridos': int, 'calculo_automatico': bool}},
+              con los mismos valores que Insumo.calcular_envases_requeridos()
+    """
+    filas = _filas(insumos)
+    if not peso_paciente_kg or peso_paciente_kg <= 0:
+        return {fila[0]: dict(SIN_CALCULO) for fila in filas}
+    if not filas:
+        return {}
+
+    peso = float(peso_paciente_kg)
+    if np is not None:
+        return _envases_numpy(filas, peso, dias_tratamiento)
+    return _envases_python(filas, peso, dias_tratamiento)
@@ -0,0 +1,60 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from inventario.models import Insumo, MovimientoInventario
+from inventario.services import INGRESO, SALIDA, conciliar_stock, stock_a_fecha
+
+
+class Command(BaseCommand):
+    help = 'Concilia Insumo.stock_actual contra el libro MovimientoInventario'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--corregir',
+            action='store_true',
+            help='Registra un ajuste por cada diferencia para que el libro cuadre con stock_actual',
+        )
+        parser.add_argument(
+            '--fecha',
+            type=date.fromisoformat,
+            help='Además, muestra el stock de cada insumo al cierre de esta fecha (YYYY-MM-DD)',
+        )
+
+    def handle(self, *args, **options):
+        if options.get('fecha'):
+            self._stock_a_fecha(options['fecha'])
+
+        diferencias = conciliar_stock()
+        if not diferencias:
+            self.stdout.write(self.style.SUCCESS('✓ El libro de movimientos cuadra con el stock actual'))
+            return
+
+        for fila in diferencias:
+            self.stdout.write(
+                f"  {fila['insumo_id']:>6} {fila['medicamento'][:40]:<40} "
+                f"stock={fila['stock_actual']} libro={fila['saldo_libro']}"
+            )
+        self.stdout.write(self.style.WARNING(f'{len(diferencias)} insumos con diferencias'))
+
+        if options['corregir']:
+            with transaction.atomic():
+                MovimientoInventario.objects.bulk_create([
+                    MovimientoInventario(
+                        insumo_id=fila['insumo_id'],
+                        tipo=INGRESO if fila['stock_actual'] > fila['saldo_libro'] else SALIDA,
+                        origen='ajuste',
+                        cantidad=fila['stock_actual'] - fila['saldo_libro'],
+                        saldo=fila['stock_actual'],
+                    )
+                    for fila in diferencias
+                ])
+            self.stdout.write(self.style.SUCCESS(f'✓ {len(diferencias)} ajustes registrados'))
+
+    def _stock_a_fecha(self, fecha):
+        saldos = stock_a_fecha(fecha)
+        nombres = dict(Insumo.objects.values_list('idInventario', 'medicamento'))
+        self.stdout.write(f'Stock al cierre del {fecha}:')
+        for insumo_id, saldo in sorted(saldos.items()):
+            self.stdout.write(f'  {insumo_id:>6} {nombres[insumo_id][:40]:<40} {saldo}')
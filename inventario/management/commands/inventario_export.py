@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from inventario.planillas import exportar_insumos
+
+
+class Command(BaseCommand):
+    help = 'Exporta el catálogo de insumos a una planilla .xlsx o .csv (re-importable)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta de salida .xlsx o .csv')
+        parser.add_argument('--archivados', action='store_true', help='Incluye los insumos archivados')
+
+    def handle(self, *args, **options):
+        try:
+            total = exportar_insumos(options['archivo'], incluir_archivados=options['archivados'])
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f"✓ {total} insumos exportados a {options['archivo']}"))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from inventario.planillas import TAMANO_LOTE, importar_insumos, leer_planilla
+
+
+class Command(BaseCommand):
+    help = 'Importa el catálogo de insumos desde una planilla .xlsx o .csv (upsert por SKU)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Planilla .xlsx o .csv con encabezado (columnas = campos de Insumo)')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE,
+                            help=f'Filas por lote de validación y escritura (default: {TAMANO_LOTE})')
+        parser.add_argument('--simular', action='store_true',
+                            help='Valida e informa sin guardar cambios')
+
+    def handle(self, *args, **options):
+        try:
+            filas = leer_planilla(options['archivo'])
+            with transaction.atomic():
+                resumen = importar_insumos(filas, tamano_lote=max(1, options['lote']))
+                if options['simular']:
+                    transaction.set_rollback(True)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for numero, mensaje in resumen['errores']:
+            self.stdout.write(self.style.WARNING(f'  Fila {numero}: {mensaje}'))
+
+        prefijo = '(simulación) ' if options['simular'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {prefijo}{resumen['procesadas']} filas: {resumen['creados']} creados, "
+            f"{resumen['actualizados']} actualizados, {len(resumen['errores'])} con errores"
+        ))
@@ -0,0 +1,44 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventario.pronostico import (
+    COBERTURA_OBJETIVO_DIAS,
+    PLAZO_REPOSICION_DIAS,
+    VENTANA_DIAS,
+    calcular_pronosticos,
+    insumos_a_reponer,
+)
+
+
+class Command(BaseCommand):
+    help = 'Calcula consumo, días de cobertura y reposición sugerida por insumo (tarea programada, p. ej. diaria)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ventana', type=int, default=VENTANA_DIAS,
+                            help=f'Días de consumo a promediar (default: {VENTANA_DIAS})')
+        parser.add_argument('--plazo', type=int, default=PLAZO_REPOSICION_DIAS,
+                            help=f'Días que demora una reposición (default: {PLAZO_REPOSICION_DIAS})')
+        parser.add_argument('--cobertura', type=int, default=COBERTURA_OBJETIVO_DIAS,
+                            help=f'Días de consumo que debe cubrir un pedido (default: {COBERTURA_OBJETIVO_DIAS})')
+        parser.add_argument('--fecha', type=date.fromisoformat,
+                            help='Fecha del cálculo YYYY-MM-DD (por defecto, hoy)')
+
+    def handle(self, *args, **options):
+        if options['ventana'] < 1 or options['plazo'] < 0 or options['cobertura'] < 0:
+            raise CommandError('--ventana debe ser al menos 1; --plazo y --cobertura no pueden ser negativos')
+
+        filas = calcular_pronosticos(
+            ventana_dias=options['ventana'],
+            plazo_dias=options['plazo'],
+            cobertura_dias=options['cobertura'],
+            hoy=options.get('fecha'),
+        )
+        self.stdout.write(self.style.SUCCESS(f'✓ {filas} pronósticos escritos'))
+
+        for pronostico in insumos_a_reponer(limite=None):
+            self.stdout.write(
+                f'  {pronostico.insumo_id:>6} {pronostico.insumo.medicamento[:40]:<40} '
+                f'stock={pronostico.stock_actual} cobertura={pronostico.dias_cobertura or "-"} '
+                f'pedir={pronostico.cantidad_sugerida}'
+            )
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:20
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def abrir_libro(apps, schema_editor):
+    """Saldo de apertura: un ajuste por insumo con el stock actual al crear el libro"""
+    Insumo = apps.get_model('inventario', 'Insumo')
+    MovimientoInventario = apps.get_model('inventario', 'MovimientoInventario')
+    MovimientoInventario.objects.bulk_create(
+        [
+            MovimientoInventario(
+                insumo_id=insumo_id,
+                tipo='ingreso_stock' if stock > 0 else 'salida_stock',
+                origen='ajuste',
+                cantidad=stock,
+                saldo=stock,
+            )
+            for insumo_id, stock in Insumo.objects.exclude(stock_actual=0).values_list('idInventario', 'stock_actual')
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0006_actualizar_tipos_movimiento'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimientoInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('ingreso_stock', 'Ingreso de Stock'), ('salida_stock', 'Salida de Stock')], max_length=30)),
+                ('origen', models.CharField(choices=[('consulta', 'Consulta'), ('hospitalizacion', 'Hospitalización'), ('venta', 'Venta'), ('ajuste', 'Ajuste')], default='ajuste', max_length=20)),
+                ('origen_id', models.PositiveIntegerField(blank=True, help_text='ID de la consulta, hospitalización o venta', null=True)),
+                ('cantidad', models.IntegerField(help_text='Positiva en ingresos, negativa en salidas')),
+                ('saldo', models.IntegerField(help_text='Stock del insumo después del movimiento')),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('insumo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimientos', to='inventario.insumo')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Movimiento de inventario',
+                'verbose_name_plural': 'Movimientos de inventario',
+                'db_table': 'movimiento_inventario',
+                'ordering': ['-fecha', '-id'],
+                'indexes': [models.Index(fields=['insumo', 'fecha'], name='movimiento__insumo__4ada9a_idx'), models.Index(fields=['origen', 'origen_id'], name='movimiento__origen_e19f4b_idx')],
+            },
+        ),
+        migrations.RunPython(abrir_libro, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:27
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Lower, Trim
+
+
+def normalizar_catalogo(apps, schema_editor):
+    """Especie en minúsculas (vacía -> NULL) y dosis_display calculado para los insumos existentes"""
+    from inventario.models import Insumo as InsumoActual
+
+    Insumo = apps.get_model('inventario', 'Insumo')
+    Insumo.objects.update(especie=Lower(Trim('especie')))
+    Insumo.objects.filter(especie='').update(especie=None)
+
+    insumos = list(Insumo.objects.all())
+    for insumo in insumos:
+        # El modelo histórico no tiene métodos: se usa el del modelo actual
+        insumo.dosis_display = InsumoActual.get_dosis_display(insumo)[:120]
+    Insumo.objects.bulk_update(insumos, ['dosis_display'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0007_movimientoinventario'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='insumo',
+            name='dosis_display',
+            field=models.CharField(default='-', editable=False, max_length=120),
+        ),
+        migrations.AddIndex(
+            model_name='insumo',
+            index=models.Index(condition=models.Q(('stock_actual__gt', 0)), fields=['archivado', 'especie', 'medicamento', 'idInventario'], name='inventario_catalogo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='insumo',
+            index=models.Index(fields=['tiene_rango_peso', 'peso_min_kg', 'peso_max_kg'], name='inventario_rango_peso_idx'),
+        ),
+        migrations.RunPython(normalizar_catalogo, migrations.RunPython.noop),
+    ]
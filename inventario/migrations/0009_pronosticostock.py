@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:29
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0008_catalogo_productos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PronosticoStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stock_actual', models.IntegerField(help_text='Stock al momento del cálculo')),
+                ('consumo_diario', models.DecimalField(decimal_places=3, help_text='Consumo promedio por día', max_digits=12)),
+                ('dias_cobertura', models.DecimalField(blank=True, decimal_places=1, help_text='Días que alcanza el stock al consumo promedio (vacío si no hay consumo)', max_digits=12, null=True)),
+                ('fecha_quiebre', models.DateField(blank=True, help_text='Fecha estimada en que se agota el stock', null=True)),
+                ('punto_reorden', models.IntegerField(help_text='Stock mínimo + consumo durante el plazo de reposición')),
+                ('cantidad_sugerida', models.IntegerField(default=0, help_text='Unidades a pedir (0 si no requiere reposición)')),
+                ('requiere_reposicion', models.BooleanField(default=False)),
+                ('ventana_dias', models.PositiveIntegerField(help_text='Días de consumo considerados')),
+                ('fecha_calculo', models.DateTimeField(default=django.utils.timezone.now)),
+                ('insumo', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='pronostico', to='inventario.insumo')),
+            ],
+            options={
+                'verbose_name': 'Pronóstico de stock',
+                'verbose_name_plural': 'Pronósticos de stock',
+                'db_table': 'pronostico_stock',
+                'ordering': ['fecha_quiebre'],
+                'indexes': [models.Index(fields=['requiere_reposicion', 'fecha_quiebre'], name='pronostico__requier_cf6a49_idx')],
+            },
+        ),
+    ]
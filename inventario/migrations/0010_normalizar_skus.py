@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:31
+
+from collections import defaultdict
+
+from django.db import migrations
+from django.db.models import Count
+from django.db.models.functions import Trim
+
+
+def normalizar_skus(apps, schema_editor):
+    """
+    SKU vacío -> NULL. Si quedan SKUs repetidos la migración se detiene y los
+    lista: son identificadores de negocio (lectores de código de barras,
+    planillas) y los debe corregir el personal, no la migración.
+    """
+    Insumo = apps.get_model('inventario', 'Insumo')
+    Insumo.objects.update(sku=Trim('sku'))
+    Insumo.objects.filter(sku='').update(sku=None)
+
+    repetidos = defaultdict(list)
+    skus = Insumo.objects.exclude(sku=None).order_by().values('sku').annotate(n=Count('idInventario')).filter(n__gt=1).values('sku')
+    for insumo in Insumo.objects.filter(sku__in=skus).order_by('sku', 'idInventario'):
+        repetidos[insumo.sku].append(f'{insumo.idInventario} ({insumo.medicamento})')
+    if repetidos:
+        detalle = '\n'.join(f"  SKU '{sku}': insumos {', '.join(insumos)}" for sku, insumos in repetidos.items())
+        raise RuntimeError(
+            f"SKU repetidos ({len(repetidos)}); corríjalos en el admin de Inventario y vuelva a ejecutar migrate:\n"
+            f"{detalle}"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0009_pronosticostock'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalizar_skus, migrations.RunPython.noop),
+    ]
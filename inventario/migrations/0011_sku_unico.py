@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0010_normalizar_skus'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='insumo',
+            constraint=models.UniqueConstraint(fields=('sku',), name='inventario_sku_unico'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:02
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def crear_version(apps, schema_editor):
+    """La fila única que invalidar_catalogo() incrementa"""
+    VersionCatalogo = apps.get_model('inventario', 'VersionCatalogo')
+    VersionCatalogo.objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0011_sku_unico'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionCatalogo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('modificado', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Versión del catálogo',
+                'verbose_name_plural': 'Versión del catálogo',
+                'db_table': 'version_catalogo',
+            },
+        ),
+        migrations.RunPython(crear_version, migrations.RunPython.noop),
+    ]
@@ -2,8 +2,10 @@
 from django.db import models
 from django.conf import settings
 from django.utils import timezone
+from decimal import Decimal
+from historial.captura import SnapshotCargaMixin
 
-class Insumo(models.Model):
+class Insumo(SnapshotCargaMixin, models.Model):
     TIPO_MOVIMIENTO_CHOICES = [
         ('ingreso_stock', 'Ingreso de Stock'),
         ('salida_stock', 'Salida de Stock'),
@@ -62,6 +64,9 @@ class Insumo(models.Model):
     peso_min_kg = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, help_text="Peso mínimo en kg")
     peso_max_kg = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, help_text="Peso máximo en kg")
     
+    # Texto de get_dosis_display(), guardado en save() para el catálogo de api_productos
+    dosis_display = models.CharField(max_length=120, default='-', editable=False)
+    
     # Campos informativos
     precauciones = models.TextField(blank=True, null=True)
     contraindicaciones = models.TextField(blank=True, null=True)
@@ -79,10 +84,47 @@ class Insumo(models.Model):
         verbose_name = 'Insumo'
         verbose_name_plural = 'Insumos'
         ordering = ['medicamento']
+        indexes = [
+            # Catálogo de api_productos: activos con stock, por especie y en orden de cursor
+            models.Index(
+                fields=['archivado', 'especie', 'medicamento', 'idInventario'],
+                condition=models.Q(stock_actual__gt=0),
+                name='inventario_catalogo_idx',
+            ),
+            models.Index(fields=['tiene_rango_peso', 'peso_min_kg', 'peso_max_kg'], name='inventario_rango_peso_idx'),
+        ]
+        constraints = [
+            # Clave de la importación masiva (upsert por SKU); admite varios NULL
+            models.UniqueConstraint(fields=['sku'], name='inventario_sku_unico'),
+        ]
     
     def __str__(self):
         return self.medicamento
     
+    def normalizar_campos(self):
+        """
+        Normaliza los campos derivados antes de guardar. save() la llama siempre;
+        quien guarde con bulk_create (importación) debe llamarla a mano.
+        """
+        # SKU único o NULL: un SKU vacío no debe chocar con otros vacíos
+        self.sku = (self.sku or '').strip() or None
+        # Especie en minúsculas y sin vacíos: el catálogo filtra por igualdad exacta
+        self.especie = (self.especie or '').strip().lower() or None
+        # Decimales con la escala de la BD, para que el texto coincida con el de una instancia leída
+        for campo in ('dosis_ml', 'peso_kg', 'peso_min_kg', 'peso_max_kg'):
+            valor = getattr(self, campo)
+            if valor not in (None, ''):
+                field = self._meta.get_field(campo)
+                setattr(self, campo, field.to_python(valor).quantize(Decimal(1).scaleb(-field.decimal_places)))
+        self.dosis_display = self.get_dosis_display()[:120]
+    
+    def save(self, *args, **kwargs):
+        self.normalizar_campos()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'dosis_display'}
+        super().save(*args, **kwargs)
+    
     def get_usuario_nombre_completo(self):
         if self.usuario_ultimo_movimiento:
             return f"{self.usuario_ultimo_movimiento.nombre} {self.usuario_ultimo_movimiento.apellido}"
@@ -286,3 +328,102 @@ class Insumo(models.Model):
             resultado['detalle'] = "No se pudo calcular automáticamente - valores insuficientes"
         
         return resultado
+
+
+class MovimientoInventario(models.Model):
+    """
+    Libro de movimientos de stock (solo se agregan filas).
+
+    Cada fila es un movimiento de un insumo con su cantidad (positiva en
+    ingresos, negativa en salidas) y el saldo resultante, escrita en la misma
+    transacción que el cambio de Insumo.stock_actual. El saldo de la última
+    fila de un insumo debe coincidir con su stock_actual (ver
+    inventario.services.conciliar_stock).
+    """
+
+    ORIGEN_CHOICES = [
+        ('consulta', 'Consulta'),
+        ('hospitalizacion', 'Hospitalización'),
+        ('venta', 'Venta'),
+        ('ajuste', 'Ajuste'),
+    ]
+
+    insumo = models.ForeignKey(Insumo, on_delete=models.CASCADE, related_name='movimientos')
+    tipo = models.CharField(max_length=30, choices=Insumo.TIPO_MOVIMIENTO_CHOICES[:2])
+    origen = models.CharField(max_length=20, choices=ORIGEN_CHOICES, default='ajuste')
+    origen_id = models.PositiveIntegerField(null=True, blank=True, help_text='ID de la consulta, hospitalización o venta')
+    cantidad = models.IntegerField(help_text='Positiva en ingresos, negativa en salidas')
+    saldo = models.IntegerField(help_text='Stock del insumo después del movimiento')
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    fecha = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'movimiento_inventario'
+        verbose_name = 'Movimiento de inventario'
+        verbose_name_plural = 'Movimientos de inventario'
+        ordering = ['-fecha', '-id']
+        indexes = [
+            models.Index(fields=['insumo', 'fecha']),
+            models.Index(fields=['insumo', '-id'], name='movimiento_insumo_ultimo_idx'),
+            models.Index(fields=['origen', 'origen_id']),
+        ]
+
+    def __str__(self):
+        return f"{self.insumo_id}: {self.cantidad:+d} → {self.saldo} ({self.get_origen_display()})"
+
+
+class PronosticoStock(models.Model):
+    """
+    Pronóstico de consumo y reposición de un insumo (una fila por insumo).
+
+    Lo escribe el comando `pronosticar_stock` (tarea programada) a partir del
+    libro MovimientoInventario; el dashboard solo lee estas filas. Ver
+    inventario.pronostico para el detalle del cálculo.
+    """
+
+    insumo = models.OneToOneField(Insumo, on_delete=models.CASCADE, related_name='pronostico')
+    stock_actual = models.IntegerField(help_text='Stock al momento del cálculo')
+    consumo_diario = models.DecimalField(max_digits=12, decimal_places=3, help_text='Consumo promedio por día')
+    dias_cobertura = models.DecimalField(
+        max_digits=12, decimal_places=1, null=True, blank=True,
+        help_text='Días que alcanza el stock al consumo promedio (vacío si no hay consumo)'
+    )
+    fecha_quiebre = models.DateField(null=True, blank=True, help_text='Fecha estimada en que se agota el stock')
+    punto_reorden = models.IntegerField(help_text='Stock mínimo + consumo durante el plazo de reposición')
+    cantidad_sugerida = models.IntegerField(default=0, help_text='Unidades a pedir (0 si no requiere reposición)')
+    requiere_reposicion = models.BooleanField(default=False)
+    ventana_dias = models.PositiveIntegerField(help_text='Días de consumo considerados')
+    fecha_calculo = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'pronostico_stock'
+        verbose_name = 'Pronóstico de stock'
+        verbose_name_plural = 'Pronósticos de stock'
+        ordering = ['fecha_quiebre']
+        indexes = [
+            models.Index(fields=['requiere_reposicion', 'fecha_quiebre']),
+        ]
+
+    def __str__(self):
+        return f"{self.insumo_id}: {self.dias_cobertura} días de cobertura"
+
+
+class VersionCatalogo(models.Model):
+    """
+    Versión del catálogo de productos (una sola fila, pk=1).
+
+    invalidar_catalogo() la incrementa al confirmarse cada cambio de insumos;
+    api_productos arma su ETag y Last-Modified desde esta fila, así que todos
+    los procesos ven la misma versión.
+    """
+
+    version = models.PositiveBigIntegerField(default=0)
+    modificado = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'version_catalogo'
+        verbose_name = 'Versión del catálogo'
+        verbose_name_plural = 'Versión del catálogo'
+
+    def __str__(self):
+        return f"Catálogo v{self.version}"
@@ -0,0 +1,275 @@
+"""
+Importación y exportación masiva del catálogo de insumos (XLSX / CSV).
+
+- Importación: lee la planilla fila a fila (openpyxl en modo read_only, o
+  csv), valida por lotes con las reglas de los campos del modelo y hace upsert
+  por SKU con bulk_create(update_conflicts=True). Una fila inválida se informa
+  con su número y no detiene el resto. No pasa por Insumo.save() ni por sus
+  signals: el stock no se importa (se mueve con inventario.services) y solo
+  los cambios de precio quedan en el historial.
+- Exportación: xlsxwriter en modo constant_memory y .iterator() sobre el
+  queryset, así la memoria no crece con el tamaño del catálogo.
+
+FUNCIONES:
+- leer_planilla(): Filas (número, {columna: valor}) de un .xlsx o .csv
+- importar_insumos(): Valida y hace upsert por lotes
+- exportar_insumos(): Escribe el catálogo a .xlsx o .csv
+"""
+
+import csv
+from decimal import Decimal
+from itertools import islice
+from pathlib import Path
+
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+from django.db.models import BooleanField, DecimalField
+
+from historial.captura import historial_en_lote
+from historial.utils import registrar_cambio_precio
+
+from .cache import invalidar_catalogo
+from .models import Insumo
+
+# Columnas de la planilla (= campos de Insumo); stock_actual y archivado solo se exportan
+COLUMNAS_IMPORTABLES = (
+    'sku', 'medicamento', 'marca', 'tipo', 'formato', 'especie', 'descripcion', 'precio_venta',
+    'stock_minimo', 'stock_medio', 'dosis_ml', 'ml_contenedor', 'cantidad_pastillas', 'unidades_pipeta',
+    'peso_kg', 'tiene_rango_peso', 'peso_min_kg', 'peso_max_kg',
+    'precauciones', 'contraindicaciones', 'efectos_adversos',
+)
+COLUMNAS_EXPORTACION = COLUMNAS_IMPORTABLES + ('stock_actual', 'archivado')
+COLUMNAS_OBLIGATORIAS = ('sku', 'medicamento')
+
+TAMANO_LOTE = 500
+
+VERDADEROS = {'1', 'true', 't', 'si', 'sí', 's', 'x', 'verdadero'}
+
+
+def _columna(nombre):
+    return str(nombre or '').strip().lower().replace(' ', '_')
+
+
+# =============================================================================
+# LECTURA
+# =============================================================================
+
+def _leer_xlsx(ruta):
+    from openpyxl import load_workbook
+
+    libro = load_workbook(ruta, read_only=True, data_only=True)
+    try:
+        filas = libro.active.iter_rows(values_only=True)
+        encabezado = [_columna(nombre) for nombre in next(filas, ())]
+        for numero, valores in enumerate(filas, start=2):
+            if any(valor not in (None, '') for valor in valores):
+                yield numero, dict(zip(encabezado, valores))
+    finally:
+        libro.close()
+
+
+def _leer_csv(ruta):
+    with open(ruta, newline='', encoding='utf-8-sig') as archivo:
+        try:
+            dialecto = csv.Sniffer().sniff(archivo.read(4096), delimiters=',;\t')
+        except csv.Error:
+            dialecto = csv.excel
+        archivo.seek(0)
+        lector = csv.reader(archivo, dialecto)
+        encabezado = [_columna(nombre) for nombre in next(lector, [])]
+        for valores in lector:
+            if any(valor.strip() for valor in valores):
+                yield lector.line_num, dict(zip(encabezado, valores))
+
+
+def leer_planilla(ruta):
+    """Generador de (número de fila, {columna: valor}); la fila 1 es el encabezado."""
+    extension = Path(ruta).suffix.lower()
+    if extension == '.csv':
+        return _leer_csv(ruta)
+    if extension in ('.xlsx', '.xlsm'):
+        return _leer_xlsx(ruta)
+    raise ValueError(f"Formato no soportado: '{extension}' (use .xlsx o .csv)")
+
+
+# =============================================================================
+# IMPORTACIÓN
+# =============================================================================
+
+def _limpiar(valores, campos):
+    """{columna: valor} -> {campo: valor validado}; ValidationError con todos los errores de la fila."""
+    datos = {}
+    errores = []
+    for campo in campos:
+        field = Insumo._meta.get_field(campo)
+        valor = valores.get(campo)
+        if isinstance(valor, str):
+            valor = valor.strip()
+        try:
+            if isinstance(field, BooleanField):
+                valor = str(valor).lower() in VERDADEROS if valor not in (None, '') else False
+            elif valor in (None, ''):
+                valor = None if field.null else ('' if field.blank else field.get_default())
+            elif campo in ('formato', 'especie'):
+                valor = str(valor).lower()
+            elif isinstance(field, DecimalField) and isinstance(valor, str):
+                valor = valor.replace(',', '.')
+            elif isinstance(valor, float) and not isinstance(field, DecimalField):
+                valor = int(valor) if valor.is_integer() else valor
+            datos[campo] = field.clean(valor, None)
+        except ValidationError as e:
+            errores.extend(f"{campo}: {mensaje}" for mensaje in e.messages)
+    if not datos.get('sku') and not any(error.startswith('sku:') for error in errores):
+        errores.append('sku: requerido para importar')
+    if errores:
+        raise ValidationError(errores)
+    return datos
+
+
+def _upsert(insumos, campos_actualizar):
+    Insumo.objects.bulk_create(
+        insumos,
+        update_conflicts=True,
+        unique_fields=['sku'],
+        update_fields=campos_actualizar,
+    )
+
+
+def _importar_lote(lote, campos, resumen, skus_vistos, usuario):
+    validos = []
+    for numero, valores in lote:
+        try:
+            datos = _limpiar(valores, campos)
+        except ValidationError as e:
+            resumen['errores'].append((numero, '; '.join(e.messages)))
+            continue
+        if datos['sku'] in skus_vistos:
+            resumen['errores'].append((numero, f"SKU '{datos['sku']}' repetido en la planilla"))
+            continue
+        skus_vistos.add(datos['sku'])
+        validos.append((numero, datos))
+    if not validos:
+        return
+
+    # Los existentes se completan sobre la fila actual: dosis_display se calcula con todos sus campos
+    existentes = Insumo.objects.in_bulk([datos['sku'] for _, datos in validos], field_name='sku')
+    filas = []
+    for numero, datos in validos:
+        insumo = existentes.get(datos['sku']) or Insumo()
+        precio_anterior = insumo.precio_venta if insumo.pk else None
+        for campo, valor in datos.items():
+            setattr(insumo, campo, valor)
+        insumo.normalizar_campos()
+        filas.append((numero, insumo, precio_anterior))
+
+    campos_actualizar = [campo for campo in campos if campo != 'sku'] + ['dosis_display']
+    try:
+        with transaction.atomic():
+            _upsert([insumo for _, insumo, _ in filas], campos_actualizar)
+        importadas = filas
+    except DatabaseError:
+        # Un error de la BD no validado antes: se reintenta fila a fila para aislarlo
+        importadas = []
+        for fila in filas:
+            try:
+                with transaction.atomic():
+                    _upsert([fila[1]], campos_actualizar)
+                importadas.append(fila)
+            except DatabaseError as e:
+                resumen['errores'].append((fila[0], str(e)))
+
+    with historial_en_lote():
+        for _, insumo, precio_anterior in importadas:
+            if insumo.sku in existentes:
+                resumen['actualizados'] += 1
+                if 'precio_venta' in campos and insumo.precio_venta is not None and insumo.precio_venta != precio_anterior:
+                    registrar_cambio_precio(
+                        entidad='inventario',
+                        objeto_id=insumo.pk,
+                        nombre_objeto=insumo.medicamento,
+                        precio_anterior=precio_anterior,
+                        precio_nuevo=insumo.precio_venta,
+                        usuario=usuario,
+                    )
+            else:
+                resumen['creados'] += 1
+
+
+def importar_insumos(filas, usuario=None, tamano_lote=TAMANO_LOTE):
+    """
+    Importa filas de leer_planilla() haciendo upsert por SKU, por lotes.
+
+    Solo se actualizan las columnas presentes en la planilla; un insumo nuevo
+    toma los valores por defecto del modelo en las demás (stock 0).
+
+    Returns:
+        dict: {'procesadas', 'creados', 'actualizados', 'errores': [(fila, mensaje), ...]}
+
+    Raises:
+        ValueError: Si faltan columnas obligatorias (sku, medicamento)
+    """
+    filas = iter(filas)
+    resumen = {'procesadas': 0, 'creados': 0, 'actualizados': 0, 'errores': []}
+    skus_vistos = set()
+    campos = None
+    while lote := list(islice(filas, tamano_lote)):
+        if campos is None:
+            encabezado = set(lote[0][1])
+            faltan = [columna for columna in COLUMNAS_OBLIGATORIAS if columna not in encabezado]
+            if faltan:
+                raise ValueError(f"Faltan columnas obligatorias: {', '.join(faltan)}")
+            campos = [campo for campo in COLUMNAS_IMPORTABLES if campo in encabezado]
+        resumen['procesadas'] += len(lote)
+        _importar_lote(lote, campos, resumen, skus_vistos, usuario)
+
+    if resumen['creados'] or resumen['actualizados']:
+        invalidar_catalogo()
+    return resumen
+
+
+# =============================================================================
+# EXPORTACIÓN
+# =============================================================================
+
+def _celda(valor):
+    if isinstance(valor, Decimal):
+        return float(valor)
+    return '' if valor is None else valor
+
+
+def exportar_insumos(ruta, incluir_archivados=False):
+    """
+    Escribe el catálogo en `ruta` (.xlsx o .csv) con las columnas de
+    COLUMNAS_EXPORTACION; la planilla resultante se puede volver a importar.
+
+    Returns:
+        int: Insumos exportados
+    """
+    extension = Path(ruta).suffix.lower()
+    if extension not in ('.xlsx', '.csv'):
+        raise ValueError(f"Formato no soportado: '{extension}' (use .xlsx o .csv)")
+
+    insumos = Insumo.objects.all() if incluir_archivados else Insumo.objects.filter(archivado=False)
+    filas = insumos.order_by('idInventario').values_list(*COLUMNAS_EXPORTACION).iterator(chunk_size=2000)
+
+    total = 0
+    if extension == '.csv':
+        with open(ruta, 'w', newline='', encoding='utf-8-sig') as archivo:
+            escritor = csv.writer(archivo)
+            escritor.writerow(COLUMNAS_EXPORTACION)
+            for fila in filas:
+                escritor.writerow(['' if valor is None else valor for valor in fila])
+                total += 1
+        return total
+
+    import xlsxwriter
+
+    libro = xlsxwriter.Workbook(str(ruta), {'constant_memory': True})
+    try:
+        hoja = libro.add_worksheet('Insumos')
+        hoja.write_row(0, 0, COLUMNAS_EXPORTACION, libro.add_format({'bold': True}))
+        for total, fila in enumerate(filas, start=1):
+            hoja.write_row(total, 0, [_celda(valor) for valor in fila])
+    finally:
+        libro.close()
+    return total
@@ -0,0 +1,125 @@
+"""
+Pronóstico de consumo y reposición de insumos.
+
+El consumo sale del libro MovimientoInventario: las salidas con origen
+consulta, hospitalización o venta (ventas pagadas, insumos confirmados de
+consultas y hospitalizaciones, descuentos por servicios), netas de los
+reintegros por anulación. Los ajustes manuales no cuentan como consumo.
+
+Por insumo:
+- consumo_diario = consumo de la ventana / días observados (la ventana, o
+  menos si el insumo tiene movimientos desde hace menos tiempo)
+- dias_cobertura = stock_actual / consumo_diario; fecha_quiebre = hoy + cobertura
+- punto_reorden = stock_minimo + consumo del plazo de reposición
+- cantidad_sugerida = lo que falta para llegar a stock_medio o al stock_minimo
+  más el consumo del plazo y de la cobertura objetivo (el mayor), solo si el
+  stock está en o bajo el punto de reorden
+
+FUNCIONES:
+- calcular_pronosticos(): Recalcula la tabla PronosticoStock (una consulta de agregación)
+- insumos_a_reponer(): Filas que requieren reposición, para el dashboard
+"""
+
+import math
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Min, Q, Sum
+from django.utils import timezone
+
+from .models import Insumo, MovimientoInventario, PronosticoStock
+from .services import stock_a_fecha
+
+ORIGENES_CONSUMO = ('consulta', 'hospitalizacion', 'venta')
+
+VENTANA_DIAS = 30
+PLAZO_REPOSICION_DIAS = 7
+COBERTURA_OBJETIVO_DIAS = 30
+
+# Coberturas mayores no tienen fecha de quiebre útil (y evitan desbordar date)
+COBERTURA_MAXIMA_DIAS = 3650
+
+
+def _consumos(desde, hasta):
+    """{insumo_id: (consumo neto entre `desde` y `hasta`, fecha del primer movimiento antes de `hasta`)}"""
+    filas = MovimientoInventario.objects.filter(fecha__lt=hasta).order_by().values('insumo_id').annotate(
+        neto=Sum('cantidad', filter=Q(origen__in=ORIGENES_CONSUMO, fecha__gte=desde)),
+        primero=Min('fecha'),
+    )
+    return {fila['insumo_id']: (max(-(fila['neto'] or 0), 0), fila['primero']) for fila in filas}
+
+
+def calcular_pronosticos(ventana_dias=VENTANA_DIAS, plazo_dias=PLAZO_REPOSICION_DIAS,
+                         cobertura_dias=COBERTURA_OBJETIVO_DIAS, hoy=None):
+    """
+    Recalcula PronosticoStock para todos los insumos activos.
+
+    Args:
+        ventana_dias: Días de consumo a promediar (incluye hoy)
+        plazo_dias: Días que demora una reposición
+        cobertura_dias: Días de consumo que debe cubrir un pedido
+        hoy: Fecha del cálculo (default: hoy). Con una fecha pasada solo cuentan
+             los movimientos hasta ese día y el stock es el del libro a esa fecha
+
+    Returns:
+        int: Filas escritas
+    """
+    hoy = hoy or timezone.localdate()
+    desde = timezone.make_aware(datetime.combine(hoy - timedelta(days=ventana_dias - 1), time.min))
+    hasta = timezone.make_aware(datetime.combine(hoy + timedelta(days=1), time.min))
+    consumos = _consumos(desde, hasta)
+    saldos = stock_a_fecha(hoy) if hoy < timezone.localdate() else None
+    ahora = timezone.now()
+
+    pronosticos = []
+    insumos = Insumo.objects.filter(archivado=False).values_list(
+        'idInventario', 'stock_actual', 'stock_minimo', 'stock_medio'
+    )
+    for insumo_id, stock, minimo, medio in insumos.iterator():
+        if saldos is not None:
+            stock = saldos.get(insumo_id, 0)
+        consumo, primero = consumos.get(insumo_id, (0, None))
+        dias = ventana_dias
+        if primero is not None:
+            dias = max(1, min(ventana_dias, (hoy - timezone.localdate(primero)).days + 1))
+        diario = Decimal(consumo) / dias
+
+        cobertura = fecha_quiebre = None
+        if diario > 0:
+            cobertura = Decimal(max(stock, 0)) / diario
+            if cobertura < COBERTURA_MAXIMA_DIAS:
+                fecha_quiebre = hoy + timedelta(days=int(cobertura))
+
+        punto_reorden = minimo + math.ceil(diario * plazo_dias)
+        requiere = stock <= punto_reorden
+        objetivo = max(medio, minimo + math.ceil(diario * (plazo_dias + cobertura_dias)))
+
+        pronosticos.append(PronosticoStock(
+            insumo_id=insumo_id,
+            stock_actual=stock,
+            consumo_diario=diario.quantize(Decimal('0.001')),
+            dias_cobertura=cobertura.quantize(Decimal('0.1')) if cobertura is not None else None,
+            fecha_quiebre=fecha_quiebre,
+            punto_reorden=punto_reorden,
+            cantidad_sugerida=max(objetivo - stock, 0) if requiere else 0,
+            requiere_reposicion=requiere,
+            ventana_dias=dias,
+            fecha_calculo=ahora,
+        ))
+
+    with transaction.atomic():
+        PronosticoStock.objects.all().delete()
+        PronosticoStock.objects.bulk_create(pronosticos, batch_size=500)
+    return len(pronosticos)
+
+
+def insumos_a_reponer(limite=10):
+    """Pronósticos que requieren reposición, primero los que se agotan antes."""
+    return list(
+        PronosticoStock.objects.filter(
+            requiere_reposicion=True, insumo__archivado=False
+        ).select_related('insumo').order_by(
+            F('fecha_quiebre').asc(nulls_last=True), 'stock_actual', 'insumo__medicamento'
+        )[:limite]
+    )
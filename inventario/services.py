@@ -0,0 +1,256 @@
+"""
+Servicios de inventario: movimientos de stock.
+
+Todo cambio de Insumo.stock_actual pasa por mover_stock(): un único UPDATE
+para todos los insumos de la operación, con el stock calculado en la base de
+datos (`stock_actual = stock_actual - n`) y, en las salidas, la condición
+`stock_actual >= n` por insumo. La concurrencia la resuelve el bloqueo de fila
+del propio UPDATE: si otra caja descontó primero y el stock ya no alcanza, la
+fila no se actualiza, el conteo de filas no cuadra y la operación completa se
+revierte. No se lee el stock antes de escribir ni se bloquea la tabla.
+
+Cada movimiento queda en el libro MovimientoInventario (cantidad, saldo
+resultante, origen y usuario), escrito en bloque en la misma transacción.
+
+FUNCIONES:
+- descontar_stock(): Salida de stock (todo o nada)
+- reintegrar_stock(): Ingreso o devolución de stock
+- mover_stock(): Primitiva común a ambas
+- stock_a_fecha(): Stock de cada insumo al cierre de una fecha, desde el libro
+- conciliar_stock(): Insumos cuyo stock_actual no coincide con el libro
+"""
+
+from datetime import datetime, time, timedelta
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Q, Subquery, When
+from django.utils import timezone
+
+from .models import Insumo, MovimientoInventario
+from .signals import stock_actualizado
+
+SALIDA = 'salida_stock'
+INGRESO = 'ingreso_stock'
+
+
+def _normalizar(cantidades):
+    """
+    {insumo_o_id: cantidad} o [(insumo_o_id, cantidad), ...] -> {id: int}.
+    Suma los repetidos y descarta cantidades en cero.
+    """
+    items = cantidades.items() if isinstance(cantidades, dict) else cantidades
+    total = {}
+    for insumo, cantidad in items:
+        pk = insumo.pk if isinstance(insumo, Insumo) else int(insumo)
+        total[pk] = total.get(pk, 0) + int(cantidad)
+    for pk, cantidad in total.items():
+        if cantidad < 0:
+            raise ValidationError(f"Cantidad inválida para el insumo {pk}: {cantidad}")
+    return {pk: cantidad for pk, cantidad in total.items() if cantidad}
+
+
+def _mensaje_stock_insuficiente(cantidades):
+    vigentes = {
+        pk: (medicamento, stock)
+        for pk, medicamento, stock in Insumo.objects.filter(
+            pk__in=cantidades
+        ).values_list('pk', 'medicamento', 'stock_actual')
+    }
+    errores = []
+    for pk, cantidad in cantidades.items():
+        if pk not in vigentes:
+            errores.append(f"El insumo {pk} no existe en el inventario.")
+            continue
+        medicamento, stock = vigentes[pk]
+        if stock < cantidad:
+            errores.append(
+                f"Stock insuficiente para '{medicamento}': "
+                f"Se requieren {cantidad} unidades, "
+                f"pero solo hay {stock} disponibles."
+            )
+    return "\n".join(errores) or "El stock cambió durante la operación. Intente nuevamente."
+
+
+def _origen(origen):
+    """Consulta / Hospitalizacion / Venta, par (origen, id) o None -> (origen, id)."""
+    if origen is None:
+        return 'ajuste', None
+    if isinstance(origen, tuple):
+        return origen
+    meta = getattr(origen, '_meta', None)
+    if meta and meta.model_name in dict(MovimientoInventario.ORIGEN_CHOICES):
+        return meta.model_name, origen.pk
+    return 'ajuste', None
+
+
+def mover_stock(cantidades, tipo, usuario=None, origen=None):
+    """
+    Aplica un movimiento de stock a varios insumos en un solo UPDATE.
+
+    Args:
+        cantidades: {insumo_o_id: cantidad} o lista de pares (cantidades positivas)
+        tipo: SALIDA o INGRESO
+        usuario: Usuario responsable (queda en usuario_ultimo_movimiento)
+        origen: Consulta, Hospitalizacion o Venta que causa el movimiento, o un
+                par ('venta', id); None registra un ajuste manual
+
+    Returns:
+        dict: {insumo_id: {'medicamento', 'cantidad', 'stock_anterior', 'stock_actual'}}
+
+    Raises:
+        ValidationError: Si en una salida algún insumo no tiene stock suficiente
+                         (no se descuenta ninguno)
+    """
+    cantidades = _normalizar(cantidades)
+    if not cantidades:
+        return {}
+
+    signo = -1 if tipo == SALIDA else 1
+    ahora = timezone.now()
+    campos = {
+        'stock_actual': Case(
+            *[When(pk=pk, then=F('stock_actual') + signo * cantidad) for pk, cantidad in cantidades.items()],
+            default=F('stock_actual'),
+            output_field=IntegerField(),
+        ),
+        'ultimo_movimiento': ahora,
+        'tipo_ultimo_movimiento': tipo,
+        'usuario_ultimo_movimiento': usuario,
+    }
+    if tipo == INGRESO:
+        campos['ultimo_ingreso'] = ahora
+        filtro = Q(pk__in=cantidades)
+    else:
+        filtro = reduce(or_, (Q(pk=pk, stock_actual__gte=cantidad) for pk, cantidad in cantidades.items()))
+
+    with transaction.atomic():
+        actualizados = Insumo.objects.filter(filtro).update(**campos)
+        if actualizados != len(cantidades):
+            # Revierte solo este savepoint; el error se arma fuera con el stock vigente
+            transaction.set_rollback(True)
+        else:
+            # Fecha del libro tomada con la fila ya bloqueada: sigue el orden de los commits
+            fecha = timezone.now()
+            movimientos = {
+                pk: {
+                    'medicamento': medicamento,
+                    'cantidad': cantidades[pk],
+                    'stock_anterior': stock - signo * cantidades[pk],
+                    'stock_actual': stock,
+                }
+                for pk, medicamento, stock in Insumo.objects.filter(
+                    pk__in=cantidades
+                ).values_list('pk', 'medicamento', 'stock_actual')
+            }
+            origen_tipo, origen_id = _origen(origen)
+            MovimientoInventario.objects.bulk_create([
+                MovimientoInventario(
+                    insumo_id=pk,
+                    tipo=tipo,
+                    origen=origen_tipo,
+                    origen_id=origen_id,
+                    cantidad=signo * movimiento['cantidad'],
+                    saldo=movimiento['stock_actual'],
+                    usuario=usuario,
+                    fecha=fecha,
+                )
+                for pk, movimiento in movimientos.items()
+            ])
+            stock_actualizado.send(sender=Insumo, movimientos=movimientos, tipo=tipo, usuario=usuario)
+
+    if actualizados != len(cantidades):
+        raise ValidationError(_mensaje_stock_insuficiente(cantidades))
+    return movimientos
+
+
+def descontar_stock(cantidades, usuario=None, origen=None):
+    """Descuenta stock de varios insumos; si uno no alcanza no se descuenta ninguno."""
+    return mover_stock(cantidades, SALIDA, usuario, origen)
+
+
+def reintegrar_stock(cantidades, usuario=None, origen=None):
+    """Suma stock a varios insumos (ingresos y devoluciones)."""
+    return mover_stock(cantidades, INGRESO, usuario, origen)
+
+
+def registrar_ajuste(insumo, stock_anterior, usuario=None):
+    """
+    Registra en el libro un cambio de stock hecho con Insumo.save() (alta,
+    edición del formulario, admin), que no pasa por mover_stock().
+    Sin usuario se usa el último usuario que movió el insumo.
+    """
+    diferencia = insumo.stock_actual - stock_anterior
+    if not diferencia:
+        return None
+    return MovimientoInventario.objects.create(
+        insumo=insumo,
+        tipo=INGRESO if diferencia > 0 else SALIDA,
+        origen='ajuste',
+        cantidad=diferencia,
+        saldo=insumo.stock_actual,
+        usuario_id=usuario.pk if usuario else insumo.usuario_ultimo_movimiento_id,
+    )
+
+
+# =============================================================================
+# CONSULTAS SOBRE EL LIBRO
+# =============================================================================
+
+def _saldo_hasta(limite=None):
+    """
+    Subquery con el saldo del último movimiento de cada insumo (antes de `limite`).
+
+    "Último" es el de mayor id, no el de mayor fecha: el id se asigna después
+    del UPDATE que bloquea la fila del insumo, así que sigue el orden en que se
+    aplicaron los movimientos aunque dos transacciones concurrentes tengan
+    fechas en orden inverso.
+    """
+    movimientos = MovimientoInventario.objects.filter(insumo=OuterRef('pk'))
+    if limite is not None:
+        movimientos = movimientos.filter(fecha__lt=limite)
+    return Subquery(movimientos.order_by('-id').values('saldo')[:1])
+
+
+def stock_a_fecha(fecha, insumos=None):
+    """
+    Stock de cada insumo al cierre de `fecha` (date: fin del día local; datetime:
+    ese instante). Una consulta con un subquery por insumo sobre (insumo, fecha).
+
+    Returns:
+        dict: {insumo_id: stock}; 0 si el insumo no tenía movimientos
+    """
+    if isinstance(fecha, datetime):
+        limite = fecha
+    else:
+        limite = timezone.make_aware(datetime.combine(fecha + timedelta(days=1), time.min))
+
+    qs = Insumo.objects.all() if insumos is None else Insumo.objects.filter(pk__in=insumos)
+    return {
+        pk: saldo or 0
+        for pk, saldo in qs.annotate(saldo=_saldo_hasta(limite)).values_list('pk', 'saldo')
+    }
+
+
+def conciliar_stock():
+    """
+    Insumos cuyo stock_actual no coincide con el saldo del último movimiento
+    del libro (o que tienen stock sin movimientos).
+
+    Returns:
+        list: [{'insumo_id', 'medicamento', 'stock_actual', 'saldo_libro'}, ...]
+    """
+    diferencias = Insumo.objects.annotate(saldo_libro=_saldo_hasta()).filter(
+        ~Q(stock_actual=F('saldo_libro')) | (Q(saldo_libro__isnull=True) & ~Q(stock_actual=0))
+    ).values('idInventario', 'medicamento', 'stock_actual', 'saldo_libro')
+    return [
+        {
+            'insumo_id': fila['idInventario'],
+            'medicamento': fila['medicamento'],
+            'stock_actual': fila['stock_actual'],
+            'saldo_libro': fila['saldo_libro'] or 0,
+        }
+        for fila in diferencias
+    ]
@@ -3,13 +3,16 @@ Signals para el modelo Insumo (Inventario).
 
 Sincroniza eventos existentes con el sistema de historial centralizado.
 """
-from django.db.models.signals import pre_save, post_save
-from django.dispatch import receiver
+from django.db.models.signals import post_delete, pre_save, post_save
+from django.dispatch import Signal, receiver
 from django.utils import timezone
 from decimal import Decimal
 
+from .cache import invalidar_catalogo
 from .models import Insumo
 
+from historial.captura import guardar_estado_anterior, historial_en_lote, tomar_estado_anterior
+from historial.middleware import get_current_user
 from historial.models import RegistroHistorico
 from historial.utils import (
     registrar_creacion,
@@ -19,44 +22,50 @@ from historial.utils import (
 )
 
 
-# Variable global para almacenar el estado anterior
-_insumo_anterior = {}
+# Movimientos de stock hechos con inventario.services.mover_stock(): son UPDATE
+# directos, sin pre_save/post_save. Argumentos: movimientos, tipo, usuario.
+stock_actualizado = Signal()
+
+# Campos comparados por insumo_post_save (estado con que se cargó la instancia)
+CAMPOS_HISTORIAL = (
+    'medicamento', 'marca', 'sku', 'tipo', 'formato', 'descripcion', 'especie',
+    'precio_venta', 'stock_actual',
+    # Campos de dosis
+    'dosis_ml', 'ml_contenedor', 'cantidad_pastillas', 'unidades_pipeta', 'peso_kg',
+    # Campos de información adicional
+    'precauciones', 'contraindicaciones', 'efectos_adversos',
+)
 
 
 @receiver(pre_save, sender=Insumo)
-def insumo_pre_save(sender, instance, **kwargs):
+def insumo_pre_save(sender, instance, update_fields=None, **kwargs):
+    """
+    Captura el estado anterior del insumo antes de guardar, desde los valores
+    con que se cargó (sin volver a leer la fila).
+    """
+    guardar_estado_anterior(instance, CAMPOS_HISTORIAL, update_fields)
+
+
+@receiver(post_save, sender=Insumo)
+def insumo_libro_movimientos(sender, instance, created, **kwargs):
     """
-    Captura el estado anterior del insumo antes de guardar.
+    Cambios de stock hechos con save() (alta con stock inicial, edición, admin)
+    quedan en el libro MovimientoInventario como ajuste.
     """
-    if instance.pk:
-        try:
-            anterior = Insumo.objects.get(pk=instance.pk)
-            _insumo_anterior[instance.pk] = {
-                'medicamento': anterior.medicamento,
-                'marca': anterior.marca,
-                'sku': anterior.sku,
-                'tipo': anterior.tipo,
-                'formato': anterior.formato,
-                'descripcion': anterior.descripcion,
-                'especie': anterior.especie,
-                'precio_venta': anterior.precio_venta,
-                'stock_actual': anterior.stock_actual,
-                # Campos de dosis
-                'dosis_ml': anterior.dosis_ml,
-                'ml_contenedor': anterior.ml_contenedor,
-                'cantidad_pastillas': anterior.cantidad_pastillas,
-                'unidades_pipeta': anterior.unidades_pipeta,
-                'peso_kg': anterior.peso_kg,
-                # Campos de información adicional
-                'precauciones': anterior.precauciones,
-                'contraindicaciones': anterior.contraindicaciones,
-                'efectos_adversos': anterior.efectos_adversos,
-            }
-        except Insumo.DoesNotExist:
-            pass
+    from .services import registrar_ajuste
+
+    anterior = tomar_estado_anterior(instance)
+    if created:
+        stock_anterior = 0
+    elif anterior is not None:
+        stock_anterior = anterior['stock_actual']
+    else:
+        return
+    registrar_ajuste(instance, stock_anterior, get_current_user())
 
 
 @receiver(post_save, sender=Insumo)
+@historial_en_lote()
 def insumo_post_save(sender, instance, created, **kwargs):
     """
     Sincroniza eventos del inventario con el sistema de historial centralizado.
@@ -86,7 +95,7 @@ def insumo_post_save(sender, instance, created, **kwargs):
             
         else:
             # ACTUALIZACIÓN - Sincronizar con historial centralizado
-            anterior = _insumo_anterior.get(instance.pk)
+            anterior = tomar_estado_anterior(instance)
             
             if not anterior:
                 return
@@ -168,13 +177,33 @@ def insumo_post_save(sender, instance, created, **kwargs):
             # NOTA: No actualizamos tipo_ultimo_movimiento aquí porque el modelo Insumo
             # ya lo maneja en su propia lógica de negocio (especialmente para stock).
             # El signal solo registra en el historial centralizado sin interferir.
-            
-            # Limpiar estado anterior
-            if instance.pk in _insumo_anterior:
-                del _insumo_anterior[instance.pk]
     
     except Exception as e:
         # No fallar la operación principal si falla el registro de historial
         import logging
         logger = logging.getLogger(__name__)
         logger.error(f"Error en signal de Insumo: {e}", exc_info=True)
+
+
+@receiver(stock_actualizado)
+def stock_actualizado_historial(sender, movimientos, tipo, usuario=None, **kwargs):
+    """Registra en el historial centralizado cada insumo de un movimiento de stock."""
+    usuario = usuario or get_current_user()
+    with historial_en_lote():
+        for insumo_id, movimiento in movimientos.items():
+            registrar_cambio_stock(
+                objeto_id=insumo_id,
+                nombre_insumo=movimiento['medicamento'],
+                tipo_movimiento=tipo,
+                stock_anterior=movimiento['stock_anterior'],
+                stock_nuevo=movimiento['stock_actual'],
+                usuario=usuario
+            )
+
+
+@receiver(post_save, sender=Insumo)
+@receiver(post_delete, sender=Insumo)
+@receiver(stock_actualizado)
+def insumo_invalidar_catalogo(sender, **kwargs):
+    """Renueva la versión del catálogo (ETag de api_productos)."""
+    invalidar_catalogo()
@@ -1,3 +1,302 @@
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from cuentas.models import CustomUser
+from historial.models import RegistroHistorico
+
+from . import dosis
+from .models import Insumo, MovimientoInventario, PronosticoStock
+from .planillas import exportar_insumos, importar_insumos, leer_planilla
+from .pronostico import calcular_pronosticos, insumos_a_reponer
+from .services import conciliar_stock, descontar_stock, reintegrar_stock, stock_a_fecha
+
+
+class MovimientoStockTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.a = Insumo.objects.create(medicamento='Amoxicilina', stock_actual=5)
+        cls.b = Insumo.objects.create(medicamento='Meloxicam', stock_actual=2)
+
+    def test_descuenta_varios_insumos_en_un_update(self):
+        with CaptureQueriesContext(connection) as consultas, self.captureOnCommitCallbacks(execute=True):
+            movimientos = descontar_stock({self.a.pk: 3, self.b.pk: 2})
+
+        updates = [q['sql'] for q in consultas.captured_queries if q['sql'].startswith('UPDATE "inventario"')]
+        self.assertEqual(len(updates), 1)
+
+        self.assertEqual(movimientos[self.a.pk]['stock_anterior'], 5)
+        self.assertEqual(movimientos[self.a.pk]['stock_actual'], 2)
+        self.a.refresh_from_db()
+        self.b.refresh_from_db()
+        self.assertEqual((self.a.stock_actual, self.b.stock_actual), (2, 0))
+        self.assertEqual(self.a.tipo_ultimo_movimiento, 'salida_stock')
+        self.assertEqual(
+            RegistroHistorico.objects.filter(entidad='inventario', tipo_evento='salida_stock').count(), 2
+        )
+
+    def test_sin_stock_suficiente_no_descuenta_ninguno(self):
+        with self.assertRaisesMessage(ValidationError, "Stock insuficiente para 'Meloxicam'"):
+            descontar_stock({self.a.pk: 1, self.b.pk: 3})
+
+        self.a.refresh_from_db()
+        self.b.refresh_from_db()
+        self.assertEqual((self.a.stock_actual, self.b.stock_actual), (5, 2))
+
+    def test_descuento_concurrente_usa_el_stock_de_la_bd(self):
+        # Instancia cargada antes de que otra caja vendiera: el descuento no la usa
+        obsoleta = Insumo.objects.get(pk=self.a.pk)
+        descontar_stock({self.a.pk: 4})
+
+        with self.assertRaises(ValidationError):
+            descontar_stock({obsoleta: 4})
+        obsoleta.refresh_from_db()
+        self.assertEqual(obsoleta.stock_actual, 1)
+
+    def test_reintegro_suma_repetidos(self):
+        reintegrar_stock([(self.b.pk, 1), (self.b, 2)])
+
+        self.b.refresh_from_db()
+        self.assertEqual(self.b.stock_actual, 5)
+        self.assertIsNotNone(self.b.ultimo_ingreso)
+
+
+class LibroMovimientosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.insumo = Insumo.objects.create(medicamento='Amoxicilina', stock_actual=10)
+
+    def test_alta_y_movimientos_quedan_en_el_libro_con_saldo(self):
+        descontar_stock({self.insumo.pk: 3}, origen=('venta', 7))
+        reintegrar_stock({self.insumo.pk: 1})
+
+        movimientos = list(
+            self.insumo.movimientos.order_by('fecha', 'id').values_list('origen', 'origen_id', 'cantidad', 'saldo')
+        )
+        self.assertEqual(movimientos, [('ajuste', None, 10, 10), ('venta', 7, -3, 7), ('ajuste', None, 1, 8)])
+        self.assertEqual(conciliar_stock(), [])
+
+    def test_stock_a_fecha_y_conciliacion(self):
+        MovimientoInventario.objects.filter(insumo=self.insumo).update(fecha=timezone.now() - timedelta(days=3))
+        descontar_stock({self.insumo.pk: 4})
+        hace_dos_dias = timezone.localdate() - timedelta(days=2)
+
+        self.assertEqual(stock_a_fecha(hace_dos_dias)[self.insumo.pk], 10)
+        self.assertEqual(stock_a_fecha(timezone.localdate())[self.insumo.pk], 6)
+
+        Insumo.objects.filter(pk=self.insumo.pk).update(stock_actual=5)
+        self.assertEqual(conciliar_stock()[0]['saldo_libro'], 6)
+
+    def test_saldo_sigue_el_orden_del_libro_y_no_la_fecha(self):
+        descontar_stock({self.insumo.pk: 1})
+        descontar_stock({self.insumo.pk: 2})
+        # Dos cobros concurrentes: el que se aplicó después quedó con la fecha anterior
+        ultimo = self.insumo.movimientos.latest('id')
+        self.insumo.movimientos.filter(pk=ultimo.pk).update(fecha=timezone.now() - timedelta(minutes=5))
+
+        self.assertEqual(conciliar_stock(), [])
+        self.assertEqual(stock_a_fecha(timezone.localdate())[self.insumo.pk], 7)
+
+
+class EnvasesLoteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        crear = Insumo.objects.create
+        crear(medicamento='Jarabe', formato='liquido', dosis_ml=2.5, peso_kg=10, ml_contenedor=60)
+        crear(medicamento='Ampolla', formato='inyectable', dosis_ml=1, ml_contenedor=5)
+        crear(medicamento='Sin dosis', formato='liquido', ml_contenedor=100)
+        crear(medicamento='Comprimidos', formato='pastilla', cantidad_pastillas=10, peso_kg=5,
+              tiene_rango_peso=True, peso_min_kg=2, peso_max_kg=8)
+        crear(medicamento='Comprimidos sin ref', formato='pastilla', cantidad_pastillas=20,
+              tiene_rango_peso=True, peso_min_kg=20)
+        crear(medicamento='Pipeta chica', formato='pipeta', unidades_pipeta=3,
+              tiene_rango_peso=True, peso_max_kg=10)
+        crear(medicamento='Pipeta grande', formato='pipeta', unidades_pipeta=3,
+              tiene_rango_peso=True, peso_min_kg=10, peso_max_kg=40)
+        crear(medicamento='Crema', formato='crema', dosis_ml=7, ml_contenedor=30)
+        crear(medicamento='Sin formato', dosis_ml=1, ml_contenedor=10)
+
+    def _por_insumo(self, peso, dias):
+        return {
+            insumo.pk: {
+                clave: valor for clave, valor in insumo.calcular_envases_requeridos(peso, dias).items()
+                if clave in ('envases_requeridos', 'calculo_automatico')
+            }
+            for insumo in Insumo.objects.all()
+        }
+
+    def test_lote_coincide_con_el_calculo_por_insumo(self):
+        for peso, dias in [(0, 1), (3.2, 1), (9.75, 7), (25, 14)]:
+            esperado = self._por_insumo(peso, dias)
+            with self.assertNumQueries(1):
+                self.assertEqual(dosis.calcular_envases_lote(Insumo.objects.all(), peso, dias), esperado)
+            filas = dosis._filas(list(Insumo.objects.all()))
+            if peso:
+                self.assertEqual(dosis._envases_python(filas, float(peso), dias), esperado)
+                if dosis.np is not None:
+                    self.assertEqual(dosis._envases_numpy(filas, float(peso), dias), esperado)
+
+    def test_api_productos_incluye_envases(self):
+        Insumo.objects.update(stock_actual=5)
+        self.client.force_login(CustomUser.objects.create_user(
+            rut='11111111-1', password='clave-segura-123', nombre='Ana', apellido='Pérez',
+            correo='ana@example.com', rol='veterinario',
+        ))
+        respuesta = self.client.get(reverse('inventario:api_productos'), {'peso': 12, 'dias': 3})
+        productos = {p['nombre']: p for p in respuesta.json()['productos']}
+        self.assertEqual(productos['Jarabe']['envases_requeridos'], 1)
+        self.assertTrue(productos['Jarabe']['calculo_automatico'])
+        self.assertNotIn('Comprimidos', productos)
+
+
+class CatalogoProductosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = CustomUser.objects.create_user(
+            rut='11111111-1', password='clave-segura-123', nombre='Ana', apellido='Pérez',
+            correo='ana@example.com', rol='veterinario',
+        )
+        for nombre, especie in [('Amoxicilina', 'Canino'), ('Bravecto', ''), ('Clindamicina', 'felino'),
+                                ('Doxiciclina', 'ambos'), ('Enrofloxacino', 'canino')]:
+            Insumo.objects.create(medicamento=nombre, especie=especie, stock_actual=3,
+                                  formato='liquido', dosis_ml=1, peso_kg=10)
+        Insumo.objects.create(medicamento='Archivado', especie='canino', stock_actual=3, archivado=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.usuario)
+        self.url = reverse('inventario:api_productos')
+
+    def test_especie_normalizada_y_cursor(self):
+        nombres = []
+        params = {'especie': 'canino', 'limite': 2}
+        while True:
+            data = self.client.get(self.url, params).json()
+            nombres += [p['nombre'] for p in data['productos']]
+            if not data['siguiente']:
+                break
+            params['cursor'] = data['siguiente']
+
+        self.assertEqual(nombres, ['Amoxicilina', 'Bravecto', 'Doxiciclina', 'Enrofloxacino'])
+        self.assertEqual(Insumo.objects.get(medicamento='Bravecto').especie, None)
+        self.assertEqual(data['productos'][0]['dosis_display'], '1.00 ml por 10.00 kg')
+
+    def test_etag_responde_304_hasta_que_cambia_el_catalogo(self):
+        respuesta = self.client.get(self.url)
+        etag = respuesta['ETag']
+        self.assertTrue(respuesta.has_header('Last-Modified'))
+
+        # Otro worker (con su propia caché local) ve la misma versión: vive en la BD
+        cache.clear()
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Sesión, usuario y la fila de versión: el catálogo no se consulta
+        self.assertFalse([q for q in consultas.captured_queries if '"inventario"' in q['sql']])
+
+        amoxicilina = Insumo.objects.get(medicamento='Amoxicilina')
+        with self.captureOnCommitCallbacks() as callbacks, CaptureQueriesContext(connection) as consultas:
+            descontar_stock({amoxicilina.pk: 1})
+        # La transacción del movimiento no toca (ni bloquea) la fila de versión
+        self.assertFalse([q for q in consultas.captured_queries if '"version_catalogo"' in q['sql']])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class PronosticoStockTests(TestCase):
+    def test_consumo_cobertura_y_reposicion(self):
+        hoy = timezone.localdate()
+        usado = Insumo.objects.create(medicamento='Amoxicilina', stock_actual=40, stock_minimo=5, stock_medio=20)
+        quieto = Insumo.objects.create(medicamento='Meloxicam', stock_actual=3, stock_minimo=5, stock_medio=20)
+        MovimientoInventario.objects.update(fecha=timezone.now() - timedelta(days=60))
+
+        descontar_stock({usado.pk: 12}, origen=('venta', 1))
+        descontar_stock({usado.pk: 20}, origen=('consulta', 2))
+        reintegrar_stock({usado.pk: 2}, origen=('venta', 1))   # anulación: descuenta del consumo
+        reintegrar_stock({usado.pk: 50})                          # compra: no es consumo
+
+        self.assertEqual(calcular_pronosticos(ventana_dias=30, plazo_dias=7, cobertura_dias=30), 2)
+
+        pronostico = PronosticoStock.objects.get(insumo=usado)
+        self.assertEqual(pronostico.consumo_diario, 1)
+        self.assertEqual(pronostico.dias_cobertura, 60)
+        self.assertEqual(pronostico.fecha_quiebre, hoy + timedelta(days=60))
+        self.assertEqual(pronostico.punto_reorden, 12)
+        self.assertFalse(pronostico.requiere_reposicion)
+
+        # Sin consumo: sin fecha de quiebre, pero bajo el mínimo propio del insumo
+        sin_consumo = PronosticoStock.objects.get(insumo=quieto)
+        self.assertIsNone(sin_consumo.fecha_quiebre)
+        self.assertEqual(sin_consumo.cantidad_sugerida, 17)
+        self.assertEqual([p.insumo_id for p in insumos_a_reponer()], [quieto.pk])
+
+    def test_fecha_pasada_ignora_movimientos_posteriores(self):
+        insumo = Insumo.objects.create(medicamento='Amoxicilina', stock_actual=40, stock_minimo=5, stock_medio=20)
+        MovimientoInventario.objects.update(fecha=timezone.now() - timedelta(days=60))
+        descontar_stock({insumo.pk: 10}, origen=('venta', 1))
+        MovimientoInventario.objects.filter(pk=insumo.movimientos.latest('id').pk).update(
+            fecha=timezone.now() - timedelta(days=20)
+        )
+        descontar_stock({insumo.pk: 20}, origen=('venta', 2))   # después de la fecha del cálculo
+
+        fecha = timezone.localdate() - timedelta(days=10)
+        call_command('pronosticar_stock', '--fecha', fecha.isoformat(), '--ventana', '30', stdout=StringIO())
+
+        pronostico = PronosticoStock.objects.get(insumo=insumo)
+        self.assertEqual((pronostico.stock_actual, pronostico.consumo_diario), (30, Decimal('0.333')))
+        self.assertEqual(pronostico.fecha_quiebre, fecha + timedelta(days=90))
+
+
+class PlanillasTests(TestCase):
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directorio.cleanup)
+
+    def _csv(self, contenido):
+        ruta = Path(self.directorio.name) / 'lista.csv'
+        ruta.write_text(contenido, encoding='utf-8')
+        return leer_planilla(ruta)
+
+    def test_upsert_por_sku_con_errores_por_fila(self):
+        existente = Insumo.objects.create(medicamento='Amoxicilina', sku='AMX-1', precio_venta=1000, stock_actual=7)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            resumen = importar_insumos(self._csv(
+                'SKU;Medicamento;Formato;Precio Venta;Dosis ML;Peso KG\n'
+                'AMX-1;Amoxicilina 500;liquido;1200,50;2;10\n'
+                'MEL-1;Meloxicam;Pastilla;800;;\n'
+                'MAL-1;Sin formato válido;jarabe;10;;\n'
+                ';Sin SKU;liquido;10;;\n'
+                'MEL-1;Meloxicam repetido;pastilla;900;;\n'
+            ), tamano_lote=2)
+
+        self.assertEqual((resumen['procesadas'], resumen['creados'], resumen['actualizados']), (5, 1, 1))
+        self.assertEqual([numero for numero, _ in resumen['errores']], [4, 5, 6])
+        existente.refresh_from_db()
+        self.assertEqual(existente.precio_venta, Decimal('1200.50'))
+        self.assertEqual(existente.stock_actual, 7)
+        self.assertEqual(existente.dosis_display, '2.00 ml por 10.00 kg')
+        self.assertEqual(Insumo.objects.get(sku='MEL-1').formato, 'pastilla')
+        self.assertTrue(RegistroHistorico.objects.filter(objeto_id=existente.pk, tipo_evento='actualizacion_precio').exists())
+
+    def test_exportacion_xlsx_se_puede_reimportar(self):
+        Insumo.objects.create(medicamento='Bravecto', sku='BRV-1', formato='pastilla', precio_venta=25000, stock_minimo=3)
+        ruta = Path(self.directorio.name) / 'catalogo.xlsx'
+
+        self.assertEqual(exportar_insumos(ruta), 1)
+        Insumo.objects.filter(sku='BRV-1').update(stock_minimo=99)
+        resumen = importar_insumos(leer_planilla(ruta))
 
-# Create your tests here.
+        self.assertEqual((resumen['actualizados'], resumen['errores']), (1, []))
+        self.assertEqual(Insumo.objects.get(sku='BRV-1').stock_minimo, 3)
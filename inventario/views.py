@@ -1,18 +1,27 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.http import JsonResponse
+from django.core.exceptions import ValidationError
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_http_methods
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_http_methods
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
 from functools import wraps
 from decimal import Decimal
+import base64
 import json
+import logging
 import pytz
-import traceback
 from .models import Insumo
+from .cache import etag_catalogo, ultima_modificacion_catalogo
+from .dosis import calcular_envases_lote
+from .services import mover_stock
 from django.db.models import Q
 
 
+logger = logging.getLogger(__name__)
+
+
 def solo_admin_y_vet(view_func):
     """Decorador para permitir solo admin y veterinarios editar inventario"""
     @wraps(view_func)
@@ -83,8 +92,7 @@ def crear_insumo(request):
             })
             
         except Exception as e:
-            print(f"Error al crear insumo: {str(e)}")
-            traceback.print_exc()
+            logger.exception('Error al crear insumo')
             return JsonResponse({'success': False, 'error': str(e)}, status=400)
     
     return JsonResponse({'success': False, 'error': 'Método no permitido'}, status=405)
@@ -99,8 +107,6 @@ def editar_insumo(request, insumo_id):
             insumo = get_object_or_404(Insumo, idInventario=insumo_id)
             data = json.loads(request.body)
             
-            print(f"📝 Datos recibidos para editar insumo {insumo_id}:", data)
-            
             stock_anterior = insumo.stock_actual
             
             # Actualizar campos básicos
@@ -208,8 +214,7 @@ def editar_insumo(request, insumo_id):
             })
             
         except Exception as e:
-            print(f"❌ Error al editar insumo: {str(e)}")
-            traceback.print_exc()
+            logger.exception('Error al editar insumo %s', insumo_id)
             return JsonResponse({'success': False, 'error': str(e)}, status=400)
     
     return JsonResponse({'success': False, 'error': 'Método no permitido'}, status=405)
@@ -273,8 +278,7 @@ def detalle_insumo(request, insumo_id):
             }
         })
     except Exception as e:
-        print(f"❌ ERROR en detalle_insumo:")
-        traceback.print_exc()
+        logger.exception('Error en detalle_insumo %s', insumo_id)
         return JsonResponse({
             'success': False,
             'error': str(e)
@@ -288,8 +292,6 @@ def eliminar_insumo(request, insumo_id):
     if request.method != 'POST':
         return JsonResponse({'success': False, 'error': 'Método no permitido'}, status=405)
     
-    print(f"🗑️ Procesando eliminación de insumo ID: {insumo_id}")
-    
     from django.db import connection
     
     try:
@@ -302,7 +304,6 @@ def eliminar_insumo(request, insumo_id):
                 return JsonResponse({'success': False, 'error': 'Producto no encontrado'}, status=404)
             
             nombre_insumo = row[0]
-            print(f"📦 Producto: {nombre_insumo}")
             
             # 2. Verificar relaciones (solo tablas que existen)
             relaciones = []
@@ -324,7 +325,7 @@ def eliminar_insumo(request, insumo_id):
             # 3. Si está en uso, ARCHIVAR en lugar de eliminar
             if relaciones:
                 cursor.execute('UPDATE inventario SET archivado = true WHERE "idInventario" = %s', [insumo_id])
-                print(f"📁 Archivado (en uso en: {", ".join(relaciones)}): {nombre_insumo}")
+                logger.info('Insumo %s archivado en lugar de eliminado (en uso en: %s)', insumo_id, relaciones)
                 
                 return JsonResponse({
                     'success': True,
@@ -334,7 +335,7 @@ def eliminar_insumo(request, insumo_id):
             
             # 4. Si NO está en uso, eliminar permanentemente
             cursor.execute('DELETE FROM inventario WHERE "idInventario" = %s', [insumo_id])
-            print(f"✅ Eliminado permanentemente: {nombre_insumo}")
+            logger.info('Insumo %s eliminado permanentemente', insumo_id)
             
             return JsonResponse({
                 'success': True,
@@ -343,10 +344,7 @@ def eliminar_insumo(request, insumo_id):
             })
     
     except Exception as e:
-        print(f"❌ ERROR CRÍTICO: {str(e)}")
-        print(f"❌ Tipo de excepción: {type(e).__name__}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('Error al eliminar insumo %s', insumo_id)
         
         # Devolver el error específico para debugging
         return JsonResponse({
@@ -370,11 +368,11 @@ def modificar_stock_insumo(request, insumo_id):
                 stock_nuevo = int(data['stock_actual'])
                 stock_anterior = insumo.stock_actual
                 
-                # Determinar tipo de movimiento
+                # Se aplica como diferencia sobre el stock leído: un descuento
+                # concurrente (p. ej. una venta) no se pierde al guardar
                 if stock_nuevo > stock_anterior:
                     tipo_movimiento = 'ingreso_stock'
                     cantidad = stock_nuevo - stock_anterior
-                    insumo.ultimo_ingreso = timezone.now()
                 elif stock_nuevo < stock_anterior:
                     tipo_movimiento = 'salida_stock'
                     cantidad = stock_anterior - stock_nuevo
@@ -384,8 +382,6 @@ def modificar_stock_insumo(request, insumo_id):
                         'error': 'El stock no ha cambiado'
                     }, status=400)
                 
-                insumo.stock_actual = stock_nuevo
-                
             else:
                 # Método anterior con tipo_movimiento y cantidad
                 tipo_movimiento = data.get('tipo_movimiento')
@@ -397,28 +393,19 @@ def modificar_stock_insumo(request, insumo_id):
                         'error': 'La cantidad debe ser mayor a 0'
                     }, status=400)
                 
-                stock_anterior = insumo.stock_actual
-                
-                if tipo_movimiento == 'ingreso_stock':
-                    insumo.stock_actual += cantidad
-                    insumo.ultimo_ingreso = timezone.now()
-                elif tipo_movimiento == 'salida_stock':
-                    if insumo.stock_actual < cantidad:
-                        return JsonResponse({
-                            'success': False,
-                            'error': f'Stock insuficiente. Stock actual: {insumo.stock_actual}'
-                        }, status=400)
-                    insumo.stock_actual -= cantidad
-                else:
+                if tipo_movimiento not in ('ingreso_stock', 'salida_stock'):
                     return JsonResponse({
                         'success': False,
                         'error': 'Tipo de movimiento no válido'
                     }, status=400)
             
-            insumo.ultimo_movimiento = timezone.now()
-            insumo.tipo_ultimo_movimiento = tipo_movimiento
-            insumo.usuario_ultimo_movimiento = request.user
-            insumo.save()
+            # UPDATE condicional: una salida sin stock suficiente no modifica nada
+            try:
+                movimiento = mover_stock({insumo.pk: cantidad}, tipo_movimiento, request.user)[insumo.pk]
+            except ValidationError as e:
+                return JsonResponse({'success': False, 'error': e.messages[0]}, status=400)
+            stock_anterior = movimiento['stock_anterior']
+            insumo.refresh_from_db()
             
             # Datos para debug
             local_tz = pytz.timezone('America/Santiago')
@@ -441,39 +428,68 @@ def modificar_stock_insumo(request, insumo_id):
             })
             
         except Exception as e:
-            print(f"Error al modificar stock: {str(e)}")
-            traceback.print_exc()
+            logger.exception('Error al modificar stock de insumo %s', insumo_id)
             return JsonResponse({'success': False, 'error': str(e)}, status=400)
     
     return JsonResponse({'success': False, 'error': 'Método no permitado'}, status=405)
 
+# Página del catálogo de api_productos (el selector sigue `siguiente` hasta el final)
+PRODUCTOS_POR_PAGINA = 200
+PRODUCTOS_POR_PAGINA_MAX = 500
+
+CAMPOS_CATALOGO = (
+    'idInventario', 'medicamento', 'marca', 'especie', 'formato', 'stock_actual', 'precio_venta',
+    'dosis_display', 'dosis_ml', 'ml_contenedor', 'cantidad_pastillas', 'unidades_pipeta', 'peso_kg',
+    'tiene_rango_peso', 'peso_min_kg', 'peso_max_kg',
+)
+
+
+def _codificar_cursor(producto):
+    valor = json.dumps([producto.medicamento, producto.idInventario]).encode()
+    return base64.urlsafe_b64encode(valor).decode()
+
+
+def _decodificar_cursor(cursor):
+    medicamento, insumo_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return str(medicamento), int(insumo_id)
+
+
+@login_required
 @require_http_methods(["GET"])
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=etag_catalogo, last_modified_func=ultima_modificacion_catalogo)
 def api_productos(request):
     """
-    API para obtener productos del inventario
+    API para obtener productos del inventario (activos y con stock)
     Filtros disponibles:
-    - especie: perro, gato, ambos
+    - especie: canino, felino, ... (incluye siempre "ambos" y sin especie)
     - peso: peso del paciente en kg (para filtrar por rango)
+    - dias: días de tratamiento para el cálculo de envases (default: 1)
+    - cursor / limite: paginación por cursor; `siguiente` trae el cursor de
+      la página siguiente o null en la última
+
+    Con peso válido cada producto incluye envases_requeridos y
+    calculo_automatico, calculados en lote para todo el listado.
+
+    Responde con ETag / Last-Modified de la versión del catálogo
+    (inventario.cache): una llamada repetida sin cambios devuelve 304.
     """
     try:
         # Obtener parámetros de filtro
-        especie_filtro = request.GET.get('especie', '').lower()
+        especie_filtro = request.GET.get('especie', '').strip().lower()
         peso_filtro = request.GET.get('peso', None)
+        peso = None
+        try:
+            limite = min(max(1, int(request.GET.get('limite', PRODUCTOS_POR_PAGINA))), PRODUCTOS_POR_PAGINA_MAX)
+        except ValueError:
+            limite = PRODUCTOS_POR_PAGINA
         
-        # Query base
-        productos = Insumo.objects.filter(stock_actual__gt=0)
+        # Query base (usa inventario_catalogo_idx)
+        productos = Insumo.objects.filter(archivado=False, stock_actual__gt=0)
         
-        # Filtrar por especie
+        # Filtrar por especie (guardada normalizada: minúsculas, sin vacíos)
         if especie_filtro:
-            # Incluir productos para la especie específica o "ambos"
-            # Normalizar especie a minúsculas para comparación
-            productos = productos.filter(
-                Q(especie__iexact=especie_filtro) | 
-                Q(especie__iexact='ambos') | 
-                Q(especie__isnull=True) |
-                Q(especie='')
-            )
-            print(f"🔍 Filtrado por especie '{especie_filtro}': {productos.count()} productos encontrados")
+            productos = productos.filter(Q(especie__in=[especie_filtro, 'ambos']) | Q(especie__isnull=True))
         
         # Filtrar por peso (si tiene rango de peso definido)
         if peso_filtro:
@@ -482,20 +498,39 @@ def api_productos(request):
                 # Incluir productos sin rango de peso O que el peso esté dentro del rango
                 productos = productos.filter(
                     Q(tiene_rango_peso=False) |
-                    Q(tiene_rango_peso__isnull=True) |
-                    (
-                        Q(tiene_rango_peso=True) &
-                        Q(peso_min_kg__lte=peso) &
-                        Q(peso_max_kg__gte=peso)
-                    )
+                    Q(peso_min_kg__lte=peso, peso_max_kg__gte=peso)
                 )
             except ValueError:
                 pass  # Si el peso no es válido, ignorar este filtro
         
+        cursor = request.GET.get('cursor')
+        if cursor:
+            try:
+                medicamento, insumo_id = _decodificar_cursor(cursor)
+            except (ValueError, TypeError):
+                return JsonResponse({'success': False, 'error': 'Cursor inválido'}, status=400)
+            productos = productos.filter(
+                Q(medicamento__gt=medicamento) | Q(medicamento=medicamento, idInventario__gt=insumo_id)
+            )
+        
+        productos = list(
+            productos.only(*CAMPOS_CATALOGO).order_by('medicamento', 'idInventario')[:limite + 1]
+        )
+        siguiente = _codificar_cursor(productos[limite - 1]) if len(productos) > limite else None
+        productos = productos[:limite]
+        
+        envases = {}
+        if peso and peso > 0:
+            try:
+                dias = max(1, int(request.GET.get('dias', 1)))
+            except ValueError:
+                dias = 1
+            envases = calcular_envases_lote(productos, peso, dias)
+        
         # Construir respuesta
         productos_data = []
         for producto in productos:
-            productos_data.append({
+            producto_data = {
                 'id': producto.idInventario,
                 'nombre': producto.medicamento,
                 'marca': producto.marca or '',
@@ -503,7 +538,7 @@ def api_productos(request):
                 'formato': producto.formato or '',
                 'stock': producto.stock_actual,
                 'precio': float(producto.precio_venta) if producto.precio_venta else 0,
-                'dosis_display': producto.get_dosis_display(),
+                'dosis_display': producto.dosis_display,
                 
                 # Datos para cálculo de dosis
                 'dosis_ml': float(producto.dosis_ml) if producto.dosis_ml else None,
@@ -515,12 +550,16 @@ def api_productos(request):
                 'tiene_rango_peso': producto.tiene_rango_peso,
                 'peso_min_kg': float(producto.peso_min_kg) if producto.peso_min_kg else None,
                 'peso_max_kg': float(producto.peso_max_kg) if producto.peso_max_kg else None,
-            })
+            }
+            if envases:
+                producto_data.update(envases[producto.idInventario])
+            productos_data.append(producto_data)
         
         return JsonResponse({
             'success': True,
             'productos': productos_data,
             'total': len(productos_data),
+            'siguiente': siguiente,
             'filtros_aplicados': {
                 'especie': especie_filtro or 'todos',
                 'peso': peso_filtro
@@ -528,8 +567,7 @@ def api_productos(request):
         })
         
     except Exception as e:
-        print(f"❌ Error en api_productos: {str(e)}")
-        traceback.print_exc()
+        logger.exception('Error en api_productos')
         return JsonResponse({
             'success': False,
             'error': str(e)
@@ -574,10 +612,7 @@ def productos_api(request):
         
         return JsonResponse(data, safe=False)
     except Exception as e:
-        # Log del error para debugging
-        import traceback
-        print(f"Error en productos_api: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception('Error en productos_api')
         return JsonResponse({'error': str(e)}, status=500)
 
 
@@ -626,8 +661,7 @@ def actualizar_niveles_stock(request, insumo_id):
             })
             
         except Exception as e:
-            print(f"❌ ERROR en actualizar_niveles_stock:")
-            traceback.print_exc()
+            logger.exception('Error en actualizar_niveles_stock %s', insumo_id)
             return JsonResponse({
                 'success': False,
                 'error': str(e)
@@ -4,6 +4,7 @@ from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 from datetime import date
 from dateutil.relativedelta import relativedelta
+from historial.captura import SnapshotCargaMixin
 
 User = get_user_model()
 
@@ -64,7 +65,7 @@ class Propietario(models.Model):
         super().save(*args, **kwargs)
 
 
-class Paciente(models.Model):
+class Paciente(SnapshotCargaMixin, models.Model):
     """Modelo para las mascotas/pacientes"""
     ESPECIE_CHOICES = [
         ('canino', 'Canino'),
@@ -8,8 +8,9 @@ from django.dispatch import receiver
 from django.utils import timezone
 from decimal import Decimal
 
-from .models import Paciente
+from .models import Paciente, Propietario
 from historial.models import RegistroHistorico
+from historial.captura import guardar_estado_anterior, historial_en_lote, tomar_estado_anterior
 from historial.middleware import get_current_user
 from historial.utils import (
     registrar_creacion,
@@ -21,42 +22,25 @@ from historial.utils import (
 )
 
 
-# Variable global para almacenar el estado anterior
-_paciente_anterior = {}
+# Campos comparados por paciente_post_save (estado con que se cargó la instancia)
+CAMPOS_HISTORIAL = (
+    'nombre', 'especie', 'raza', 'color', 'sexo', 'fecha_nacimiento', 'edad_anos', 'edad_meses',
+    'microchip', 'ultimo_peso', 'alergias', 'enfermedades_cronicas', 'medicamentos_actuales',
+    'cirugia_previa', 'propietario_id', 'activo',
+)
 
 
 @receiver(pre_save, sender=Paciente)
-def paciente_pre_save(sender, instance, **kwargs):
+def paciente_pre_save(sender, instance, update_fields=None, **kwargs):
     """
-    Captura el estado anterior del paciente antes de guardar.
+    Captura el estado anterior del paciente antes de guardar, desde los valores
+    con que se cargó (sin volver a leer la fila).
     """
-    if instance.pk:
-        try:
-            anterior = Paciente.objects.get(pk=instance.pk)
-            _paciente_anterior[instance.pk] = {
-                'nombre': anterior.nombre,
-                'especie': anterior.especie,
-                'raza': anterior.raza,
-                'color': anterior.color,
-                'sexo': anterior.sexo,
-                'fecha_nacimiento': anterior.fecha_nacimiento,
-                'edad_anos': anterior.edad_anos,
-                'edad_meses': anterior.edad_meses,
-                'microchip': anterior.microchip,
-                'ultimo_peso': anterior.ultimo_peso,
-                'alergias': anterior.alergias,
-                'enfermedades_cronicas': anterior.enfermedades_cronicas,
-                'medicamentos_actuales': anterior.medicamentos_actuales,
-                'cirugia_previa': anterior.cirugia_previa,
-                'propietario_id': anterior.propietario_id,
-                'propietario': anterior.propietario,  # Guardar objeto completo
-                'activo': anterior.activo,
-            }
-        except Paciente.DoesNotExist:
-            pass
+    guardar_estado_anterior(instance, CAMPOS_HISTORIAL, update_fields)
 
 
 @receiver(post_save, sender=Paciente)
+@historial_en_lote()
 def paciente_post_save(sender, instance, created, **kwargs):
     """
     Registra eventos de cambios en el paciente.
@@ -91,7 +75,7 @@ def paciente_post_save(sender, instance, created, **kwargs):
             
         else:
             # ACTUALIZACIÓN - Detectar cambios
-            anterior = _paciente_anterior.get(instance.pk)
+            anterior = tomar_estado_anterior(instance)
             
             if not anterior:
                 return
@@ -109,7 +93,7 @@ def paciente_post_save(sender, instance, created, **kwargs):
                 registrar_cambio_propietario(
                     paciente_id=instance.pk,
                     nombre_paciente=instance.nombre,
-                    propietario_anterior=anterior['propietario'],  # Usar el capturado en pre_save
+                    propietario_anterior=Propietario.objects.get(pk=anterior['propietario_id']),
                     propietario_nuevo=instance.propietario,
                     usuario=usuario
                 )
@@ -244,10 +228,6 @@ def paciente_post_save(sender, instance, created, **kwargs):
                     tipo_ultimo_movimiento=instance.tipo_ultimo_movimiento,
                     usuario_ultima_modificacion=usuario
                 )
-            
-            # Limpiar estado anterior
-            if instance.pk in _paciente_anterior:
-                del _paciente_anterior[instance.pk]
     
     except Exception as e:
         # No fallar la operación principal si falla el registro de historial
@@ -5,6 +5,7 @@ from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required
 import json
+import logging
 from datetime import date, datetime
 from .models import Paciente, Propietario
 from agenda.models import Cita
@@ -23,6 +24,9 @@ try:
 except ImportError:
     MODELOS_EXTENDIDOS = False
 
+
+logger = logging.getLogger(__name__)
+
 # Función auxiliar para normalizar teléfonos chilenos
 def normalize_chile_phone(phone):
     """Normaliza números de teléfono chilenos al formato +569XXXXXXXX"""
@@ -98,14 +102,14 @@ def validar_propietario_duplicado(nombre, apellido, telefono, email, propietario
     # 2. Verificar teléfono duplicado (estricto - no permitir)
     if telefono_normalizado:
         query = Propietario.objects.filter(telefono=telefono_normalizado)
-        print(f"[VALIDACION] Propietarios con telefono {telefono_normalizado}: {query.count()}")
         if propietario_id:
-            print(f"[VALIDACION] Excluyendo propietario_id={propietario_id} (tipo: {type(propietario_id)})")
             query = query.exclude(id=propietario_id)
-            print(f"[VALIDACION] Despues de exclude: {query.count()}")
         if query.exists():
             prop_existente = query.first()
-            print(f"[VALIDACION] Encontrado duplicado: ID={prop_existente.id}, nombre={prop_existente.nombre_completo}")
+            logger.debug(
+                'Teléfono duplicado %s: propietario existente=%s (excluido=%s)',
+                telefono_normalizado, prop_existente.id, propietario_id
+            )
             return {
                 'valid': False,
                 'type': 'telefono_duplicado',
@@ -149,10 +153,6 @@ def pacientes_view(request):
 @login_required
 def ficha_mascota_view(request, paciente_id):
     """Vista de la ficha de la mascota"""
-    print("\n" + "="*80)
-    print(f"🔍 FICHA_MASCOTA_VIEW EJECUTANDOSE - Paciente ID: {paciente_id}")
-    print("="*80 + "\n", flush=True)
-    
     from cuentas.models import CustomUser
     
     paciente = get_object_or_404(Paciente, id=paciente_id)
@@ -169,12 +169,6 @@ def ficha_mascota_view(request, paciente_id):
         .order_by('fecha', 'hora_inicio')
     )
     
-    print(f"📅 Fecha hoy: {hoy}")
-    print(f"📋 Total citas agendadas encontradas: {citas_agendadas.count()}")
-    for cita in citas_agendadas:
-        print(f"   └─ Cita ID {cita.id}: {cita.fecha} {cita.hora_inicio}-{cita.hora_fin} | Vet: {cita.veterinario.nombre} | Servicio: {cita.servicio.nombre if cita.servicio else 'Sin servicio'}")
-    print("", flush=True)
-    
     # Obtener otros datos relacionados
     hospitalizaciones = paciente.hospitalizaciones.all() if hasattr(paciente, 'hospitalizaciones') else []
     examenes = paciente.examenes.all() if hasattr(paciente, 'examenes') else []
@@ -184,13 +178,13 @@ def ficha_mascota_view(request, paciente_id):
     veterinarios = CustomUser.objects.filter(rol='veterinario').order_by('nombre', 'apellido')
     
     # Si no hay con rol='veterinario', excluir administración y recepción
-    if veterinarios.count() == 0:
+    if not veterinarios.exists():
         veterinarios = CustomUser.objects.exclude(
             rol__in=['administracion', 'recepcion']
         ).order_by('nombre', 'apellido')
     
     # Si aún no hay, usar todos los usuarios
-    if veterinarios.count() == 0:
+    if not veterinarios.exists():
         veterinarios = CustomUser.objects.all().order_by('nombre', 'apellido')
     
     # ⭐ OBTENER PROPIETARIOS
@@ -473,12 +467,10 @@ def editar_paciente(request, paciente_id):
         if isinstance(crear_nuevo_propietario, str):
             crear_nuevo_propietario = crear_nuevo_propietario.lower() in ['true', '1', 'on']
         
-        # LOG DEBUG
-        print(f"\n=== EDITAR PACIENTE DEBUG ===")
-        print(f"propietario_id recibido: {propietario_id}")
-        print(f"actualizar_propietario: {actualizar_propietario}")
-        print(f"crear_nuevo_propietario: {crear_nuevo_propietario}")
-        print(f"paciente.propietario_id actual: {paciente.propietario_id}")
+        logger.debug(
+            'editar_paciente paciente=%s propietario_id=%s actual=%s actualizar=%s crear_nuevo=%s',
+            paciente.id, propietario_id, paciente.propietario_id, actualizar_propietario, crear_nuevo_propietario
+        )
 
         campos_basicos = ['nombre', 'especie', 'raza', 'sexo', 'color', 'microchip']
         for campo in campos_basicos:
@@ -566,7 +558,6 @@ def editar_paciente(request, paciente_id):
             paciente.propietario = nuevo_propietario
         else:
             propietario_id_efectivo = propietario_id or paciente.propietario_id
-            print(f"propietario_id_efectivo calculado: {propietario_id_efectivo}")
             
             if propietario_id_efectivo:
                 propietario = get_object_or_404(Propietario, id=propietario_id_efectivo)
@@ -578,16 +569,10 @@ def editar_paciente(request, paciente_id):
                     nuevo_telefono = propietario_data.get('telefono') or propietario_data.get('propietario_telefono', propietario.telefono)
                     nuevo_email = propietario_data.get('email') or propietario_data.get('propietario_email', propietario.email)
                     
-                    print(f"Actualizando propietario ID: {propietario.id}")
-                    print(f"nuevo_telefono: {nuevo_telefono}")
-                    print(f"nuevo_email: {nuevo_email}")
-                    
                     # Solo validar si cambió el teléfono o email
                     telefono_cambio = normalize_chile_phone(nuevo_telefono) != propietario.telefono
                     email_cambio = nuevo_email.lower().strip() != (propietario.email or '').lower().strip()
                     
-                    print(f"telefono_cambio: {telefono_cambio}, email_cambio: {email_cambio}")
-                    
                     if telefono_cambio or email_cambio:
                         # Validar si los cambios crean duplicados
                         validacion = validar_propietario_duplicado(
@@ -599,8 +584,6 @@ def editar_paciente(request, paciente_id):
                             ignore_name_warning=ignore_name_warning
                         )
                         
-                        print(f"Resultado validación: {validacion}")
-                        
                         if not validacion['valid']:
                             return JsonResponse({
                                 'success': False,
@@ -663,8 +646,7 @@ def editar_paciente(request, paciente_id):
             }
         })
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception('Error al editar paciente %s', paciente_id)
         return JsonResponse({'success': False, 'error': str(e)}, status=400)
 
 @csrf_exempt
@@ -2,6 +2,7 @@ from django.db import models
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from inventario.models import Insumo
+from historial.captura import SnapshotCargaMixin
 
 # Create your models here.
 
@@ -35,7 +36,7 @@ from inventario.models import Insumo
 #   SERVICIOS
 # ===========================
 
-class Servicio(models.Model):
+class Servicio(SnapshotCargaMixin, models.Model):
     """
     Modelo para servicios veterinarios ofrecidos en la clínica.
     
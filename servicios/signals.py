@@ -8,6 +8,7 @@ from django.dispatch import receiver
 from django.utils import timezone
 
 from .models import Servicio
+from historial.captura import guardar_estado_anterior, historial_en_lote, tomar_estado_anterior
 from historial.models import RegistroHistorico
 from historial.utils import (
     registrar_creacion,
@@ -17,31 +18,21 @@ from historial.utils import (
 )
 
 
-# Variable global para almacenar el estado anterior
-_servicio_anterior = {}
+# Campos comparados por servicio_post_save (estado con que se cargó la instancia)
+CAMPOS_HISTORIAL = ('nombre', 'descripcion', 'categoria', 'precio', 'duracion', 'activo')
 
 
 @receiver(pre_save, sender=Servicio)
-def servicio_pre_save(sender, instance, **kwargs):
+def servicio_pre_save(sender, instance, update_fields=None, **kwargs):
     """
-    Captura el estado anterior del servicio antes de guardar.
+    Captura el estado anterior del servicio antes de guardar, desde los valores
+    con que se cargó (sin volver a leer la fila).
     """
-    if instance.pk:
-        try:
-            anterior = Servicio.objects.get(pk=instance.pk)
-            _servicio_anterior[instance.pk] = {
-                'nombre': anterior.nombre,
-                'descripcion': anterior.descripcion,
-                'categoria': anterior.categoria,
-                'precio': anterior.precio,
-                'duracion': anterior.duracion,
-                'activo': anterior.activo,
-            }
-        except Servicio.DoesNotExist:
-            pass
+    guardar_estado_anterior(instance, CAMPOS_HISTORIAL, update_fields)
 
 
 @receiver(post_save, sender=Servicio)
+@historial_en_lote()
 def servicio_post_save(sender, instance, created, **kwargs):
     """
     Registra eventos de cambios en el servicio.
@@ -76,7 +67,7 @@ def servicio_post_save(sender, instance, created, **kwargs):
             
         else:
             # ACTUALIZACIÓN - Detectar cambios
-            anterior = _servicio_anterior.get(instance.pk)
+            anterior = tomar_estado_anterior(instance)
             
             if not anterior:
                 return
@@ -198,10 +189,6 @@ def servicio_post_save(sender, instance, created, **kwargs):
                     tipo_ultimo_movimiento=instance.tipo_ultimo_movimiento,
                     usuario_ultima_modificacion=usuario
                 )
-            
-            # Limpiar estado anterior
-            if instance.pk in _servicio_anterior:
-                del _servicio_anterior[instance.pk]
     
     except Exception as e:
         # No fallar la operación principal si falla el registro de historial
@@ -673,14 +673,15 @@ async function cargarTodasLasAgendas() {
     });
     
     try {
-        // Cargar TODAS las agendas primero para saber quién trabaja
-        const promesasTodos = vetsACargar.map(vetId => 
-            fetch(`/agenda/bloques/${vetId}/${year}/${month}/${day}/`)
-                .then(response => response.json())
-                .then(data => ({ vetId, data }))
-        );
-        
-        const todosDatos = await Promise.all(promesasTodos);
+        // Cargar TODAS las agendas en una sola petición para saber quién trabaja
+        const params = new URLSearchParams({
+            veterinarios: vetsACargar.join(','),
+            desde: `${year}-${month}-${day}`,
+            dias: 1,
+        });
+        const response = await fetch(`/agenda/bloques/rango/?${params}`);
+        const rango = await response.json();
+        const todosDatos = (rango.agendas || []).map(data => ({ vetId: String(data.veterinario_id), data }));
         
         // Filtrar solo los que trabajan
         const vetsTrabajando = todosDatos.filter(({ data }) => data.trabaja);
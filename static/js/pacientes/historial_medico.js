@@ -850,8 +850,7 @@ window.onclick = function (event) {
 // Cargar inventario
 async function cargarInventario() {
     try {
-        const response = await fetch('/inventario/api/productos/');
-        const data = await response.json();
+        const data = await obtenerProductosCatalogo();
         
         console.log('📦 Inventario cargado:', data);
         
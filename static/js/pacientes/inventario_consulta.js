@@ -11,6 +11,26 @@ if (!window.medicamentosSeleccionados) {
     window.medicamentosSeleccionados = [];
 }
 
+/**
+ * Obtener el catálogo completo de /inventario/api/productos/ siguiendo el
+ * cursor de paginación. Cada página responde 304 (caché del navegador)
+ * mientras el catálogo no cambie.
+ */
+async function obtenerProductosCatalogo(params = new URLSearchParams()) {
+    const productos = [];
+    let cursor = null;
+    do {
+        const pagina = new URLSearchParams(params);
+        if (cursor) pagina.set('cursor', cursor);
+        const response = await fetch(`/inventario/api/productos/?${pagina.toString()}`);
+        const data = await response.json();
+        if (!data.success) return data;
+        productos.push(...data.productos);
+        cursor = data.siguiente;
+    } while (cursor);
+    return { success: true, productos: productos, total: productos.length };
+}
+
 /**
  * Cargar inventario filtrado según el paciente
  */
@@ -41,18 +61,12 @@ async function cargarInventarioFiltrado() {
             peso: peso
         });
 
-        const response = await fetch(`/inventario/api/productos/?${params.toString()}`);
-        const data = await response.json();
+        const data = await obtenerProductosCatalogo(params);
 
         if (data.success) {
             medicamentosDisponibles = data.productos;
             console.log(`✅ ${data.total} medicamentos disponibles para ${window.pacienteData.especie || 'todas las especies'}`);
             
-            // Mostrar información de filtrado aplicado
-            if (data.filtros_aplicados && data.filtros_aplicados.especie) {
-                console.log(`📋 Filtro aplicado: ${data.filtros_aplicados.especie}`);
-            }
-            
             mostrarInventario(medicamentosDisponibles);
         } else {
             console.error('❌ Error al cargar inventario:', data.error);
@@ -144,6 +158,10 @@ function mostrarInventario(productos) {
                         <span class="badge-compact badge-stock ${producto.stock < 10 ? 'bajo' : ''}">
                             <i class="bi bi-box"></i> ${producto.stock}
                         </span>
+                        ${producto.calculo_automatico ? `
+                        <span class="badge-compact badge-dosis" title="Envases requeridos para el peso del paciente">
+                            <i class="bi bi-calculator"></i> ${producto.envases_requeridos} env.
+                        </span>` : ''}
                     </div>
                 </div>
                 <button type="button" class="btn-agregar-compact" onclick="agregarMedicamento(${producto.id})" title="Agregar">
@@ -0,0 +1,86 @@
+"""
+Logging estructurado con ID de correlación por request.
+
+- CorrelacionMiddleware: asigna un ID a cada request (respeta X-Request-ID si
+  viene del proxy) y lo devuelve en la respuesta.
+- FiltroCorrelacion: agrega `request_id` a cada registro de log.
+- FormateadorJSON: una línea JSON por registro (LOG_FORMAT=json).
+
+Los mensajes usan argumentos estilo %: el texto solo se arma si el nivel está
+habilitado, así que un logger.debug() con DEBUG desactivado no cuesta nada.
+"""
+import json
+import logging
+import re
+import uuid
+from threading import local
+
+from django.core.signals import request_finished
+
+_thread_locals = local()
+
+# IDs aceptados desde la cabecera: evita inyectar texto arbitrario en los logs
+ID_VALIDO = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+SIN_ID = '-'
+
+
+def get_request_id():
+    """ID de correlación del request actual ('-' fuera de un request)."""
+    return getattr(_thread_locals, 'request_id', SIN_ID)
+
+
+def set_request_id(request_id):
+    _thread_locals.request_id = request_id
+
+
+class CorrelacionMiddleware:
+    """
+    Middleware que asigna el ID de correlación del request y lo expone en
+    request.request_id y en la cabecera X-Request-ID de la respuesta.
+    """
+
+    CABECERA = 'X-Request-ID'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Se limpia al terminar la respuesta (no al salir del middleware) para que
+        # el log de django.request sobre 4xx/5xx también lleve el ID
+        request_finished.connect(_limpiar_request_id, dispatch_uid='veteriaria.logs.limpiar_request_id')
+
+    def __call__(self, request):
+        entrante = request.headers.get(self.CABECERA, '')
+        request_id = entrante if ID_VALIDO.match(entrante) else uuid.uuid4().hex
+        request.request_id = request_id
+        set_request_id(request_id)
+        response = self.get_response(request)
+        response[self.CABECERA] = request_id
+        return response
+
+
+def _limpiar_request_id(**kwargs):
+    set_request_id(SIN_ID)
+
+
+class FiltroCorrelacion(logging.Filter):
+    """Agrega `request_id` al registro para usarlo en el formato."""
+
+    def filter(self, record):
+        record.request_id = get_request_id()
+        return True
+
+
+class FormateadorJSON(logging.Formatter):
+    """Formatea cada registro como un objeto JSON en una sola línea."""
+
+    def format(self, record):
+        data = {
+            'ts': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'nivel': record.levelname,
+            'logger': record.name,
+            'request_id': getattr(record, 'request_id', SIN_ID),
+            'mensaje': record.getMessage(),
+        }
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
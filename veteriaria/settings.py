@@ -35,6 +35,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'veteriaria.logs.CorrelacionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -42,6 +43,8 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'historial.middleware.CurrentUserMiddleware',
+    'historial.middleware.PerfilSQLMiddleware',
+    'dashboard.middleware.MetricasLoteMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -73,6 +76,31 @@ DATABASES = {
     )
 }
 
+# Caché (fragmentos del dashboard). locmem por defecto; con varios procesos usar un
+# backend compartido, p. ej. CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+# y CACHE_LOCATION=/var/tmp/vet_cache, o DatabaseCache (requiere `createcachetable`).
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='vet-santa-sofia'),
+    }
+}
+
+# Perfil SQL por request (historial.middleware.PerfilSQLMiddleware): fracción de
+# requests muestreados entre 0 y 1 (p. ej. 0.05). 0 lo desactiva sin costo.
+# Reporte en /historial/rendimiento/ (solo administración).
+PERFIL_SQL_MUESTREO = config('PERFIL_SQL_MUESTREO', default=0.0, cast=float)
+# Días que se conservan las muestras: se purgan solas de a poco al guardar nuevas
+# y con `manage.py purgar_muestras_rendimiento` (tarea programada)
+PERFIL_SQL_RETENCION_DIAS = config('PERFIL_SQL_RETENCION_DIAS', default=30, cast=int)
+
+# Historial: los eventos se escriben dentro de la transacción del cambio. Con
+# HISTORIAL_COLA_ARCHIVO (ruta a un archivo SQLite local, p. ej. /var/tmp/vet_historial.sqlite3)
+# se encolan ahí al confirmarla y los inserta `manage.py procesar_cola_historial --continuo`
+# (correr como servicio en el mismo servidor); una caída entre el COMMIT y el
+# encolado pierde esos eventos. Vacío: se insertan en la transacción.
+HISTORIAL_COLA_ARCHIVO = config('HISTORIAL_COLA_ARCHIVO', default='')
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -107,6 +135,34 @@ AUTHENTICATION_BACKENDS = [
     'django.contrib.auth.backends.ModelBackend',
 ]
 
+# Logging: LOG_LEVEL controla las apps de la clínica (DEBUG para diagnosticar,
+# WARNING para silenciar); LOG_FORMAT=json emite una línea JSON por registro.
+LOG_LEVEL = config('LOG_LEVEL', default='INFO').upper()
+LOG_FORMAT = config('LOG_FORMAT', default='texto')
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'correlacion': {'()': 'veteriaria.logs.FiltroCorrelacion'},
+    },
+    'formatters': {
+        'texto': {'format': '%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s'},
+        'json': {'()': 'veteriaria.logs.FormateadorJSON'},
+    },
+    'handlers': {
+        'consola': {
+            'class': 'logging.StreamHandler',
+            'filters': ['correlacion'],
+            'formatter': 'json' if LOG_FORMAT == 'json' else 'texto',
+        },
+    },
+    'root': {'handlers': ['consola'], 'level': 'WARNING'},
+    'loggers': {
+        app: {'level': LOG_LEVEL}
+        for app in ['agenda', 'caja', 'clinica', 'cuentas', 'dashboard', 'historial', 'inventario', 'pacientes', 'servicios']
+    },
+}
+
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 SESSION_COOKIE_SECURE = not DEBUG
 CSRF_COOKIE_SECURE = not DEBUG